@@ -0,0 +1,84 @@
+"""added direct-conversation participant pair key
+
+Revision ID: 0f5685b209a3
+Revises: 7cf0e37bfb10
+Create Date: 2026-10-19 09:12:41.204118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0f5685b209a3"
+down_revision: Union[str, None] = "7cf0e37bfb10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# ids compared bytewise, the order python's sorted() gives the application
+PAIR_KEY = (
+    'LEAST(sender_id COLLATE "C", recipient_id COLLATE "C")'
+    " || ':' || "
+    'GREATEST(sender_id COLLATE "C", recipient_id COLLATE "C")'
+)
+
+# every conversation of a pair, with the oldest one kept
+RANKED_CONVERSATIONS = f"""
+    SELECT
+        id,
+        first_value(id) OVER (
+            PARTITION BY {PAIR_KEY}
+            ORDER BY created_at, id
+        ) AS keep_id
+    FROM chat_direct_conversations
+    WHERE sender_id IS NOT NULL AND recipient_id IS NOT NULL
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "chat_direct_conversations",
+        sa.Column("participant_pair_key", sa.String(length=121), nullable=True),
+    )
+    # merge conversations started from both sides of the same pair
+    op.execute(
+        f"""
+        UPDATE chat_direct_messages AS message
+        SET conversation_id = ranked.keep_id
+        FROM ({RANKED_CONVERSATIONS}) AS ranked
+        WHERE message.conversation_id = ranked.id AND ranked.id <> ranked.keep_id
+        """
+    )
+    op.execute(
+        f"""
+        DELETE FROM chat_direct_conversations
+        WHERE id IN (
+            SELECT id FROM ({RANKED_CONVERSATIONS}) AS ranked
+            WHERE ranked.id <> ranked.keep_id
+        )
+        """
+    )
+    op.execute(
+        f"""
+        UPDATE chat_direct_conversations
+        SET participant_pair_key = {PAIR_KEY}
+        WHERE sender_id IS NOT NULL AND recipient_id IS NOT NULL
+        """
+    )
+    op.create_index(
+        "ix_unique_conversations_participant_pair_key",
+        "chat_direct_conversations",
+        ["participant_pair_key"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_unique_conversations_participant_pair_key",
+        table_name="chat_direct_conversations",
+    )
+    op.drop_column("chat_direct_conversations", "participant_pair_key")
@@ -0,0 +1,33 @@
+"""added room invitation expiry index
+
+Revision ID: 3f6b0c9a1e27
+Revises: e4a9d2c7f318
+Create Date: 2026-10-19 16:52:18.204113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f6b0c9a1e27"
+down_revision: Union[str, None] = "e4a9d2c7f318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_room_invitations_status_expiration",
+        "chat_room_invitations",
+        ["invitation_status", "expiration"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_room_invitations_status_expiration", table_name="chat_room_invitations"
+    )
@@ -0,0 +1,69 @@
+"""added direct-conversation last message
+
+Revision ID: 5c2e8d41a7b9
+Revises: 0f5685b209a3
+Create Date: 2026-10-19 11:02:17.538290
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c2e8d41a7b9"
+down_revision: Union[str, None] = "0f5685b209a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "chat_direct_conversations",
+        sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.add_column(
+        "chat_direct_conversations",
+        sa.Column("last_message_id", sa.String(length=60), nullable=True),
+    )
+    # point every conversation at its newest message
+    op.execute(
+        """
+        UPDATE chat_direct_conversations AS conversation
+        SET last_message_id = latest.id, last_message_at = latest.created_at
+        FROM (
+            SELECT DISTINCT ON (conversation_id) conversation_id, id, created_at
+            FROM chat_direct_messages
+            WHERE conversation_id IS NOT NULL
+            ORDER BY conversation_id, created_at DESC, id DESC
+        ) AS latest
+        WHERE latest.conversation_id = conversation.id
+        """
+    )
+    op.create_index(
+        "ix_conversations_sender_id_last_message_at",
+        "chat_direct_conversations",
+        ["sender_id", sa.text("last_message_at DESC")],
+        unique=False,
+    )
+    op.create_index(
+        "ix_conversations_recipient_id_last_message_at",
+        "chat_direct_conversations",
+        ["recipient_id", sa.text("last_message_at DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_conversations_recipient_id_last_message_at",
+        table_name="chat_direct_conversations",
+    )
+    op.drop_index(
+        "ix_conversations_sender_id_last_message_at",
+        table_name="chat_direct_conversations",
+    )
+    op.drop_column("chat_direct_conversations", "last_message_id")
+    op.drop_column("chat_direct_conversations", "last_message_at")
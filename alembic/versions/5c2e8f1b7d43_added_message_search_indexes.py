@@ -0,0 +1,46 @@
+"""added message search indexes
+
+Revision ID: 5c2e8f1b7d43
+Revises: 9a4e7d2b6c81
+Create Date: 2026-10-19 19:12:08.407316
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c2e8f1b7d43"
+down_revision: Union[str, None] = "9a4e7d2b6c81"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("chat_direct_messages", "chat_room_messages")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector")
+        op.execute(
+            f"UPDATE {table} SET search_vector = "
+            "to_tsvector('pg_catalog.english', coalesce(content, ''))"
+        )
+        op.execute(
+            f"CREATE INDEX ix_{table}_search_vector "
+            f"ON {table} USING gin (search_vector)"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_search_vector_update "
+            f"BEFORE INSERT OR UPDATE OF content ON {table} FOR EACH ROW "
+            "EXECUTE FUNCTION tsvector_update_trigger("
+            "search_vector, 'pg_catalog.english', content)"
+        )
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table}")
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,33 @@
+"""added room members roster index
+
+Revision ID: 8d3a61f0c2b4
+Revises: 5c2e8d41a7b9
+Create Date: 2026-10-19 14:21:40.118502
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d3a61f0c2b4"
+down_revision: Union[str, None] = "5c2e8d41a7b9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_room_members_roster",
+        "chat_room_members",
+        ["room_id", sa.text("is_admin DESC"), "created_at", "member_id"],
+        unique=False,
+        postgresql_where=sa.text("left_room IS FALSE"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_room_members_roster", table_name="chat_room_members")
@@ -0,0 +1,43 @@
+"""added room invitation inbox indexes
+
+Revision ID: 9a4e7d2b6c81
+Revises: 3f6b0c9a1e27
+Create Date: 2026-10-19 17:34:45.918270
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4e7d2b6c81"
+down_revision: Union[str, None] = "3f6b0c9a1e27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_room_invitations_invitee_status_created_at",
+        "chat_room_invitations",
+        ["invitee_id", "invitation_status", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_room_invitations_room_status",
+        "chat_room_invitations",
+        ["room_id", "invitation_status"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_room_invitations_room_status", table_name="chat_room_invitations"
+    )
+    op.drop_index(
+        "ix_room_invitations_invitee_status_created_at",
+        table_name="chat_room_invitations",
+    )
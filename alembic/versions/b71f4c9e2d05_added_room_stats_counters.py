@@ -0,0 +1,61 @@
+"""added room stats counters
+
+Revision ID: b71f4c9e2d05
+Revises: 8d3a61f0c2b4
+Create Date: 2026-10-19 14:12:40.118302
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b71f4c9e2d05"
+down_revision: Union[str, None] = "8d3a61f0c2b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "chat_rooms",
+        sa.Column("member_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "chat_rooms",
+        sa.Column("message_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "chat_rooms",
+        sa.Column("last_activity_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    # count every room's members and messages once, the writes keep them up
+    op.execute(
+        """
+        UPDATE chat_rooms AS room
+        SET member_count = (
+                SELECT count(*) FROM chat_room_members AS member
+                WHERE member.room_id = room.id AND member.left_room IS FALSE
+            ),
+            message_count = (
+                SELECT count(*) FROM chat_room_messages AS message
+                WHERE message.room_id = room.id AND message.is_deleted IS FALSE
+            ),
+            last_activity_at = GREATEST(
+                room.created_at,
+                (SELECT max(created_at) FROM chat_room_messages AS message
+                 WHERE message.room_id = room.id),
+                (SELECT max(created_at) FROM chat_room_members AS member
+                 WHERE member.room_id = room.id)
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("chat_rooms", "last_activity_at")
+    op.drop_column("chat_rooms", "message_count")
+    op.drop_column("chat_rooms", "member_count")
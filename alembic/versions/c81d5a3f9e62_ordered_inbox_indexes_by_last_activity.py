@@ -0,0 +1,65 @@
+"""ordered inbox indexes by last activity
+
+Revision ID: c81d5a3f9e62
+Revises: 5c2e8f1b7d43
+Create Date: 2026-10-20 09:14:36.201874
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c81d5a3f9e62"
+down_revision: Union[str, None] = "5c2e8f1b7d43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index(
+        "ix_conversations_sender_id_last_message_at",
+        table_name="chat_direct_conversations",
+    )
+    op.drop_index(
+        "ix_conversations_recipient_id_last_message_at",
+        table_name="chat_direct_conversations",
+    )
+    op.create_index(
+        "ix_conversations_sender_id_activity",
+        "chat_direct_conversations",
+        ["sender_id", sa.text("coalesce(last_message_at, created_at) DESC")],
+        unique=False,
+    )
+    op.create_index(
+        "ix_conversations_recipient_id_activity",
+        "chat_direct_conversations",
+        ["recipient_id", sa.text("coalesce(last_message_at, created_at) DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_conversations_recipient_id_activity",
+        table_name="chat_direct_conversations",
+    )
+    op.drop_index(
+        "ix_conversations_sender_id_activity",
+        table_name="chat_direct_conversations",
+    )
+    op.create_index(
+        "ix_conversations_recipient_id_last_message_at",
+        "chat_direct_conversations",
+        ["recipient_id", sa.text("last_message_at DESC")],
+        unique=False,
+    )
+    op.create_index(
+        "ix_conversations_sender_id_last_message_at",
+        "chat_direct_conversations",
+        ["sender_id", sa.text("last_message_at DESC")],
+        unique=False,
+    )
@@ -0,0 +1,61 @@
+"""added room discovery indexes
+
+Revision ID: e4a9d2c7f318
+Revises: b71f4c9e2d05
+Create Date: 2026-10-19 15:40:03.551870
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a9d2c7f318"
+down_revision: Union[str, None] = "b71f4c9e2d05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DISCOVERABLE = sa.text("is_private IS FALSE AND is_deactivated IS FALSE")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_rooms_discoverable_name_prefix",
+        "chat_rooms",
+        [sa.text("lower(name) text_pattern_ops")],
+        unique=False,
+        postgresql_where=DISCOVERABLE,
+    )
+    op.create_index(
+        "ix_rooms_discoverable_name_trgm",
+        "chat_rooms",
+        [sa.text("name gin_trgm_ops")],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_where=DISCOVERABLE,
+    )
+    op.create_index(
+        "ix_rooms_discoverable_last_activity_at",
+        "chat_rooms",
+        [sa.text("last_activity_at DESC")],
+        unique=False,
+        postgresql_where=DISCOVERABLE,
+    )
+    op.create_index(
+        "ix_rooms_discoverable_member_count",
+        "chat_rooms",
+        [sa.text("member_count DESC")],
+        unique=False,
+        postgresql_where=DISCOVERABLE,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_rooms_discoverable_member_count", table_name="chat_rooms")
+    op.drop_index("ix_rooms_discoverable_last_activity_at", table_name="chat_rooms")
+    op.drop_index("ix_rooms_discoverable_name_trgm", table_name="chat_rooms")
+    op.drop_index("ix_rooms_discoverable_name_prefix", table_name="chat_rooms")
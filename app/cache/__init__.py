@@ -0,0 +1,31 @@
+"""
+Tiered cache package
+
+An in-process LRU in front of Redis for repository reads, with jittered
+ttls, coalesced misses and tag invalidation on commit, and single-flight
+coalescing of identical concurrent reads.
+"""
+
+from app.cache.lru import MISSING, LocalLRU
+from app.cache.single_flight import DistributedSingleFlight, SingleFlight
+from app.cache.tiered import TieredCache, tiered_cache
+from app.cache.invalidation import instance_tags, pending_tags, written_tables
+from app.cache.serialization import Record, Uncacheable
+from app.cache.decorators import cache_key, cached, coalesced
+
+__all__ = [
+    "MISSING",
+    "LocalLRU",
+    "SingleFlight",
+    "DistributedSingleFlight",
+    "TieredCache",
+    "tiered_cache",
+    "instance_tags",
+    "pending_tags",
+    "written_tables",
+    "Record",
+    "Uncacheable",
+    "cache_key",
+    "cached",
+    "coalesced",
+]
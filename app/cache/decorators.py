@@ -0,0 +1,226 @@
+"""
+Cache decorators module
+
+Lets repository read methods adopt the tiered cache, or only request
+coalescing, declaratively:
+
+    @cached("rooms", tags=("chat_rooms:{room_id}",))
+    async def fetch(self, room_id, session, attributes=[]): ...
+
+The key is built from the namespace and every argument but self and
+session. Tags are formatted with the arguments, row tags with each row of a
+list result, and entries also carry the table tag of each.
+
+    @coalesced("room-messages", tables=("chat_room_messages",))
+    async def fetch_all(self, room_id, offset, order, session, ...): ...
+
+Concurrent identical calls share one execution, keyed the same way.
+"""
+
+import functools
+import inspect
+import json
+import typing
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.invalidation import pending_tags, written_tables
+from app.cache.serialization import Uncacheable, dump, load
+from app.cache.tiered import TieredCache, tag_table, tiered_cache
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: Cache ::")
+
+NOT_KEYED = ("self", "session")
+
+
+class SharedResult:
+    """
+    A coalesced call's result, serialized only if another call joined it.
+    """
+
+    def __init__(self, namespace: str, result: typing.Any) -> None:
+        self.namespace = namespace
+        self.result = result
+        self._payload: typing.Any = None
+        self._dumped = False
+
+    @property
+    def payload(self) -> typing.Any:
+        """
+        The result as a payload, None when it cannot be shared.
+        """
+        if not self._dumped:
+            self._dumped = True
+            self._payload = shareable(self.namespace, self.result)
+        return self._payload
+
+
+def shareable(namespace: str, result: typing.Any) -> typing.Any:
+    """
+    Serializes a result for other sessions, None when it cannot be.
+    """
+    try:
+        return dump(result)
+    except Uncacheable as exc:
+        logger.warning("%s result not shared: %s", namespace, str(exc))
+        return None
+
+
+def call_arguments(
+    signature: inspect.Signature, args: tuple, kwargs: dict
+) -> typing.Tuple[AsyncSession, typing.Dict[str, typing.Any]]:
+    """
+    The session of a repository call, and its other arguments by name.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = {
+        name: value for name, value in bound.arguments.items() if name not in NOT_KEYED
+    }
+    return bound.arguments["session"], arguments
+
+
+def cache_key(namespace: str, arguments: typing.Mapping[str, typing.Any]) -> str:
+    """
+    Builds the cache key of a call.
+    """
+    return f"{namespace}:" + json.dumps(arguments, sort_keys=True, default=str)
+
+
+def cached(
+    namespace: str,
+    tags: typing.Sequence[str] = (),
+    row_tags: typing.Sequence[str] = (),
+    ttl: typing.Optional[float] = None,
+    cache: typing.Optional[TieredCache] = None,
+):
+    """
+    Caches the results of an async repository read method.
+
+    Hits are rebuilt without a query, mapped instances are merged into the
+    caller's session. None results are not cached, and a session that wrote
+    to a tagged table in its open transaction reads from the database.
+
+    Args:
+        namespace(str): Prefix of the keys, and the metrics label.
+        tags(Sequence[str]): Tags of the entries, formatted with the arguments.
+        row_tags(Sequence[str]): Tags formatted with each row of a list
+            result, for the rows it joins in.
+        ttl(float): Seconds the entries live, the configured default if None.
+        cache(TieredCache): The cache, the shared one if None.
+    Returns:
+        the decorator.
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+        (cache or tiered_cache).watch([*tags, *row_tags])
+        tables = {tag_table(tag) for tag in (*tags, *row_tags)}
+        row_tables = {tag_table(tag) for tag in row_tags}
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            session, arguments = call_arguments(signature, args, kwargs)
+            entry_tags = [*tables, *[tag.format(**arguments) for tag in tags]]
+            store = cache or tiered_cache
+            pending = pending_tags(session)
+            if (
+                not store.enabled
+                or pending.intersection(entry_tags)
+                or any(tag_table(tag) in row_tables for tag in pending)
+            ):
+                return await function(*args, **kwargs)
+
+            # the loading caller gets its own result back, not a copy
+            loaded = []
+            found_tags: typing.List[str] = []
+
+            async def loader() -> typing.Any:
+                result = await function(*args, **kwargs)
+                loaded.append(result)
+                for row in result if row_tags and result else ():
+                    found_tags.extend(tag.format(**row) for tag in row_tags)
+                return shareable(namespace, result)
+
+            payload = await store.get_or_load(
+                cache_key(namespace, arguments),
+                loader,
+                tags=lambda: [*entry_tags, *found_tags],
+                ttl=ttl,
+                namespace=namespace,
+            )
+            if loaded:
+                return loaded[0]
+            if payload is None:
+                # the shared load found nothing, or nothing it could cache
+                return await function(*args, **kwargs)
+            return await load(payload, session)
+
+        return wrapper
+
+    return decorator
+
+
+def coalesced(
+    namespace: str,
+    tables: typing.Sequence[str] = (),
+    remote: typing.Optional[bool] = None,
+    cache: typing.Optional[TieredCache] = None,
+):
+    """
+    Shares one execution among concurrent identical calls of an async
+    repository read method, without caching its result.
+
+    Joining calls get the result rebuilt in their own session. A session
+    that wrote to one of the tables in its open transaction runs its own
+    query.
+
+    Args:
+        namespace(str): Prefix of the keys, and the metrics label.
+        tables(Sequence[str]): The tables the method reads.
+        remote(bool): Whether to coalesce across workers, the configured
+            default if None.
+        cache(TieredCache): The cache whose Redis client is used, the shared
+            one if None.
+    Returns:
+        the decorator.
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            session, arguments = call_arguments(signature, args, kwargs)
+            store = cache or tiered_cache
+            if written_tables(session).intersection(tables):
+                return await function(*args, **kwargs)
+            across_workers = store.remote_single_flight if remote is None else remote
+
+            # the executing caller gets its own result back, not a copy
+            loaded = []
+
+            async def loader() -> typing.Any:
+                result = await function(*args, **kwargs)
+                loaded.append(result)
+                if across_workers:
+                    return shareable(namespace, result)
+                return SharedResult(namespace, result)
+
+            shared = await store.coalesce(
+                cache_key(namespace, arguments),
+                loader,
+                namespace=namespace,
+                remote=across_workers,
+            )
+            if loaded:
+                return loaded[0]
+            payload = shared.payload if isinstance(shared, SharedResult) else shared
+            if payload is None:
+                return await function(*args, **kwargs)
+            return await load(payload, session)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,244 @@
+"""
+Cache invalidation module
+
+Session events collect the tags a transaction makes stale and drop them from
+the tiered cache once it commits:
+- {table}:{primary key} for each flushed instance
+- {table}.{foreign key}:{value} for each of its foreign keys, old and new
+- for ORM insert, update and delete statements, the tags of the kinds cached
+  entries carry, read from the rows' parameters or from the = and IN
+  comparisons of the WHERE clause, {table} when they do not pin them
+
+A rollback discards them. Tags of tables no cached entry depends on are
+ignored, the tables written are still noted for coalesced reads. Raw text
+statements are not seen, and neither are statements run with the
+cache_invalidate=False execution option: denormalized counters moved on
+every write, which cached entries may show up to their ttl old.
+"""
+
+import typing
+
+from sqlalchemy import Column, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.dml import Insert, UpdateBase
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from sqlalchemy.util import await_only
+from sqlalchemy.util.concurrency import in_greenlet
+
+from app.cache.tiered import tag_table, tiered_cache
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: Cache Invalidation ::")
+
+PENDING_TAGS = "cache_tags"
+WRITTEN_TABLES = "cache_written_tables"
+
+
+def instance_tags(instance: typing.Any) -> typing.Set[str]:
+    """
+    Tags an instance change makes stale.
+
+    Args:
+        instance: The mapped instance.
+    Returns:
+        Set[str]: the tags.
+    """
+    state = inspect(instance)
+    mapper = state.mapper
+    table = mapper.local_table.name
+    identity = mapper.primary_key_from_instance(instance)
+    tags = {f"{table}:{':'.join(str(value) for value in identity)}"}
+    for column in mapper.local_table.columns:
+        if not column.foreign_keys:
+            continue
+        key = mapper.get_property_by_column(column).key
+        history = state.attrs[key].history
+        for value in (*history.added, *history.unchanged, *history.deleted):
+            if value is not None:
+                tags.add(f"{table}.{column.name}:{value}")
+    return tags
+
+
+def pinned_values(
+    clause: typing.Any, parameters: typing.Mapping[str, typing.Any]
+) -> typing.Dict[str, typing.List[typing.Any]]:
+    """
+    Values the = and IN comparisons of an AND clause pin columns to.
+
+    Args:
+        clause: The WHERE clause.
+        parameters(Mapping): The values of unvalued bind parameters.
+    Returns:
+        Dict[str, List]: column name -> values.
+    """
+    if clause is None:
+        return {}
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        pinned: typing.Dict[str, typing.List[typing.Any]] = {}
+        for condition in clause.clauses:
+            for name, values in pinned_values(condition, parameters).items():
+                pinned.setdefault(name, []).extend(values)
+        return pinned
+    if not (
+        isinstance(clause, BinaryExpression)
+        and clause.operator in (operators.eq, operators.in_op)
+        and isinstance(clause.left, Column)
+        and isinstance(clause.right, BindParameter)
+    ):
+        return {}
+    bind = clause.right
+    if bind.value is None and bind.callable is None:
+        value = parameters.get(bind.key)
+    else:
+        value = bind.effective_value
+    values = list(value) if clause.operator is operators.in_op else [value]
+    if value is None or None in values:
+        return {}
+    return {clause.left.name: values}
+
+
+def statement_tags(dml: UpdateBase, parameters: typing.Any) -> typing.Set[str]:
+    """
+    Tags an insert, update or delete statement makes stale.
+
+    Args:
+        dml(UpdateBase): The statement.
+        parameters: Its execution parameters, a dict or a list of rows.
+    Returns:
+        Set[str]: the tags, the table tag when its rows are not pinned.
+    """
+    table = dml.table
+    name = table.name
+    kinds = tiered_cache.kinds.get(name, set())
+    primary_key = [column.name for column in table.primary_key.columns]
+    values = {
+        getattr(key, "name", key): getattr(bind, "value", bind)
+        for key, bind in (getattr(dml, "_values", None) or {}).items()
+    }
+
+    if isinstance(parameters, list) or isinstance(dml, Insert):
+        # bulk rows, or a single row insert
+        rows = parameters if isinstance(parameters, list) else [parameters or values]
+        pinned: typing.Dict[str, typing.List[typing.Any]] = {}
+        for row in rows:
+            for column, value in row.items():
+                if value is not None:
+                    pinned.setdefault(column, []).append(value)
+        complete = lambda column: len(pinned.get(column, ())) == len(rows)
+    else:
+        if any(f"{name}.{column}" in kinds for column in values):
+            # rows move between groups, their old ones are unknown
+            return {name}
+        pinned = pinned_values(dml.whereclause, parameters or {})
+        complete = lambda column: column in pinned
+
+    tags: typing.Set[str] = set()
+    for kind in sorted(kinds):
+        if kind == f"{name}:":
+            if len(primary_key) != 1 or not complete(primary_key[0]):
+                if isinstance(dml, Insert):
+                    # new rows, nothing was cached under their ids
+                    continue
+                return {name}
+            tags.update(f"{name}:{value}" for value in pinned[primary_key[0]])
+        else:
+            column = kind.split(".", 1)[1]
+            if not complete(column):
+                return {name}
+            tags.update(f"{kind}:{value}" for value in pinned[column])
+    if name in tiered_cache.whole_tables:
+        tags.add(name)
+    return tags
+
+
+def pending_tags(session: typing.Any) -> typing.Set[str]:
+    """
+    Tags the open transaction of a session made stale, not yet invalidated.
+    """
+    return session.info.get(PENDING_TAGS, set())
+
+
+def written_tables(session: typing.Any) -> typing.Set[str]:
+    """
+    Tables the open transaction of a session wrote to.
+    """
+    return session.info.get(WRITTEN_TABLES, set())
+
+
+def collect(session: Session, tags: typing.Iterable[str]) -> None:
+    """
+    Adds tags to the session's pending ones, if any cached entry uses them.
+    """
+    tags = {tag for tag in tags if tag_table(tag) in tiered_cache.tables}
+    if tags:
+        session.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_flush_tags(session: Session, flush_context) -> None:
+    """
+    Collects the tags of the instances a flush wrote.
+    """
+    instances = (*session.new, *session.dirty, *session.deleted)
+    session.info.setdefault(WRITTEN_TABLES, set()).update(
+        inspect(instance).mapper.local_table.name for instance in instances
+    )
+    if not tiered_cache.tables:
+        return
+    tags: typing.Set[str] = set()
+    for instance in instances:
+        tags.update(instance_tags(instance))
+    collect(session, tags)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def collect_statement_tags(orm_execute_state) -> None:
+    """
+    Collects the tags of ORM insert, update and delete statements,
+    returning ones included.
+    """
+    statement = orm_execute_state.statement
+    dml = statement if isinstance(statement, UpdateBase) else None
+    if dml is None and isinstance(getattr(statement, "element", None), UpdateBase):
+        dml = statement.element
+    table = getattr(getattr(dml, "table", None), "name", None)
+    if table is None:
+        return
+    orm_execute_state.session.info.setdefault(WRITTEN_TABLES, set()).add(table)
+    if table not in tiered_cache.tables:
+        return
+    if not orm_execute_state.execution_options.get("cache_invalidate", True):
+        return
+    collect(
+        orm_execute_state.session,
+        statement_tags(dml, orm_execute_state.parameters),
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_tags(session: Session) -> None:
+    """
+    Invalidates the tags of a committed transaction.
+    """
+    session.info.pop(WRITTEN_TABLES, None)
+    tags = session.info.pop(PENDING_TAGS, None)
+    if not tags:
+        return
+    try:
+        if in_greenlet():
+            # AsyncSession commits in a greenlet spawned from the event loop
+            await_only(tiered_cache.invalidate(tags))
+        else:
+            tiered_cache.invalidate_sync(tags)
+    except Exception as exc:  # the commit stands, entries expire on their ttl
+        logger.error("cache invalidation failed: %s", str(exc))
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_rolled_back_tags(session: Session) -> None:
+    """
+    Discards the tags of a rolled back transaction.
+    """
+    session.info.pop(WRITTEN_TABLES, None)
+    session.info.pop(PENDING_TAGS, None)
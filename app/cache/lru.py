@@ -0,0 +1,112 @@
+"""
+LocalLRU Module
+
+In-process least recently used cache, the first tier of the tiered cache.
+Entries expire on their own ttl and are indexed by tag so a commit can drop
+every entry it made stale.
+"""
+
+import time
+import typing
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LocalLRU:
+    """
+    Bounded in-process cache with per entry ttl and tags.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, typing.Tuple[float, typing.Any, typing.Tuple[str, ...]]]" = (
+            OrderedDict()
+        )
+        self._tags: typing.Dict[str, typing.Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> typing.Any:
+        """
+        Reads an entry.
+
+        Args:
+            key(str): The cache key.
+        Returns:
+            Any: the value, MISSING when absent or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._discard(key)
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: str, value: typing.Any, ttl: float, tags: typing.Sequence[str] = ()
+    ) -> None:
+        """
+        Stores an entry, evicting the least recently used beyond maxsize.
+
+        Args:
+            key(str): The cache key.
+            value(Any): The value.
+            ttl(float): Seconds the entry lives.
+            tags(Sequence[str]): Tags the entry is invalidated by.
+        Returns:
+            None
+        """
+        if self.maxsize <= 0:
+            return
+        self._discard(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        """
+        Drops an entry.
+        """
+        self._discard(key)
+
+    def invalidate(self, tags: typing.Iterable[str]) -> int:
+        """
+        Drops every entry carrying any of the tags.
+
+        Args:
+            tags(Iterable[str]): The tags.
+        Returns:
+            int: the number of entries dropped.
+        """
+        dropped = 0
+        for tag in tags:
+            for key in self._tags.pop(tag, set()):
+                if key in self._entries:
+                    self._discard(key)
+                    dropped += 1
+        return dropped
+
+    def clear(self) -> None:
+        """
+        Drops every entry.
+        """
+        self._entries.clear()
+        self._tags.clear()
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,159 @@
+"""
+Cache serialization module
+
+Repository results are cached as JSON compatible payloads:
+- mapped instances keep their model and loaded column values, and are merged
+  back into the reading session without a query, as persistent objects
+- columns a model lists in __cache_exclude__ are left out, they stay unloaded
+  on a cached instance
+- row mappings come back as Record, a dict with attribute access
+- datetimes, dates, decimals, uuids and tuples are tagged so they come back
+  with their type
+"""
+
+import decimal
+import enum
+import typing
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.database.session import Base
+
+
+class Uncacheable(Exception):
+    """
+    Raised for a result the cache cannot store faithfully.
+    """
+
+
+class Record(dict):
+    """
+    A cached row mapping, readable by key or by attribute like RowMapping.
+    """
+
+    def __getattr__(self, name: str) -> typing.Any:
+        try:
+            return self[name]
+        except KeyError as exc:
+            raise AttributeError(name) from exc
+
+
+_models: typing.Dict[str, typing.Any] = {}
+
+
+def model_mapper(table_name: str):
+    """
+    Resolves the mapper of a model by its table name.
+    """
+    if not _models:
+        for mapper in Base.registry.mappers:
+            _models[mapper.local_table.name] = mapper
+    try:
+        return _models[table_name]
+    except KeyError as exc:
+        raise Uncacheable(f"unknown model {table_name}") from exc
+
+
+def dump(value: typing.Any) -> typing.Any:
+    """
+    Converts a repository result into a JSON compatible payload.
+
+    Args:
+        value(Any): The result.
+    Returns:
+        Any: the payload.
+    Raises:
+        Uncacheable: for values that would not come back as they went in.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, enum.Enum):
+        return dump(value.value)
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, tuple):
+        return {"__tuple__": [dump(item) for item in value]}
+    if isinstance(value, list):
+        return [dump(item) for item in value]
+    if isinstance(value, (RowMapping, Record)):
+        return {"__row__": {key: dump(item) for key, item in value.items()}}
+    if isinstance(value, dict):
+        return {str(key): dump(item) for key, item in value.items()}
+    if isinstance(value, Base):
+        state = inspect(value)
+        attrs = {}
+        excluded = getattr(state.mapper.class_, "__cache_exclude__", ())
+        for column in state.mapper.column_attrs:
+            if column.key in excluded:
+                continue
+            if column.key not in state.dict:
+                raise Uncacheable(f"{column.key} is not loaded")
+            attrs[column.key] = dump(state.dict[column.key])
+        return {"__model__": state.mapper.local_table.name, "attrs": attrs}
+    raise Uncacheable(f"cannot cache {type(value).__name__}")
+
+
+async def load(payload: typing.Any, session: AsyncSession) -> typing.Any:
+    """
+    Rebuilds a repository result from its payload.
+
+    Args:
+        payload(Any): The payload.
+        session(AsyncSession): The session mapped instances are merged into.
+    Returns:
+        Any: the result.
+    """
+    if isinstance(payload, list):
+        return [await load(item, session) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+    if "__datetime__" in payload:
+        return datetime.fromisoformat(payload["__datetime__"])
+    if "__date__" in payload:
+        return date.fromisoformat(payload["__date__"])
+    if "__decimal__" in payload:
+        return decimal.Decimal(payload["__decimal__"])
+    if "__tuple__" in payload:
+        return tuple([await load(item, session) for item in payload["__tuple__"]])
+    if "__row__" in payload:
+        return Record(
+            {key: await load(item, session) for key, item in payload["__row__"].items()}
+        )
+    if "__model__" in payload:
+        return await merge_instance(payload, session)
+    return {key: await load(item, session) for key, item in payload.items()}
+
+
+async def merge_instance(payload: dict, session: AsyncSession) -> typing.Any:
+    """
+    Places a cached instance in the session, without querying.
+
+    An instance the session already holds wins, it may carry changes not
+    flushed yet.
+    """
+    mapper = model_mapper(payload["__model__"])
+    attrs = {key: await load(value, session) for key, value in payload["attrs"].items()}
+    identity_key = mapper.identity_key_from_primary_key(
+        [attrs[mapper.get_property_by_column(column).key] for column in mapper.primary_key]
+    )
+    existing = session.sync_session.identity_map.get(identity_key)
+    if existing is not None:
+        return existing
+
+    instance = mapper.class_manager.new_instance()
+    for key, value in attrs.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    return await session.merge(instance, load=False)
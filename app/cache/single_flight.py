@@ -0,0 +1,252 @@
+"""
+SingleFlight Module
+
+Coalesces concurrent loads of the same key: the first caller runs the loader,
+the others await its result instead of hitting the database again.
+
+DistributedSingleFlight extends this across workers: the worker holding
+sf:lock:{key} runs the loader and publishes its JSON result under
+sf:result:{key}:{token}, the others poll for it and run the loader
+themselves if the lock goes away without a result or the wait times out.
+"""
+
+import asyncio
+import json
+import time
+import typing
+import uuid
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.metrics import SINGLE_FLIGHT_CALLS
+
+T = typing.TypeVar("T")
+
+# takes the lock, or returns the token of the flight holding it
+ACQUIRE_LOCK = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return ARGV[1]
+end
+return redis.call('GET', KEYS[1])
+"""
+
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    In-process request coalescing keyed by cache key.
+    """
+
+    def __init__(self) -> None:
+        self._flights: typing.Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> bool:
+        """
+        Whether a load of the key is running.
+        """
+        return key in self._flights
+
+    async def do(
+        self,
+        key: str,
+        loader: typing.Callable[[], typing.Awaitable[T]],
+        namespace: str = "default",
+    ) -> T:
+        """
+        Runs the loader, or joins the load of the key already running.
+
+        Args:
+            key(str): The cache key.
+            loader(Callable): Coroutine function producing the value.
+            namespace(str): The metrics label of the key.
+        Returns:
+            the loader's result, its exception is raised to every caller. A
+            caller whose leader was cancelled joins or runs the next load.
+        """
+        while (flight := self._flights.get(key)) is not None:
+            SINGLE_FLIGHT_CALLS.labels(namespace=namespace, result="coalesced").inc()
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not flight.cancelled() or (task and task.cancelling()):
+                    raise
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            # retrieved here so a flight nobody joined does not log its error
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+
+class DistributedSingleFlight:
+    """
+    Request coalescing within the worker, then across workers through Redis.
+    Results must be JSON compatible.
+    """
+
+    def __init__(
+        self,
+        local: SingleFlight,
+        client: typing.Callable[[], typing.Optional[Redis]],
+        on_error: typing.Callable[[str, Exception], None],
+        lock_ttl: float,
+        result_ttl: float,
+        poll_interval: float,
+        prefix: str = "sf",
+    ) -> None:
+        self.local = local
+        self.client = client
+        self.on_error = on_error
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+
+    def lock_key(self, key: str) -> str:
+        """
+        Redis key held by the worker loading a key.
+        """
+        return f"{self.prefix}:lock:{key}"
+
+    def result_key(self, key: str, token: str) -> str:
+        """
+        Redis key of the result of one flight.
+        """
+        return f"{self.prefix}:result:{key}:{token}"
+
+    async def do(
+        self,
+        key: str,
+        loader: typing.Callable[[], typing.Awaitable[typing.Any]],
+        namespace: str = "default",
+        remote: bool = True,
+    ) -> typing.Any:
+        """
+        Runs the loader, or joins the load of the key running in this
+        worker, or with remote, in another one.
+
+        Args:
+            key(str): The key.
+            loader(Callable): Coroutine function producing the value.
+            namespace(str): The metrics label of the key.
+            remote(bool): Whether to coalesce across workers.
+        Returns:
+            the loader's result.
+        """
+
+        async def load() -> typing.Any:
+            SINGLE_FLIGHT_CALLS.labels(namespace=namespace, result="executed").inc()
+            return await loader()
+
+        if not remote:
+            return await self.local.do(key, load, namespace)
+        return await self.local.do(
+            key, lambda: self.remote(key, load, namespace), namespace
+        )
+
+    async def remote(
+        self,
+        key: str,
+        loader: typing.Callable[[], typing.Awaitable[typing.Any]],
+        namespace: str,
+    ) -> typing.Any:
+        """
+        Runs the loader while holding the key's lock, or waits for the
+        result of the worker holding it.
+        """
+        client = self.client()
+        if client is None:
+            return await loader()
+        token = uuid.uuid4().hex
+        try:
+            holder = await client.register_script(ACQUIRE_LOCK)(
+                keys=[self.lock_key(key)], args=[token, int(self.lock_ttl * 1000)]
+            )
+        except RedisError as exc:
+            self.on_error("lock", exc)
+            return await loader()
+
+        if holder == token:
+            try:
+                result = await loader()
+                await self.publish(client, key, token, result)
+                return result
+            finally:
+                try:
+                    await client.register_script(RELEASE_LOCK)(
+                        keys=[self.lock_key(key)], args=[token]
+                    )
+                except RedisError as exc:
+                    self.on_error("unlock", exc)
+
+        if holder is not None:
+            try:
+                raw = await self.wait(client, key, holder)
+            except RedisError as exc:
+                self.on_error("result read", exc)
+                raw = None
+            if raw is not None:
+                SINGLE_FLIGHT_CALLS.labels(
+                    namespace=namespace, result="coalesced_remote"
+                ).inc()
+                return json.loads(raw)
+        return await loader()
+
+    async def publish(
+        self, client: Redis, key: str, token: str, result: typing.Any
+    ) -> None:
+        """
+        Shares a flight's result with the workers waiting for it.
+        """
+        try:
+            await client.set(
+                self.result_key(key, token),
+                json.dumps(result),
+                px=int(self.result_ttl * 1000),
+            )
+        except RedisError as exc:
+            self.on_error("result write", exc)
+
+    async def wait(
+        self, client: Redis, key: str, holder: str
+    ) -> typing.Optional[str]:
+        """
+        Polls for the result of another worker's flight.
+
+        Returns:
+            str: the JSON result, None once the flight ended without one or
+            the lock ttl passed.
+        """
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            # the lock first: the result is written before it is released
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(self.lock_key(key))
+                pipe.get(self.result_key(key, holder))
+                current, raw = await pipe.execute()
+            if raw is not None:
+                return raw
+            if current != holder:
+                return None
+        return None
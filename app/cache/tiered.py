@@ -0,0 +1,494 @@
+"""
+TieredCache Module
+
+Two tier read cache: a short lived in-process LRU in front of Redis.
+- cache:{key}: the entry, JSON of its payload and tags (STRING)
+- cache:tag:{tag}: the keys carrying a tag (SET)
+
+Ttls are jittered so entries filled together do not expire together, and
+concurrent misses of a key share one load, across workers with
+SINGLE_FLIGHT_REMOTE. A load is not stored when one of its tags was
+invalidated while it ran. Redis errors are logged and skip Redis for a
+backoff period, the cache then runs on its local tier alone: the
+invalidations Redis missed are kept and replayed before it is read again.
+"""
+
+import asyncio
+import collections
+import json
+import random
+import time
+import typing
+
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.cache.lru import MISSING, LocalLRU
+from app.cache.single_flight import DistributedSingleFlight, SingleFlight
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.database.redis_db import InstrumentedRedis
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: Tiered Cache ::")
+
+# tag sets live as long as their longest lived entry
+STORE_ENTRY = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for index = 2, #KEYS do
+    redis.call('SADD', KEYS[index], KEYS[1])
+    if redis.call('TTL', KEYS[index]) < tonumber(ARGV[2]) then
+        redis.call('EXPIRE', KEYS[index], ARGV[2])
+    end
+end
+"""
+
+INVALIDATE_TAGS = """
+local dropped = 0
+for index = 1, #KEYS do
+    for _, key in ipairs(redis.call('SMEMBERS', KEYS[index])) do
+        dropped = dropped + redis.call('DEL', key)
+    end
+    redis.call('DEL', KEYS[index])
+end
+return dropped
+"""
+
+# past this many missed tags, every Redis entry is dropped on recovery instead
+MAX_DEFERRED_TAGS = 10000
+
+
+def tag_table(tag: str) -> str:
+    """
+    The table a tag belongs to, tags being {table}, {table}:{id} or
+    {table}.{column}:{value}.
+    """
+    return tag.split(":", 1)[0].split(".", 1)[0]
+
+
+def tag_kind(tag: str) -> typing.Optional[str]:
+    """
+    What a tag pins rows by: "{table}:" for the primary key,
+    "{table}.{column}" for a column, None for a whole table tag.
+    """
+    if ":" not in tag:
+        return None
+    prefix = tag.split(":", 1)[0]
+    return prefix if "." in prefix else f"{prefix}:"
+
+
+class TieredCache:
+    """
+    In-process LRU in front of Redis, with tag invalidation.
+    """
+
+    def __init__(
+        self,
+        prefix: str = "cache",
+        local_maxsize: int = settings.cache_local_maxsize,
+        local_ttl: float = settings.cache_local_ttl_seconds,
+        default_ttl: float = settings.cache_default_ttl_seconds,
+        jitter: float = settings.cache_ttl_jitter,
+        redis_url: typing.Optional[str] = settings.redis_url,
+        enabled: bool = settings.cache_enabled,
+        remote_single_flight: bool = settings.single_flight_remote,
+    ) -> None:
+        self.prefix = prefix
+        self.local = LocalLRU(local_maxsize)
+        self.local_ttl = local_ttl
+        self.default_ttl = default_ttl
+        self.jitter = jitter
+        self.redis_url = redis_url
+        self.enabled = enabled
+        self.single_flight = SingleFlight()
+        self.remote_single_flight = remote_single_flight
+        self.flights = DistributedSingleFlight(
+            self.single_flight,
+            client=self.redis,
+            on_error=self.redis_failed,
+            lock_ttl=settings.single_flight_lock_ttl_seconds,
+            result_ttl=settings.single_flight_result_ttl_seconds,
+            poll_interval=settings.single_flight_poll_interval_seconds,
+        )
+        self._redis: typing.Optional[Redis] = None
+        self._redis_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._redis_sync: typing.Optional[SyncRedis] = None
+        self._redis_skipped_until = 0.0
+        # invalidation sequence, the last one of each tag invalidated while
+        # loads that started before it run, and those loads' start points
+        self._generation = 0
+        self._tag_generations: typing.Dict[str, int] = {}
+        self._loads: typing.Counter[int] = collections.Counter()
+        # tags Redis missed while skipped, None when too many to replay
+        self._deferred_tags: typing.Optional[typing.Set[str]] = set()
+        # tables cached entries depend on, changes to others are not tracked
+        self.tables: typing.Set[str] = set()
+        # per table, the kinds of tags cached entries carry
+        self.kinds: typing.Dict[str, typing.Set[str]] = {}
+        # tables some entry reads whole, any new row makes it stale
+        self.whole_tables: typing.Set[str] = set()
+
+    def key(self, key: str) -> str:
+        """
+        Redis key of an entry.
+        """
+        return f"{self.prefix}:{key}"
+
+    def tag_key(self, tag: str) -> str:
+        """
+        Redis key of the set of entries carrying a tag.
+        """
+        return f"{self.prefix}:tag:{tag}"
+
+    def watch(self, tags: typing.Iterable[str]) -> None:
+        """
+        Tracks changes to the tables of the tags, and their kinds.
+
+        Args:
+            tags(Iterable[str]): Tags, or tag templates like "chat_rooms:{room_id}".
+        Returns:
+            None
+        """
+        for tag in tags:
+            table = tag_table(tag)
+            self.tables.add(table)
+            kind = tag_kind(tag)
+            if kind is None:
+                self.whole_tables.add(table)
+            else:
+                self.kinds.setdefault(table, set()).add(kind)
+
+    def jittered(self, ttl: typing.Optional[float] = None) -> float:
+        """
+        Spreads a ttl by +/- the jitter fraction.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        return ttl * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def redis(self) -> typing.Optional[Redis]:
+        """
+        The shared Redis client of the running event loop, None while Redis
+        is skipped.
+        """
+        if not self.redis_url or time.monotonic() < self._redis_skipped_until:
+            return None
+        loop: typing.Optional[asyncio.AbstractEventLoop]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        # connections belong to the loop that opened them, and celery tasks
+        # start a new loop with each asyncio.run
+        if self._redis is None or self._redis_loop is not loop:
+            self._redis_loop = loop
+            self._redis = InstrumentedRedis.from_url(
+                self.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=settings.cache_redis_timeout_seconds,
+                socket_timeout=settings.cache_redis_timeout_seconds,
+            )
+        return self._redis
+
+    def redis_sync(self) -> typing.Optional[SyncRedis]:
+        """
+        Blocking Redis client, for invalidations outside the event loop.
+        """
+        if not self.redis_url or time.monotonic() < self._redis_skipped_until:
+            return None
+        if self._redis_sync is None:
+            self._redis_sync = SyncRedis.from_url(
+                self.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=settings.cache_redis_timeout_seconds,
+                socket_timeout=settings.cache_redis_timeout_seconds,
+            )
+        return self._redis_sync
+
+    def redis_failed(self, action: str, exc: Exception) -> None:
+        """
+        Logs a Redis error and skips Redis for the backoff period.
+        """
+        logger.warning("cache %s failed: %s", action, str(exc))
+        self._redis_skipped_until = (
+            time.monotonic() + settings.cache_redis_backoff_seconds
+        )
+
+    async def get(self, key: str, namespace: str = "default") -> typing.Any:
+        """
+        Reads an entry, from the local tier then Redis.
+
+        Args:
+            key(str): The cache key.
+            namespace(str): The metrics label of the entry.
+        Returns:
+            Any: the payload, MISSING on a miss.
+        """
+        if not self.enabled:
+            return MISSING
+        payload = self.local.get(key)
+        if payload is not MISSING:
+            CACHE_REQUESTS.labels(namespace=namespace, result="local").inc()
+            return payload
+
+        if self.redis() is not None and self._deferred_tags != set():
+            # entries it missed the invalidation of are stale
+            await self.invalidate(())
+        client = self.redis()
+        if client is not None:
+            try:
+                raw = await client.get(self.key(key))
+            except RedisError as exc:
+                self.redis_failed("read", exc)
+                raw = None
+            if raw is not None:
+                entry = json.loads(raw)
+                self.local.set(key, entry["value"], self.local_ttl, entry["tags"])
+                CACHE_REQUESTS.labels(namespace=namespace, result="redis").inc()
+                return entry["value"]
+
+        CACHE_REQUESTS.labels(namespace=namespace, result="miss").inc()
+        return MISSING
+
+    async def set(
+        self,
+        key: str,
+        payload: typing.Any,
+        tags: typing.Sequence[str] = (),
+        ttl: typing.Optional[float] = None,
+    ) -> None:
+        """
+        Stores an entry in both tiers. Commits only invalidate the tags of
+        watched tables.
+
+        Args:
+            key(str): The cache key.
+            payload(Any): JSON compatible value.
+            tags(Sequence[str]): Tags the entry is invalidated by.
+            ttl(float): Seconds the entry lives, jittered.
+        Returns:
+            None
+        """
+        if not self.enabled:
+            return
+        ttl = self.jittered(ttl)
+        self.local.set(key, payload, min(ttl, self.local_ttl), tags)
+
+        client = self.redis()
+        if client is None:
+            return
+        try:
+            await client.register_script(STORE_ENTRY)(
+                keys=[self.key(key), *[self.tag_key(tag) for tag in tags]],
+                args=[json.dumps({"value": payload, "tags": list(tags)}), int(ttl) or 1],
+            )
+        except RedisError as exc:
+            self.redis_failed("write", exc)
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: typing.Callable[[], typing.Awaitable[typing.Any]],
+        tags: typing.Union[
+            typing.Sequence[str], typing.Callable[[], typing.Sequence[str]]
+        ] = (),
+        ttl: typing.Optional[float] = None,
+        namespace: str = "default",
+    ) -> typing.Any:
+        """
+        Reads an entry, loading and storing it on a miss. Concurrent misses
+        of a key share one load.
+
+        Args:
+            key(str): The cache key.
+            loader(Callable): Coroutine function producing the payload, None
+                payloads are not stored.
+            tags(Sequence[str]): Tags the entry is invalidated by, or a
+                callable returning them once the loader ran.
+            ttl(float): Seconds the entry lives, jittered.
+            namespace(str): The metrics label of the entry.
+        Returns:
+            Any: the payload.
+        """
+        payload = await self.get(key, namespace)
+        if payload is not MISSING:
+            return payload
+
+        async def load_and_store() -> typing.Any:
+            started = self.load_started()
+            try:
+                payload = await loader()
+                if payload is None:
+                    return payload
+                entry_tags = tags() if callable(tags) else tags
+                if not self.invalidated_since(started, entry_tags):
+                    await self.set(key, payload, entry_tags, ttl)
+                return payload
+            finally:
+                self.load_finished(started)
+
+        return await self.coalesce(key, load_and_store, namespace)
+
+    async def coalesce(
+        self,
+        key: str,
+        loader: typing.Callable[[], typing.Awaitable[typing.Any]],
+        namespace: str = "default",
+        remote: typing.Optional[bool] = None,
+    ) -> typing.Any:
+        """
+        Runs the loader once for concurrent calls with the same key.
+
+        Args:
+            key(str): The key.
+            loader(Callable): Coroutine function producing the value, JSON
+                compatible when coalescing across workers.
+            namespace(str): The metrics label of the key.
+            remote(bool): Whether to coalesce across workers, the configured
+                default if None.
+        Returns:
+            Any: the loader's result.
+        """
+        if remote is None:
+            remote = self.remote_single_flight
+        return await self.flights.do(key, loader, namespace, remote=remote)
+
+    async def invalidate(self, tags: typing.Iterable[str]) -> None:
+        """
+        Drops every entry carrying any of the tags, from both tiers.
+
+        Args:
+            tags(Iterable[str]): The tags.
+        Returns:
+            None
+        """
+        tags = self.invalidate_local(tags)
+        client = self.redis()
+        if client is None:
+            self.defer(tags)
+            return
+        tags = self.with_deferred(tags)
+        if tags == []:
+            return
+        try:
+            if tags is None:
+                async for key in client.scan_iter(match=self.key("*"), count=1000):
+                    await client.unlink(key)
+            else:
+                await client.register_script(INVALIDATE_TAGS)(
+                    keys=[self.tag_key(tag) for tag in tags]
+                )
+        except RedisError as exc:
+            self.defer(tags)
+            self.redis_failed("invalidation", exc)
+
+    def invalidate_sync(self, tags: typing.Iterable[str]) -> None:
+        """
+        Blocking invalidate, for callers outside the event loop.
+        """
+        tags = self.invalidate_local(tags)
+        client = self.redis_sync()
+        if client is None:
+            self.defer(tags)
+            return
+        tags = self.with_deferred(tags)
+        if tags == []:
+            return
+        try:
+            if tags is None:
+                for key in client.scan_iter(match=self.key("*"), count=1000):
+                    client.unlink(key)
+            else:
+                client.register_script(INVALIDATE_TAGS)(
+                    keys=[self.tag_key(tag) for tag in tags]
+                )
+        except RedisError as exc:
+            self.defer(tags)
+            self.redis_failed("invalidation", exc)
+
+    def defer(self, tags: typing.Optional[typing.Iterable[str]]) -> None:
+        """
+        Keeps the tags of an invalidation Redis missed, to replay once it is
+        reachable. Past MAX_DEFERRED_TAGS, or with None, every Redis entry is
+        dropped on recovery instead.
+        """
+        if not self.redis_url or self._deferred_tags is None:
+            return
+        if tags is None:
+            self._deferred_tags = None
+            return
+        self._deferred_tags.update(tags)
+        if len(self._deferred_tags) > MAX_DEFERRED_TAGS:
+            self._deferred_tags = None
+
+    def with_deferred(
+        self, tags: typing.Sequence[str]
+    ) -> typing.Optional[typing.List[str]]:
+        """
+        Takes the deferred tags along with an invalidation's.
+
+        Returns:
+            List[str]: the tags to invalidate in Redis, None to drop every
+            entry.
+        """
+        deferred, self._deferred_tags = self._deferred_tags, set()
+        if deferred is None:
+            return None
+        return sorted(deferred.union(tags))
+
+    def invalidate_local(self, tags: typing.Iterable[str]) -> typing.List[str]:
+        """
+        Drops the tagged entries of the local tier.
+
+        Returns:
+            List[str]: the tags.
+        """
+        tags = sorted(set(tags))
+        if tags:
+            self._generation += 1
+            if self._loads:
+                for tag in tags:
+                    self._tag_generations[tag] = self._generation
+            self.local.invalidate(tags)
+        return tags
+
+    def load_started(self) -> int:
+        """
+        Notes a load starting.
+
+        Returns:
+            int: the invalidation sequence it started at.
+        """
+        self._loads[self._generation] += 1
+        return self._generation
+
+    def load_finished(self, started: int) -> None:
+        """
+        Notes a load finishing, forgetting the invalidations no running load
+        started before.
+        """
+        self._loads[started] -= 1
+        if self._loads[started] <= 0:
+            del self._loads[started]
+        oldest = min(self._loads, default=self._generation)
+        if started < oldest:
+            self._tag_generations = {
+                tag: generation
+                for tag, generation in self._tag_generations.items()
+                if generation > oldest
+            }
+
+    def invalidated_since(self, started: int, tags: typing.Iterable[str]) -> bool:
+        """
+        Whether a tag was invalidated after a load started.
+        """
+        return any(self._tag_generations.get(tag, 0) > started for tag in tags)
+
+    def clear_local(self) -> None:
+        """
+        Drops every entry of the local tier.
+        """
+        self.local.clear()
+
+
+tiered_cache = TieredCache()
@@ -20,6 +20,21 @@ class Settings(BaseSettings):
     db_name: str
     db_schema: str
 
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 18000
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    db_pgbouncer_transaction_mode: bool = False
+    sync_db_pool_size: int = 10
+    sync_db_max_overflow: int = 20
+    # comma separated async urls of read replicas, empty reads from the primary
+    db_replica_urls: str = ""
+    db_replica_ejection_seconds: float = 30.0
+    # tracked per worker process, see ReplicaRouter
+    db_read_your_writes_seconds: float = 5.0
+
     jwt_access_token_expiry: int
     jwt_refresh_token_expiry: int
     jwt_algorithm: str
@@ -56,6 +71,38 @@ class Settings(BaseSettings):
     cloudinary_api_name: str
 
     redis_url: str
+    dm_pair_cache_ttl_seconds: int = 86400
+    inbox_cache_ttl_seconds: int = 86400
+    message_history_cache_size: int = 50
+    message_history_cache_ttl_seconds: int = 3600
+    room_roster_cache_ttl_seconds: int = 3600
+    room_membership_cache_ttl_seconds: int = 3600
+    # room member/message counters drift only through failed writes or
+    # manual edits, the sweep repairs them in batches of rooms
+    room_stats_reconcile_interval_seconds: int = 3600
+    room_stats_reconcile_batch_size: int = 500
+    # public room rankings are precomputed by celery beat
+    room_discovery_refresh_interval_seconds: int = 300
+    room_discovery_ranking_size: int = 200
+    room_discovery_ranking_ttl_seconds: int = 900
+    # overdue pending invitations are expired by celery beat, in batches
+    room_invitation_expiry_interval_seconds: int = 300
+    room_invitation_expiry_batch_size: int = 500
+    cache_enabled: bool = True
+    cache_local_maxsize: int = 10000
+    # bounds how long a worker serves an entry another worker invalidated
+    cache_local_ttl_seconds: float = 5.0
+    cache_default_ttl_seconds: int = 300
+    cache_ttl_jitter: float = 0.1
+    cache_redis_timeout_seconds: float = 0.5
+    cache_redis_backoff_seconds: float = 5.0
+    # coalesce identical reads across workers too, through a redis lock
+    single_flight_remote: bool = False
+    single_flight_lock_ttl_seconds: float = 5.0
+    single_flight_result_ttl_seconds: float = 2.0
+    single_flight_poll_interval_seconds: float = 0.02
+
+    slow_query_threshold_ms: float = 500.0
 
     model_config: SettingsConfigDict = {  # type: ignore
         "env_file": ".env",
@@ -0,0 +1,182 @@
+"""
+Prometheus metrics module
+
+Multi-process safe: when the PROMETHEUS_MULTIPROC_DIR environment variable
+is set (to an empty directory shared by all uvicorn/celery worker processes,
+before they start), every process writes its samples there and /metrics
+aggregates them.
+"""
+
+import os
+import time
+import typing
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status_code"],
+)
+
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_active_connections",
+    "Open websocket connections",
+    multiprocess_mode="livesum",
+)
+PUBSUB_CHANNELS = Gauge(
+    "websocket_pubsub_channels",
+    "Redis pubsub channels subscribed by open websocket connections",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond pool_size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+
+REDIS_COMMAND_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+MESSAGE_HISTORY_CACHE_REQUESTS = Counter(
+    "message_history_cache_requests_total",
+    "First page history reads by cache outcome",
+    ["kind", "result"],
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Tiered cache reads by namespace and the tier that answered",
+    ["namespace", "result"],
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Coalesced reads: executed ran the query, coalesced and coalesced_remote "
+    "shared one running in this worker or another, each a query saved",
+    ["namespace", "result"],
+)
+
+CELERY_TASK_QUEUE_LATENCY = Histogram(
+    "celery_task_queue_latency_seconds",
+    "Time between a task being published and a worker starting it",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+CELERY_TASK_FAILURES = Counter(
+    "celery_task_failures_total",
+    "Tasks that failed for good",
+    ["task"],
+)
+CELERY_TASK_RETRIES = Counter(
+    "celery_task_retries_total",
+    "Task retries",
+    ["task"],
+)
+
+
+def render_metrics() -> typing.Tuple[bytes, str]:
+    """
+    Renders all metrics in the Prometheus text format.
+
+    Returns:
+        tuple: the payload and its content type.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def instrument_pool(engine: typing.Union[AsyncEngine, Engine], name: str) -> None:
+    """
+    Keeps the pool gauges of an engine up to date on checkout and checkin.
+
+    Args:
+        engine(AsyncEngine | Engine): The engine to instrument.
+        name(str): The engine label.
+    Returns:
+        None
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    def update_pool_gauges(returning: int) -> None:
+        # read the pool on every event, engine.dispose() replaces it
+        pool = sync_engine.pool
+        checked_out = getattr(pool, "checkedout", None)
+        overflow = getattr(pool, "overflow", None)
+        if checked_out:
+            DB_POOL_CHECKED_OUT.labels(engine=name).set(checked_out() - returning)
+        if overflow:
+            DB_POOL_OVERFLOW.labels(engine=name).set(max(overflow(), 0))
+
+    # checkin fires before the connection is handed back to the pool
+    event.listen(sync_engine, "checkout", lambda *_: update_pool_gauges(0))
+    event.listen(sync_engine, "checkin", lambda *_: update_pool_gauges(1))
+
+
+# ------------------ celery signal handlers ------------------
+
+
+def stamp_task_sent_at(headers: typing.Optional[dict] = None, **_: typing.Any) -> None:
+    """
+    before_task_publish handler, stamps the publish time on the message headers.
+    """
+    if headers is not None:
+        headers["sent_at"] = time.time()
+
+
+def observe_task_queue_latency(task: typing.Any = None, **_: typing.Any) -> None:
+    """
+    task_prerun handler, records how long the task waited in the queue.
+    """
+    sent_at = getattr(task.request, "sent_at", None) if task else None
+    if sent_at:
+        CELERY_TASK_QUEUE_LATENCY.labels(task=task.name).observe(
+            max(time.time() - float(sent_at), 0)
+        )
+
+
+def count_task_failure(sender: typing.Any = None, **_: typing.Any) -> None:
+    """
+    task_failure handler.
+    """
+    CELERY_TASK_FAILURES.labels(task=getattr(sender, "name", "unknown")).inc()
+
+
+def count_task_retry(sender: typing.Any = None, **_: typing.Any) -> None:
+    """
+    task_retry handler.
+    """
+    CELERY_TASK_RETRIES.labels(task=getattr(sender, "name", "unknown")).inc()
@@ -10,6 +10,8 @@ from starlette.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.utils.task_logger import create_logger
+from app.database.query_stats import QueryStats, query_stats_var
+from app.core.metrics import HTTP_REQUEST_LATENCY
 
 logger = create_logger("Route middleware logger")
 
@@ -65,6 +67,7 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
             and not request.url.path.startswith("/docs")
             and not request.url.path.startswith("/favicon")
             and not request.url.path.startswith("/openapi")
+            and request.url.path != "/metrics"
         ):
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -115,11 +118,22 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
         if not hasattr(request, "current_user"):
             request.current_user = None  # type: ignore
 
-        # Process the request
-        response = await call_next(request)
+        # Process the request, collecting the statements it issues
+        query_stats = QueryStats()
+        query_stats_token = query_stats_var.set(query_stats)
+        try:
+            response = await call_next(request)
+        finally:
+            query_stats_var.reset(query_stats_token)
 
         # Log response status and time taken
         process_time = time.time() - start_time
+        route = request.scope.get("route")
+        HTTP_REQUEST_LATENCY.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status_code=response.status_code,
+        ).observe(process_time)
         user_info = (
             request.state.current_user
             if hasattr(request.state, "current_user")
@@ -136,8 +150,12 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
                 "method": request.method,
                 "status_code": response.status_code,
                 "process_time": f"{process_time:.2f}s",
+                **query_stats.log_fields(),
             },
         )
+        response.headers["Server-Timing"] = (
+            f"{query_stats.server_timing()}, app;dur={process_time * 1000:.2f}"
+        )
 
         return response
 
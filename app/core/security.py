@@ -9,14 +9,26 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Depends, Request, HTTPException, Header, WebSocket
 from jose import jwt, JWTError
 import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app.core.config import settings
 from app.utils.task_logger import create_logger
-from app.database.session import get_async_session, AsyncSession
+from app.database.session import (
+    get_async_session,
+    get_async_session_factory,
+    AsyncSession,
+)
+from app.database.replica import current_user_var
 from app.models.user_session import UserSession
 
 logger = create_logger(":: SECURITY CONFIG ::")
 
+# session check run on every authenticated request, prebuilt once
+ACTIVE_SESSION_JTI = sa.select(UserSession.jti).where(
+    UserSession.session_id == sa.bindparam("session_id"),
+    UserSession.is_logged_out.is_(False),
+)
+
 http_bearer_security = HTTPBearer(
     bearerFormat="JWT",
     scheme_name="BearerAuth",
@@ -29,6 +41,9 @@ RequestCredentials = typing.Annotated[
 ]
 
 Session = typing.Annotated[AsyncSession, Depends(get_async_session)]
+SessionFactory = typing.Annotated[
+    async_sessionmaker[AsyncSession], Depends(get_async_session_factory)
+]
 
 
 async def set_current_user_claims_from_token(
@@ -47,16 +62,22 @@ async def set_current_user_claims_from_token(
         )
 
     claims = await verify_jwt_tokens(token, "access")
+    # routes reads to the primary right after this user's own writes
+    current_user_var.set(claims.get("user_id"))
 
     request.state.claims = claims
     request.state.current_user = claims.get("user_id")
 
 
 async def validate_logout_status(
-    credential: RequestCredentials, request: Request, session: Session
+    credential: RequestCredentials, request: Request, session_factory: SessionFactory
 ) -> None:
     """
     Uses DI to Validates auth bearer, log out status and sets claims to request.
+
+    The log out status is read from the primary, in its own short-lived
+    session, so a token is refused as soon as its session logs out whatever
+    the replication lag.
     """
     if not credential:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -69,21 +90,22 @@ async def validate_logout_status(
 
     claims = await verify_jwt_tokens(token, "access")
 
-    is_not_logged_in = (
-        await session.execute(
-            sa.select(UserSession).where(
-                UserSession.session_id == claims.get("session_id"),
-                UserSession.is_logged_out.is_(False),
+    async with session_factory() as session:
+        is_not_logged_in = (
+            await session.execute(
+                ACTIVE_SESSION_JTI, {"session_id": claims.get("session_id")}
             )
-        )
-    ).scalar_one_or_none()
+        ).scalar_one_or_none()
 
     if not is_not_logged_in:
         raise HTTPException(status_code=401, detail="session expired")
 
-    if claims.get("jti") != is_not_logged_in.jti:
+    if claims.get("jti") != is_not_logged_in:
         raise HTTPException(status_code=401, detail="Invalid or expired session")
 
+    # routes reads to the primary right after this user's own writes
+    current_user_var.set(claims.get("user_id"))
+
     request.state.claims = claims
     request.state.current_user = claims.get("user_id")
 
@@ -100,6 +122,7 @@ async def get_refresh_token_header(
         raise HTTPException(status_code=401, detail="Missing X-REFRESH-TOKEN Header")
 
     claims = await verify_jwt_tokens(x_refresh_token, "refresh")
+    current_user_var.set(claims.get("user_id"))
 
     request.state.claims = claims
     request.state.current_user = claims.get("user_id")
@@ -187,7 +210,7 @@ async def verify_jwt_tokens(
 
 
 async def validate_ws_logout_status(
-    session: Session,
+    session_factory: SessionFactory,
     websocket: WebSocket,
     Authorization: str = Header(
         description="Authorization header", title="Authorization"
@@ -195,6 +218,9 @@ async def validate_ws_logout_status(
 ) -> None:
     """
     Uses DI to Validates auth bearer, log out status and sets claims to request.
+
+    Uses its own short-lived session, closed before the websocket relay starts,
+    so an open socket does not hold a pooled connection.
     """
     if not Authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -209,19 +235,17 @@ async def validate_ws_logout_status(
 
     claims = await verify_jwt_tokens(token, "access")
 
-    is_not_logged_in = (
-        await session.execute(
-            sa.select(UserSession).where(
-                UserSession.session_id == claims.get("session_id"),
-                UserSession.is_logged_out.is_(False),
+    async with session_factory() as session:
+        is_not_logged_in = (
+            await session.execute(
+                ACTIVE_SESSION_JTI, {"session_id": claims.get("session_id")}
             )
-        )
-    ).scalar_one_or_none()
+        ).scalar_one_or_none()
 
     if not is_not_logged_in:
         raise HTTPException(status_code=401, detail="session expired")
 
-    if claims.get("jti") != is_not_logged_in.jti:
+    if claims.get("jti") != is_not_logged_in:
         raise HTTPException(status_code=401, detail="Invalid or expired session")
 
     websocket.state.claims = claims
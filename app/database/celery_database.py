@@ -1,6 +1,6 @@
 from celery.backends.database.session import ResultModelBase
 
-from app.database.session import sync_engine
+from app.database.session import get_sync_engine
 from app.utils.task_logger import create_logger
 
 logger = create_logger("CELERY DATABASE")
@@ -9,7 +9,7 @@ logger = create_logger("CELERY DATABASE")
 def setup_celery_results_db():
     """Create engine and create tables for celery results backend."""
     # Create tables defined by Celery's backend models
-    ResultModelBase.metadata.create_all(sync_engine)
+    ResultModelBase.metadata.create_all(get_sync_engine())
     logger.info("Celery result backend tables created successfully.")
 
 
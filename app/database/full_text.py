@@ -0,0 +1,175 @@
+"""
+Full-text search module
+
+Message contents are indexed for search by the database itself:
+- Postgres: a search_vector tsvector column, kept up to date by a trigger,
+  under a GIN index
+- SQLite, for tests and dev: an FTS5 table over the contents, keyed by an
+  integer id per row, kept up to date by triggers
+
+Neither is mapped on the models. They are created along with the indexed
+table, and by migration on existing databases.
+"""
+
+import re
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+SEARCH_CONFIG = "pg_catalog.english"
+
+POSTGRES_DDL = (
+    "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_{table}_search_vector "
+    "ON {table} USING gin (search_vector)",
+    "CREATE TRIGGER {table}_search_vector_update "
+    "BEFORE INSERT OR UPDATE OF {column} ON {table} FOR EACH ROW "
+    "EXECUTE FUNCTION tsvector_update_trigger(search_vector, '"
+    + SEARCH_CONFIG
+    + "', {column})",
+)
+# an external content table: FTS5 keeps only the index, rows are read back
+# by an integer key. Message ids are strings and the implicit rowid of their
+# tables may change (VACUUM, copying a table), so each row gets a stable
+# INTEGER PRIMARY KEY in {table}_fts_ids, and the content is read through a
+# view keyed by it
+SQLITE_DDL = (
+    "CREATE TABLE IF NOT EXISTS {table}_fts_ids "
+    "(fts_id INTEGER PRIMARY KEY, id VARCHAR(60) NOT NULL UNIQUE)",
+    "CREATE VIEW IF NOT EXISTS {table}_fts_content AS "
+    "SELECT {table}_fts_ids.fts_id, {table}.{column} FROM {table}_fts_ids "
+    "JOIN {table} ON {table}.id = {table}_fts_ids.id",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({column}, "
+    "content='{table}_fts_content', content_rowid='fts_id')",
+    "CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} "
+    "BEGIN INSERT INTO {table}_fts_ids(id) VALUES (new.id); "
+    "INSERT INTO {table}_fts(rowid, {column}) "
+    "SELECT fts_id, new.{column} FROM {table}_fts_ids WHERE id = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} "
+    "BEGIN INSERT INTO {table}_fts({table}_fts, rowid, {column}) "
+    "SELECT 'delete', fts_id, old.{column} FROM {table}_fts_ids "
+    "WHERE id = old.id; "
+    "DELETE FROM {table}_fts_ids WHERE id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_fts_update "
+    "AFTER UPDATE OF {column} ON {table} "
+    "BEGIN INSERT INTO {table}_fts({table}_fts, rowid, {column}) "
+    "SELECT 'delete', fts_id, old.{column} FROM {table}_fts_ids "
+    "WHERE id = old.id; "
+    "INSERT INTO {table}_fts(rowid, {column}) "
+    "SELECT fts_id, new.{column} FROM {table}_fts_ids WHERE id = new.id; END",
+)
+SQLITE_DROP = (
+    "DROP TABLE IF EXISTS {table}_fts",
+    "DROP VIEW IF EXISTS {table}_fts_content",
+    "DROP TABLE IF EXISTS {table}_fts_ids",
+)
+
+
+def index_content(table: sa.Table, column: str = "content") -> None:
+    """
+    Indexes a text column for search whenever its table is created.
+
+    Args:
+        table(Table): The table.
+        column(str): The name of the text column.
+    Returns:
+        None
+    """
+    names = {"table": table.name, "column": column}
+    for statement in POSTGRES_DDL:
+        sa.event.listen(
+            table,
+            "after_create",
+            sa.DDL(statement.format(**names)).execute_if(dialect="postgresql"),
+        )
+    for statement in SQLITE_DDL:
+        sa.event.listen(
+            table,
+            "after_create",
+            sa.DDL(statement.format(**names)).execute_if(dialect="sqlite"),
+        )
+    for statement in SQLITE_DROP:
+        sa.event.listen(
+            table,
+            "before_drop",
+            sa.DDL(statement.format(**names)).execute_if(dialect="sqlite"),
+        )
+
+
+def search_terms(text: str) -> typing.List[str]:
+    """
+    Splits searched text into its words.
+
+    Args:
+        text(str): The searched text.
+    Returns:
+        List[str]: the words, empty when there are none to search.
+    """
+    return re.findall(r"\w+", text)
+
+
+def match(
+    table: sa.Table, text: str, dialect: str
+) -> typing.Tuple[sa.FromClause, typing.Any, typing.Any]:
+    """
+    Matches the rows of an indexed table containing every word of a text.
+
+    Args:
+        table(Table): The indexed table.
+        text(str): The searched text, with at least one word.
+        dialect(str): The name of the session's dialect.
+    Returns:
+        tuple: the clause to select from, the match condition and the rank
+        of each match, higher for better ones.
+    """
+    if dialect == "postgresql":
+        vector = sa.literal_column(f"{table.name}.search_vector", type_=TSVECTOR)
+        query = sa.func.plainto_tsquery(SEARCH_CONFIG, text)
+        return table, vector.op("@@")(query), sa.func.ts_rank_cd(vector, query)
+
+    ids = sa.table(f"{table.name}_fts_ids", sa.column("fts_id"), sa.column("id"))
+    index = sa.table(f"{table.name}_fts", sa.column("rowid"), sa.column("rank"))
+    # every word as a quoted string, so no word reads as FTS5 syntax
+    phrases = " ".join(
+        '"{}"'.format(word.replace('"', '""')) for word in search_terms(text)
+    )
+    return (
+        table.join(ids, ids.c.id == table.c.id).join(
+            index, index.c.rowid == ids.c.fts_id
+        ),
+        sa.literal_column(index.name).op("MATCH")(phrases),
+        # bm25 scores better matches lower
+        -index.c.rank,
+    )
+
+
+def ranked_after(
+    rank: typing.Any,
+    created_at: typing.Any,
+    row_id: typing.Any,
+    after: typing.Tuple[float, typing.Any, str],
+) -> typing.Any:
+    """
+    Keyset condition of the matches following a match, best ranked first
+    then newest first.
+
+    Args:
+        rank: The rank of each match.
+        created_at: The creation time column.
+        row_id: The id column.
+        after(tuple): (rank, created_at, id) of the last match of a page.
+    Returns:
+        the condition.
+    """
+    after_rank, after_created_at, after_id = after
+    return sa.or_(
+        rank < after_rank,
+        sa.and_(
+            rank == after_rank,
+            sa.or_(
+                created_at < after_created_at,
+                sa.and_(created_at == after_created_at, row_id < after_id),
+            ),
+        ),
+    )
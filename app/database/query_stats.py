@@ -0,0 +1,140 @@
+"""
+Query stats module
+"""
+
+import time
+import typing
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: QUERY STATS ::")
+
+STATEMENT_LOG_LENGTH = 500
+
+
+@dataclass
+class QueryStats:
+    """
+    Statements issued while handling one request.
+    """
+
+    count: int = 0
+    total_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_statement: typing.Optional[str] = None
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        """
+        Records an executed statement.
+
+        Args:
+            statement(str): The statement sent to the database.
+            elapsed_ms(float): Time spent executing, in milliseconds.
+        Returns:
+            None
+        """
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement[:STATEMENT_LOG_LENGTH]
+
+    def server_timing(self) -> str:
+        """
+        Formats the stats as a Server-Timing header value.
+        """
+        return (
+            f'db;dur={self.total_ms:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_ms:.2f}"
+        )
+
+    def log_fields(self) -> typing.Dict[str, typing.Any]:
+        """
+        Formats the stats as structured log fields.
+        """
+        return {
+            "db_queries": self.count,
+            "db_time": f"{self.total_ms:.2f}ms",
+            "db_slowest": f"{self.slowest_ms:.2f}ms",
+            "db_slowest_statement": self.slowest_statement,
+        }
+
+
+# set per request by RequestLoggerMiddleware, None outside of a request
+query_stats_var: ContextVar[typing.Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+def redact_parameters(parameters: typing.Any, executemany: bool) -> typing.Any:
+    """
+    Replaces bound parameter values, keeping only their names or positions.
+
+    Args:
+        parameters(Any): The parameters passed to the DBAPI cursor.
+        executemany(bool): If the parameters are a sequence of parameter sets.
+    Returns:
+        Any: The redacted parameters.
+    """
+    if executemany:
+        return f"{len(parameters)} parameter sets"
+    if isinstance(parameters, dict):
+        return {key: "***" for key in parameters}
+    if isinstance(parameters, (list, tuple)):
+        return ["***"] * len(parameters)
+    return "***"
+
+
+def before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    """
+    Marks the start of a statement.
+    """
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+def after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    """
+    Records the statement on the current request stats and logs it if slow.
+    """
+    started_at = conn.info.pop("query_started_at", time.perf_counter())
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+    stats = query_stats_var.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+    if elapsed_ms >= settings.slow_query_threshold_ms:
+        logger.warning(
+            "Slow query",
+            extra={
+                "statement": statement[:STATEMENT_LOG_LENGTH],
+                "parameters": redact_parameters(parameters, executemany),
+                "duration": f"{elapsed_ms:.2f}ms",
+            },
+        )
+
+
+def register_query_listeners(engine: typing.Union[AsyncEngine, Engine]) -> None:
+    """
+    Attaches the query stats hooks to an engine.
+
+    Args:
+        engine(AsyncEngine | Engine): The engine to instrument.
+    Returns:
+        None
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if not event.contains(sync_engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
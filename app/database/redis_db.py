@@ -2,18 +2,34 @@
 Redis session module
 """
 
+import time
 from contextlib import contextmanager, asynccontextmanager
 import redis
-import redis.asyncio as aio_redis
 from redis.asyncio import Redis
 from tenacity import retry, wait_fixed, stop_after_attempt
 
 from app.core.config import settings
+from app.core.metrics import REDIS_COMMAND_LATENCY
 from app.utils.task_logger import create_logger
 
 logger = create_logger(":: REDIS SESSION ::")
 
 
+class InstrumentedRedis(Redis):
+    """
+    Asynchronous Redis client recording command latency.
+    """
+
+    async def execute_command(self, *args, **options):
+        started_at = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_LATENCY.labels(command=str(args[0]).upper()).observe(
+                time.perf_counter() - started_at
+            )
+
+
 @contextmanager
 @retry(
     wait=wait_fixed(2), stop=stop_after_attempt(5)
@@ -42,7 +58,7 @@ async def get_redis_async():
     """
     Asynchronous connection to Redis.
     """
-    conn = aio_redis.from_url(
+    conn = InstrumentedRedis.from_url(
         url=settings.redis_url,
         max_connections=10,
         decode_responses=True,
@@ -0,0 +1,150 @@
+"""
+Read replica routing module
+"""
+
+import itertools
+import time
+import typing
+from contextvars import ContextVar
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: REPLICA ROUTER ::")
+
+# set by the auth dependencies once the token is checked, read when a write
+# commits and when a read-only session picks its engine
+current_user_var: ContextVar[typing.Optional[str]] = ContextVar(
+    "current_user", default=None
+)
+
+MAX_TRACKED_WRITERS = 10000
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """
+    Checks if an error means the server is unreachable rather than the
+    statement being wrong.
+
+    Args:
+        exc(BaseException): The raised error.
+    Returns:
+        bool: True when the replica should be ejected.
+    """
+    if isinstance(exc, (OperationalError, InterfaceError, TimeoutError)):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
+
+
+class ReplicaRouter:
+    """
+    Picks the engine for read-only units of work.
+
+    Replicas are used round-robin. A replica that fails is ejected for
+    `ejection_seconds` and retried afterwards. Users who wrote within the
+    last `read_your_writes_seconds` read from the primary so they see their
+    own changes despite replication lag.
+
+    Writes are tracked in this process's memory, so users only read their
+    own writes when their next request reaches the same worker. With
+    several workers the guarantee needs requests routed per user (sticky
+    sessions); otherwise other workers read from replicas straight away.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: typing.Sequence[AsyncEngine] = (),
+        ejection_seconds: float = 30.0,
+        read_your_writes_seconds: float = 5.0,
+    ) -> None:
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.ejection_seconds = ejection_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._counter = itertools.count()
+        self._ejected_until: typing.Dict[int, float] = {}
+        self._last_write_at: typing.Dict[str, float] = {}
+
+    def choose(self, user_id: typing.Optional[str] = None) -> AsyncEngine:
+        """
+        Chooses the engine for a read.
+
+        Args:
+            user_id(str): The current user, if any.
+        Returns:
+            AsyncEngine: a healthy replica, or the primary.
+        """
+        if not self.replicas or self.recently_wrote(user_id):
+            return self.primary
+
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            index = next(self._counter) % len(self.replicas)
+            if self._ejected_until.get(index, 0) <= now:
+                return self.replicas[index]
+        return self.primary
+
+    def eject(self, engine: AsyncEngine) -> None:
+        """
+        Takes a failing replica out of rotation for a while.
+
+        Args:
+            engine(AsyncEngine): The engine that failed.
+        Returns:
+            None
+        """
+        for index, replica in enumerate(self.replicas):
+            if replica is engine:
+                self._ejected_until[index] = time.monotonic() + self.ejection_seconds
+                logger.warning(
+                    "Replica %s ejected for %ss", index, self.ejection_seconds
+                )
+
+    async def dispose(self) -> None:
+        """
+        Closes the pools of all replicas.
+        """
+        for replica in self.replicas:
+            await replica.dispose()
+
+    def is_replica(self, engine: typing.Any) -> bool:
+        """
+        Checks if an engine is one of the replicas.
+        """
+        return any(engine is replica for replica in self.replicas)
+
+    def mark_write(self, user_id: typing.Optional[str]) -> None:
+        """
+        Records that a user just wrote to the primary.
+
+        Args:
+            user_id(str): The user that wrote.
+        Returns:
+            None
+        """
+        if not user_id or not self.replicas:
+            return
+        now = time.monotonic()
+        if len(self._last_write_at) >= MAX_TRACKED_WRITERS:
+            cutoff = now - self.read_your_writes_seconds
+            self._last_write_at = {
+                user: written_at
+                for user, written_at in self._last_write_at.items()
+                if written_at > cutoff
+            }
+        self._last_write_at[user_id] = now
+
+    def recently_wrote(self, user_id: typing.Optional[str]) -> bool:
+        """
+        Checks if a user wrote within the read-your-writes window.
+        """
+        if not user_id:
+            return False
+        written_at = self._last_write_at.get(user_id)
+        return (
+            written_at is not None
+            and time.monotonic() - written_at < self.read_your_writes_seconds
+        )
@@ -3,13 +3,13 @@ Database session module
 """
 
 import os
-import asyncio
-from typing import AsyncIterator
+import time
+import uuid
+from typing import AsyncIterator, Optional
 from datetime import datetime
 from contextlib import contextmanager
 
 from sqlalchemy.ext.asyncio import (
-    async_scoped_session,  # For creating scoped sessions in async environments
     async_sessionmaker,  # For creating session factories
     AsyncEngine,  # Represents an async engine (connection to DB)
     create_async_engine,  # Preferred way to create async engine
@@ -24,6 +24,7 @@ from sqlalchemy.orm import (
     declarative_mixin,
     scoped_session,
     sessionmaker,
+    Session,
 )
 from sqlalchemy import (
     MetaData,  # To define metadata and naming conventions
@@ -33,12 +34,18 @@ from sqlalchemy import (
     String,
     func,
     create_engine,
+    Engine,
+    event,
+    Select,
 )
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, InvalidRequestError
 from uuid6 import uuid7
 
 
 from app.core.config import settings
+from app.core.metrics import instrument_pool, DB_POOL_WAIT
+from app.database.query_stats import register_query_listeners
+from app.database.replica import ReplicaRouter, current_user_var, is_connection_error
 
 naming_convention = {
     "ix": "ix_%(column_0_label)s",  # index
@@ -61,28 +68,282 @@ class Base(AsyncAttrs, DeclarativeBase):
         metadata = MetaData(naming_convention=naming_convention)
 
 
-# Creates the async engine, use pool_size and max_overflow for control over connections
-async_engine: AsyncEngine = create_async_engine(
-    url=DATABASE_URL,
-    echo=False,
-    future=True,
-    poolclass=pool.AsyncAdaptedQueuePool,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=18000,
-)
+class TimedQueuePool(pool.QueuePool):
+    """
+    QueuePool recording how long checkouts wait for a connection, labelled
+    by the pool's logging_name.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # recreate() passes logging_name back, so the label survives dispose()
+        self.metrics_label = kwargs.get("logging_name") or "default"
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(engine=self.metrics_label).observe(
+                time.perf_counter() - started_at
+            )
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, pool.AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool recording how long checkouts wait for a connection.
+    """
+
+
+def asyncpg_connect_args() -> dict:
+    """
+    Builds asyncpg driver arguments from settings.
+
+    Behind PgBouncer in transaction mode prepared statements can't be reused
+    across transactions (the server connection changes), so both statement
+    caches are disabled and every prepared statement gets a unique name.
+    """
+    if settings.db_pgbouncer_transaction_mode:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.db_statement_cache_size,
+        "prepared_statement_cache_size": settings.db_statement_cache_size,
+    }
+
+
+def build_async_engine(url: str, logging_name: str) -> AsyncEngine:
+    """
+    Creates an instrumented async engine, pool sizing comes from settings
+    (DB_POOL_*).
+
+    Args:
+        url(str): The database url.
+        logging_name(str): The pool label used in logs and metrics.
+    Returns:
+        AsyncEngine: the engine.
+    """
+    engine = create_async_engine(
+        url=url,
+        echo=False,
+        future=True,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_logging_name=logging_name,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=asyncpg_connect_args() if "asyncpg" in url else {},
+    )
+    register_query_listeners(engine)
+    instrument_pool(engine, logging_name)
+    return engine
+
+
+def read_only(engine: AsyncEngine) -> AsyncEngine:
+    """
+    Postgres starts read-only repeatable read transactions on the returned
+    engine, so every statement of a transaction reads the same snapshot. It
+    shares the pool of the given one.
+    """
+    if engine.dialect.name == "postgresql":
+        return engine.execution_options(
+            postgresql_readonly=True, isolation_level="REPEATABLE READ"
+        )
+    return engine
+
+
+async_engine: AsyncEngine = build_async_engine(DATABASE_URL, "async")
+
+
+class PrimarySession(Session):
+    """
+    Sync session backing the read-write AsyncSession, remembers who wrote so
+    their next reads skip lagging replicas.
+    """
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def flag_flush_write(session, flush_context) -> None:
+    """
+    Flags the transaction as having written through the unit of work.
+    """
+    session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def flag_statement_write(orm_execute_state) -> None:
+    """
+    Flags the transaction as having written through an ORM-enabled
+    insert, update or delete statement.
+    """
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def mark_user_write(session) -> None:
+    """
+    Records the current user as a recent writer once the write is durable.
+    """
+    session.info["committed"] = True
+    if session.info.pop("wrote", False):
+        replica_router.mark_write(current_user_var.get())
+
+
+class PrimaryAsyncSession(AsyncSession):
+    """
+    Session for read-write units of work.
+
+    It checks out a connection on its first statement and returns it when
+    the unit of work commits. Reads run after that, e.g. while building the
+    response, end their transaction at once instead of holding a connection
+    through Redis publishing and serialization. A write, pending change or
+    locking read starts a unit of work again, held until its own commit.
+    """
+
+    sync_session_class = PrimarySession
+
+    def _releases(self, statement) -> bool:
+        session = self.sync_session
+        return (
+            session.info.get("committed", False)
+            and not session.info.get("wrote", False)
+            and isinstance(statement, Select)
+            and statement._for_update_arg is None
+            and not (session.new or session.dirty or session.deleted)
+        )
+
+    async def _run(self, method, statement, *args, **kwargs):
+        result = await method(statement, *args, **kwargs)
+        if self.in_transaction() and self._releases(statement):
+            await self.commit()
+        return result
+
+    async def execute(self, statement, *args, **kwargs):
+        return await self._run(super().execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await self._run(super().scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await self._run(super().scalars, statement, *args, **kwargs)
+
 
 # Create a session factory, ensuring sessions are async
 async_session_factory = async_sessionmaker(
-    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    bind=async_engine,
+    class_=PrimaryAsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
 )
 
-# Create scoped session tied to async loop
-AsyncScoppedSession = async_scoped_session(
-    session_factory=async_session_factory, scopefunc=asyncio.current_task
+
+class ReadOnlySession(Session):
+    """
+    Sync session backing ReadOnlyAsyncSession, refuses to flush changes.
+
+    With a `replica_router` in its info each transaction is bound to the
+    engine the router picks, reused until the transaction ends.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kw):
+        router: Optional[ReplicaRouter] = self.info.get("replica_router")
+        if bind is not None or router is None:
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kw)
+        engine = self.info.get("bound_engine")
+        if engine is None:
+            engine = router.choose(current_user_var.get())
+            self.info["bound_engine"] = engine
+        return engine.sync_engine
+
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def refuse_read_only_flush(session, flush_context, instances) -> None:
+    """
+    Guards read-only sessions against writes.
+    """
+    raise InvalidRequestError("Read-only session can not flush changes")
+
+
+@event.listens_for(ReadOnlySession, "after_transaction_end")
+def unbind_read_only_transaction(session, transaction) -> None:
+    """
+    Lets the next transaction pick an engine again.
+    """
+    if transaction.parent is None:
+        session.info.pop("bound_engine", None)
+        session.info.pop("has_read", None)
+
+
+class ReadOnlyAsyncSession(AsyncSession):
+    """
+    Session for read-only units of work (GET routes).
+
+    All statements of a session run in one read-only transaction on one
+    engine, so reads that belong together (a page and its count) agree.
+    The transaction ends, and the connection goes back to the pool, when
+    the session closes or commits.
+
+    The first statement failing because its replica is unreachable ejects
+    the replica and runs once more on the next engine the router picks.
+    Later failures are raised, a retry would mix two snapshots.
+    """
+
+    sync_session_class = ReadOnlySession
+
+    async def _run(self, method, *args, **kwargs):
+        try:
+            result = await method(*args, **kwargs)
+        except Exception as exc:
+            router: Optional[ReplicaRouter] = self.info.get("replica_router")
+            engine = self.info.get("bound_engine")
+            if router is None or not router.is_replica(engine):
+                raise
+            if self.info.get("has_read") or not is_connection_error(exc):
+                raise
+            router.eject(engine)
+            await self.rollback()
+            result = await method(*args, **kwargs)
+        self.info["has_read"] = True
+        return result
+
+    async def execute(self, *args, **kwargs):
+        return await self._run(super().execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._run(super().scalar, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._run(super().get, *args, **kwargs)
+
+
+read_only_engine: AsyncEngine = read_only(async_engine)
+
+# Read replicas (DB_REPLICA_URLS), reads fall back to the primary when none
+# is configured or healthy
+replica_router = ReplicaRouter(
+    primary=read_only_engine,
+    replicas=[
+        read_only(build_async_engine(url.strip(), f"replica-{index}"))
+        for index, url in enumerate(settings.db_replica_urls.split(","))
+        if url.strip()
+    ],
+    ejection_seconds=settings.db_replica_ejection_seconds,
+    read_your_writes_seconds=settings.db_read_your_writes_seconds,
 )
 
+read_only_session_factory = async_sessionmaker(
+    bind=read_only_engine,
+    class_=ReadOnlyAsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+    info={"replica_router": replica_router},
+)
 
 async def create_tables() -> None:
     """
@@ -116,44 +377,82 @@ async def drop_specific_table(table: Table) -> None:
         await conn.run_sync(table.drop)
 
 
+def get_async_session_factory() -> async_sessionmaker[AsyncSession]:
+    """
+    Dependency to provide the session factory, for callers that must open
+    and close a short-lived session themselves instead of holding one for
+    the lifetime of the request (e.g. websocket authentication).
+    """
+    return async_session_factory
+
+
 async def get_async_session() -> AsyncIterator[AsyncSession]:
     """
     Dependency to provide a database session for each request.
     Handles session lifecycle including commit and rollback.
+
+    The session checks out a connection on its first statement and returns
+    it when the unit of work commits or rolls back, reads after the commit
+    release theirs at once (see PrimaryAsyncSession). Each request gets its
+    own session, closed when the request ends.
     """
-    async with AsyncScoppedSession() as session:
-        try:
-            yield session
-        finally:
-            await AsyncScoppedSession.remove()
-            await session.close()
-
-
-# run with postgres sync multi connection pool
-database_url = settings.celery_result_backend.split("+")[1]
-sync_engine = create_engine(
-    url=database_url,
-    echo=False,
-    future=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=60,
-    pool_recycle=18000,
-)
+    async with async_session_factory() as session:
+        yield session
 
-# run with sqlite sync singleton connection pool
-if settings.mode == "DEV":
-    database_url = settings.celery_result_backend_test.split("+", maxsplit=1)[1]
-    sync_engine = create_engine(
-        url=database_url,
-        echo=False,
-        future=True,
-    )
 
-# Create a session factory, ensuring sessions are sync for celery backend
-sync_session_factory = sessionmaker(
-    bind=sync_engine, autoflush=False, expire_on_commit=False
-)
+async def get_read_only_session() -> AsyncIterator[ReadOnlyAsyncSession]:
+    """
+    Dependency to provide a read-only database session for GET routes.
+    Its reads share one transaction, ended when the request finishes.
+    """
+    async with read_only_session_factory() as session:
+        yield session
+
+
+_sync_engine: Optional[Engine] = None
+
+
+def get_sync_engine() -> Engine:
+    """
+    Creates the sync engine for the celery results backend on first use.
+    Only celery workers need it, so the web process never opens this pool.
+    """
+    global _sync_engine
+    if _sync_engine is not None:
+        return _sync_engine
+
+    if settings.mode == "DEV":
+        # run with sqlite sync singleton connection pool
+        database_url = settings.celery_result_backend_test.split("+", maxsplit=1)[1]
+        _sync_engine = create_engine(
+            url=database_url,
+            echo=False,
+            future=True,
+        )
+    else:
+        # run with postgres sync multi connection pool
+        database_url = settings.celery_result_backend.split("+")[1]
+        _sync_engine = create_engine(
+            url=database_url,
+            echo=False,
+            future=True,
+            poolclass=TimedQueuePool,
+            pool_logging_name="sync",
+            pool_size=settings.sync_db_pool_size,
+            max_overflow=settings.sync_db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+        )
+
+    instrument_pool(_sync_engine, "sync")
+    sync_session_factory.configure(bind=_sync_engine)
+    return _sync_engine
+
+
+# Create a session factory, ensuring sessions are sync for celery backend,
+# bound to the sync engine by get_sync_engine
+sync_session_factory = sessionmaker(autoflush=False, expire_on_commit=False)
 
 # Create scoped session tied for celery backend
 SyncScoppedSession = scoped_session(
@@ -167,6 +466,7 @@ def get_sync_session():
     Dependency to provide a database session for each request.
     Handles session lifecycle including commit and rollback.
     """
+    get_sync_engine()
     session = SyncScoppedSession()
     try:
         yield session
@@ -0,0 +1,103 @@
+"""
+Prebuilt statements module
+
+Hot queries are built once, at import or on first use, with `bindparam`
+placeholders and executed with a parameters dict. A reused statement
+object memoizes its compiled cache key, a statement rebuilt on every call
+pays for building the tree and generating the key each time.
+"""
+
+import functools
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.ext.compiler import compiles
+
+
+@functools.lru_cache(maxsize=256)
+def selected_columns(
+    model: typing.Any, attributes: typing.Tuple[typing.Optional[str], ...]
+) -> typing.Tuple[typing.Any, ...]:
+    """
+    Resolves the attribute names of an attribute projection, once per
+    (model, attributes) pair.
+
+    Args:
+        model: The mapped class.
+        attributes (tuple): The requested attribute names.
+    Returns:
+        tuple: the model attributes that exist, in order.
+    """
+    return tuple(
+        getattr(model, attr)
+        for attr in attributes
+        if isinstance(attr, str) and hasattr(model, attr)
+    )
+
+
+def projection(
+    model: typing.Any, attributes: typing.Sequence[typing.Optional[str]]
+) -> typing.Optional[sa.Select]:
+    """
+    Builds the select of a model, or of some of its attributes.
+
+    Args:
+        model: The mapped class.
+        attributes (Sequence[str]): Optional attribute names to select.
+    Returns:
+        Select: the select, None if no requested attribute exists.
+    """
+    if not attributes:
+        return sa.select(model)
+    columns = selected_columns(model, tuple(attributes))
+    if not columns:
+        return None
+    return sa.select(*columns)
+
+
+async def update_returning(
+    session: typing.Any, model: typing.Any, query: sa.Update
+) -> typing.Any:
+    """
+    Runs an UPDATE and returns the row it changed, loaded into the session's
+    identity map from RETURNING so no follow-up SELECT is needed.
+
+    Args:
+        session (AsyncSession): The database async session object.
+        model: The mapped class updated.
+        query (Update): The guarded update, without RETURNING.
+    Returns:
+        the updated instance, None if the update matched no row.
+    """
+    return (
+        await session.execute(
+            sa.select(model)
+            .from_statement(query.returning(model))
+            .execution_options(populate_existing=True)
+        )
+    ).scalar_one_or_none()
+
+
+class greatest(sa.sql.functions.GenericFunction):  # pylint: disable=invalid-name
+    """
+    The larger of two values, NULL only if both are, as Postgres' GREATEST.
+    """
+
+    name = "greatest"
+    inherit_cache = True
+
+    def __init__(self, first: typing.Any, second: typing.Any, **kwargs) -> None:
+        first = sa.sql.coercions.expect(sa.sql.roles.ExpressionElementRole, first)
+        super().__init__(first, second, type_=first.type, **kwargs)
+
+
+@compiles(greatest, "sqlite")
+def compile_sqlite_greatest(element: greatest, compiler, **kw) -> str:
+    """
+    SQLite's multi-argument max() is NULL if any argument is.
+    """
+    first, second = element.clauses
+    return compiler.process(
+        sa.func.max(sa.func.coalesce(first, second), sa.func.coalesce(second, first)),
+        **kw,
+    )
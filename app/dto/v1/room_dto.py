@@ -3,6 +3,8 @@ Room DTOs
 """
 
 import json
+from datetime import datetime, timezone
+from enum import Enum
 
 from typing import Annotated, Optional, List
 from pydantic import (
@@ -30,6 +32,16 @@ class RoomBaseDto(BaseModel):
     is_deactivated: bool = Field(examples=[False])
     allow_admin_messages_only: bool = Field(examples=[False])
     is_private: bool = Field(examples=[False])
+    member_count: int = Field(default=0, examples=[12])
+    message_count: int = Field(default=0, examples=[240])
+    last_activity_at: Optional[datetime] = Field(
+        default=None, examples=[datetime.now(timezone.utc)]
+    )
+    online_count: Optional[int] = Field(
+        default=None,
+        examples=[3],
+        description="Members online, null when presence is unavailable",
+    )
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -147,3 +159,30 @@ class UpdateResponseDto(BaseModel):
     )
     status_code: int = Field(default=201, examples=[200])
     data: dict = Field(default={}, examples=[{}])
+
+
+# ++++++++++++++++++++++++++++ Discover rooms ++++++++++++++++++++++++++
+
+
+class RoomRankingEnum(str, Enum):
+    """
+    Public room ranking enum
+    """
+
+    ACTIVITY = "activity"
+    SIZE = "size"
+
+
+class DiscoverRoomsResponseDto(BaseModel):
+    """
+    Discover public rooms response
+    """
+
+    message: str = Field(
+        default="Rooms retrieved successfully.",
+        examples=["Rooms retrieved successfully."],
+    )
+    status_code: int = Field(default=200, examples=[200])
+    page: int = Field(examples=[1])
+    limit: int = Field(examples=[20])
+    data: List[RoomBaseDto]
@@ -2,7 +2,7 @@
 Room invitation dto module
 """
 
-from typing import Annotated
+from typing import Annotated, List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -52,6 +52,60 @@ class RoomInvitationResponseDto(BaseModel):
     data: RoomInvitationBaseDto
 
 
+# +++++++++++++++++++++++++++++++++++++++ Bulk ROom invitation +++++++++++++++++++++++++++===
+class RoomInvitationBulkRequestDto(BaseModel):
+    """
+    RoomInvitationBulkRequestDto
+    """
+
+    invitee_ids: List[
+        Annotated[
+            str, StringConstraints(min_length=20, max_length=40, strip_whitespace=True)
+        ]
+    ] = Field(
+        min_length=1, max_length=200, examples=[["312423-4-3544354-5-41342165"]]
+    )
+    room_id: Annotated[
+        str, StringConstraints(min_length=20, max_length=40, strip_whitespace=True)
+    ] = Field(examples=["312423-4-3544354-5-41342165"])
+
+
+class InvitationOutcomeEnum(str, Enum):
+    """
+    Outcome of inviting one user in a bulk invitation
+    """
+
+    INVITED = "invited"
+    REINVITED = "reinvited"
+    ALREADY_INVITED = "already_invited"
+    ALREADY_MEMBER = "already_member"
+    NOT_FOUND = "not_found"
+    SELF = "self"
+
+
+class RoomInvitationOutcomeDto(BaseModel):
+    """
+    RoomInvitationOutcomeDto
+    """
+
+    invitee_id: str = Field(examples=["312423-4-3544354-5-41342165"])
+    outcome: InvitationOutcomeEnum = Field(examples=["invited"])
+    invitation: Optional[RoomInvitationBaseDto] = None
+
+
+class RoomInvitationBulkResponseDto(BaseModel):
+    """
+    RoomInvitationBulkResponseDto
+    """
+
+    status_code: int = Field(default=200, examples=[200])
+    message: str = Field(
+        default="Invitations processed successfully",
+        examples=["Invitations processed successfully"],
+    )
+    data: List[RoomInvitationOutcomeDto]
+
+
 # +++++++++++++++++++++++++++++++++++++++ ROom invitation accept/reject +++++++++++++++++++++++++++===
 class InvitationStatusEnum(str, Enum):
     """
@@ -98,3 +152,59 @@ class RoomInvitationUpdateResponseDto(BaseModel):
 
 
 # +++++++++++++++++++++++++++++++++++++++ Fetch ROom invitations +++++++++++++++++++++++++++===
+class InvitationStatusFilterEnum(str, Enum):
+    """
+    Invitation status filter enum
+    """
+
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    DECLINED = "declined"
+    EXPIRED = "expired"
+    CANCELLED = "cancelled"
+
+
+class RoomInvitationListItemDto(RoomInvitationBaseDto):
+    """
+    RoomInvitationListItemDto
+    """
+
+    inviter_id: Optional[str] = Field(examples=["312423-4-3544354-5-41342165"])
+    created_at: datetime = Field(examples=[datetime.now()])
+
+
+class RoomInvitationsResponseDto(BaseModel):
+    """
+    RoomInvitationsResponseDto
+    """
+
+    status_code: int = Field(default=200, examples=[200])
+    message: str = Field(
+        default="Invitations fetched successfully",
+        examples=["Invitations fetched successfully"],
+    )
+    limit: int = Field(default=50, examples=[50])
+    next_cursor: Optional[str] = Field(
+        default=None,
+        examples=["WyIyMDI0LTAxLTAxVDAwOjAwOjAwKzAwOjAwIiwiMTIzIl0"],
+        description="Cursor of the next page, null on the last page",
+    )
+    pending_count: Optional[int] = Field(
+        default=None,
+        examples=[3],
+        description="Pending invitations in total, null for sent invitations",
+    )
+    data: List[RoomInvitationListItemDto]
+
+
+class PendingInvitationsCountResponseDto(BaseModel):
+    """
+    PendingInvitationsCountResponseDto
+    """
+
+    status_code: int = Field(default=200, examples=[200])
+    message: str = Field(
+        default="Pending invitations counted successfully",
+        examples=["Pending invitations counted successfully"],
+    )
+    pending_count: int = Field(examples=[3])
@@ -3,6 +3,8 @@ Room Member DTOs
 """
 
 from typing import Optional, List, Annotated
+from datetime import datetime, timezone
+from enum import Enum
 import json
 from pydantic import (
     BaseModel,
@@ -25,6 +27,9 @@ class RoomMemberBaseDto(BaseModel):
     )
     profile_photo: Optional[str] = Field(default=None, examples=["https://image.com"])
     is_admin: bool = Field(examples=[False])
+    joined_at: Optional[datetime] = Field(
+        default=None, examples=[datetime.now(timezone.utc)]
+    )
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -39,9 +44,29 @@ class RoomMebersResponseDto(BaseModel):
         default="Room Members fetched succesfully",
         examples=["Room Members fetched succesfully"],
     )
+    limit: int = Field(default=50, examples=[50])
+    next_cursor: Optional[str] = Field(
+        default=None,
+        examples=["WzEsIjIwMjQtMDEtMDFUMDA6MDA6MDArMDA6MDAiLCIxMjMiXQ"],
+        description="Cursor of the next page, null on the last page",
+    )
     data: List[Optional[RoomMemberBaseDto]]
 
 
+class RoomOnlineMembersResponseDto(BaseModel):
+    """
+    RoomOnlineMembersResponseDto
+    """
+
+    status_code: int = Field(default=200, examples=[200])
+    message: str = Field(
+        default="Online Room Members fetched succesfully",
+        examples=["Online Room Members fetched succesfully"],
+    )
+    online_count: int = Field(examples=[1])
+    data: List[str] = Field(examples=[["121212121212-1212-2121-2121-21212121"]])
+
+
 # +++++++++++++++++++++++++ Add Room Member ++++++++++++++++++++++++++++
 class AddRoomMemberRequestDto(BaseModel):
     """
@@ -109,3 +134,55 @@ class UpdateRoomMemberResponseDto(BaseModel):
         examples=["Room Member updated succesfully"],
     )
     data: dict = Field(default={}, examples=[{}])
+
+
+# +++++++++++++++++++++++++ Bulk update Room Members ++++++++++++++++++++++++++++
+class BulkRoomMembersActionEnum(str, Enum):
+    """
+    Bulk room members action enum
+    """
+
+    ADD = "add"
+    REMOVE = "remove"
+    PROMOTE = "promote"
+    DEMOTE = "demote"
+
+
+class BulkUpdateRoomMembersRequestDto(BaseModel):
+    """
+    Bulk update room members
+    """
+
+    action: BulkRoomMembersActionEnum = Field(examples=["add"])
+    member_ids: List[
+        Annotated[
+            str, StringConstraints(min_length=20, max_length=40, strip_whitespace=True)
+        ]
+    ] = Field(
+        min_length=1,
+        max_length=200,
+        examples=[["121212121212-1212-2121-2121-21212121"]],
+    )
+
+
+class BulkRoomMembersResultDto(BaseModel):
+    """
+    Bulk room members result
+    """
+
+    action: BulkRoomMembersActionEnum = Field(examples=["add"])
+    updated: List[str] = Field(examples=[["121212121212-1212-2121-2121-21212121"]])
+    skipped: List[str] = Field(examples=[[]])
+
+
+class BulkUpdateRoomMembersResponseDto(BaseModel):
+    """
+    Bulk update RoomMembers ResponseDto
+    """
+
+    status_code: int = Field(default=200, examples=[200])
+    message: str = Field(
+        default="Room Members updated succesfully",
+        examples=["Room Members updated succesfully"],
+    )
+    data: BulkRoomMembersResultDto
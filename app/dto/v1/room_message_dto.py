@@ -129,6 +129,39 @@ class RoomMessageOrderEnum(str, Enum):
     ASC = "asc"
 
 
+# +++++++++++++++++++++++++++++++++++++++ search messages +++++++++++++++++++++++++++++++++++++++++
+
+
+class SearchRoomMessageResultDto(RoomMessageBaseDto):
+    """
+    Searched room message schema
+    """
+
+    rank: float = Field(
+        examples=[0.1], description="How well the message matches, higher is better"
+    )
+
+
+class SearchRoomMessagesResponseDto(BaseModel):
+    """
+    Search room messages schema
+    """
+
+    message: str = Field(
+        default="messages retrieved successfully",
+        examples=["messages retrieved successfully"],
+    )
+    status_code: int = Field(default=200, examples=[200])
+    limit: int = Field(default=20, examples=[20])
+    next_cursor: Optional[str] = Field(
+        default=None,
+        examples=["WzAuMSwiMjAyNC0wMS0wMVQwMDowMDowMCswMDowMCIsIjEyMyJd"],
+        description="Cursor of the next page, null on the last page",
+    )
+
+    data: List[SearchRoomMessageResultDto]
+
+
 # +++++++++++++++++++++++++++++++++++++++ update message +++++++++++++++++++++++++++++++++++++++++
 
 # update messages
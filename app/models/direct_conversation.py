@@ -2,10 +2,11 @@
 DirectCOnversationModel module
 """
 
-from typing import TYPE_CHECKING, List
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
 
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey, Index
+from sqlalchemy import DateTime, ForeignKey, Index, String, text
 
 
 from app.database.session import Base, ModelMixin
@@ -16,6 +17,33 @@ if TYPE_CHECKING:
     from app.models.user import User
 
 
+def participant_pair_key(user_id: str, other_user_id: str) -> str:
+    """
+    Builds the canonical key of a pair of participants, the same whichever
+    of the two started the conversation.
+
+    Args:
+        user_id(str): The id of one participant.
+        other_user_id(str): The id of the other participant.
+    Returns:
+        str: the two ids in order, joined by a colon.
+    """
+    first, second = sorted((user_id, other_user_id))
+    return f"{first}:{second}"
+
+
+def default_participant_pair_key(context) -> Optional[str]:
+    """
+    Fills participant_pair_key on insert from the row's participants.
+    """
+    parameters = context.get_current_parameters()
+    sender_id = parameters.get("sender_id")
+    recipient_id = parameters.get("recipient_id")
+    if not sender_id or not recipient_id:
+        return None
+    return participant_pair_key(sender_id, recipient_id)
+
+
 class DirectConversation(ModelMixin, Base):
     """
     Represents the direct_conversations table in the database
@@ -33,6 +61,19 @@ class DirectConversation(ModelMixin, Base):
         index=True,
         nullable=True,
     )
+    participant_pair_key: Mapped[Optional[str]] = mapped_column(
+        String(121),
+        default=default_participant_pair_key,
+        nullable=True,
+    )
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+    last_message_id: Mapped[Optional[str]] = mapped_column(
+        String(60),
+        nullable=True,
+    )
     is_deleted_for_sender: Mapped[bool] = mapped_column(
         default=False,
         server_default="FALSE",
@@ -65,4 +106,21 @@ class DirectConversation(ModelMixin, Base):
             "recipient_id",
             unique=True,
         ),
+        Index(
+            "ix_unique_conversations_participant_pair_key",
+            "participant_pair_key",
+            unique=True,
+        ),
+        # each participant's inbox, most recent activity first, conversations
+        # without messages by when they started
+        Index(
+            "ix_conversations_sender_id_activity",
+            "sender_id",
+            text("coalesce(last_message_at, created_at) DESC"),
+        ),
+        Index(
+            "ix_conversations_recipient_id_activity",
+            "recipient_id",
+            text("coalesce(last_message_at, created_at) DESC"),
+        ),
     )
@@ -9,6 +9,7 @@ from sqlalchemy.orm import mapped_column, Mapped, relationship, validates
 from sqlalchemy import DateTime, ForeignKey, Text
 
 
+from app.database.full_text import index_content
 from app.database.session import Base, ModelMixin
 from app.models.enums import message_status_enum
 
@@ -123,3 +124,7 @@ class DirectMessage(ModelMixin, Base):
         if key == "media_url":
             value = str(value)
         return value
+
+
+# the contents are searched through a full-text index
+index_content(DirectMessage.__table__)  # type: ignore
@@ -2,10 +2,11 @@
 Room model module
 """
 
+from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import DateTime, ForeignKey, Index, func, text
 
 from app.database.session import Base, ModelMixin
 from app.models.room_member import RoomMember
@@ -39,6 +40,13 @@ class Room(ModelMixin, Base):
     allow_non_admin_invitations: Mapped[bool] = mapped_column(
         default=True, server_default="TRUE"
     )
+    # maintained by membership and message writes, repaired by
+    # reconcile_room_stats
+    member_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    message_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_activity_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     # ------------------- relationships -------------------------
 
@@ -61,3 +69,37 @@ class Room(ModelMixin, Base):
     room_messages: Mapped["RoomMessage"] = relationship(
         "RoomMessage", back_populates="room", uselist=False
     )
+
+    # discovery only lists public rooms still active
+    __table_args__ = (
+        # name prefix search
+        Index(
+            "ix_rooms_discoverable_name_prefix",
+            func.lower(name).label("name_lower"),
+            postgresql_ops={"name_lower": "text_pattern_ops"},
+            postgresql_where=text("is_private IS FALSE AND is_deactivated IS FALSE"),
+            sqlite_where=text("is_private = 0 AND is_deactivated = 0"),
+        ),
+        # fuzzy name search, pg_trgm; a plain partial index on SQLite
+        Index(
+            "ix_rooms_discoverable_name_trgm",
+            name,
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+            postgresql_where=text("is_private IS FALSE AND is_deactivated IS FALSE"),
+            sqlite_where=text("is_private = 0 AND is_deactivated = 0"),
+        ),
+        # rankings
+        Index(
+            "ix_rooms_discoverable_last_activity_at",
+            text("last_activity_at DESC"),
+            postgresql_where=text("is_private IS FALSE AND is_deactivated IS FALSE"),
+            sqlite_where=text("is_private = 0 AND is_deactivated = 0"),
+        ),
+        Index(
+            "ix_rooms_discoverable_member_count",
+            text("member_count DESC"),
+            postgresql_where=text("is_private IS FALSE AND is_deactivated IS FALSE"),
+            sqlite_where=text("is_private = 0 AND is_deactivated = 0"),
+        ),
+    )
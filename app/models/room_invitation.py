@@ -6,7 +6,7 @@ from typing import TYPE_CHECKING
 from datetime import datetime
 
 from sqlalchemy.orm import relationship
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
 from app.database.session import (
     Base,
     ModelMixin,
@@ -79,4 +79,17 @@ class RoomInvitation(ModelMixin, Base):
         UniqueConstraint(
             room_id, invitee_id, name="uq_room_invitation_room_id_invitee_id"
         ),
+        # the expiry sweep walks pending invitations by expiration
+        Index(
+            "ix_room_invitations_status_expiration", invitation_status, expiration
+        ),
+        # a user's invitation inbox by status, newest first
+        Index(
+            "ix_room_invitations_invitee_status_created_at",
+            "invitee_id",
+            "invitation_status",
+            "created_at",
+        ),
+        # a room's invitations by status
+        Index("ix_room_invitations_room_status", "room_id", "invitation_status"),
     )
@@ -4,7 +4,7 @@ RoomMember Model Module
 
 from typing import TYPE_CHECKING
 from sqlalchemy.orm import relationship
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, text
 
 
 from app.database.session import (
@@ -53,4 +53,14 @@ class RoomMember(ModelMixin, Base):
 
     __table_args__ = (
         UniqueConstraint(room_id, member_id, name="uq_room_member_room_id_user_id"),
+        # the roster of a room, admins first then by join time
+        Index(
+            "ix_room_members_roster",
+            "room_id",
+            text("is_admin DESC"),
+            "created_at",
+            "member_id",
+            postgresql_where=text("left_room IS FALSE"),
+            sqlite_where=text("left_room = 0"),
+        ),
     )
@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING, Optional, List
 from sqlalchemy import ForeignKey, TEXT
 from sqlalchemy.orm import relationship
 
+from app.database.full_text import index_content
 from app.database.session import Base, ModelMixin, String, Mapped, mapped_column
 from app.models.enums import message_status_enum
 
@@ -68,3 +69,7 @@ class RoomMessage(ModelMixin, Base):
         uselist=True,
         passive_deletes=True,
     )
+
+
+# the contents are searched through a full-text index
+index_content(RoomMessage.__table__)  # type: ignore
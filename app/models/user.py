@@ -54,6 +54,9 @@ class User(ModelMixin, Base):
         Index("uq_chat_users_idempotency_key", idempotency_key, unique=True),
     )
 
+    # credentials never leave the database through the shared cache
+    __cache_exclude__ = ("password", "idempotency_key")
+
     # ---------------------------- relationships ---------------------
 
     sessions: Mapped[List["UserSession"]] = relationship(
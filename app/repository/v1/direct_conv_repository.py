@@ -5,10 +5,67 @@ DirectConversationRepository Module
 import typing
 import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from redis.asyncio import Redis
 
-from app.models.direct_conversation import DirectConversation
+from app.models.direct_conversation import DirectConversation, participant_pair_key
 from app.models.direct_message import DirectMessage
 from app.models.user import User
+from app.repository.v1.inbox_cache_repository import inbox_cache_repository
+
+# prebuilt conversation lookups, executed with bound parameters
+FETCH_BY_ID = sa.select(DirectConversation).where(
+    DirectConversation.id == sa.bindparam("conversation_id")
+)
+FIND_BY_PAIR_KEY = sa.select(DirectConversation).where(
+    DirectConversation.participant_pair_key == sa.bindparam("pair_key")
+)
+FIND_BY_PAIR_KEY_AND_ID = FIND_BY_PAIR_KEY.where(
+    DirectConversation.id == sa.bindparam("conversation_id")
+)
+
+# what orders the inbox, in the database and in its cache: the last message,
+# or for conversations without one when they started
+LAST_ACTIVE_AT = sa.func.coalesce(
+    DirectConversation.last_message_at, DirectConversation.created_at
+)
+
+# the new message's own timestamp, so the conversation and message agree
+MESSAGE_CREATED_AT = (
+    sa.select(DirectMessage.created_at)
+    .where(DirectMessage.id == sa.bindparam("message_id"))
+    .scalar_subquery()
+)
+SET_LAST_MESSAGE = (
+    sa.update(DirectConversation)
+    .where(
+        DirectConversation.id == sa.bindparam("conversation_id"),
+        # never move back to an older message committed late
+        sa.or_(
+            DirectConversation.last_message_at.is_(None),
+            DirectConversation.last_message_at <= MESSAGE_CREATED_AT,
+        ),
+    )
+    .values(
+        last_message_at=MESSAGE_CREATED_AT,
+        last_message_id=sa.bindparam("message_id"),
+    )
+    .execution_options(synchronize_session=False)
+)
+
+# brings a conversation either side deleted back; only writes when it was
+RESTORE = (
+    sa.update(DirectConversation)
+    .where(
+        DirectConversation.id == sa.bindparam("conversation_id"),
+        sa.or_(
+            DirectConversation.is_deleted_for_sender.is_(True),
+            DirectConversation.is_deleted_for_recipient.is_(True),
+        ),
+    )
+    .values(is_deleted_for_sender=False, is_deleted_for_recipient=False)
+    .execution_options(synchronize_session=False)
+)
 
 
 class DirectConversationRepository:
@@ -37,27 +94,90 @@ class DirectConversationRepository:
         return new_direct_conversation
 
     async def update(
-        self, is_deleted: bool, conversation_id: str, session: AsyncSession
+        self,
+        user_id: str,
+        conversation_ids: typing.List[str],
+        session: AsyncSession,
+        redis: typing.Optional[Redis] = None,
+    ) -> typing.List[str]:
+        """
+        Deletes conversations for the current user, on their side only.
+
+
+        Args:
+            user_id(str): The id of the current user.
+            conversation_ids(List[str]): The ids of the conversations.
+            session(AsyncSession): The database session object.
+            redis(Redis): Optional redis client, to drop them from the cached inbox.
+        Returns:
+            List[str]: the ids of the conversations deleted.
+        """
+        deleted = []
+        for participant, is_deleted in [
+            (
+                DirectConversation.sender_id,
+                DirectConversation.is_deleted_for_sender,
+            ),
+            (
+                DirectConversation.recipient_id,
+                DirectConversation.is_deleted_for_recipient,
+            ),
+        ]:
+            query = (
+                sa.update(DirectConversation)
+                .where(
+                    DirectConversation.id.in_(conversation_ids),
+                    participant == user_id,
+                    is_deleted.is_(False),
+                )
+                .values({is_deleted: True})
+                .returning(DirectConversation.id, DirectConversation.participant_pair_key)
+                .execution_options(synchronize_session=False)
+            )
+            deleted.extend((await session.execute(query)).all())
+        await session.commit()
+
+        if redis is not None:
+            await inbox_cache_repository.remove(
+                user_id=user_id,
+                conversation_ids=[conversation_id for conversation_id, _ in deleted],
+                pair_keys=[pair_key for _, pair_key in deleted if pair_key],
+                redis=redis,
+            )
+        return [conversation_id for conversation_id, _ in deleted]
+
+    async def restore(self, conversation_id: str, session: AsyncSession) -> None:
+        """
+        Undoes a deletion of the conversation on either side, for a conversation
+        whose row was never loaded. Runs in the transaction sending the message.
+
+
+        Args:
+            conversation_id(str): The id of the conversation.
+            session(AsyncSession): The database session object.
+        """
+        await session.execute(RESTORE, {"conversation_id": conversation_id})
+
+    async def set_last_message(
+        self, conversation_id: str, message_id: str, session: AsyncSession
     ) -> None:
         """
-        Updates direct conversation is_deleted status.
+        Points a conversation at its newest message. Runs in the transaction
+        inserting the message, after it is flushed.
 
 
         Args:
-            is_deleted(bool): The status of deletion.
-            converstion_id(str): The id of conversation.
+            conversation_id(str): The id of the conversation.
+            message_id(str): The id of the new message.
             session(AsyncSession): The database session object.
         Returns:
             None
         """
-        query = (
-            sa.update(DirectConversation)
-            .where(DirectConversation.id == conversation_id)
-            .values(is_deleted=is_deleted)
+        await session.execute(
+            SET_LAST_MESSAGE,
+            {"conversation_id": conversation_id, "message_id": message_id},
         )
 
-        await session.execute(query)
-
     async def fetch_by_id(
         self, conversation_id: str, session: AsyncSession
     ) -> typing.Optional[DirectConversation]:
@@ -71,10 +191,9 @@ class DirectConversationRepository:
         Returns:
             DirectConversation(object): The direct_conversation instance or None
         """
-        query = sa.select(DirectConversation).where(
-            DirectConversation.id == conversation_id,
-        )
-        return (await session.execute(query)).scalar_one_or_none()
+        return (
+            await session.execute(FETCH_BY_ID, {"conversation_id": conversation_id})
+        ).scalar_one_or_none()
 
     async def fetch_all(
         self,
@@ -106,6 +225,34 @@ class DirectConversationRepository:
 
         return (await session.execute(query)).scalars().all()
 
+    async def fetch_inbox_scores(
+        self, user_id: str, session: AsyncSession
+    ) -> typing.Sequence[sa.Row]:
+        """
+        Fetches when each of a user's conversations last had a message.
+
+
+        Args:
+            user_id(str): The id of the current user.
+            session(AsyncSession): The database session object.
+        Returns:
+            Sequence[Row]: (conversation id, last message time) rows.
+        """
+        query = sa.select(DirectConversation.id, LAST_ACTIVE_AT).where(
+            sa.or_(
+                sa.and_(
+                    DirectConversation.is_deleted_for_recipient.is_(False),
+                    DirectConversation.recipient_id == user_id,
+                ),
+                sa.and_(
+                    DirectConversation.is_deleted_for_sender.is_(False),
+                    DirectConversation.sender_id == user_id,
+                ),
+            ),
+        )
+
+        return (await session.execute(query)).all()
+
     async def get_conversation_with_last_message_count(
         self, user_id: str, page: int, limit: int, session: AsyncSession
     ) -> typing.Tuple[typing.Sequence[sa.RowMapping], int]:
@@ -122,101 +269,94 @@ class DirectConversationRepository:
         Returns:
             Tuple[Sequence[RowMapping], int]: The sequence of direct_conversation mappings and count
         """
-        # Subquery to get the latest message per conversation
-        latest_message_subquery = (
+        # each side of the inbox is a top-N scan of its
+        # (participant, last active DESC) index, ordered as the inbox cache
+        newest_first = (LAST_ACTIVE_AT.desc(), DirectConversation.id.desc())
+        as_sender = (
             sa.select(
-                DirectMessage.conversation_id,
-                DirectMessage.content,
-                DirectMessage.created_at,
-                sa.func.row_number()
-                .over(
-                    partition_by=DirectMessage.conversation_id,
-                    order_by=DirectMessage.created_at.desc(),
-                )
-                .label("row_num"),
+                DirectConversation.id.label("conversation_id"),
+                DirectConversation.recipient_id.label("peer_id"),
+                DirectConversation.last_message_at,
+                DirectConversation.last_message_id,
+                LAST_ACTIVE_AT.label("last_active_at"),
             )
-            .select_from(DirectMessage)
+            .where(
+                DirectConversation.sender_id == user_id,
+                DirectConversation.is_deleted_for_sender.is_(False),
+            )
+            .order_by(*newest_first)
+            .limit(page * limit)
             .subquery()
-        ).alias("latest_message_rn")
-
-        # Subquery to count unread messages per conversation for the current user
-        unread_message_count_subquery = (
+        )
+        as_recipient = (
             sa.select(
-                DirectMessage.conversation_id,
-                sa.func.count(DirectMessage.id).label("unread_count"),
+                DirectConversation.id.label("conversation_id"),
+                DirectConversation.sender_id.label("peer_id"),
+                DirectConversation.last_message_at,
+                DirectConversation.last_message_id,
+                LAST_ACTIVE_AT.label("last_active_at"),
+            )
+            .where(
+                DirectConversation.recipient_id == user_id,
+                DirectConversation.is_deleted_for_recipient.is_(False),
             )
-            .select_from(DirectMessage)
+            .order_by(*newest_first)
+            .limit(page * limit)
+            .subquery()
+        )
+        inbox = sa.union_all(
+            sa.select(as_sender), sa.select(as_recipient)
+        ).subquery("inbox")
+
+        last_message = aliased(DirectMessage, name="last_message")
+        # unread messages per conversation, only for the rows on the page
+        unread_message_count = (
+            sa.select(sa.func.count(DirectMessage.id))
             .where(
-                DirectMessage.conversation_id == DirectConversation.id,
+                DirectMessage.conversation_id == inbox.c.conversation_id,
                 DirectMessage.read_at.is_(None),
                 sa.or_(
                     DirectMessage.recipient_id == user_id,
                     DirectMessage.sender_id == user_id,
                 ),
             )
-            .group_by(DirectMessage.conversation_id)
-            .correlate(
-                DirectConversation
-            )  # Correlate with the outer Conversation table
-            .subquery()
-        ).alias("unread_counts")
+            .scalar_subquery()
+        )
 
         # Main query
         stmt = (
             sa.select(
-                DirectConversation.id.label("conversation_id"),
+                inbox.c.conversation_id,
                 User.id.label("user_id"),
                 User.first_name.label("firstname"),
                 User.profile_photo.label("profile_photo"),
-                DirectConversation.updated_at.label("updated_at"),
-                latest_message_subquery.c.content.label("last_message"),
-                sa.func.coalesce(unread_message_count_subquery.c.unread_count, 0).label(
-                    "unread_message_count"
-                ),
+                inbox.c.last_message_at,
+                last_message.content.label("last_message"),
+                unread_message_count.label("unread_message_count"),
             )
-            .select_from(DirectConversation)
-            .join(
-                User,
-                sa.or_(
-                    DirectConversation.sender_id == User.id,
-                    DirectConversation.recipient_id == User.id,
-                ),
-            )
-            .outerjoin(
-                latest_message_subquery,
+            .select_from(inbox)
+            .join(User, User.id == inbox.c.peer_id)
+            .outerjoin(last_message, last_message.id == inbox.c.last_message_id)
+            .order_by(inbox.c.last_active_at.desc(), inbox.c.conversation_id.desc())
+            .limit(limit)
+            .offset((page - 1) * limit)
+        )
+
+        count_stmt = sa.select(sa.func.count(DirectConversation.id)).where(
+            sa.or_(
                 sa.and_(
-                    latest_message_subquery.c.conversation_id == DirectConversation.id,
-                    latest_message_subquery.c.row_num == 1,
+                    DirectConversation.is_deleted_for_recipient.is_(False),
+                    DirectConversation.recipient_id == user_id,
                 ),
-            )
-            .outerjoin(
-                unread_message_count_subquery,  # Join with the new unread count subquery
-                unread_message_count_subquery.c.conversation_id
-                == DirectConversation.id,
-            )
-            .where(
-                sa.or_(
-                    sa.and_(
-                        DirectConversation.is_deleted_for_recipient.is_(False),
-                        DirectConversation.recipient_id == user_id,
-                    ),
-                    sa.and_(
-                        DirectConversation.is_deleted_for_sender.is_(False),
-                        DirectConversation.sender_id == user_id,
-                    ),
+                sa.and_(
+                    DirectConversation.is_deleted_for_sender.is_(False),
+                    DirectConversation.sender_id == user_id,
                 ),
-                User.id != user_id,
-            )
-            .order_by(DirectConversation.updated_at.desc())
+            ),
         )
-
-        # Execute the query
-        count_stmt = sa.select(sa.func.count()).select_from(stmt.subquery())  # noqa
         count_result = await session.execute(count_stmt)
         total_conversations = count_result.scalar_one_or_none() or 0
 
-        stmt = stmt.limit(limit).offset((page - 1) * limit)
-
         result = await session.execute(stmt)
         conversations = result.mappings().all()
 
@@ -230,7 +370,9 @@ class DirectConversationRepository:
         conversation_id: typing.Optional[str] = None,
     ) -> typing.Optional[DirectConversation]:
         """
-        Checks if users already has a conversation using their IDs
+        Checks if users already has a conversation using their IDs.
+        Looks up the canonical participant pair key, a single unique index
+        seek whichever of the two sent the first message.
 
 
         Args:
@@ -241,18 +383,15 @@ class DirectConversationRepository:
         Return:
             COnversation if found, None if not found.
         """
-        query = sa.select(DirectConversation).where(
-            (
-                (DirectConversation.sender_id == sender_id)
-                & (DirectConversation.recipient_id == recipient_id)
-                | (DirectConversation.sender_id == recipient_id)
-                & (DirectConversation.recipient_id == sender_id)
-            )
+        query = FIND_BY_PAIR_KEY_AND_ID if conversation_id else FIND_BY_PAIR_KEY
+
+        result = await session.execute(
+            query,
+            {
+                "pair_key": participant_pair_key(sender_id, recipient_id),
+                "conversation_id": conversation_id,
+            },
         )
-        if conversation_id:
-            query = query.where(DirectConversation.id == conversation_id)
-
-        result = await session.execute(query)
         return result.scalar_one_or_none()
 
 
@@ -2,16 +2,72 @@
 DirectMessageRepository Module
 """
 
+import functools
 import typing
 from datetime import datetime, timezone, timedelta
 
 import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.full_text import match, ranked_after
+from app.database.statements import projection, update_returning
 from app.models.direct_message import DirectMessage
 from app.models.direct_conversation import DirectConversation
 
 
+@functools.lru_cache(maxsize=32)
+def fetch_statement(
+    attributes: typing.Tuple[typing.Optional[str], ...], by_conversation: bool
+) -> typing.Optional[sa.Select]:
+    """
+    Prebuilt message fetch, bound with message_id (and conversation_id).
+    """
+    query = projection(DirectMessage, attributes)
+    if query is None:
+        return None
+    query = query.where(DirectMessage.id == sa.bindparam("message_id"))
+    if by_conversation:
+        query = query.where(
+            DirectMessage.conversation_id == sa.bindparam("conversation_id")
+        )
+    return query
+
+
+@functools.lru_cache(maxsize=32)
+def fetch_all_statements(
+    attributes: typing.Tuple[typing.Optional[str], ...], order: str, limited: bool
+) -> typing.Optional[typing.Tuple[sa.Select, sa.Select]]:
+    """
+    Prebuilt page and count of the messages of a conversation a user still
+    sees, bound with conversation_id, user_id, offset (and limit).
+    """
+    query = projection(DirectMessage, attributes)
+    if query is None:
+        return None
+    user_id = sa.bindparam("user_id")
+    query = query.where(
+        DirectMessage.conversation_id == sa.bindparam("conversation_id"),
+        sa.or_(
+            sa.and_(
+                DirectMessage.is_deleted_for_sender.is_(False),
+                DirectMessage.sender_id == user_id,
+            ),
+            sa.and_(
+                DirectMessage.is_deleted_for_recipient.is_(False),
+                DirectMessage.recipient_id == user_id,
+            ),
+        ),
+    )
+    count = sa.select(sa.func.count()).select_from(query.subquery())
+    order_by = sa.desc if order == "desc" else sa.asc
+    query = query.offset(sa.bindparam("offset")).order_by(
+        order_by(DirectMessage.created_at)
+    )
+    if limited:
+        query = query.limit(sa.bindparam("limit"))
+    return query, count
+
+
 class DirectMessageRepository:
     """
     Direct Message repo
@@ -28,10 +84,11 @@ class DirectMessageRepository:
         content: typing.Union[str, None],
         sender_id: str,
         recipient_id: str,
-        conversation: DirectConversation,
+        conversation: typing.Optional[DirectConversation],
         parent_message_id: typing.Union[str, None],
         media_url: typing.Union[str, None],
         media_type: typing.Union[str, None],
+        conversation_id: typing.Optional[str] = None,
     ) -> DirectMessage:
         """
         Creates a new message.
@@ -41,24 +98,86 @@ class DirectMessageRepository:
             content(str): The message content
             sender_id(str): The id of the sender content
             recipient_id(str): The id of the recipient content
-            conversation_id(str): The id of the conversation content
+            conversation(DirectConversation): The conversation, if loaded.
             media_type(str): The media type
             media_url(str): The message content.
+            conversation_id(str): The id of the conversation, when it is not loaded.
         Returns:
             Message(object): new message object.
         """
+        if conversation is not None:
+            conversation_fields = {"direct_conversation": conversation}
+        else:
+            conversation_fields = {"conversation_id": conversation_id}
         new_message = self.model(
             sender_id=sender_id,
             content=content,
             media_type=media_type,
             media_url=media_url,
             recipient_id=recipient_id,
-            direct_conversation=conversation,
             parent_message_id=parent_message_id,
+            **conversation_fields,
         )
 
         return new_message
 
+    async def search(
+        self,
+        user_id: str,
+        text: str,
+        session: AsyncSession,
+        limit: int,
+        after: typing.Optional[typing.Tuple[float, datetime, str]] = None,
+        conversation_id: typing.Optional[str] = None,
+    ) -> typing.Sequence[typing.Tuple[DirectMessage, float]]:
+        """
+        Searches the messages a user sent or received and did not delete
+        for themselves, best matches first then newest first.
+
+
+        Args:
+            user_id(str): The id of the current user
+            text(str): The searched text, with at least one word.
+            session (AsyncSession): The database async session object.
+            limit (int): The number of messages to retrieve.
+            after (tuple): (rank, created_at, id) of the last message of the
+                previous page, None for the first page.
+            conversation_id(str): Optional conversation to search in.
+        Returns:
+            Sequence: (message, rank) of each matching message.
+        """
+        matches, condition, rank = match(
+            self.model.__table__, text, session.get_bind().dialect.name
+        )
+        query = (
+            sa.select(self.model, rank.label("rank"))
+            .select_from(matches)
+            .where(
+                condition,
+                sa.or_(
+                    sa.and_(
+                        self.model.is_deleted_for_sender.is_(False),
+                        self.model.sender_id == user_id,
+                    ),
+                    sa.and_(
+                        self.model.is_deleted_for_recipient.is_(False),
+                        self.model.recipient_id == user_id,
+                    ),
+                ),
+            )
+        )
+        if conversation_id:
+            query = query.where(self.model.conversation_id == conversation_id)
+        if after is not None:
+            query = query.where(
+                ranked_after(rank, self.model.created_at, self.model.id, after)
+            )
+        query = query.order_by(
+            rank.desc(), self.model.created_at.desc(), self.model.id.desc()
+        ).limit(limit)
+
+        return (await session.execute(query)).tuples().all()
+
     async def fetch(
         self,
         session: AsyncSession,
@@ -76,24 +195,39 @@ class DirectMessageRepository:
         Returns:
             Message if found or None
         """
-        if len(attributes) > 0:
-            selected_fields = [
-                getattr(self.model, attr)
-                for attr in attributes
-                if isinstance(attr, str) and hasattr(self.model, attr)
-            ]
-            if not selected_fields:
-                return None
-            query = sa.select(*selected_fields).where(self.model.id == message_id)
-            if conversation_id:
-                query = query.where(self.model.conversation_id == conversation_id)
-            return (await session.execute(query)).scalar_one_or_none()
-
-        query = sa.select(self.model).where(self.model.id == message_id)
-        if conversation_id:
-            query = query.where(self.model.conversation_id == conversation_id)
+        query = fetch_statement(tuple(attributes), bool(conversation_id))
+        if query is None:
+            return None
+
+        return (
+            await session.execute(
+                query, {"message_id": message_id, "conversation_id": conversation_id}
+            )
+        ).scalar_one_or_none()
+
+    async def fetch_recent(
+        self, conversation_id: str, limit: int, session: AsyncSession
+    ) -> typing.Sequence[DirectMessage]:
+        """
+        Retrieves the newest messages, deleted ones included, newest first.
+        Fills the message history cache.
+
+
+        Args:
+            conversation_id(str): The id of the conversation
+            limit(int): The number of messages.
+            session (AsyncSession): The database async session object.
+        Returns:
+            Sequence[DirectMessage]: the messages.
+        """
+        query = (
+            sa.select(self.model)
+            .where(self.model.conversation_id == conversation_id)
+            .order_by(self.model.created_at.desc())
+            .limit(limit)
+        )
 
-        return (await session.execute(query)).scalar_one_or_none()
+        return (await session.execute(query)).scalars().all()
 
     async def fetch_all(
         self,
@@ -103,6 +237,7 @@ class DirectMessageRepository:
         order: str,
         session: AsyncSession,
         attributes: typing.List[typing.Union[str, None]] = [],
+        limit: typing.Optional[int] = None,
     ) -> typing.Tuple[typing.Sequence[typing.Optional[DirectMessage]], int]:
         """
         Retrieves all messages.
@@ -115,62 +250,25 @@ class DirectMessageRepository:
             order(str): The order by (e., asc, desc).
             session (AsyncSession): The database async session object.
             attributes (List[str]): Optional list of fields to select from the message
+            limit (int): Optional page size.
         Returns:
             Message(object): new message object.
         """
-        order_by = sa.desc if order == "desc" else sa.asc
-        if len(attributes) > 0:
-            selected_fields = [
-                getattr(self.model, attr)
-                for attr in attributes
-                if isinstance(attr, str) and hasattr(self.model, attr)
-            ]
-            if not selected_fields:
-                return [], 0
-            query = sa.select(*selected_fields).where(
-                self.model.conversation_id == conversation_id,
-                sa.or_(
-                    sa.and_(
-                        self.model.is_deleted_for_sender.is_(False),
-                        self.model.sender_id == user_id,
-                    ),
-                    sa.and_(
-                        self.model.is_deleted_for_recipient.is_(False),
-                        self.model.recipient_id == user_id,
-                    ),
-                ),
-            )
-
-            count_stmt = sa.select(sa.func.count()).select_from(query.subquery())
-            count_result = await session.execute(count_stmt)
-            total_count = count_result.scalar_one() or 0
-
-            query = query.offset(offset).order_by(order_by(self.model.created_at))
-
-            result = (await session.execute(query)).scalars().all()
-
-            return (result, total_count)
-        query = sa.select(self.model).where(
-            self.model.conversation_id == conversation_id,
-            sa.or_(
-                sa.and_(
-                    self.model.is_deleted_for_sender.is_(False),
-                    self.model.sender_id == user_id,
-                ),
-                sa.and_(
-                    self.model.is_deleted_for_recipient.is_(False),
-                    self.model.recipient_id == user_id,
-                ),
-            ),
-        )
-
-        count_stmt = sa.select(sa.func.count()).select_from(query.subquery())
-        count_result = await session.execute(count_stmt)
+        statements = fetch_all_statements(tuple(attributes), order, bool(limit))
+        if statements is None:
+            return [], 0
+        query, count_stmt = statements
+        parameters = {
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "offset": offset,
+            "limit": limit,
+        }
+
+        count_result = await session.execute(count_stmt, parameters)
         total_count = count_result.scalar_one() or 0
 
-        query = query.offset(offset).order_by(order_by(self.model.created_at))
-
-        result = (await session.execute(query)).scalars().all()
+        result = (await session.execute(query, parameters)).scalars().all()
 
         return (result, total_count)
 
@@ -239,32 +337,42 @@ class DirectMessageRepository:
         user_id: str,
         content: str,
         session: AsyncSession,
-        message: DirectMessage,
-    ) -> DirectMessage:
+        message_id: str,
+        conversation_id: typing.Optional[str] = None,
+    ) -> typing.Optional[DirectMessage]:
         """
-        Updates a message.
+        Updates a message in one round trip.
+
+        Only the sender can edit a message they have not deleted, within 15
+        minutes of sending it. The guards are part of the UPDATE so
+        concurrent edits and deletes can't slip between a check and a write.
+
         Args:
-            message(DirectMessage): The message to update
-            contest(str): The new message content
+            message_id(str): The id of the message to update
+            conversation_id(str): The optional id of the message conversation
+            content(str): The new message content
             user_id(str): The id of the current user.
             session (AsyncSession): The database async session object.
         Returns:
-            int
+            DirectMessage: the updated message, None if a guard failed
         """
+        edit_window_start = datetime.now(timezone.utc) - timedelta(minutes=15)
         query = (
             sa.update(self.model)
             .where(
-                self.model.conversation_id == message.conversation_id,
-                self.model.id == message.id,
+                self.model.id == message_id,
                 self.model.sender_id == user_id,
+                self.model.is_deleted_for_sender.is_(False),
+                self.model.created_at > edit_window_start,
             )
             .values(content=content, is_edited=True)
         )
+        if conversation_id:
+            query = query.where(self.model.conversation_id == conversation_id)
 
-        await session.execute(query)
+        updated_message = await update_returning(session, self.model, query)
         await session.commit()
-        await session.refresh(message)
-        return message
+        return updated_message
 
 
 direct_message_repository = DirectMessageRepository()
@@ -0,0 +1,268 @@
+"""
+InboxCacheRepository Module
+
+Each user's inbox is cached in Redis as a sorted set of conversation ids
+scored by the time of their last message, next to what hydrates a page:
+- dm:inbox:{user_id}: conversation_id -> last message timestamp (ZSET)
+- dm:inbox-peers:{user_id}: conversation_id -> the other participant (HASH)
+- dm:conversation-preview:{conversation_id}: last message, unread count (HASH)
+- dm:inbox-generation:{user_id}: bumped by every write to the user's inbox
+  or a preview in it (STRING)
+"""
+
+import json
+import typing
+from datetime import datetime
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.repository.v1.redis_cache_repository import SortedSetPageCache
+
+# only moves inboxes and previews that are already cached: a partial set
+# would pass for the whole inbox. KEYS are the preview, then the inbox and
+# the generation of each participant
+RECORD_MESSAGE = """
+for index = 2, #KEYS, 2 do
+    redis.call('INCR', KEYS[index + 1])
+    redis.call('EXPIRE', KEYS[index + 1], ARGV[4])
+    if redis.call('EXISTS', KEYS[index]) == 1 then
+        redis.call('ZADD', KEYS[index], ARGV[2], ARGV[1])
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'last_message', ARGV[3])
+    redis.call('HINCRBY', KEYS[1], 'unread_message_count', 1)
+end
+"""
+
+PREVIEW_FIELDS = ("last_message", "unread_message_count")
+
+
+def inbox_key(user_id: str) -> str:
+    """
+    Redis key of a user's inbox sorted set.
+    """
+    return f"dm:inbox:{user_id}"
+
+
+def peers_key(user_id: str) -> str:
+    """
+    Redis key of the other participant of each of a user's conversations.
+    """
+    return f"dm:inbox-peers:{user_id}"
+
+
+def preview_key(conversation_id: str) -> str:
+    """
+    Redis key of a conversation's preview.
+    """
+    return f"dm:conversation-preview:{conversation_id}"
+
+
+def inbox_generation_key(user_id: str) -> str:
+    """
+    Redis key of the write generation of a user's inbox.
+    """
+    return f"dm:inbox-generation:{user_id}"
+
+
+def conversation_pair_key(pair_key: str) -> str:
+    """
+    Redis key caching the conversation id of a participant pair.
+    """
+    return f"dm:conversation-pair:{pair_key}"
+
+
+def activity_score(moment: typing.Optional[datetime]) -> float:
+    """
+    Scores a conversation by the time of its last message.
+    """
+    return moment.timestamp() if moment else 0.0
+
+
+class InboxCacheRepository(SortedSetPageCache):
+    """
+    Inbox cache repo
+    """
+
+    name = "inbox cache"
+    ttl_setting = "inbox_cache_ttl_seconds"
+
+    def order_key(self, scope_id: str) -> str:
+        return inbox_key(scope_id)
+
+    def generation_key(self, scope_id: str) -> str:
+        return inbox_generation_key(scope_id)
+
+    def score(
+        self, item: typing.Tuple[str, typing.Optional[datetime]]
+    ) -> typing.Tuple[str, float]:
+        conversation_id, moment = item
+        return conversation_id, activity_score(moment)
+
+    def page_hashes(
+        self, scope_id: str, rows: typing.Sequence[typing.Any]
+    ) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        hashes: typing.Dict[str, typing.Dict[str, typing.Any]] = {
+            peers_key(scope_id): {
+                row["conversation_id"]: json.dumps(
+                    {
+                        "user_id": row["user_id"],
+                        "firstname": row["firstname"],
+                        "profile_photo": row["profile_photo"],
+                    }
+                )
+                for row in rows
+            }
+        }
+        for row in rows:
+            hashes[preview_key(row["conversation_id"])] = {
+                "last_message": json.dumps(row["last_message"]),
+                "unread_message_count": row["unread_message_count"],
+            }
+        return hashes
+
+    async def page(
+        self, user_id: str, limit: int, redis: Redis
+    ) -> typing.Optional[typing.Tuple[typing.List[dict], int]]:
+        """
+        Reads the first page of a user's inbox and its total count, None
+        when the inbox or any preview on the page is not cached.
+        """
+        ordered = await self.read(
+            self.execute(
+                redis,
+                lambda pipe: pipe.zrevrange(inbox_key(user_id), 0, limit - 1).zcard(
+                    inbox_key(user_id)
+                ),
+            )
+        )
+        if not ordered or not ordered[1]:
+            return None
+        conversation_ids, count = ordered
+        if not conversation_ids:
+            return [], count
+
+        def queue(pipe) -> None:
+            pipe.hmget(peers_key(user_id), conversation_ids)
+            for conversation_id in conversation_ids:
+                pipe.hmget(preview_key(conversation_id), PREVIEW_FIELDS)
+
+        hydrated = await self.read(self.execute(redis, queue))
+        if hydrated is None:
+            return None
+        peers, previews = hydrated[0], hydrated[1:]
+        conversations = []
+        for conversation_id, peer, preview in zip(conversation_ids, peers, previews):
+            if peer is None or None in preview:
+                return None
+            last_message, unread_message_count = preview
+            conversations.append(
+                {
+                    "conversation_id": conversation_id,
+                    **json.loads(peer),
+                    "last_message": json.loads(last_message),
+                    "unread_message_count": int(unread_message_count),
+                }
+            )
+        return conversations, count
+
+    async def record_message(
+        self,
+        conversation_id: str,
+        participant_ids: typing.Sequence[str],
+        sent_at: datetime,
+        content: typing.Optional[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Moves a conversation to the top of its participants' cached inboxes
+        and updates its cached preview.
+        """
+        await self.write(
+            self.script(
+                redis,
+                RECORD_MESSAGE,
+                keys=[
+                    preview_key(conversation_id),
+                    *[
+                        key
+                        for user_id in participant_ids
+                        for key in (inbox_key(user_id), inbox_generation_key(user_id))
+                    ],
+                ],
+                args=[
+                    conversation_id,
+                    activity_score(sent_at),
+                    json.dumps(content),
+                    self.ttl,
+                ],
+            )
+        )
+
+    async def forget_preview(
+        self,
+        conversation_id: str,
+        participant_ids: typing.Sequence[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Drops a conversation's cached preview, after its messages change.
+        """
+
+        def queue(pipe) -> None:
+            for user_id in participant_ids:
+                self.bump(pipe, user_id)
+            pipe.delete(preview_key(conversation_id))
+
+        await self.write(self.execute(redis, queue, transaction=True))
+
+    async def conversation_id(
+        self, pair_key: str, redis: Redis
+    ) -> typing.Optional[str]:
+        """
+        Reads the cached conversation of a participant pair. Only live
+        conversations are cached, a hit needs no database read.
+        """
+        return await self.read(redis.get(conversation_pair_key(pair_key)))
+
+    async def store_conversation_id(
+        self, pair_key: str, conversation_id: str, redis: Redis
+    ) -> None:
+        """
+        Caches the conversation of a participant pair.
+        """
+        await self.write(
+            redis.set(
+                conversation_pair_key(pair_key),
+                conversation_id,
+                ex=settings.dm_pair_cache_ttl_seconds,
+            )
+        )
+
+    async def remove(
+        self,
+        user_id: str,
+        conversation_ids: typing.Sequence[str],
+        pair_keys: typing.Sequence[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Removes conversations from a user's cached inbox, and their
+        participant pairs from the conversation lookup cache.
+        """
+        if not conversation_ids:
+            return
+
+        def queue(pipe) -> None:
+            self.bump(pipe, user_id)
+            pipe.zrem(inbox_key(user_id), *conversation_ids)
+            pipe.hdel(peers_key(user_id), *conversation_ids)
+            if pair_keys:
+                pipe.delete(*[conversation_pair_key(key) for key in pair_keys])
+
+        await self.write(self.execute(redis, queue, transaction=True))
+
+
+inbox_cache_repository = InboxCacheRepository()
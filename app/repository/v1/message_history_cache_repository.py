@@ -0,0 +1,312 @@
+"""
+MessageHistoryCacheRepository Module
+
+The newest messages of each conversation and room are cached in Redis so the
+first page of history, the read right after opening a chat, skips the
+database:
+- {kind}:history:{id}: the newest messages, newest first, deleted ones
+  included with their flags (LIST of JSON)
+- {kind}:history-count:{id}: messages visible to each viewer (HASH)
+- {kind}:history-generation:{id}: bumped by every write (STRING), a fill
+  only lands when it is unchanged since the miss that triggered it
+
+kind is "dm" for direct conversations, viewers being the participants, and
+"room" for rooms, with a single "all" viewer.
+"""
+
+import json
+import typing
+from datetime import datetime
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.metrics import MESSAGE_HISTORY_CACHE_REQUESTS
+from app.repository.v1.redis_cache_repository import RedisCacheRepository
+
+DIRECT = "dm"
+ROOM = "room"
+ROOM_VIEWER = "all"
+
+DIRECT_MESSAGE_FIELDS = (
+    "id",
+    "sender_id",
+    "recipient_id",
+    "conversation_id",
+    "parent_message_id",
+    "status",
+    "is_edited",
+    "created_at",
+    "content",
+    "media_url",
+    "media_type",
+    "is_deleted_for_sender",
+    "is_deleted_for_recipient",
+)
+ROOM_MESSAGE_FIELDS = (
+    "id",
+    "sender_id",
+    "room_id",
+    "parent_message_id",
+    "status",
+    "is_edited",
+    "created_at",
+    "content",
+    "media_url",
+    "media_type",
+    "is_deleted",
+)
+
+# pushes only onto a cached list and bumps only cached counts, a list or
+# count created here would pass for the whole history
+PUSH_MESSAGE = """
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+if redis.call('LPUSHX', KEYS[1], ARGV[1]) > 0 then
+    redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+end
+for index = 4, #ARGV do
+    if redis.call('HEXISTS', KEYS[2], ARGV[index]) == 1 then
+        redis.call('HINCRBY', KEYS[2], ARGV[index], 1)
+    end
+end
+"""
+
+PATCH_MESSAGE = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+local entries = redis.call('LRANGE', KEYS[1], 0, -1)
+local changes = cjson.decode(ARGV[2])
+for index, entry in ipairs(entries) do
+    local message = cjson.decode(entry)
+    if message['id'] == ARGV[1] then
+        for field, value in pairs(changes) do
+            message[field] = value
+        end
+        redis.call('LSET', KEYS[1], index - 1, cjson.encode(message))
+        return 1
+    end
+end
+return 0
+"""
+
+# a write between the miss and the fill bumped the generation, the rows
+# read in between may predate it
+FILL_HISTORY = """
+if (redis.call('GET', KEYS[3]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 5))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+def history_key(kind: str, scope_id: str) -> str:
+    """
+    Redis key of the cached newest messages of a conversation or room.
+    """
+    return f"{kind}:history:{scope_id}"
+
+
+def count_key(kind: str, scope_id: str) -> str:
+    """
+    Redis key of the visible message counts of a conversation or room.
+    """
+    return f"{kind}:history-count:{scope_id}"
+
+
+def generation_key(kind: str, scope_id: str) -> str:
+    """
+    Redis key of the write generation of a conversation or room.
+    """
+    return f"{kind}:history-generation:{scope_id}"
+
+
+def serialize(message: typing.Any, fields: typing.Sequence[str]) -> str:
+    """
+    Serializes a message into a cache entry.
+
+    Args:
+        message: The DirectMessage or RoomMessage.
+        fields(Sequence[str]): The attributes to keep.
+    Returns:
+        str: the JSON entry.
+    """
+    entry = {}
+    for field in fields:
+        value = getattr(message, field)
+        entry[field] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(entry)
+
+
+def is_visible(kind: str, entry: dict, viewer_id: str) -> bool:
+    """
+    Whether a cached message shows in a viewer's history.
+    """
+    if kind == ROOM:
+        return not entry["is_deleted"]
+    return (entry["sender_id"] == viewer_id and not entry["is_deleted_for_sender"]) or (
+        entry["recipient_id"] == viewer_id and not entry["is_deleted_for_recipient"]
+    )
+
+
+class MessageHistoryCacheRepository(RedisCacheRepository):
+    """
+    Message history cache repo
+    """
+
+    name = "message history cache"
+    ttl_setting = "message_history_cache_ttl_seconds"
+
+    async def page(
+        self, kind: str, scope_id: str, viewer_id: str, limit: int, redis: Redis
+    ) -> typing.Optional[typing.Tuple[typing.List[dict], int]]:
+        """
+        Reads a viewer's first page of history, newest first, and their total
+        count, None when the cache cannot answer the whole page.
+        """
+        cached = await self.read(
+            self.execute(
+                redis,
+                lambda pipe: pipe.lrange(history_key(kind, scope_id), 0, -1).hget(
+                    count_key(kind, scope_id), viewer_id
+                ),
+            )
+        )
+        entries, count = cached or ([], None)
+
+        messages = [
+            message
+            for message in map(json.loads, entries)
+            if is_visible(kind, message, viewer_id)
+        ]
+        # a full list may be hiding older visible messages behind deleted ones
+        window_exhausted = (
+            len(messages) < limit and len(entries) >= settings.message_history_cache_size
+        )
+        if not entries or count is None or window_exhausted:
+            MESSAGE_HISTORY_CACHE_REQUESTS.labels(kind=kind, result="miss").inc()
+            return None
+        MESSAGE_HISTORY_CACHE_REQUESTS.labels(kind=kind, result="hit").inc()
+        return messages[:limit], int(count)
+
+    async def generation(
+        self, kind: str, scope_id: str, redis: Redis
+    ) -> typing.Optional[str]:
+        """
+        Reads the write generation before the rows of a fill are read: ""
+        before any write, None when redis failed.
+        """
+
+        async def current() -> str:
+            return await redis.get(generation_key(kind, scope_id)) or ""
+
+        return await self.read(current())
+
+    async def fill(
+        self,
+        kind: str,
+        scope_id: str,
+        viewer_id: str,
+        entries: typing.Sequence[str],
+        count: int,
+        generation: typing.Optional[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Caches the newest serialized messages and a viewer's count after a
+        miss, unless a write happened since generation was read.
+        """
+        if not entries or generation is None:
+            return
+        await self.write(
+            self.script(
+                redis,
+                FILL_HISTORY,
+                keys=[
+                    history_key(kind, scope_id),
+                    count_key(kind, scope_id),
+                    generation_key(kind, scope_id),
+                ],
+                args=[generation, self.ttl, viewer_id, count, *entries],
+            )
+        )
+
+    async def push(
+        self,
+        kind: str,
+        scope_id: str,
+        entry: str,
+        viewer_ids: typing.Sequence[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Adds a new message to the cached history, dropping the oldest beyond
+        the cache size, and counts it for viewer_ids.
+        """
+        await self.write(
+            self.script(
+                redis,
+                PUSH_MESSAGE,
+                keys=[
+                    history_key(kind, scope_id),
+                    count_key(kind, scope_id),
+                    generation_key(kind, scope_id),
+                ],
+                args=[
+                    entry,
+                    settings.message_history_cache_size,
+                    self.ttl,
+                    *viewer_ids,
+                ],
+            )
+        )
+
+    async def patch(
+        self,
+        kind: str,
+        scope_id: str,
+        message_id: str,
+        changes: dict,
+        redis: Redis,
+    ) -> None:
+        """
+        Updates fields of a cached message, after an edit or a delete.
+        """
+        await self.write(
+            self.script(
+                redis,
+                PATCH_MESSAGE,
+                keys=[history_key(kind, scope_id), generation_key(kind, scope_id)],
+                args=[message_id, json.dumps(changes), self.ttl],
+            )
+        )
+
+    async def forget_counts(
+        self,
+        kind: str,
+        scope_id: str,
+        viewer_ids: typing.Sequence[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Drops viewers' cached counts after a delete, their next read
+        refills them.
+        """
+        key = generation_key(kind, scope_id)
+        await self.write(
+            self.execute(
+                redis,
+                lambda pipe: pipe.incr(key)
+                .expire(key, self.ttl)
+                .hdel(count_key(kind, scope_id), *viewer_ids),
+                transaction=True,
+            )
+        )
+
+
+message_history_cache_repository = MessageHistoryCacheRepository()
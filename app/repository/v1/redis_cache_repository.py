@@ -0,0 +1,198 @@
+"""
+RedisCacheRepository Module
+
+Base of the repositories caching database reads in Redis. A failed Redis call
+is logged and reads as a cache miss, the database stays the source of truth.
+"""
+
+import typing
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError, WatchError
+
+from app.core.config import settings
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: Redis Cache Repository ::")
+
+T = typing.TypeVar("T")
+
+
+class RedisCacheRepository:
+    """
+    Redis cache repo base
+    """
+
+    name = "redis cache"
+    ttl_setting = ""
+
+    @property
+    def ttl(self) -> int:
+        """
+        Seconds the cached keys live, read from the settings.
+        """
+        return getattr(settings, self.ttl_setting)
+
+    async def read(self, command: typing.Awaitable[T]) -> typing.Optional[T]:
+        """
+        Awaits a Redis read, None when it failed.
+        """
+        try:
+            return await command
+        except RedisError as exc:
+            logger.warning("%s read failed: %s", self.name, str(exc))
+            return None
+
+    async def write(self, command: typing.Awaitable[typing.Any]) -> None:
+        """
+        Awaits a Redis write, dropped when it failed.
+        """
+        try:
+            await command
+        except RedisError as exc:
+            logger.warning("%s write failed: %s", self.name, str(exc))
+
+    @staticmethod
+    async def execute(
+        redis: Redis,
+        queue: typing.Callable[[Pipeline], typing.Any],
+        transaction: bool = False,
+    ) -> typing.List[typing.Any]:
+        """
+        Runs the commands queued by queue in one pipeline.
+        """
+        async with redis.pipeline(transaction=transaction) as pipe:
+            queue(pipe)
+            return await pipe.execute()
+
+    @staticmethod
+    def script(
+        redis: Redis,
+        script: str,
+        keys: typing.Sequence[str],
+        args: typing.Sequence[typing.Any] = (),
+    ) -> typing.Awaitable[typing.Any]:
+        """
+        Runs a Lua script.
+        """
+        return redis.register_script(script)(keys=list(keys), args=list(args))
+
+
+class SortedSetPageCache(RedisCacheRepository):
+    """
+    Base of the caches holding the order of a whole collection in a sorted set
+    and the rows of the pages read so far in hashes. Every write bumps the
+    collection's generation, a fill only lands when it is unchanged since the
+    miss that triggered it.
+    """
+
+    def order_key(self, scope_id: str) -> str:
+        """
+        Redis key of the sorted set of a collection.
+        """
+        raise NotImplementedError
+
+    def generation_key(self, scope_id: str) -> str:
+        """
+        Redis key of the write generation of a collection.
+        """
+        raise NotImplementedError
+
+    def score(self, item: typing.Any) -> typing.Tuple[str, float]:
+        """
+        The member and score of an item of the collection's order.
+        """
+        raise NotImplementedError
+
+    def page_hashes(
+        self, scope_id: str, rows: typing.Sequence[typing.Any]
+    ) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        """
+        The hash fields caching a page of rows, by key.
+        """
+        raise NotImplementedError
+
+    def bump(self, pipe: Pipeline, scope_id: str) -> Pipeline:
+        """
+        Queues the generation bump of a write to a collection.
+        """
+        key = self.generation_key(scope_id)
+        return pipe.incr(key).expire(key, self.ttl)
+
+    async def is_cached(self, scope_id: str, redis: Redis) -> typing.Optional[bool]:
+        """
+        Whether a collection's order is cached, None when redis is unavailable.
+        """
+        exists = await self.read(redis.exists(self.order_key(scope_id)))
+        return None if exists is None else bool(exists)
+
+    async def generation(
+        self, scope_id: str, redis: Redis
+    ) -> typing.Optional[str]:
+        """
+        Reads the write generation before the rows of a fill are read: ""
+        before any write, None when redis failed.
+        """
+
+        async def current() -> str:
+            return await redis.get(self.generation_key(scope_id)) or ""
+
+        return await self.read(current())
+
+    async def fill(
+        self,
+        scope_id: str,
+        rows: typing.Sequence[typing.Any],
+        items: typing.Sequence[typing.Any],
+        generation: str,
+        redis: Redis,
+    ) -> None:
+        """
+        Caches the rows of a page, and the order of the whole collection when
+        items are given, unless a write happened since generation was read.
+        """
+        key = self.order_key(scope_id)
+        generation_key = self.generation_key(scope_id)
+
+        async def guarded() -> None:
+            async with redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(generation_key)
+                if (await pipe.get(generation_key) or "") != generation:
+                    return
+                pipe.multi()
+                if items:
+                    pipe.delete(key).zadd(key, dict(map(self.score, items))).expire(
+                        key, self.ttl
+                    )
+                for hash_key, mapping in self.page_hashes(scope_id, rows).items():
+                    pipe.hset(hash_key, mapping=mapping).expire(hash_key, self.ttl)
+                try:
+                    await pipe.execute()
+                except WatchError:
+                    # a write landed since the check
+                    return
+
+        if rows or items:
+            await self.write(guarded())
+
+    async def cache_page(
+        self,
+        scope_id: str,
+        rows: typing.Sequence[typing.Any],
+        load_items: typing.Callable[[], typing.Awaitable[typing.Sequence[typing.Any]]],
+        generation: typing.Optional[str],
+        redis: Redis,
+    ) -> None:
+        """
+        Caches a page read after a miss, and the whole order if it is not
+        cached yet, loaded with load_items. generation is read before the
+        page, None skips the fill.
+        """
+        if generation is None:
+            return
+        is_cached = await self.is_cached(scope_id, redis)
+        if is_cached is None:
+            return
+        items = [] if is_cached else await load_items()
+        await self.fill(scope_id, rows, items, generation, redis)
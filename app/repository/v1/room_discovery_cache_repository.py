@@ -0,0 +1,51 @@
+"""
+RoomDiscoveryCacheRepository Module
+
+The public room rankings are precomputed by celery beat and cached in Redis
+as JSON lists, room:discover:{ranking}, replaced whole on each refresh.
+"""
+
+import json
+import typing
+
+from redis.asyncio import Redis
+
+from app.repository.v1.redis_cache_repository import RedisCacheRepository
+
+
+def ranking_key(ranking: str) -> str:
+    """
+    Redis key of a cached ranking.
+    """
+    return f"room:discover:{ranking}"
+
+
+class RoomDiscoveryCacheRepository(RedisCacheRepository):
+    """
+    Room discovery cache repo
+    """
+
+    name = "room discovery cache"
+    ttl_setting = "room_discovery_ranking_ttl_seconds"
+
+    async def fetch(
+        self, ranking: str, redis: Redis
+    ) -> typing.Optional[typing.List[dict]]:
+        """
+        Reads a cached ranking, None on a miss.
+        """
+        rooms = await self.read(redis.get(ranking_key(ranking)))
+        return json.loads(rooms) if rooms is not None else None
+
+    async def store(
+        self, ranking: str, rooms: typing.Sequence[dict], redis: Redis
+    ) -> None:
+        """
+        Replaces a cached ranking with JSON compatible rooms.
+        """
+        await self.write(
+            redis.set(ranking_key(ranking), json.dumps(list(rooms)), ex=self.ttl)
+        )
+
+
+room_discovery_cache_repository = RoomDiscoveryCacheRepository()
@@ -6,8 +6,37 @@ import typing
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
 
+from app.cache import cached
+from app.database.statements import update_returning
 from app.models.room_invitation import RoomInvitation
+from app.models.room_member import RoomMember
+
+# a batch of overdue pending invitations, oldest first; concurrent sweeps
+# skip each other's rows instead of waiting on them
+OVERDUE = (
+    sa.select(RoomInvitation.id)
+    .where(
+        RoomInvitation.invitation_status == "pending",
+        RoomInvitation.expiration < sa.bindparam("now"),
+    )
+    .order_by(RoomInvitation.expiration)
+    .limit(sa.bindparam("batch_size"))
+    .with_for_update(skip_locked=True)
+)
+EXPIRE_OVERDUE = (
+    sa.update(RoomInvitation)
+    .where(RoomInvitation.id.in_(OVERDUE))
+    .values(invitation_status="expired")
+    .returning(
+        RoomInvitation.id,
+        RoomInvitation.room_id,
+        RoomInvitation.invitee_id,
+        RoomInvitation.expiration,
+    )
+    .execution_options(synchronize_session=False)
+)
 
 
 class RoomInvitationRepository:
@@ -94,18 +123,215 @@ class RoomInvitationRepository:
 
         return (await session.execute(query)).scalar_one_or_none()
 
-    async def update(
-        self, session: AsyncSession, invitation_id: str, status: str
+    async def fetch_statuses(
+        self, session: AsyncSession, room_id: str, invitee_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, str]:
+        """
+        Fetches the invitations of users to a room.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            room_id (str): The id of the Room.
+            invitee_ids (Sequence): The ids of the invited users.
+        Returns:
+            Dict: invitee id -> invitation status, for the invited users.
+        """
+        if not invitee_ids:
+            return {}
+        query = sa.select(
+            RoomInvitation.invitee_id, RoomInvitation.invitation_status
+        ).where(
+            RoomInvitation.room_id == room_id,
+            RoomInvitation.invitee_id.in_(invitee_ids),
+        )
+
+        return dict((await session.execute(query)).tuples().all())
+
+    async def upsert_pending(
+        self,
+        session: AsyncSession,
+        room_id: str,
+        inviter_id: str,
+        invitee_ids: typing.Sequence[str],
+    ) -> typing.Sequence[RoomInvitation]:
+        """
+        Invites users to a room in one statement: new invitees get an
+        invitation, existing invitations are made pending again for 7 days,
+        from the new inviter. Accepted invitations of members still in the
+        room are left alone.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            room_id (str): The id of the Room for invitation.
+            inviter_id (str): The id of the user inviting the others.
+            invitee_ids (Sequence): The ids of the users been invited.
+        Returns:
+            Sequence[RoomInvitation]: the pending invitations, none for the
+            invitees left alone.
+        """
+        if not invitee_ids:
+            return []
+        expiration = datetime.now(timezone.utc) + timedelta(days=7)
+        insert = (
+            postgresql.insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite.insert
+        )
+        query = insert(RoomInvitation).values(
+            [
+                {
+                    "room_id": room_id,
+                    "inviter_id": inviter_id,
+                    "invitee_id": invitee_id,
+                    "expiration": expiration,
+                }
+                for invitee_id in invitee_ids
+            ]
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[RoomInvitation.room_id, RoomInvitation.invitee_id],
+            set_={
+                "invitation_status": "pending",
+                "inviter_id": query.excluded.inviter_id,
+                "expiration": query.excluded.expiration,
+                "updated_at": sa.func.now(),
+            },
+            # the invitee may have accepted since the caller read the statuses
+            where=sa.or_(
+                RoomInvitation.invitation_status != "accepted",
+                RoomInvitation.invitee_id.in_(
+                    sa.select(RoomMember.member_id).where(
+                        RoomMember.room_id == room_id, RoomMember.left_room.is_(True)
+                    )
+                ),
+            ),
+        ).returning(RoomInvitation)
+
+        invitations = (
+            (
+                await session.execute(
+                    sa.select(RoomInvitation)
+                    .from_statement(query)
+                    .execution_options(populate_existing=True)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        await session.commit()
+
+        return invitations
+
+    async def fetch_page(
+        self,
+        session: AsyncSession,
+        limit: int,
+        room_id: typing.Optional[str] = None,
+        inviter_id: typing.Optional[str] = None,
+        invitee_id: typing.Optional[str] = None,
+        invitation_status: typing.Optional[str] = None,
+        after: typing.Optional[typing.Tuple[datetime, str]] = None,
+    ) -> typing.Sequence[RoomInvitation]:
+        """
+        Fetches a page of invitations, newest first.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            limit (int): The number of invitations to retrieve.
+            room_id (str): The Optional id of the Room invited to.
+            inviter_id (str): The Optional id of the user who invited.
+            invitee_id (str): The Optional id of the invited user.
+            invitation_status (str): The Optional status of the invitations.
+            after (tuple): (created_at, id) of the last invitation of the
+                previous page, None for the first page.
+        Returns:
+            Sequence[RoomInvitation]: the invitations.
+        """
+        query = sa.select(RoomInvitation)
+        if room_id:
+            query = query.where(RoomInvitation.room_id == room_id)
+        if inviter_id:
+            query = query.where(RoomInvitation.inviter_id == inviter_id)
+        if invitee_id:
+            query = query.where(RoomInvitation.invitee_id == invitee_id)
+        if invitation_status:
+            query = query.where(RoomInvitation.invitation_status == invitation_status)
+        if after is not None:
+            created_at, invitation_id = after
+            query = query.where(
+                sa.or_(
+                    RoomInvitation.created_at < created_at,
+                    sa.and_(
+                        RoomInvitation.created_at == created_at,
+                        RoomInvitation.id < invitation_id,
+                    ),
+                )
+            )
+        query = query.order_by(
+            RoomInvitation.created_at.desc(), RoomInvitation.id.desc()
+        ).limit(limit)
+
+        return (await session.execute(query)).scalars().all()
+
+    @cached(
+        "received-invitation-counts",
+        tags=("chat_room_invitations.invitee_id:{invitee_id}",),
+    )
+    async def count_pending_received(
+        self, session: AsyncSession, invitee_id: str
     ) -> int:
         """
-        Updates room invitation.
+        Counts a user's pending invitations, for badges.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            invitee_id (str): The id of the invited user.
+        Returns:
+            int: the number of pending invitations.
+        """
+        query = sa.select(sa.func.count()).where(
+            RoomInvitation.invitee_id == invitee_id,
+            RoomInvitation.invitation_status == "pending",
+        )
+
+        return (await session.execute(query)).scalar_one()
+
+    @cached("room-invitation-counts", tags=("chat_room_invitations.room_id:{room_id}",))
+    async def count_pending_for_room(self, session: AsyncSession, room_id: str) -> int:
+        """
+        Counts a room's pending invitations, for badges.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            room_id (str): The id of the Room.
+        Returns:
+            int: the number of pending invitations.
+        """
+        query = sa.select(sa.func.count()).where(
+            RoomInvitation.room_id == room_id,
+            RoomInvitation.invitation_status == "pending",
+        )
+
+        return (await session.execute(query)).scalar_one()
+
+    async def update(
+        self,
+        session: AsyncSession,
+        invitation_id: str,
+        status: str,
+        expected_status: typing.Optional[str] = None,
+    ) -> typing.Optional[RoomInvitation]:
+        """
+        Updates room invitation in one round trip.
 
         Args:
             session (AsyncSession): The database async session object.
             invitation_id (str): The id of the invitation.
             status (str): The status of the invitation.
+            expected_status (str): Only update if the invitation currently has
+                this status, so two concurrent transitions can't both apply.
         Returns:
-            int: The number of affected rows
+            RoomInvitation: The updated invitation, None if no invitation matched
         """
         expiration = datetime.now(timezone.utc) + timedelta(days=7)
         query = (
@@ -113,13 +339,43 @@ class RoomInvitationRepository:
             .where(RoomInvitation.id == invitation_id)
             .values(invitation_status=status)
         )
+        if expected_status:
+            query = query.where(RoomInvitation.invitation_status == expected_status)
         if status == "pending":
             query = query.values(expiration=expiration, invitation_status=status)
 
-        result = await session.execute(query)
+        updated_invitation = await update_returning(session, RoomInvitation, query)
+        await session.commit()
+
+        return updated_invitation
+
+    async def expire_overdue(
+        self, session: AsyncSession, batch_size: int
+    ) -> typing.Sequence[typing.Mapping]:
+        """
+        Expires a batch of pending invitations past their expiration, in its
+        own transaction.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            batch_size (int): The most invitations to expire.
+        Returns:
+            Sequence: (id, room_id, invitee_id, expiration) of each expired
+            invitation, fewer than batch_size once none are left.
+        """
+        expired = (
+            (
+                await session.execute(
+                    EXPIRE_OVERDUE,
+                    {"now": datetime.now(timezone.utc), "batch_size": batch_size},
+                )
+            )
+            .mappings()
+            .all()
+        )
         await session.commit()
 
-        return result.rowcount
+        return expired
 
 
 room_invitation_repository = RoomInvitationRepository()
@@ -2,14 +2,52 @@
 Room meber repo module
 """
 
+import functools
 import typing
+from datetime import datetime
 
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import cached
+from app.database.statements import projection, update_returning
 from app.models.room_member import RoomMember
 from app.models.room import Room
 from app.models.user import User
+from app.repository.v1.room_repository import room_repository
+
+
+ROSTER_COLUMNS = (
+    User.first_name,
+    User.last_name,
+    User.id.label("member_id"),
+    User.profile_photo,
+    RoomMember.is_admin,
+    RoomMember.created_at.label("joined_at"),
+)
+# admins first, then by join time, member id breaking ties
+ROSTER_ORDER = (
+    RoomMember.is_admin.desc(),
+    RoomMember.created_at.asc(),
+    RoomMember.member_id.asc(),
+)
+
+
+@functools.lru_cache(maxsize=32)
+def fetch_statement(
+    attributes: typing.Tuple[typing.Optional[str], ...]
+) -> typing.Optional[sa.Select]:
+    """
+    Prebuilt membership fetch, bound with member_id and room_id.
+    """
+    query = projection(RoomMember, attributes)
+    if query is None:
+        return None
+    return query.where(
+        RoomMember.member_id == sa.bindparam("member_id"),
+        RoomMember.room_id == sa.bindparam("room_id"),
+    )
 
 
 class RoomMemberRepository:
@@ -39,10 +77,53 @@ class RoomMemberRepository:
         """
         new_member = RoomMember(member_id=member_id, room_id=room_id, is_admin=is_admin)
         session.add(new_member)
+        await session.flush()
+        await room_repository.add_members(room_id=room_id, count=1, session=session)
 
         await session.commit()
         return new_member
 
+    async def bulk_add(
+        self, room_id: str, member_ids: typing.Sequence[str], session: AsyncSession
+    ) -> typing.List[str]:
+        """
+        Adds users to a room in one statement, as non admins. Users who
+        left the room rejoin it, current members are left as they are.
+
+        Args:
+            room_id (str): The id of room.
+            member_ids (Sequence): The ids of existing users to add.
+            session ( AsyncSession): The async database session object.
+        Returns:
+            List[str]: ids of the users who joined or rejoined.
+        """
+        if not member_ids:
+            return []
+        insert = (
+            postgresql.insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite.insert
+        )
+        query = insert(RoomMember).values(
+            [
+                {"room_id": room_id, "member_id": member_id, "is_admin": False}
+                for member_id in member_ids
+            ]
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[RoomMember.room_id, RoomMember.member_id],
+            set_={"left_room": False, "is_admin": False, "updated_at": sa.func.now()},
+            where=RoomMember.left_room.is_(True),
+        ).returning(RoomMember.member_id)
+
+        joined = list((await session.execute(query)).scalars().all())
+        await room_repository.add_members(
+            room_id=room_id, count=len(joined), session=session
+        )
+
+        await session.commit()
+        return joined
+
     async def fetch(
         self,
         member_id: str,
@@ -60,26 +141,23 @@ class RoomMemberRepository:
         Returns:
             RoomMember or None
         """
-        if len(attributes) > 0:
-            selected_fields = [
-                getattr(self.model, attr)
-                for attr in attributes
-                if isinstance(attr, str) and hasattr(self.model, attr)
-            ]
-            if not selected_fields:
-                return None
-            query = sa.select(*selected_fields).where(
-                self.model.member_id == member_id, self.model.room_id == room_id
-            )
+        query = fetch_statement(tuple(attributes))
+        if query is None:
+            return None
 
-            return (await session.execute(query)).mappings().one_or_none()
-
-        query = sa.select(self.model).where(
-            self.model.member_id == member_id, self.model.room_id == room_id
+        result = await session.execute(
+            query, {"member_id": member_id, "room_id": room_id}
         )
+        if len(attributes) > 0:
+            return result.mappings().one_or_none()
+        return result.scalar_one_or_none()
 
-        return (await session.execute(query)).scalar_one_or_none()
-
+    @cached(
+        "room-members",
+        tags=("chat_rooms:{room_id}", "chat_room_members.room_id:{room_id}"),
+        # each row carries its member's profile
+        row_tags=("chat_users:{member_id}",),
+    )
     async def fetch_all(
         self, session: AsyncSession, room_id: str
     ) -> typing.Sequence[typing.Optional[typing.Any]]:
@@ -111,6 +189,189 @@ class RoomMemberRepository:
 
         return (await session.execute(query)).mappings().all()
 
+    async def fetch_roster(
+        self,
+        room_id: str,
+        session: AsyncSession,
+        limit: int,
+        after: typing.Optional[typing.Tuple[bool, datetime, str]] = None,
+    ) -> typing.Sequence[sa.RowMapping]:
+        """
+        Retrieves a page of a room's members, admins first then by join time.
+
+        Args:
+            room_id (str): The id of the room.
+            session (AsyncSession): The database async session object.
+            limit (int): The number of members to retrieve.
+            after (tuple): (is_admin, joined_at, member_id) of the last member
+                of the previous page, None for the first page.
+        Returns:
+            Sequence of RowMapping: the members with their profiles.
+        """
+        query = (
+            sa.select(*ROSTER_COLUMNS)
+            .select_from(RoomMember)
+            .join(User, RoomMember.member_id == User.id)
+            .where(RoomMember.room_id == room_id, RoomMember.left_room.is_(False))
+        )
+        if after is not None:
+            is_admin, joined_at, member_id = after
+            later_joiners = sa.and_(
+                RoomMember.is_admin.is_(is_admin),
+                sa.or_(
+                    RoomMember.created_at > joined_at,
+                    sa.and_(
+                        RoomMember.created_at == joined_at,
+                        RoomMember.member_id > member_id,
+                    ),
+                ),
+            )
+            # past the last admin, every member who is not one follows
+            query = query.where(
+                sa.or_(RoomMember.is_admin.is_(False), later_joiners)
+                if is_admin
+                else later_joiners
+            )
+        query = query.order_by(*ROSTER_ORDER).limit(limit)
+
+        return (await session.execute(query)).mappings().all()
+
+    async def fetch_roster_member(
+        self, room_id: str, member_id: str, session: AsyncSession
+    ) -> typing.Optional[sa.RowMapping]:
+        """
+        Retrieves a member's roster row.
+
+        Args:
+            room_id (str): The id of the room.
+            member_id (str): The id of the member.
+            session (AsyncSession): The database async session object.
+        Returns:
+            RowMapping: the member with their profile, None if not in the room.
+        """
+        query = (
+            sa.select(*ROSTER_COLUMNS)
+            .select_from(RoomMember)
+            .join(User, RoomMember.member_id == User.id)
+            .where(
+                RoomMember.room_id == room_id,
+                RoomMember.member_id == member_id,
+                RoomMember.left_room.is_(False),
+            )
+        )
+        return (await session.execute(query)).mappings().one_or_none()
+
+    async def fetch_roster_scores(
+        self, room_id: str, session: AsyncSession
+    ) -> typing.Sequence[typing.Tuple[str, bool, datetime]]:
+        """
+        Retrieves what orders every member of a room, from the roster index.
+
+        Args:
+            room_id (str): The id of the room.
+            session (AsyncSession): The database async session object.
+        Returns:
+            Sequence: (member_id, is_admin, joined_at) of each member.
+        """
+        query = sa.select(
+            RoomMember.member_id, RoomMember.is_admin, RoomMember.created_at
+        ).where(RoomMember.room_id == room_id, RoomMember.left_room.is_(False))
+
+        return (await session.execute(query)).tuples().all()
+
+    async def fetch_member_ids(
+        self, room_ids: typing.Sequence[str], session: AsyncSession
+    ) -> typing.Dict[str, typing.List[str]]:
+        """
+        Retrieves the ids of the current members of rooms.
+
+        Args:
+            room_ids (Sequence): The ids of the rooms.
+            session (AsyncSession): The database async session object.
+        Returns:
+            Dict: room id -> ids of its members, for every room given.
+        """
+        members: typing.Dict[str, typing.List[str]] = {
+            room_id: [] for room_id in room_ids
+        }
+        if not room_ids:
+            return members
+        query = sa.select(RoomMember.room_id, RoomMember.member_id).where(
+            RoomMember.room_id.in_(room_ids), RoomMember.left_room.is_(False)
+        )
+        for room_id, member_id in await session.execute(query):
+            members[room_id].append(member_id)
+        return members
+
+    async def fetch_left_room(
+        self, room_id: str, member_ids: typing.Sequence[str], session: AsyncSession
+    ) -> typing.Dict[str, bool]:
+        """
+        Retrieves the membership of users in a room, current or past.
+
+        Args:
+            room_id (str): The id of the room.
+            member_ids (Sequence): The ids of the users.
+            session (AsyncSession): The database async session object.
+        Returns:
+            Dict: member id -> whether they left the room, for the users who
+            ever joined it.
+        """
+        if not member_ids:
+            return {}
+        query = sa.select(RoomMember.member_id, RoomMember.left_room).where(
+            RoomMember.room_id == room_id, RoomMember.member_id.in_(member_ids)
+        )
+
+        return dict((await session.execute(query)).tuples().all())
+
+    async def bulk_update(
+        self,
+        room_id: str,
+        session: AsyncSession,
+        member_ids: typing.Sequence[str],
+        is_admin: typing.Optional[bool] = None,
+        left_room: typing.Optional[bool] = None,
+    ) -> typing.List[str]:
+        """
+        Promotes, demotes or removes current members of a room in one
+        statement, skipping those already in the new state.
+
+        Args:
+            room_id (str): The id of room.
+            session ( AsyncSession): The async database session object.
+            member_ids (Sequence): The ids of the room members to update.
+            is_admin (bool): The new admin status, unchanged if None.
+            left_room (bool): True to remove the members, unchanged if None.
+        Returns:
+            List[str]: ids of the members that were updated.
+        """
+        if not member_ids:
+            return []
+        query = sa.update(RoomMember).where(
+            RoomMember.room_id == room_id,
+            RoomMember.member_id.in_(member_ids),
+            RoomMember.left_room.is_(False),
+        )
+        if is_admin is not None:
+            query = query.where(RoomMember.is_admin.is_(not is_admin)).values(
+                is_admin=is_admin
+            )
+        if left_room:
+            query = query.values(left_room=True)
+        query = query.returning(RoomMember.member_id).execution_options(
+            synchronize_session=False
+        )
+
+        updated = list((await session.execute(query)).scalars().all())
+        if left_room:
+            await room_repository.remove_members(
+                room_id=room_id, count=len(updated), session=session
+            )
+
+        await session.commit()
+        return updated
+
     async def update(
         self,
         room_id: str,
@@ -118,20 +379,49 @@ class RoomMemberRepository:
         member_id: str,
         is_admin: typing.Union[None, bool],
         left_room: typing.Union[None, bool],
-    ):
+        where_is_admin: typing.Optional[bool] = None,
+        where_left_room: typing.Optional[bool] = None,
+    ) -> typing.Optional[RoomMember]:
         """
-        Updates room member status
+        Updates room member status in one round trip.
+
+        Args:
+            room_id (str): The id of room.
+            session ( AsyncSession): The async database session object.
+            member_id (str): The id of the room member to update.
+            is_admin (bool): The new admin status, unchanged if None.
+            left_room (bool): The new left room status, unchanged if None.
+            where_is_admin (bool): Only update if the admin status is this.
+            where_left_room (bool): Only update if the left room status is this.
+        Returns:
+            RoomMember: the updated member, None if no member matched
         """
         query = sa.update(RoomMember).where(
             RoomMember.room_id == room_id, RoomMember.member_id == member_id
         )
+        if where_is_admin is not None:
+            query = query.where(RoomMember.is_admin.is_(where_is_admin))
+        if where_left_room is not None:
+            query = query.where(RoomMember.left_room.is_(where_left_room))
         if is_admin is not None:
             query = query.values(is_admin=is_admin)
         if left_room is not None:
             query = query.values(left_room=left_room)
 
-        await session.execute(query)
+        updated_member = await update_returning(session, RoomMember, query)
+        if updated_member and left_room is not None:
+            if where_left_room is None:
+                # the row may or may not have changed
+                await room_repository.recount_members(room_id=room_id, session=session)
+            elif where_left_room is not left_room:
+                count_change = (
+                    room_repository.add_members
+                    if not left_room
+                    else room_repository.remove_members
+                )
+                await count_change(room_id=room_id, count=1, session=session)
         await session.commit()
+        return updated_member
 
 
 room_member_repository = RoomMemberRepository()
@@ -2,12 +2,35 @@
 RoomMessage Repository
 """
 
+import functools
 import typing
+from datetime import datetime, timedelta, timezone
 
 import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import coalesced
+from app.database.full_text import match, ranked_after
+from app.database.statements import projection, update_returning
+from app.models.room_member import RoomMember
 from app.models.room_message import RoomMessage
+from app.repository.v1.room_repository import room_repository
+
+
+@functools.lru_cache(maxsize=32)
+def fetch_statement(
+    attributes: typing.Tuple[typing.Optional[str], ...]
+) -> typing.Optional[sa.Select]:
+    """
+    Prebuilt room message fetch, bound with message_id and room_id.
+    """
+    query = projection(RoomMessage, attributes)
+    if query is None:
+        return None
+    return query.where(
+        RoomMessage.id == sa.bindparam("message_id"),
+        RoomMessage.room_id == sa.bindparam("room_id"),
+    )
 
 
 class RoomMessageRepository:
@@ -54,11 +77,40 @@ class RoomMessageRepository:
         )
 
         session.add(new_message)
+        await session.flush()
+        await room_repository.add_message(
+            room_id=room_id, message_id=new_message.id, session=session
+        )
 
         await session.commit()
 
         return new_message
 
+    async def fetch_recent(
+        self, room_id: str, limit: int, session: AsyncSession
+    ) -> typing.Sequence[RoomMessage]:
+        """
+        Retrieves the newest messages, deleted ones included, newest first.
+        Fills the message history cache.
+
+
+        Args:
+            room_id(str): The id of the room
+            limit(int): The number of messages.
+            session (AsyncSession): The database async session object.
+        Returns:
+            Sequence[RoomMessage]: the messages.
+        """
+        query = (
+            sa.select(self.model)
+            .where(self.model.room_id == room_id)
+            .order_by(self.model.created_at.desc())
+            .limit(limit)
+        )
+
+        return (await session.execute(query)).scalars().all()
+
+    @coalesced("room-messages", tables=("chat_room_messages",))
     async def fetch_all(
         self,
         room_id: str,
@@ -66,6 +118,7 @@ class RoomMessageRepository:
         order: str,
         session: AsyncSession,
         attributes: typing.List[typing.Optional[str]] = [],
+        limit: typing.Optional[int] = None,
     ) -> typing.Tuple[typing.Sequence[typing.Optional[RoomMessage]], int]:
         """
         Retrieves all messages.
@@ -76,6 +129,7 @@ class RoomMessageRepository:
             order(str): The order by (e., asc, desc).
             session (AsyncSession): The database async session object.
             attributes (List[str]): Optional list of fields to select from the message
+            limit (int): Optional page size.
         Returns:
             List[Optional[RoomMessage]]: List containing optional room messages.
         """
@@ -97,6 +151,8 @@ class RoomMessageRepository:
             total_count = count_result.scalar_one() or 0
 
             query = query.offset(offset).order_by(order_by(self.model.created_at))
+            if limit:
+                query = query.limit(limit)
 
             result = (await session.execute(query)).scalars().all()
 
@@ -110,11 +166,64 @@ class RoomMessageRepository:
         total_count = count_result.scalar_one() or 0
 
         query = query.offset(offset).order_by(order_by(self.model.created_at))
+        if limit:
+            query = query.limit(limit)
 
         result = (await session.execute(query)).scalars().all()
 
         return (result, total_count)
 
+    async def search(
+        self,
+        user_id: str,
+        text: str,
+        session: AsyncSession,
+        limit: int,
+        after: typing.Optional[typing.Tuple[float, datetime, str]] = None,
+        room_id: typing.Optional[str] = None,
+    ) -> typing.Sequence[typing.Tuple[RoomMessage, float]]:
+        """
+        Searches the messages of the rooms a user is a member of, deleted
+        ones aside, best matches first then newest first.
+
+        Args:
+            user_id (str): The id of the current user.
+            text (str): The searched text, with at least one word.
+            session (AsyncSession): The database async session object.
+            limit (int): The number of messages to retrieve.
+            after (tuple): (rank, created_at, id) of the last message of the
+                previous page, None for the first page.
+            room_id (str): Optional room to search in.
+        Returns:
+            Sequence: (message, rank) of each matching message.
+        """
+        matches, condition, rank = match(
+            self.model.__table__, text, session.get_bind().dialect.name
+        )
+        member_rooms = sa.select(RoomMember.room_id).where(
+            RoomMember.member_id == user_id, RoomMember.left_room.is_(False)
+        )
+        query = (
+            sa.select(self.model, rank.label("rank"))
+            .select_from(matches)
+            .where(
+                condition,
+                self.model.room_id.in_(member_rooms),
+                self.model.is_deleted.is_(False),
+            )
+        )
+        if room_id:
+            query = query.where(self.model.room_id == room_id)
+        if after is not None:
+            query = query.where(
+                ranked_after(rank, self.model.created_at, self.model.id, after)
+            )
+        query = query.order_by(
+            rank.desc(), self.model.created_at.desc(), self.model.id.desc()
+        ).limit(limit)
+
+        return (await session.execute(query)).tuples().all()
+
     async def fetch(
         self,
         session: AsyncSession,
@@ -133,57 +242,56 @@ class RoomMessageRepository:
         Returns:
             Message if found or None
         """
-        if len(attributes) > 0:
-            selected_fields = [
-                getattr(self.model, attr)
-                for attr in attributes
-                if isinstance(attr, str) and hasattr(self.model, attr)
-            ]
-            if not selected_fields:
-                return None
-            query = sa.select(*selected_fields).where(
-                self.model.id == message_id, self.model.room_id == room_id
-            )
-
-            return (await session.execute(query)).mappings().one_or_none()
+        query = fetch_statement(tuple(attributes))
+        if query is None:
+            return None
 
-        query = sa.select(self.model).where(
-            self.model.id == message_id, self.model.room_id == room_id
+        result = await session.execute(
+            query, {"message_id": message_id, "room_id": room_id}
         )
-
-        return (await session.execute(query)).scalar_one_or_none()
+        if len(attributes) > 0:
+            return result.mappings().one_or_none()
+        return result.scalar_one_or_none()
 
     async def update(
         self,
         user_id: str,
         content: str,
         session: AsyncSession,
-        message: RoomMessage,
-    ) -> RoomMessage:
+        message_id: str,
+        room_id: str,
+    ) -> typing.Optional[RoomMessage]:
         """
-        Updates a message.
+        Updates a message in one round trip.
+
+        Only the sender can edit a message that is not deleted, within 15
+        minutes of sending it; the guards are part of the UPDATE.
+
         Args:
-            message(DirectMessage): The message to update
-            contest(str): The new message content
+            message_id(str): The id of the message to update
+            room_id(str): The id of the room.
+            content(str): The new message content
             user_id(str): The id of the current user.
             session (AsyncSession): The database async session object.
         Returns:
-            int
+            RoomMessage: the updated message, None if a guard failed
         """
+        edit_window_start = datetime.now(timezone.utc) - timedelta(minutes=15)
         query = (
             sa.update(self.model)
             .where(
-                self.model.room_id == message.room_id,
-                self.model.id == message.id,
+                self.model.room_id == room_id,
+                self.model.id == message_id,
                 self.model.sender_id == user_id,
+                self.model.is_deleted.is_(False),
+                self.model.created_at > edit_window_start,
             )
             .values(content=content, is_edited=True)
         )
 
-        await session.execute(query)
+        updated_message = await update_returning(session, self.model, query)
         await session.commit()
-        await session.refresh(message)
-        return message
+        return updated_message
 
     async def delete(
         self,
@@ -192,25 +300,30 @@ class RoomMessageRepository:
         session: AsyncSession,
     ) -> int:
         """
-        Delete Room message(s).
+        Delete Room message(s), in the caller's transaction.
         Args:
             conversation_id(str): The id of the converstion
             message_id(str): The id of the message
             room_id(str): The id of the room.
             session (AsyncSession): The database async session object.
         Returns:
-            int
+            int: the number of messages deleted
         """
         query = (
             sa.update(self.model)
             .where(
                 self.model.room_id == room_id,
                 self.model.id == message_id,
+                self.model.is_deleted.is_(False),
             )
             .values(is_deleted=True)
         )
 
-        return (await session.execute(query)).rowcount
+        deleted = (await session.execute(query)).rowcount
+        await room_repository.remove_messages(
+            room_id=room_id, count=deleted, session=session
+        )
+        return deleted
 
 
 room_message_repository = RoomMessageRepository()
@@ -0,0 +1,164 @@
+"""
+RoomPresenceRepository Module
+
+Who in a room is online is the intersection of two Redis sets:
+- presence:online: ids of the users holding a websocket connection (SET)
+- room:members:{room_id}: ids of the room's current members (SET)
+
+Membership sets are filled from the database on a miss, then kept up to date
+by membership writes, which only touch sets that are already cached.
+"""
+
+import typing
+
+from redis.asyncio import Redis
+
+from app.repository.v1.redis_cache_repository import RedisCacheRepository
+
+PRESENCE_KEY = "presence:online"
+
+# online members of a room; ARGV[1] is the ttl to fill a missing membership
+# set with the rest of ARGV, '' to return false on a miss instead
+ONLINE_MEMBERS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if ARGV[1] == '' then
+        return false
+    end
+    for index = 2, #ARGV, 1000 do
+        redis.call('SADD', KEYS[1], unpack(ARGV, index, math.min(index + 999, #ARGV)))
+    end
+    if #ARGV > 1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+    end
+end
+return redis.call('SINTER', KEYS[1], KEYS[2])
+"""
+
+# online member count of each room, -1 for a room whose members are not cached
+ONLINE_COUNTS = """
+local counts = {}
+for index = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[index]) == 1 then
+        counts[index - 1] = #redis.call('SINTER', KEYS[index], KEYS[1])
+    else
+        counts[index - 1] = -1
+    end
+end
+return counts
+"""
+
+ADD_MEMBERS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for index = 1, #ARGV, 1000 do
+        redis.call('SADD', KEYS[1], unpack(ARGV, index, math.min(index + 999, #ARGV)))
+    end
+end
+"""
+
+
+def room_members_key(room_id: str) -> str:
+    """
+    Redis key of a room's member id set.
+    """
+    return f"room:members:{room_id}"
+
+
+class RoomPresenceRepository(RedisCacheRepository):
+    """
+    Room presence repo
+    """
+
+    name = "room presence"
+    ttl_setting = "room_membership_cache_ttl_seconds"
+
+    async def online_members(
+        self,
+        room_id: str,
+        redis: Redis,
+        member_ids: typing.Optional[typing.Sequence[str]] = None,
+    ) -> typing.Optional[typing.List[str]]:
+        """
+        Reads the online members of a room, None on a miss. member_ids, every
+        member of the room, fills the membership set on a miss.
+        """
+        args = [""] if member_ids is None else [self.ttl, *member_ids]
+        online = await self.read(
+            self.script(
+                redis,
+                ONLINE_MEMBERS,
+                keys=[room_members_key(room_id), PRESENCE_KEY],
+                args=args,
+            )
+        )
+        return None if online is None else list(online)
+
+    async def online_counts(
+        self, room_ids: typing.Sequence[str], redis: Redis
+    ) -> typing.Optional[typing.Dict[str, typing.Optional[int]]]:
+        """
+        Counts the online members of rooms, None for a room whose members are
+        not cached, None for all when redis is unavailable.
+        """
+        if not room_ids:
+            return {}
+        counts = await self.read(
+            self.script(
+                redis,
+                ONLINE_COUNTS,
+                keys=[PRESENCE_KEY, *map(room_members_key, room_ids)],
+            )
+        )
+        if counts is None:
+            return None
+        return {
+            room_id: count if count >= 0 else None
+            for room_id, count in zip(room_ids, counts)
+        }
+
+    async def fill(
+        self, members: typing.Mapping[str, typing.Sequence[str]], redis: Redis
+    ) -> None:
+        """
+        Caches the current members of rooms, by room id.
+        """
+        if not any(members.values()):
+            return
+
+        def queue(pipe) -> None:
+            for room_id, member_ids in members.items():
+                if not member_ids:
+                    continue
+                pipe.delete(room_members_key(room_id))
+                pipe.sadd(room_members_key(room_id), *member_ids)
+                pipe.expire(room_members_key(room_id), self.ttl)
+
+        await self.write(self.execute(redis, queue))
+
+    async def add_members(
+        self, room_id: str, member_ids: typing.Sequence[str], redis: Redis
+    ) -> None:
+        """
+        Adds joining or rejoining members to a cached room.
+        """
+        if not member_ids:
+            return
+        await self.write(
+            self.script(
+                redis, ADD_MEMBERS, keys=[room_members_key(room_id)], args=member_ids
+            )
+        )
+
+    async def remove_members(
+        self, room_id: str, member_ids: typing.Sequence[str], redis: Redis
+    ) -> None:
+        """
+        Removes members who left from a cached room.
+        """
+        if not member_ids:
+            return
+        await self.write(
+            redis.srem(room_members_key(room_id), *member_ids)  # type: ignore
+        )
+
+
+room_presence_repository = RoomPresenceRepository()
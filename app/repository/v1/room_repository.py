@@ -2,13 +2,123 @@
 Room Repository Module
 """
 
+import functools
 import typing
+from datetime import datetime, timezone
 
 from sqlalchemy.ext.asyncio import AsyncSession
 import sqlalchemy as sa
 
+from app.cache import cached
+from app.database.statements import greatest, projection
 from app.models.room import Room
 from app.models.room_member import RoomMember
+from app.models.room_message import RoomMessage
+
+# public rooms still active, the partial discovery indexes cover them
+DISCOVERABLE = (Room.is_private.is_(False), Room.is_deactivated.is_(False))
+RANKING_ORDER = {
+    "activity": (Room.last_activity_at.desc(), Room.id),
+    "size": (Room.member_count.desc(), Room.last_activity_at.desc(), Room.id),
+}
+
+# counters move by the rows a write changed, in its own transaction; they
+# leave cached rooms alone, or every message would evict its room
+ADD_MEMBERS = (
+    sa.update(Room)
+    .where(Room.id == sa.bindparam("room_id"))
+    .values(
+        member_count=Room.member_count + sa.bindparam("count", type_=sa.Integer),
+        last_activity_at=greatest(Room.last_activity_at, sa.func.now()),
+    )
+    .execution_options(synchronize_session=False, cache_invalidate=False)
+)
+REMOVE_MEMBERS = (
+    sa.update(Room)
+    .where(Room.id == sa.bindparam("room_id"))
+    .values(member_count=Room.member_count - sa.bindparam("count", type_=sa.Integer))
+    .execution_options(synchronize_session=False, cache_invalidate=False)
+)
+MEMBER_COUNT = (
+    sa.select(sa.func.count())
+    .where(RoomMember.room_id == Room.id, RoomMember.left_room.is_(False))
+    .scalar_subquery()
+)
+RECOUNT_MEMBERS = (
+    sa.update(Room)
+    .where(Room.id == sa.bindparam("room_id"))
+    .values(member_count=MEMBER_COUNT)
+    .execution_options(synchronize_session=False, cache_invalidate=False)
+)
+# the new message's own timestamp, never moving back to an older one
+ADD_MESSAGE = (
+    sa.update(Room)
+    .where(Room.id == sa.bindparam("room_id"))
+    .values(
+        message_count=Room.message_count + 1,
+        last_activity_at=greatest(
+            Room.last_activity_at,
+            sa.select(RoomMessage.created_at)
+            .where(RoomMessage.id == sa.bindparam("message_id"))
+            .scalar_subquery(),
+        ),
+    )
+    .execution_options(synchronize_session=False, cache_invalidate=False)
+)
+REMOVE_MESSAGES = (
+    sa.update(Room)
+    .where(Room.id == sa.bindparam("room_id"))
+    .values(
+        message_count=Room.message_count - sa.bindparam("count", type_=sa.Integer)
+    )
+    .execution_options(synchronize_session=False, cache_invalidate=False)
+)
+MESSAGE_COUNT = (
+    sa.select(sa.func.count())
+    .where(RoomMessage.room_id == Room.id, RoomMessage.is_deleted.is_(False))
+    .scalar_subquery()
+)
+LAST_ACTIVITY_AT = greatest(
+    sa.select(sa.func.max(RoomMessage.created_at))
+    .where(RoomMessage.room_id == Room.id)
+    .scalar_subquery(),
+    sa.select(sa.func.max(RoomMember.created_at))
+    .where(RoomMember.room_id == Room.id)
+    .scalar_subquery(),
+)
+# recounts a batch of rooms, writing only those that drifted
+RECONCILE_STATS = (
+    sa.update(Room)
+    .where(
+        Room.id.in_(sa.bindparam("room_ids", expanding=True)),
+        sa.or_(
+            Room.member_count != MEMBER_COUNT,
+            Room.message_count != MESSAGE_COUNT,
+            Room.last_activity_at.is_distinct_from(
+                greatest(Room.last_activity_at, LAST_ACTIVITY_AT)
+            ),
+        ),
+    )
+    .values(
+        member_count=MEMBER_COUNT,
+        message_count=MESSAGE_COUNT,
+        last_activity_at=greatest(Room.last_activity_at, LAST_ACTIVITY_AT),
+    )
+    .execution_options(synchronize_session=False, cache_invalidate=False)
+)
+
+
+@functools.lru_cache(maxsize=32)
+def fetch_statement(
+    attributes: typing.Tuple[typing.Optional[str], ...]
+) -> typing.Optional[sa.Select]:
+    """
+    Prebuilt room fetch, bound with room_id.
+    """
+    query = projection(Room, attributes)
+    if query is None:
+        return None
+    return query.where(Room.id == sa.bindparam("room_id"))
 
 
 class RoomRepository:
@@ -55,6 +165,9 @@ class RoomRepository:
             is_private=is_private,
             messages_delete_able=messages_delete_able,
             allow_admin_messages_only=allow_admin_messages_only,
+            member_count=1,
+            message_count=0,
+            last_activity_at=datetime.now(timezone.utc),
         )
         new_room_member = RoomMember(member_id=owner_id, room=new_room, is_admin=True)
         session.add_all([new_room, new_room_member])
@@ -99,6 +212,7 @@ class RoomRepository:
             await session.commit()
         return result.rowcount
 
+    @cached("rooms", tags=("chat_rooms:{room_id}",))
     async def fetch(
         self,
         room_id: str,
@@ -108,21 +222,14 @@ class RoomRepository:
         """
         Retrieves a room
         """
-        if len(attributes) > 0:
-            selected_fields = [
-                getattr(self.model, attr)
-                for attr in attributes
-                if isinstance(attr, str) and hasattr(self.model, attr)
-            ]
-            if not selected_fields:
-                return None
-            query = sa.select(*selected_fields).where(self.model.id == room_id)
-
-            return (await session.execute(query)).mappings().one_or_none()
+        query = fetch_statement(tuple(attributes))
+        if query is None:
+            return None
 
-        return (
-            await session.execute(sa.select(self.model).where(self.model.id == room_id))
-        ).scalar_one_or_none()
+        result = await session.execute(query, {"room_id": room_id})
+        if len(attributes) > 0:
+            return result.mappings().one_or_none()
+        return result.scalar_one_or_none()
 
     async def fetch_all(
         self, owner_id: str, session: AsyncSession, offset: int, limit: int
@@ -152,5 +259,178 @@ class RoomRepository:
         query = query.offset(offset).limit(limit)
         return (await session.execute(query)).scalars().all(), count
 
+    async def search_discoverable(
+        self, name: str, session: AsyncSession, offset: int, limit: int
+    ) -> typing.Sequence[Room]:
+        """
+        Searches public rooms by name: prefix matches first, then similar
+        names by pg_trgm similarity on Postgres, names containing it on SQLite.
+
+        Args:
+            name (str): The searched name.
+            session (AsyncSession): The database async session object.
+            offset (int): The number of rooms to skip.
+            limit (int): The number of rooms to retrieve.
+        Returns:
+            Sequence[Room]: the matching rooms, best first.
+        """
+        needle = name.strip().lower()
+        name_lower = sa.func.lower(self.model.name)
+        prefix = name_lower.startswith(needle, autoescape=True)
+        if session.get_bind().dialect.name == "postgresql":
+            matches = sa.or_(prefix, self.model.name.op("%")(needle))
+            closeness = sa.func.similarity(self.model.name, needle).desc()
+        else:
+            matches = name_lower.contains(needle, autoescape=True)
+            closeness = sa.func.length(self.model.name).asc()
+        query = (
+            sa.select(self.model)
+            .where(*DISCOVERABLE, matches)
+            .order_by(
+                prefix.desc(), closeness, self.model.member_count.desc(), self.model.id
+            )
+            .offset(offset)
+            .limit(limit)
+        )
+
+        return (await session.execute(query)).scalars().all()
+
+    async def fetch_ranking(
+        self, ranking: str, session: AsyncSession, limit: int
+    ) -> typing.Sequence[Room]:
+        """
+        Retrieves the top public rooms of a ranking.
+
+        Args:
+            ranking (str): activity, most recently active first, or size,
+                most members first.
+            session (AsyncSession): The database async session object.
+            limit (int): The number of rooms to retrieve.
+        Returns:
+            Sequence[Room]: the rooms in ranking order.
+        """
+        query = (
+            sa.select(self.model)
+            .where(*DISCOVERABLE)
+            .order_by(*RANKING_ORDER[ranking])
+            .limit(limit)
+        )
+
+        return (await session.execute(query)).scalars().all()
+
+    async def add_members(self, room_id: str, count: int, session: AsyncSession) -> None:
+        """
+        Counts members who joined a room. Runs in the transaction adding
+        them, after they are flushed.
+
+        Args:
+            room_id (str): The id of the room.
+            count (int): The number of members who joined.
+            session (AsyncSession): The database async session object.
+        Returns:
+            None
+        """
+        if count:
+            await session.execute(ADD_MEMBERS, {"room_id": room_id, "count": count})
+
+    async def remove_members(
+        self, room_id: str, count: int, session: AsyncSession
+    ) -> None:
+        """
+        Uncounts members who left a room, in the transaction removing them.
+
+        Args:
+            room_id (str): The id of the room.
+            count (int): The number of members who left.
+            session (AsyncSession): The database async session object.
+        Returns:
+            None
+        """
+        if count:
+            await session.execute(
+                REMOVE_MEMBERS, {"room_id": room_id, "count": count}
+            )
+
+    async def recount_members(self, room_id: str, session: AsyncSession) -> None:
+        """
+        Recounts a room's members, for writes that cannot tell how many
+        joined or left.
+
+        Args:
+            room_id (str): The id of the room.
+            session (AsyncSession): The database async session object.
+        Returns:
+            None
+        """
+        await session.execute(RECOUNT_MEMBERS, {"room_id": room_id})
+
+    async def add_message(
+        self, room_id: str, message_id: str, session: AsyncSession
+    ) -> None:
+        """
+        Counts a new message and moves the room's last activity to it. Runs
+        in the transaction inserting the message, after it is flushed.
+
+        Args:
+            room_id (str): The id of the room.
+            message_id (str): The id of the new message.
+            session (AsyncSession): The database async session object.
+        Returns:
+            None
+        """
+        await session.execute(
+            ADD_MESSAGE, {"room_id": room_id, "message_id": message_id}
+        )
+
+    async def remove_messages(
+        self, room_id: str, count: int, session: AsyncSession
+    ) -> None:
+        """
+        Uncounts deleted messages, in the transaction deleting them.
+
+        Args:
+            room_id (str): The id of the room.
+            count (int): The number of messages deleted.
+            session (AsyncSession): The database async session object.
+        Returns:
+            None
+        """
+        if count:
+            await session.execute(
+                REMOVE_MESSAGES, {"room_id": room_id, "count": count}
+            )
+
+    async def reconcile_stats(
+        self,
+        session: AsyncSession,
+        batch_size: int,
+        after_room_id: typing.Optional[str] = None,
+    ) -> typing.Tuple[typing.Optional[str], int]:
+        """
+        Recounts the stats of a batch of rooms and repairs those that
+        drifted, then commits.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            batch_size (int): The number of rooms to check.
+            after_room_id (str): The last room of the previous batch, None
+                to start from the first room.
+        Returns:
+            Tuple: the last room of this batch, None once every room was
+            checked, and the number of rooms repaired.
+        """
+        query = sa.select(self.model.id).order_by(self.model.id).limit(batch_size)
+        if after_room_id is not None:
+            query = query.where(self.model.id > after_room_id)
+        room_ids = (await session.execute(query)).scalars().all()
+        if not room_ids:
+            return None, 0
+
+        repaired = (
+            await session.execute(RECONCILE_STATS, {"room_ids": list(room_ids)})
+        ).rowcount
+        await session.commit()
+        return room_ids[-1], repaired
+
 
 room_repository = RoomRepository()
@@ -0,0 +1,411 @@
+"""
+RoomRosterCacheRepository Module
+
+Each room's roster is cached in Redis, ordered admins first then by join
+time, next to what hydrates a page:
+- room:roster:{room_id}: member_id -> roster score (ZSET)
+- room:roster-members:{room_id}: member_id -> member profile (HASH of JSON)
+- room:roster-generation:{room_id}: bumped by every write (STRING)
+
+Writes only touch rosters that are already cached, a partial set would pass
+for the whole room. A member's name or photo changing drops their profile
+from the cached rosters once the transaction commits, the next page read
+refills it.
+"""
+
+import json
+import typing
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import Update
+from sqlalchemy.util import await_only
+from sqlalchemy.util.concurrency import in_greenlet
+
+from app.cache.invalidation import pinned_values
+from app.cache.tiered import tiered_cache
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.repository.v1.redis_cache_repository import SortedSetPageCache
+from app.utils.task_logger import create_logger
+
+logger = create_logger(":: Room Roster Cache ::")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# members score after every admin; join times in microseconds stay below
+# 2**52 until 2112, so scores stay exact in redis' doubles
+MEMBER_OFFSET = 2**52
+
+# the profile fields a roster shows, and the session info key of the
+# (room_id, member_id) pairs whose cached profile a transaction made stale
+PROFILE_COLUMNS = ("first_name", "last_name", "profile_photo")
+PENDING_PROFILES = "roster_profiles"
+
+# members after the cursor member, hydrated; false when the roster, the
+# cursor member or any profile is not cached
+PAGE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local start = 0
+if ARGV[1] ~= '' then
+    local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+    if not rank then
+        return false
+    end
+    start = rank + 1
+end
+local members = redis.call('ZRANGE', KEYS[1], start, start + tonumber(ARGV[2]) - 1)
+if #members == 0 then
+    return {}
+end
+local profiles = redis.call('HMGET', KEYS[2], unpack(members))
+for index = 1, #profiles do
+    if not profiles[index] then
+        return false
+    end
+end
+return profiles
+"""
+
+ADD_MEMBER = """
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+end
+"""
+
+SET_ADMIN = """
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+end
+local profile = redis.call('HGET', KEYS[2], ARGV[1])
+if profile then
+    local member = cjson.decode(profile)
+    member['is_admin'] = ARGV[3] == '1'
+    redis.call('HSET', KEYS[2], ARGV[1], cjson.encode(member))
+end
+"""
+
+
+def roster_key(room_id: str) -> str:
+    """
+    Redis key of a room's roster sorted set.
+    """
+    return f"room:roster:{room_id}"
+
+
+def roster_members_key(room_id: str) -> str:
+    """
+    Redis key of the profiles of a room's members.
+    """
+    return f"room:roster-members:{room_id}"
+
+
+def roster_generation_key(room_id: str) -> str:
+    """
+    Redis key of the write generation of a room's roster.
+    """
+    return f"room:roster-generation:{room_id}"
+
+
+def roster_score(is_admin: bool, joined_at: datetime) -> int:
+    """
+    Scores a member: admins first, then by join time in microseconds, as
+    precise as the database. Members joined in the same microsecond tie and
+    redis orders them by member id, like the database does.
+    """
+    if joined_at.tzinfo is None:
+        joined_at = joined_at.replace(tzinfo=timezone.utc)
+    return (0 if is_admin else MEMBER_OFFSET) + (joined_at - EPOCH) // timedelta(
+        microseconds=1
+    )
+
+
+def roster_entry(row: typing.Mapping[str, typing.Any]) -> str:
+    """
+    Serializes a roster row into a cache entry.
+    """
+    return json.dumps(
+        {
+            "member_id": row["member_id"],
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "profile_photo": row["profile_photo"],
+            "is_admin": bool(row["is_admin"]),
+            "joined_at": row["joined_at"].isoformat(),
+        }
+    )
+
+
+class RoomRosterCacheRepository(SortedSetPageCache):
+    """
+    Room roster cache repo
+    """
+
+    name = "room roster cache"
+    ttl_setting = "room_roster_cache_ttl_seconds"
+
+    def order_key(self, scope_id: str) -> str:
+        return roster_key(scope_id)
+
+    def generation_key(self, scope_id: str) -> str:
+        return roster_generation_key(scope_id)
+
+    def score(
+        self, item: typing.Tuple[str, bool, datetime]
+    ) -> typing.Tuple[str, float]:
+        member_id, is_admin, joined_at = item
+        return member_id, roster_score(is_admin, joined_at)
+
+    def page_hashes(
+        self, scope_id: str, rows: typing.Sequence[typing.Any]
+    ) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        return {
+            roster_members_key(scope_id): {
+                row["member_id"]: roster_entry(row) for row in rows
+            }
+        }
+
+    async def page(
+        self,
+        room_id: str,
+        after_member_id: typing.Optional[str],
+        limit: int,
+        redis: Redis,
+    ) -> typing.Optional[typing.List[dict]]:
+        """
+        Reads the members after after_member_id, from the start when None,
+        None when the cache cannot answer the whole page.
+        """
+        profiles = await self.read(
+            self.script(
+                redis,
+                PAGE,
+                keys=[roster_key(room_id), roster_members_key(room_id)],
+                args=[after_member_id or "", limit],
+            )
+        )
+        if profiles is None:
+            return None
+        members = []
+        for profile in profiles:
+            member = json.loads(profile)
+            member["joined_at"] = datetime.fromisoformat(member["joined_at"])
+            members.append(member)
+        return members
+
+    async def add(
+        self, room_id: str, member: typing.Mapping[str, typing.Any], redis: Redis
+    ) -> None:
+        """
+        Adds a joining or rejoining member, given as a roster row, to a
+        cached roster.
+        """
+        await self.write(
+            self.script(
+                redis,
+                ADD_MEMBER,
+                keys=[
+                    roster_key(room_id),
+                    roster_members_key(room_id),
+                    roster_generation_key(room_id),
+                ],
+                args=[
+                    member["member_id"],
+                    roster_score(member["is_admin"], member["joined_at"]),
+                    roster_entry(member),
+                    self.ttl,
+                ],
+            )
+        )
+
+    async def set_admin(
+        self,
+        room_id: str,
+        member_id: str,
+        is_admin: bool,
+        joined_at: datetime,
+        redis: Redis,
+    ) -> None:
+        """
+        Moves a promoted or demoted member in a cached roster.
+        """
+        await self.write(
+            self.script(
+                redis,
+                SET_ADMIN,
+                keys=[
+                    roster_key(room_id),
+                    roster_members_key(room_id),
+                    roster_generation_key(room_id),
+                ],
+                args=[
+                    member_id,
+                    roster_score(is_admin, joined_at),
+                    int(is_admin),
+                    self.ttl,
+                ],
+            )
+        )
+
+    async def remove(self, room_id: str, member_id: str, redis: Redis) -> None:
+        """
+        Removes a member who left from a cached roster.
+        """
+        await self.write(
+            self.execute(
+                redis,
+                lambda pipe: self.bump(pipe, room_id)
+                .zrem(roster_key(room_id), member_id)
+                .hdel(roster_members_key(room_id), member_id),
+                transaction=True,
+            )
+        )
+
+    def queue_forget_profiles(
+        self, pipe: typing.Any, profiles: typing.Iterable[typing.Tuple[str, str]]
+    ) -> None:
+        """
+        Queues dropping the cached profiles of (room_id, member_id) pairs.
+        """
+        for room_id, member_id in profiles:
+            self.bump(pipe, room_id)
+            pipe.hdel(roster_members_key(room_id), member_id)
+
+    async def forget_profiles(
+        self, profiles: typing.Iterable[typing.Tuple[str, str]], redis: Redis
+    ) -> None:
+        """
+        Drops the cached profiles of (room_id, member_id) pairs, after their
+        name or photo changed.
+        """
+        await self.write(
+            self.execute(
+                redis,
+                lambda pipe: self.queue_forget_profiles(pipe, profiles),
+                transaction=True,
+            )
+        )
+
+    async def invalidate(self, room_id: str, redis: Redis) -> None:
+        """
+        Drops a cached roster, for changes too many to apply one at a time.
+        """
+        await self.write(
+            self.execute(
+                redis,
+                lambda pipe: self.bump(pipe, room_id).delete(
+                    roster_key(room_id), roster_members_key(room_id)
+                ),
+                transaction=True,
+            )
+        )
+
+
+room_roster_cache_repository = RoomRosterCacheRepository()
+
+
+def note_profile_changes(session: Session, member_ids: typing.Sequence[str]) -> None:
+    """
+    Notes the rooms showing members whose profile a transaction changes.
+    """
+    if not member_ids:
+        return
+    rows = session.connection().execute(
+        sa.select(RoomMember.room_id, RoomMember.member_id).where(
+            RoomMember.member_id.in_(member_ids), RoomMember.left_room.is_(False)
+        )
+    )
+    session.info.setdefault(PENDING_PROFILES, set()).update(map(tuple, rows))
+
+
+@event.listens_for(Session, "after_flush")
+def collect_flushed_profiles(session: Session, flush_context) -> None:
+    """
+    Collects the rooms of users whose profile a flush changed.
+    """
+    note_profile_changes(
+        session,
+        [
+            instance.id
+            for instance in session.dirty
+            if isinstance(instance, User)
+            and any(
+                inspect(instance).attrs[column].history.has_changes()
+                for column in PROFILE_COLUMNS
+            )
+        ],
+    )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def collect_updated_profiles(orm_execute_state) -> None:
+    """
+    Collects the rooms of users whose profile an ORM update statement
+    changes, when it pins them by id.
+    """
+    statement = orm_execute_state.statement
+    if isinstance(getattr(statement, "element", None), Update):
+        # an update returning ORM rows
+        statement = statement.element
+    if not isinstance(statement, Update) or statement.table.name != User.__tablename__:
+        return
+    parameters = orm_execute_state.parameters
+    rows = parameters if isinstance(parameters, list) else [parameters or {}]
+    columns = {
+        getattr(key, "name", key) for key in getattr(statement, "_values", None) or {}
+    }
+    columns.update(column for row in rows for column in row)
+    if not columns.intersection(PROFILE_COLUMNS):
+        return
+    if isinstance(parameters, list):
+        member_ids = [row.get("id") for row in rows]
+    else:
+        member_ids = pinned_values(statement.whereclause, parameters or {}).get("id")
+    if not member_ids or None in member_ids:
+        # not pinned, the rosters show the old profiles up to their ttl
+        return
+    note_profile_changes(orm_execute_state.session, member_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def forget_committed_profiles(session: Session) -> None:
+    """
+    Drops the cached profiles a committed transaction changed.
+    """
+    profiles = session.info.pop(PENDING_PROFILES, None)
+    if not profiles:
+        return
+    try:
+        if in_greenlet():
+            # AsyncSession commits in a greenlet spawned from the event loop
+            redis = tiered_cache.redis()
+            if redis is not None:
+                await_only(
+                    room_roster_cache_repository.forget_profiles(profiles, redis)
+                )
+            return
+        sync_redis = tiered_cache.redis_sync()
+        if sync_redis is not None:
+            with sync_redis.pipeline(transaction=True) as pipe:
+                room_roster_cache_repository.queue_forget_profiles(pipe, profiles)
+                pipe.execute()
+    except RedisError as exc:  # the commit stands, profiles expire on their ttl
+        logger.error("roster profile invalidation failed: %s", str(exc))
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_rolled_back_profiles(session: Session) -> None:
+    """
+    Discards the profile changes of a rolled back transaction.
+    """
+    session.info.pop(PENDING_PROFILES, None)
@@ -8,6 +8,7 @@ from uuid import uuid4
 import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import cached
 from app.utils.task_logger import create_logger
 from app.models.user import User
 
@@ -71,6 +72,7 @@ class UserRepository:
 
         return user
 
+    @cached("users", tags=("chat_users:{user_id}",))
     async def fetch_by_id(
         self,
         user_id: str,
@@ -99,6 +101,26 @@ class UserRepository:
 
         return (await session.execute(query)).scalar_one_or_none()
 
+    async def fetch_existing_ids(
+        self, user_ids: typing.Sequence[str], session: AsyncSession
+    ) -> typing.Set[str]:
+        """
+        Retrieves which of the given users exist.
+
+        Args:
+            user_ids(Sequence): The user ids.
+            session(AsyncSession): The database async session object.
+        Returns:
+            Set[str]: ids of the users that exist and are not deleted.
+        """
+        if not user_ids:
+            return set()
+        query = sa.select(self.model.id).where(
+            self.model.id.in_(user_ids), self.model.is_deleted.is_(False)
+        )
+
+        return set((await session.execute(query)).scalars().all())
+
     async def fetch_by_email(
         self,
         email: str,
@@ -241,7 +263,7 @@ class UserRepository:
                 is_deleted=True,
                 email=f"{user.email}:{str(uuid4())}",
                 username=f"{user.username}:{str(uuid4())}",
-                idempotency_key=f"{user.idempotency_key}:{str(uuid4())}",
+                idempotency_key=self.model.idempotency_key + f":{str(uuid4())}",
             )
         )
 
@@ -267,7 +289,11 @@ class UserRepository:
         Returns:
             None
         """
-        user = await self.fetch_by_id(user_id=user_id, session=session)
+        # the cached user carries no password hash
+        query = sa.select(self.model).where(
+            self.model.id == user_id, self.model.is_deleted.is_(False)
+        )
+        user = (await session.execute(query)).scalar_one_or_none()
         if not user:
             return False
         if not user.verify_password(old_password):  # type: ignore
@@ -275,7 +301,6 @@ class UserRepository:
         user.set_password(new_password)  # type: ignore
         session.add(user)
         await session.commit()
-        await session.refresh(user)
         return True
 
     async def set_new_password(
@@ -297,28 +322,29 @@ class UserRepository:
         user.set_password(new_password)
         session.add(user)
         await session.commit()
-        await session.refresh(user)
         return True
 
-    async def verify_user(self, session: AsyncSession, user: User) -> None:
+    async def verify_user(self, session: AsyncSession, email: str) -> bool:
         """
         Verifies user account.
 
         Args:
-            user(User). The current user.
+            email(str). The email of the user to verify.
             session(AsyncSession): The database async session object
         Returns:
-            None
+            bool: False if no user has the email
         """
         query = (
             sa.update(self.model)
-            .where(self.model.email == user.email)
+            .where(self.model.email == email, self.model.is_deleted.is_(False))
             .values(email_verified=True)
+            .returning(self.model.id)
         )
 
-        await session.execute(query)
+        verified_user_id = (await session.execute(query)).scalar_one_or_none()
 
         await session.commit()
+        return verified_user_id is not None
 
     async def fetch_attributes(
         self, attributes: typing.List[typing.Union[str, None]] = []
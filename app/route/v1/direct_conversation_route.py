@@ -4,6 +4,7 @@ Direct Conversation Route Module
 
 import typing
 from fastapi import APIRouter, status, Request, Depends, Query
+from redis.asyncio import Redis
 
 from app.utils.responses import responses
 from app.service.v1.direct_conversation_service import (
@@ -11,7 +12,8 @@ from app.service.v1.direct_conversation_service import (
     AsyncSession,
 )
 from app.dto.v1.direct_conversation_dto import AllConversationsResponseDto
-from app.database.session import get_async_session
+from app.database.session import get_read_only_session
+from app.database.redis_db import get_redis_client
 from app.core.security import validate_logout_status
 
 
@@ -29,7 +31,8 @@ direct_conversation_router = APIRouter(
 )
 async def retrieve_conversations(
     request: Request,
-    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
     page: int = Query(default=1, ge=1, description="The current page"),
     limit: int = Query(
         default=50, ge=1, le=50, description="The number of conversations per page"
@@ -48,5 +51,5 @@ async def retrieve_conversations(
         404
     """
     return await direct_conversation_service.fetch_direct_conversations(
-        page=page, session=session, request=request, limit=limit
+        page=page, session=session, request=request, limit=limit, redis=redis
     )
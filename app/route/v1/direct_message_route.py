@@ -16,8 +16,9 @@ from app.dto.v1.direct_message_dto import (
     UpdateMessageDto,
     DeleteMessageDto,
     DeleteMessageResponseDto,
+    SearchMessagesResponseDto,
 )
-from app.database.session import get_async_session
+from app.database.session import get_async_session, get_read_only_session
 from app.database.redis_db import get_redis_client
 from app.core.security import validate_logout_status
 
@@ -65,7 +66,8 @@ async def send_new_message(
 async def retrieve_messages(
     request: Request,
     conversation_id: str,
-    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
     page: int = Query(default=1, ge=1, description="The current page"),
     limit: int = Query(
         default=50, ge=1, le=50, description="The size of messages per page"
@@ -89,6 +91,49 @@ async def retrieve_messages(
         conversation_id=conversation_id,
         session=session,
         request=request,
+        redis=redis,
+    )
+
+
+@direct_message_router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=SearchMessagesResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def search_messages(
+    request: Request,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    q: str = Query(min_length=1, max_length=100, description="The searched text"),
+    limit: int = Query(
+        default=20, ge=1, le=50, description="The size of messages per page"
+    ),
+    cursor: typing.Optional[str] = Query(
+        default=None, description="The next_cursor of the previous page"
+    ),
+    conversation_id: typing.Optional[str] = Query(
+        default=None, description="Only search this conversation. (Optional)"
+    ),
+) -> typing.Optional[SearchMessagesResponseDto]:
+    """
+    Searches the messages sent or received by the user, best matches first.
+
+    Return:
+        Success message upon success
+    Raises:
+        422
+        500
+        400
+        401
+    """
+    return await direct_message_service.search_messages(
+        q=q,
+        limit=limit,
+        cursor=cursor,
+        conversation_id=conversation_id,
+        session=session,
+        request=request,
     )
 
 
@@ -103,6 +148,7 @@ async def update_message(
     request: Request,
     schema: UpdateMessageDto,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
 ) -> typing.Optional[UpdateMessageResponseDto]:
     """
     Updates a message of a conversation.
@@ -121,6 +167,7 @@ async def update_message(
         schema=schema,
         session=session,
         request=request,
+        redis=redis,
     )
 
 
@@ -135,6 +182,7 @@ async def delete_messages(
     request: Request,
     schema: DeleteMessageDto,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
 ) -> typing.Optional[DeleteMessageResponseDto]:
     """
     Deletes Messages.
@@ -153,4 +201,5 @@ async def delete_messages(
         schema=schema,
         session=session,
         request=request,
+        redis=redis,
     )
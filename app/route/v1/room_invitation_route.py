@@ -3,18 +3,25 @@ Room Member Route Module
 """
 
 import typing
-from fastapi import APIRouter, status, Request, Depends
+from fastapi import APIRouter, status, Request, Depends, Query
+from redis.asyncio import Redis
 
 from app.utils.responses import responses
 from app.service.v1.room_invitation_service import room_invitation_service, AsyncSession
 from app.dto.v1.room_inivitation_dto import (
+    InvitationStatusFilterEnum,
+    PendingInvitationsCountResponseDto,
+    RoomInvitationsResponseDto,
+    RoomInvitationBulkRequestDto,
+    RoomInvitationBulkResponseDto,
     RoomInvitationRequestDto,
     RoomInvitationResponseDto,
     RoomInvitationUpdateResponseDto,
     RoomInvitationUpdateRequestDto,
 )
 from app.core.security import validate_logout_status
-from app.database.session import get_async_session
+from app.database.session import get_async_session, get_read_only_session
+from app.database.redis_db import get_redis_client
 
 room_invitation_router = APIRouter(prefix="/room-invitations", tags=["ROOM INVITATION"])
 
@@ -48,6 +55,35 @@ async def invite_users_to_room(
     )
 
 
+@room_invitation_router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=RoomInvitationBulkResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def bulk_invite_users_to_room(
+    request: Request,
+    schema: RoomInvitationBulkRequestDto,
+    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+) -> RoomInvitationBulkResponseDto:
+    """
+    Invites many Users to a room at once.
+
+    Return:
+        The outcome of each invitation
+    Raises:
+        422
+        500
+        403
+        401
+        404
+    """
+    return await room_invitation_service.create_room_invitations(
+        schema=schema, request=request, session=session
+    )
+
+
 @room_invitation_router.patch(
     "",
     status_code=status.HTTP_200_OK,
@@ -59,6 +95,7 @@ async def update_room_invitation_request(
     request: Request,
     schema: RoomInvitationUpdateRequestDto,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
 ) -> typing.Optional[RoomInvitationUpdateResponseDto]:
     """
     Declines, accepts, ignores and cancels room invitation.
@@ -73,5 +110,154 @@ async def update_room_invitation_request(
         404
     """
     return await room_invitation_service.update_room_invitation_request(
-        schema=schema, session=session, request=request
+        schema=schema, session=session, request=request, redis=redis
+    )
+
+
+@room_invitation_router.get(
+    "/received",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=RoomInvitationsResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def retrieve_received_invitations(
+    request: Request,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    invitation_status: typing.Optional[InvitationStatusFilterEnum] = Query(
+        default=None, description="Only invitations with this status"
+    ),
+    limit: int = Query(
+        default=50, ge=1, le=100, description="The size of invitations per page"
+    ),
+    cursor: typing.Optional[str] = Query(
+        default=None, description="The next_cursor of the previous page"
+    ),
+) -> RoomInvitationsResponseDto:
+    """
+    Retrieves the invitations the user received, newest first, a page at a time.
+
+    Return:
+        Success message upon success
+    Raises:
+        400
+        422
+        500
+        401
+    """
+    return await room_invitation_service.retrieve_received_invitations(
+        request=request,
+        session=session,
+        limit=limit,
+        cursor=cursor,
+        invitation_status=invitation_status.value if invitation_status else None,
+    )
+
+
+@room_invitation_router.get(
+    "/received/pending-count",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=PendingInvitationsCountResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def count_pending_invitations(
+    request: Request,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+) -> PendingInvitationsCountResponseDto:
+    """
+    Counts the user's pending invitations, for badges.
+
+    Return:
+        Success message upon success
+    Raises:
+        500
+        401
+    """
+    return await room_invitation_service.count_pending_invitations(
+        request=request, session=session
+    )
+
+
+@room_invitation_router.get(
+    "/sent",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=RoomInvitationsResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def retrieve_sent_invitations(
+    request: Request,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    invitation_status: typing.Optional[InvitationStatusFilterEnum] = Query(
+        default=None, description="Only invitations with this status"
+    ),
+    limit: int = Query(
+        default=50, ge=1, le=100, description="The size of invitations per page"
+    ),
+    cursor: typing.Optional[str] = Query(
+        default=None, description="The next_cursor of the previous page"
+    ),
+) -> RoomInvitationsResponseDto:
+    """
+    Retrieves the invitations the user sent, newest first, a page at a time.
+
+    Return:
+        Success message upon success
+    Raises:
+        400
+        422
+        500
+        401
+    """
+    return await room_invitation_service.retrieve_sent_invitations(
+        request=request,
+        session=session,
+        limit=limit,
+        cursor=cursor,
+        invitation_status=invitation_status.value if invitation_status else None,
+    )
+
+
+@room_invitation_router.get(
+    "/rooms/{room_id}",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=RoomInvitationsResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def retrieve_room_invitations(
+    request: Request,
+    room_id: str,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    invitation_status: typing.Optional[InvitationStatusFilterEnum] = Query(
+        default=None, description="Only invitations with this status"
+    ),
+    limit: int = Query(
+        default=50, ge=1, le=100, description="The size of invitations per page"
+    ),
+    cursor: typing.Optional[str] = Query(
+        default=None, description="The next_cursor of the previous page"
+    ),
+) -> RoomInvitationsResponseDto:
+    """
+    Retrieves a room's invitations, newest first, a page at a time, for admins.
+
+    Return:
+        Success message upon success
+    Raises:
+        400
+        422
+        500
+        401
+        403
+        404
+    """
+    return await room_invitation_service.retrieve_room_invitations(
+        request=request,
+        session=session,
+        room_id=room_id,
+        limit=limit,
+        cursor=cursor,
+        invitation_status=invitation_status.value if invitation_status else None,
     )
@@ -3,19 +3,24 @@ Room Member Route Module
 """
 
 import typing
-from fastapi import APIRouter, status, Request, Depends
+from fastapi import APIRouter, status, Request, Depends, Query
+from redis.asyncio import Redis
 
 from app.utils.responses import responses
 from app.service.v1.room_member_service import room_member_service, AsyncSession
 from app.dto.v1.room_member_dto import (
     RoomMebersResponseDto,
+    RoomOnlineMembersResponseDto,
     AddRoomMemberRequestDto,
     AddRoomMemberResponseDto,
     UpdateRoomMemberRequestDto,
     UpdateRoomMemberResponseDto,
+    BulkUpdateRoomMembersRequestDto,
+    BulkUpdateRoomMembersResponseDto,
 )
 from app.core.security import validate_logout_status
-from app.database.session import get_async_session
+from app.database.session import get_async_session, get_read_only_session
+from app.database.redis_db import get_redis_client
 
 room_members_router = APIRouter(prefix="/room-members", tags=["ROOM MEMBERS"])
 
@@ -30,14 +35,22 @@ room_members_router = APIRouter(prefix="/room-members", tags=["ROOM MEMBERS"])
 async def retrieve_room_members(
     request: Request,
     room_id: str,
-    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
+    limit: int = Query(
+        default=50, ge=1, le=100, description="The size of members per page"
+    ),
+    cursor: typing.Optional[str] = Query(
+        default=None, description="The next_cursor of the previous page"
+    ),
 ) -> typing.Optional[RoomMebersResponseDto]:
     """
-    Retrieves all room members.
+    Retrieves room members, admins first then by join time, a page at a time.
 
     Return:
         Success message upon success
     Raises:
+        400
         422
         500
         409
@@ -45,7 +58,42 @@ async def retrieve_room_members(
         404
     """
     return await room_member_service.retrieve_room_members(
-        room_id=room_id, request=request, session=session
+        room_id=room_id,
+        request=request,
+        session=session,
+        redis=redis,
+        limit=limit,
+        cursor=cursor,
+    )
+
+
+@room_members_router.get(
+    "/{room_id}/online",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=RoomOnlineMembersResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def retrieve_online_room_members(
+    request: Request,
+    room_id: str,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
+) -> typing.Optional[RoomOnlineMembersResponseDto]:
+    """
+    Retrieves the room members who are online.
+
+    Return:
+        Success message upon success
+    Raises:
+        422
+        500
+        503
+        401
+        403
+    """
+    return await room_member_service.retrieve_online_members(
+        room_id=room_id, request=request, session=session, redis=redis
     )
 
 
@@ -61,6 +109,7 @@ async def add_room_member(
     room_id: str,
     schema: AddRoomMemberRequestDto,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
 ) -> typing.Optional[AddRoomMemberResponseDto]:
     """
     Adds a new room member.
@@ -75,7 +124,7 @@ async def add_room_member(
         404
     """
     return await room_member_service.add_room_member(
-        room_id=room_id, request=request, session=session, schema=schema
+        room_id=room_id, request=request, session=session, schema=schema, redis=redis
     )
 
 
@@ -91,6 +140,7 @@ async def update_member_to_admin_or_remove_member_from_room(
     room_id: str,
     schema: UpdateRoomMemberRequestDto,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
 ) -> typing.Optional[UpdateRoomMemberResponseDto]:
     """
     Updates a user to admin or remove a user from room.
@@ -105,5 +155,36 @@ async def update_member_to_admin_or_remove_member_from_room(
         404
     """
     return await room_member_service.update_member_to_admin_or_remove_member_from_room(
-        room_id=room_id, request=request, session=session, schema=schema
+        room_id=room_id, request=request, session=session, schema=schema, redis=redis
+    )
+
+
+@room_members_router.patch(
+    "/{room_id}/bulk",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=BulkUpdateRoomMembersResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def bulk_update_room_members(
+    request: Request,
+    room_id: str,
+    schema: BulkUpdateRoomMembersRequestDto,
+    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
+) -> BulkUpdateRoomMembersResponseDto:
+    """
+    Adds, removes, promotes or demotes many room members at once.
+
+    Return:
+        The members updated and the ones skipped
+    Raises:
+        422
+        500
+        401
+        403
+        404
+    """
+    return await room_member_service.bulk_update_room_members(
+        room_id=room_id, request=request, session=session, schema=schema, redis=redis
     )
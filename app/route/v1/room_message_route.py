@@ -6,6 +6,7 @@ import typing
 
 from fastapi import APIRouter, Depends, Request, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
 
 from app.dto.v1.room_message_dto import (
     SendRoomMessageResponseDto,
@@ -16,10 +17,12 @@ from app.dto.v1.room_message_dto import (
     UpdateRoomMessageResponseDto,
     DeleteRoomMessageDto,
     DeleteRoomMessageResponseDto,
+    SearchRoomMessagesResponseDto,
 )
 from app.utils.responses import responses
 from app.core.security import validate_logout_status
-from app.database.session import get_async_session
+from app.database.session import get_async_session, get_read_only_session
+from app.database.redis_db import get_redis_client
 from app.service.v1.room_message_service import room_message_service
 
 room_message_router = APIRouter(prefix="/room-messages", tags=["ROOM MESSAGES"])
@@ -36,6 +39,7 @@ async def send_room_message(
     request: Request,
     schema: SendRoomMessageRequestDto,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
 ) -> typing.Optional[SendRoomMessageResponseDto]:
     """
     Sends messages to a room.
@@ -53,7 +57,50 @@ async def send_room_message(
         HTTPException 403: when Only Room Admins can send messages.
     """
     return await room_message_service.create_room_message(
-        request=request, session=session, schema=schema
+        request=request, session=session, schema=schema, redis=redis
+    )
+
+
+@room_message_router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=SearchRoomMessagesResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def search_messages(
+    request: Request,
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    q: str = Query(min_length=1, max_length=100, description="The searched text"),
+    limit: int = Query(
+        default=20, ge=1, le=50, description="The size of messages per page"
+    ),
+    cursor: typing.Optional[str] = Query(
+        default=None, description="The next_cursor of the previous page"
+    ),
+    room_id: typing.Optional[str] = Query(
+        default=None, description="Only search this room. (Optional)"
+    ),
+) -> typing.Optional[SearchRoomMessagesResponseDto]:
+    """
+    Searches the messages of the user's rooms, best matches first.
+
+    Return:
+        Success message upon success
+    Raises:
+        HTTPException 400: when the search text has no words.
+        HTTPException 400: when the cursor is invalid.
+        HTTPException 401: when not authenticated.
+        HTTPException 401: when invalid access token.
+        HTTPException 401: when access token is blacklisted.
+    """
+    return await room_message_service.search_messages(
+        q=q,
+        limit=limit,
+        cursor=cursor,
+        room_id=room_id,
+        session=session,
+        request=request,
     )
 
 
@@ -67,7 +114,8 @@ async def send_room_message(
 async def retrieve_messages(
     request: Request,
     room_id: str,
-    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
     order_by: RoomMessageOrderEnum = Query(
         default=RoomMessageOrderEnum.DESC,
         description="The order of the messages. (Optional)",
@@ -98,6 +146,7 @@ async def retrieve_messages(
         session=session,
         request=request,
         order_by=order_by,
+        redis=redis,
     )
 
 
@@ -112,6 +161,7 @@ async def update_messages(
     request: Request,
     room_id: str,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
     schema: UpdateRoomMessageDto,
 ) -> typing.Optional[UpdateRoomMessageResponseDto]:
     """
@@ -136,6 +186,7 @@ async def update_messages(
         session=session,
         request=request,
         schema=schema,
+        redis=redis,
     )
 
 
@@ -150,6 +201,7 @@ async def delete_messages(
     request: Request,
     room_id: str,
     session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
     schema: DeleteRoomMessageDto,
 ) -> typing.Optional[DeleteRoomMessageResponseDto]:
     """
@@ -174,4 +226,5 @@ async def delete_messages(
         session=session,
         request=request,
         schema=schema,
+        redis=redis,
     )
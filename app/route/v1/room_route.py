@@ -4,18 +4,22 @@ Room Route Module
 
 import typing
 from fastapi import APIRouter, status, Request, Depends, Query
+from redis.asyncio import Redis
 
 from app.utils.responses import responses
 from app.service.v1.room_service import room_service, AsyncSession
 from app.dto.v1.room_dto import (
     CreateRoomRequestDto,
     CreateRoomResponseDto,
+    DiscoverRoomsResponseDto,
     RetrieveResponseDto,
+    RoomRankingEnum,
     UpdateResponseDto,
     UpdateRoomRequestDto,
 )
 from app.core.security import validate_logout_status
-from app.database.session import get_async_session
+from app.database.session import get_async_session, get_read_only_session
+from app.database.redis_db import get_redis_client
 
 rooms_router = APIRouter(prefix="/rooms", tags=["ROOMS"])
 
@@ -58,7 +62,8 @@ async def create_new_room(
 )
 async def retrieve_rooms(
     request: Request,
-    session: typing.Annotated[AsyncSession, Depends(get_async_session)],
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=20, ge=1, le=50),
 ) -> typing.Optional[RetrieveResponseDto]:
@@ -75,7 +80,50 @@ async def retrieve_rooms(
         404
     """
     return await room_service.retrieve_rooms(
-        page=page, limit=limit, request=request, session=session
+        page=page, limit=limit, request=request, session=session, redis=redis
+    )
+
+
+@rooms_router.get(
+    "/discover",
+    status_code=status.HTTP_200_OK,
+    responses=responses,
+    response_model=DiscoverRoomsResponseDto,
+    dependencies=[Depends(validate_logout_status)],
+)
+async def discover_rooms(
+    session: typing.Annotated[AsyncSession, Depends(get_read_only_session)],
+    redis: typing.Annotated[Redis, Depends(get_redis_client)],
+    name: typing.Optional[str] = Query(
+        default=None,
+        min_length=1,
+        max_length=50,
+        description="Searches public rooms by name. (Optional)",
+    ),
+    ranking: RoomRankingEnum = Query(
+        default=RoomRankingEnum.ACTIVITY,
+        description="The order of public rooms when no name is searched.",
+    ),
+    page: int = Query(default=1, ge=1),
+    limit: int = Query(default=20, ge=1, le=50),
+) -> typing.Optional[DiscoverRoomsResponseDto]:
+    """
+    Discovers public rooms.
+
+    Return:
+        Success message upon success
+    Raises:
+        422
+        500
+        401
+    """
+    return await room_service.discover_rooms(
+        session=session,
+        redis=redis,
+        page=page,
+        limit=limit,
+        ranking=ranking.value,
+        name=name,
     )
 
 
@@ -44,6 +44,7 @@ from app.utils.task_logger import create_logger
 from app.core.config import settings
 from app.core.security import generate_token
 from app.database.redis_db import get_redis_async
+from app.database.replica import current_user_var
 from app.utils.celery_setup.tasks import send_email_in_background
 
 logger = create_logger(":: Authentication Service ::")
@@ -114,7 +115,7 @@ class AuthenticationService:
         """
 
         user_exists = await user_repository.fetch_by_username_or_email(
-            str(schema.email), schema.username, session=session
+            schema.email, schema.username, session=session
         )
         if not user_exists:
             raise HTTPException(
@@ -178,6 +179,9 @@ class AuthenticationService:
         # set header x-refresh-token
         response.headers["X-REFRESH-TOKEN"] = refresh_token
 
+        # the new session is read back from the primary until replicas catch up
+        current_user_var.set(user_exists.id)
+
         # new user session record
         await user_session_repository.create(
             user_id=user_exists.id,
@@ -402,17 +406,14 @@ class AuthenticationService:
 
             if code != schema.code:
                 raise HTTPException(status_code=401, detail="Invalid credentials")
-            user = await user_repository.fetch_by_email(
-                email=schema.email, session=session
+            is_verified = await user_repository.verify_user(
+                session=session, email=schema.email
             )
-            if not user:
+            if not is_verified:
                 raise HTTPException(status_code=401, detail="User not found")
-            await user_repository.verify_user(session=session, user=user)
 
             await redis_session.delete(key)
 
-            await session.refresh(user)
-
         return AccountVerificationResponseDto()
 
     async def resend_verification_code(
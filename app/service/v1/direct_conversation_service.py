@@ -7,10 +7,12 @@ import math
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Request
+from redis.asyncio import Redis
 
 from app.repository.v1.direct_conv_repository import (
     direct_conversation_repository,
 )
+from app.repository.v1.inbox_cache_repository import inbox_cache_repository
 from app.dto.v1.direct_conversation_dto import (
     ConversationBaseDto,
     AllConversationsResponseDto,
@@ -27,27 +29,56 @@ class DirectConversationService:
     """
 
     async def fetch_direct_conversations(
-        self, request: Request, session: AsyncSession, page: int, limit: int
+        self,
+        request: Request,
+        session: AsyncSession,
+        page: int,
+        limit: int,
+        redis: Redis,
     ) -> typing.Union[AllConversationsResponseDto, None]:
         """
         Retrieves all conversations.
+        The first page is served from the cached inbox when it is complete.
 
         Args:
             request (Request): The request object.
             session (AsyncSession): The database async session object.
             page (int): The current page.
             limit (int): The number of conversations per page
+            redis (Redis): The redis client.
         Returns:
             AllConversationsResponseDto (pydantic): The response payload
         """
         claims: dict = request.state.claims
         current_user_id = claims.get("user_id", "")
 
-        all_conversations, count = (
-            await direct_conversation_repository.get_conversation_with_last_message_count(
-                limit=limit, page=page, session=session, user_id=current_user_id
+        cached_page = None
+        generation = None
+        if page == 1:
+            cached_page = await inbox_cache_repository.page(
+                user_id=current_user_id, limit=limit, redis=redis
+            )
+        if page == 1 and not cached_page:
+            # read before the rows, a write in between drops the fill
+            generation = await inbox_cache_repository.generation(
+                scope_id=current_user_id, redis=redis
+            )
+        if cached_page:
+            all_conversations, count = cached_page
+        else:
+            all_conversations, count = (
+                await direct_conversation_repository.get_conversation_with_last_message_count(
+                    limit=limit, page=page, session=session, user_id=current_user_id
+                )
+            )
+        if page == 1 and not cached_page:
+            await self.cache_inbox(
+                user_id=current_user_id,
+                conversations=all_conversations,
+                generation=generation,
+                session=session,
+                redis=redis,
             )
-        )
 
         return AllConversationsResponseDto(
             data=[
@@ -61,5 +92,35 @@ class DirectConversationService:
             total_conversations=count,
         )
 
+    async def cache_inbox(
+        self,
+        user_id: str,
+        conversations: typing.Sequence[typing.Any],
+        generation: typing.Optional[str],
+        session: AsyncSession,
+        redis: Redis,
+    ) -> None:
+        """
+        Caches a user's inbox after a miss on its first page.
+
+        Args:
+            user_id (str): The id of the user.
+            conversations (Sequence): The first page, read from the database.
+            generation (str): The inbox generation read before the page.
+            session (AsyncSession): The database async session object.
+            redis (Redis): The redis client.
+        Returns:
+            None
+        """
+        await inbox_cache_repository.cache_page(
+            user_id,
+            conversations,
+            lambda: direct_conversation_repository.fetch_inbox_scores(
+                user_id=user_id, session=session
+            ),
+            generation=generation,
+            redis=redis,
+        )
+
 
 direct_conversation_service = DirectConversationService()
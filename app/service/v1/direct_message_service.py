@@ -4,16 +4,28 @@ DirectMessageService module
 
 import typing
 import math
-from datetime import timezone, datetime, timedelta
+from datetime import datetime
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Request, HTTPException, status
 from redis.asyncio import Redis
 
+from app.core.config import settings
+from app.database.full_text import search_terms
+from app.models.direct_conversation import participant_pair_key
+
 from app.repository.v1.direct_message_repository import (
     direct_message_repository,
 )
 from app.repository.v1.user_repository import user_repository
+from app.repository.v1.inbox_cache_repository import inbox_cache_repository
+from app.repository.v1.message_history_cache_repository import (
+    DIRECT,
+    DIRECT_MESSAGE_FIELDS,
+    message_history_cache_repository,
+    serialize,
+)
 from app.repository.v1.direct_conv_repository import (
     direct_conversation_repository,
 )
@@ -26,7 +38,12 @@ from app.dto.v1.direct_message_dto import (
     UpdateMessageResponseDto,
     DeleteMessageResponseDto,
     DeleteMessageDto,
+    SearchMessageResultDto,
+    SearchMessagesResponseDto,
 )
+
+from app.utils.guards import raise_failed_guard
+from app.utils.pagination import after_cursor, split_page
 from app.utils.task_logger import create_logger
 from app.websocketss.ws_redis_connection_manager import ws_redis_connection_manager
 
@@ -77,7 +94,9 @@ class DirectMessageService:
             )
 
         conversation_exists = None
+        cached_conversation_id = None
         add_to_session_list = []
+        pair_key = participant_pair_key(current_user_id, schema.recipient_id)
         if schema.parent_message_id:
             parent_message_exists = await direct_message_repository.fetch(
                 session=session, message_id=schema.parent_message_id, attributes=["id"]
@@ -100,6 +119,10 @@ class DirectMessageService:
                     detail="Conversation not found",
                 )
         if not schema.conversation_id:
+            cached_conversation_id = await inbox_cache_repository.conversation_id(
+                pair_key=pair_key, redis=redis
+            )
+        if not schema.conversation_id and not cached_conversation_id:
             conversation_exists = await direct_conversation_repository.find_by_users(
                 sender_id=current_user_id,
                 recipient_id=schema.recipient_id,
@@ -114,18 +137,33 @@ class DirectMessageService:
 
             add_to_session_list.append(conversation_exists)
 
-        if not conversation_exists:
+        if not conversation_exists and not cached_conversation_id:
             conversation_exists = await direct_conversation_repository.create(
                 sender_id=current_user_id,
                 recipient_id=schema.recipient_id,
                 session=session,
             )
-            add_to_session_list.append(conversation_exists)
+            session.add(conversation_exists)
+            try:
+                await session.flush()
+            except IntegrityError as exc:
+                await session.rollback()
+                # a concurrent first message created the conversation
+                conversation_exists = (
+                    await direct_conversation_repository.find_by_users(
+                        sender_id=current_user_id,
+                        recipient_id=schema.recipient_id,
+                        session=session,
+                    )
+                )
+                if not conversation_exists:
+                    raise exc
         new_message = await direct_message_repository.create(
             content=schema.message,
             sender_id=current_user_id,
             recipient_id=schema.recipient_id,
             conversation=conversation_exists,
+            conversation_id=cached_conversation_id,
             media_type=schema.media_type,
             media_url=str(schema.media_url),
             parent_message_id=schema.parent_message_id,
@@ -133,8 +171,39 @@ class DirectMessageService:
 
         add_to_session_list.append(new_message)
         session.add_all(add_to_session_list)
+        await session.flush()
+        if cached_conversation_id:
+            # the row was never loaded, so undo a deletion without it
+            await direct_conversation_repository.restore(
+                conversation_id=cached_conversation_id, session=session
+            )
+        await direct_conversation_repository.set_last_message(
+            conversation_id=new_message.conversation_id,
+            message_id=new_message.id,
+            session=session,
+        )
         await session.commit()
 
+        if not cached_conversation_id:
+            await inbox_cache_repository.store_conversation_id(
+                pair_key=pair_key,
+                conversation_id=new_message.conversation_id,
+                redis=redis,
+            )
+        await inbox_cache_repository.record_message(
+            conversation_id=new_message.conversation_id,
+            participant_ids=[current_user_id, schema.recipient_id],
+            sent_at=new_message.created_at,
+            content=new_message.content,
+            redis=redis,
+        )
+        await message_history_cache_repository.push(
+            kind=DIRECT,
+            scope_id=new_message.conversation_id,
+            entry=serialize(new_message, DIRECT_MESSAGE_FIELDS),
+            viewer_ids=[current_user_id, schema.recipient_id],
+            redis=redis,
+        )
         await ws_redis_connection_manager.send_dm(
             direct_message=new_message, redis=redis
         )
@@ -149,9 +218,12 @@ class DirectMessageService:
         limit: int,
         session: AsyncSession,
         conversation_id: str,
+        redis: Redis,
     ) -> typing.Union[AllMessagesResponseDto, None]:
         """
         Retrieves all messages.
+        The first page is served from the message history cache when it can
+        answer it, without touching the database.
 
         Args:
             request (Request): The request object.
@@ -159,6 +231,7 @@ class DirectMessageService:
             page (int): The current page.
             limit (int): The number of messages per page
             conversation_id (str): The conversation for the messages
+            redis (Redis): The redis client.
         Returns:
             AllMessagesResponseDto (pydantic): The response payload
         """
@@ -166,21 +239,58 @@ class DirectMessageService:
         current_user_id = claims.get("user_id", "")
         offset = page * limit - limit
 
-        conversation_exists = await direct_conversation_repository.fetch_by_id(
-            conversation_id=conversation_id, session=session
-        )
-        if not conversation_exists:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found"
+        cached_page = None
+        generation: typing.Optional[str] = None
+        if page == 1:
+            cached_page = await message_history_cache_repository.page(
+                kind=DIRECT,
+                scope_id=conversation_id,
+                viewer_id=current_user_id,
+                limit=limit,
+                redis=redis,
+            )
+        if cached_page:
+            all_messages, count = cached_page
+        else:
+            conversation_exists = await direct_conversation_repository.fetch_by_id(
+                conversation_id=conversation_id, session=session
             )
+            if not conversation_exists:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found",
+                )
 
-        all_messages, count = await direct_message_repository.fetch_all(
-            conversation_id=conversation_id,
-            user_id=current_user_id,
-            order="desc",
-            session=session,
-            offset=offset,
-        )
+            if page == 1:
+                generation = await message_history_cache_repository.generation(
+                    kind=DIRECT, scope_id=conversation_id, redis=redis
+                )
+            all_messages, count = await direct_message_repository.fetch_all(
+                conversation_id=conversation_id,
+                user_id=current_user_id,
+                order="desc",
+                session=session,
+                offset=offset,
+                limit=limit,
+            )
+        if page == 1 and not cached_page:
+            recent_messages = await direct_message_repository.fetch_recent(
+                conversation_id=conversation_id,
+                limit=settings.message_history_cache_size,
+                session=session,
+            )
+            await message_history_cache_repository.fill(
+                kind=DIRECT,
+                scope_id=conversation_id,
+                viewer_id=current_user_id,
+                entries=[
+                    serialize(message, DIRECT_MESSAGE_FIELDS)
+                    for message in recent_messages
+                ],
+                count=count,
+                generation=generation,
+                redis=redis,
+            )
 
         return AllMessagesResponseDto(
             page=page,
@@ -194,11 +304,78 @@ class DirectMessageService:
             ],
         )
 
+    async def search_messages(
+        self,
+        request: Request,
+        session: AsyncSession,
+        q: str,
+        limit: int = 20,
+        cursor: typing.Optional[str] = None,
+        conversation_id: typing.Optional[str] = None,
+    ) -> SearchMessagesResponseDto:
+        """
+        Searches the messages the user sent or received, best matches first.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            q (str): The searched text.
+            limit (int): The number of messages per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
+            conversation_id (str): Only messages of this conversation, all if None.
+        Returns:
+            SearchMessagesResponseDto (pydantic): The response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        if not search_terms(q):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Search text has no words to search",
+            )
+        after = after_cursor(
+            cursor,
+            3,
+            lambda rank, created_at, message_id: (
+                float(rank),
+                datetime.fromisoformat(created_at),
+                str(message_id),
+            ),
+        )
+        matches, next_cursor = split_page(
+            await direct_message_repository.search(
+                user_id=current_user_id,
+                text=q,
+                session=session,
+                limit=limit + 1,
+                after=after,
+                conversation_id=conversation_id,
+            ),
+            limit,
+            lambda match: [match[1], match[0].created_at.isoformat(), match[0].id],
+        )
+
+        return SearchMessagesResponseDto(
+            limit=limit,
+            next_cursor=next_cursor,
+            data=[
+                SearchMessageResultDto(
+                    **MessageBaseDto.model_validate(
+                        message, from_attributes=True
+                    ).model_dump(),
+                    rank=rank,
+                )
+                for message, rank in matches
+            ],
+        )
+
     async def update_message(
         self,
         request: Request,
         session: AsyncSession,
         schema: UpdateMessageDto,
+        redis: Redis,
     ) -> typing.Union[UpdateMessageResponseDto, None]:
         """
         Updates a message.
@@ -207,66 +384,69 @@ class DirectMessageService:
             request (Request): The request object.
             session (AsyncSession): The database async session object.
             schema (pydantic): The request payload
+            redis (Redis): The redis client.
         Returns:
             UpdateMessageResponseDto (pydantic): The response payload
         """
         claims: dict = request.state.claims
         current_user_id = claims.get("user_id", "")
 
-        message_exists = await direct_message_repository.fetch(
+        updated_message = await direct_message_repository.update(
+            user_id=current_user_id,
             session=session,
+            content=schema.message,
             message_id=schema.message_id,
             conversation_id=schema.conversation_id,
         )
-        if not message_exists:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Invalid message id",
-            )
-        if message_exists.sender_id != current_user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User does not have enough access",
-            )
-        if (
-            message_exists
-            and message_exists.sender_id == current_user_id
-            and message_exists.is_deleted_for_sender
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Message not found."
-            )
-        if (
-            message_exists
-            and message_exists.recipient_id == current_user_id
-            and message_exists.is_deleted_for_recipient
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Message not found."
+        if not updated_message:
+            raise_failed_guard(
+                await direct_message_repository.fetch(
+                    session=session,
+                    message_id=schema.message_id,
+                    conversation_id=schema.conversation_id,
+                ),
+                missing=(status.HTTP_404_NOT_FOUND, "Invalid message id"),
+                guards=[
+                    (
+                        lambda message: message.sender_id != current_user_id,
+                        status.HTTP_403_FORBIDDEN,
+                        "User does not have enough access",
+                    ),
+                    (
+                        lambda message: message.is_deleted_for_sender,
+                        status.HTTP_404_NOT_FOUND,
+                        "Message not found.",
+                    ),
+                ],
+                otherwise=(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Cannot update after 15 minutes of sending a message",
+                ),
             )
-        now = datetime.now(timezone.utc)
 
-        if (
-            message_exists.created_at.replace(tzinfo=timezone.utc)
-            + timedelta(minutes=15)
-        ) < (now + timedelta(seconds=0)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cannot update after 15 minutes of sending a message",
-            )
-        updated_message = await direct_message_repository.update(
-            user_id=current_user_id,
-            session=session,
-            content=schema.message,
-            message=message_exists,
+        # the edited message may be the one previewed in the inbox
+        await inbox_cache_repository.forget_preview(
+            conversation_id=updated_message.conversation_id,
+            participant_ids=[updated_message.sender_id, updated_message.recipient_id],
+            redis=redis,
+        )
+        await message_history_cache_repository.patch(
+            kind=DIRECT,
+            scope_id=updated_message.conversation_id,
+            message_id=updated_message.id,
+            changes={"content": updated_message.content, "is_edited": True},
+            redis=redis,
         )
-
         return UpdateMessageResponseDto(
             data=MessageBaseDto.model_validate(updated_message, from_attributes=True)
         )
 
     async def delete_messages(
-        self, schema: DeleteMessageDto, session: AsyncSession, request: Request
+        self,
+        schema: DeleteMessageDto,
+        session: AsyncSession,
+        request: Request,
+        redis: Redis,
     ) -> typing.Union[DeleteMessageResponseDto, None]:
         """
         Deletes messages.
@@ -275,12 +455,15 @@ class DirectMessageService:
             request (Request): The request object.
             session (AsyncSession): The database async session object.
             schema (pydantic): The request payload
+            redis (Redis): The redis client.
         Returns:
             DeleteMessageResponseDto (pydantic): The response payload
         """
         claims: dict = request.state.claims
 
         current_user_id = claims.get("user_id", "")
+        # (message, flags set, viewers whose visible count changed)
+        deleted_messages: typing.List[typing.Tuple[typing.Any, dict, list]] = []
 
         if not schema.delete_for_both:
             for message_id in schema.message_ids:
@@ -299,6 +482,14 @@ class DirectMessageService:
                     message_id=message_id,
                     user_id=current_user_id,
                 )
+                if affected_row:
+                    deleted_messages.append(
+                        (
+                            message_exists,
+                            {"is_deleted_for_sender": True},
+                            [current_user_id],
+                        )
+                    )
 
         else:
             for message_id in schema.message_ids:
@@ -319,8 +510,30 @@ class DirectMessageService:
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="Cannot delete message after 15 minutes",
                     )
+                deleted_messages.append(
+                    (
+                        message_exists,
+                        {"is_deleted_for_sender": True, "is_deleted_for_recipient": True},
+                        [message_exists.sender_id, message_exists.recipient_id],
+                    )
+                )
         await session.commit()
 
+        for message, changes, viewer_ids in deleted_messages:
+            await message_history_cache_repository.patch(
+                kind=DIRECT,
+                scope_id=message.conversation_id,
+                message_id=message.id,
+                changes=changes,
+                redis=redis,
+            )
+            await message_history_cache_repository.forget_counts(
+                kind=DIRECT,
+                scope_id=message.conversation_id,
+                viewer_ids=viewer_ids,
+                redis=redis,
+            )
+
         return DeleteMessageResponseDto()
 
 
@@ -3,20 +3,31 @@ Room Invitation service module
 """
 
 import typing
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Request, HTTPException, status
+from redis.asyncio import Redis
 
 from app.repository.v1.room_invitation_repository import room_invitation_repository
 from app.repository.v1.user_repository import user_repository
 from app.repository.v1.room_repository import room_repository
 from app.repository.v1.room_member_repository import room_member_repository
+from app.service.v1.room_member_service import room_member_service
 from app.dto.v1.room_inivitation_dto import (
+    InvitationOutcomeEnum,
+    PendingInvitationsCountResponseDto,
     RoomInvitationBaseDto,
+    RoomInvitationBulkRequestDto,
+    RoomInvitationBulkResponseDto,
+    RoomInvitationListItemDto,
+    RoomInvitationOutcomeDto,
     RoomInvitationRequestDto,
     RoomInvitationResponseDto,
     RoomInvitationUpdateRequestDto,
     RoomInvitationUpdateResponseDto,
+    RoomInvitationsResponseDto,
 )
+from app.utils.pagination import after_cursor, split_page
 
 
 class RoomInvitationService:
@@ -101,11 +112,11 @@ class RoomInvitationService:
             and is_invited_user_a_member.left_room
             and invitation_exists
         ):
-            await room_invitation_repository.update(
+            updated_invitation = await room_invitation_repository.update(
                 session=session, invitation_id=invitation_exists.id, status="pending"
             )
             invitation_base = RoomInvitationBaseDto.model_validate(
-                invitation_exists, from_attributes=True
+                updated_invitation, from_attributes=True
             )
             return RoomInvitationResponseDto(data=invitation_base)
 
@@ -119,11 +130,19 @@ class RoomInvitationService:
             "expired",
             "declined",
         ]:
-            await room_invitation_repository.update(
-                session=session, invitation_id=invitation_exists.id, status="pending"
+            updated_invitation = await room_invitation_repository.update(
+                session=session,
+                invitation_id=invitation_exists.id,
+                status="pending",
+                expected_status=invitation_exists.invitation_status,
             )
+            if not updated_invitation:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Invitee already has an Invitation to this room.",
+                )
             invitation_base = RoomInvitationBaseDto.model_validate(
-                invitation_exists, from_attributes=True
+                updated_invitation, from_attributes=True
             )
             return RoomInvitationResponseDto(data=invitation_base)
 
@@ -138,11 +157,129 @@ class RoomInvitationService:
         )
         return RoomInvitationResponseDto(data=invitation_base)
 
+    async def create_room_invitations(
+        self,
+        request: Request,
+        session: AsyncSession,
+        schema: RoomInvitationBulkRequestDto,
+    ) -> RoomInvitationBulkResponseDto:
+        """
+        Invites many users to a room at once. Users, memberships and
+        existing invitations are looked up a set at a time, and every
+        invitation is written by a single upsert.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            schema (RoomInvitationBulkRequestDto): The request payload.
+        Returns:
+            RoomInvitationBulkResponseDto (pydantic): the outcome for each
+            invitee, in request order.
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        room_exists = await room_repository.fetch(
+            session=session, room_id=schema.room_id
+        )
+        if not room_exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Room does not exist.",
+            )
+        is_current_user_a_member = await room_member_repository.fetch(
+            room_id=schema.room_id, session=session, member_id=current_user_id
+        )
+        if not is_current_user_a_member or is_current_user_a_member.left_room:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not part of the Room.",
+            )
+        if (
+            not room_exists.allow_non_admin_invitations
+            and not is_current_user_a_member.is_admin
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invitation only alowed for Admins",
+            )
+
+        invitee_ids = list(dict.fromkeys(schema.invitee_ids))
+        others = [
+            invitee_id for invitee_id in invitee_ids if invitee_id != current_user_id
+        ]
+        existing_users = await user_repository.fetch_existing_ids(
+            user_ids=others, session=session
+        )
+        left_room = await room_member_repository.fetch_left_room(
+            room_id=schema.room_id, member_ids=list(existing_users), session=session
+        )
+        invitation_statuses = await room_invitation_repository.fetch_statuses(
+            session=session, room_id=schema.room_id, invitee_ids=list(existing_users)
+        )
+
+        outcomes: typing.Dict[str, InvitationOutcomeEnum] = {}
+        for invitee_id in invitee_ids:
+            if invitee_id == current_user_id:
+                outcomes[invitee_id] = InvitationOutcomeEnum.SELF
+            elif invitee_id not in existing_users:
+                outcomes[invitee_id] = InvitationOutcomeEnum.NOT_FOUND
+            elif left_room.get(invitee_id) is False:
+                outcomes[invitee_id] = InvitationOutcomeEnum.ALREADY_MEMBER
+            elif (
+                invitation_statuses.get(invitee_id) == "pending"
+                and invitee_id not in left_room
+            ):
+                # members who left are invited again whatever the status
+                outcomes[invitee_id] = InvitationOutcomeEnum.ALREADY_INVITED
+            elif invitee_id in invitation_statuses:
+                outcomes[invitee_id] = InvitationOutcomeEnum.REINVITED
+            else:
+                outcomes[invitee_id] = InvitationOutcomeEnum.INVITED
+
+        invitations = await room_invitation_repository.upsert_pending(
+            session=session,
+            room_id=schema.room_id,
+            inviter_id=current_user_id,
+            invitee_ids=[
+                invitee_id
+                for invitee_id, outcome in outcomes.items()
+                if outcome
+                in (InvitationOutcomeEnum.INVITED, InvitationOutcomeEnum.REINVITED)
+            ],
+        )
+        invitation_by_invitee = {
+            invitation.invitee_id: RoomInvitationBaseDto.model_validate(
+                invitation, from_attributes=True
+            )
+            for invitation in invitations
+        }
+        for invitee_id, outcome in outcomes.items():
+            # joined the room since the statuses were read
+            if (
+                outcome
+                in (InvitationOutcomeEnum.INVITED, InvitationOutcomeEnum.REINVITED)
+                and invitee_id not in invitation_by_invitee
+            ):
+                outcomes[invitee_id] = InvitationOutcomeEnum.ALREADY_MEMBER
+
+        return RoomInvitationBulkResponseDto(
+            data=[
+                RoomInvitationOutcomeDto(
+                    invitee_id=invitee_id,
+                    outcome=outcome,
+                    invitation=invitation_by_invitee.get(invitee_id),
+                )
+                for invitee_id, outcome in outcomes.items()
+            ]
+        )
+
     async def update_room_invitation_request(
         self,
         request: Request,
         session: AsyncSession,
         schema: RoomInvitationUpdateRequestDto,
+        redis: Redis,
     ) -> typing.Optional[RoomInvitationUpdateResponseDto]:
         """
         Updates room invitation request.
@@ -151,6 +288,7 @@ class RoomInvitationService:
             request (Request): The request object.
             session (AsyncSession): The database async session object.
             schema (RoomInvitationUpdateRequestDto): The request payload.
+            redis (Redis): The redis client.
         Returns:
             RoomInvitationUpdateResponseDto (pydantic): The response payload
         """
@@ -215,9 +353,17 @@ class RoomInvitationService:
                     status_code=status.HTTP_409_CONFLICT,
                     detail=f"Cannot cancel request, invitation is already {invitation_exists.invitation_status}",
                 )
-            await room_invitation_repository.update(
-                session=session, status="cancelled", invitation_id=schema.invitation_id
+            updated_invitation = await room_invitation_repository.update(
+                session=session,
+                status="cancelled",
+                invitation_id=schema.invitation_id,
+                expected_status="pending",
             )
+            if not updated_invitation:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Cannot cancel request, invitation is no longer pending",
+                )
             message = "Invitation request cancelled successfully."
         elif schema.action.value == "decline":
             # invitee is declining the invitation
@@ -231,9 +377,17 @@ class RoomInvitationService:
                     status_code=status.HTTP_409_CONFLICT,
                     detail=f"Cannot decline invitation request, invitation is already {invitation_exists.invitation_status}",
                 )
-            await room_invitation_repository.update(
-                session=session, status="declined", invitation_id=schema.invitation_id
+            updated_invitation = await room_invitation_repository.update(
+                session=session,
+                status="declined",
+                invitation_id=schema.invitation_id,
+                expected_status="pending",
             )
+            if not updated_invitation:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Cannot decline request, invitation is no longer pending",
+                )
             message = "Invitation request declined successfully."
 
         elif schema.action.value == "accept":
@@ -248,26 +402,222 @@ class RoomInvitationService:
                     status_code=status.HTTP_409_CONFLICT,
                     detail=f"Cannot accept invitation request, invitation is already {invitation_exists.invitation_status}",
                 )
-            await room_invitation_repository.update(
-                session=session, status="accepted", invitation_id=schema.invitation_id
+            updated_invitation = await room_invitation_repository.update(
+                session=session,
+                status="accepted",
+                invitation_id=schema.invitation_id,
+                expected_status="pending",
             )
+            if not updated_invitation:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Cannot accept request, invitation is no longer pending",
+                )
             _ = await room_member_repository.create(
                 room_id=schema.room_id,
                 session=session,
                 is_admin=False,
                 member_id=invitation_exists.invitee_id,
             )
+            await room_member_service.cache_joined_member(
+                room_id=schema.room_id,
+                member_id=invitation_exists.invitee_id,
+                session=session,
+                redis=redis,
+            )
             message = "Invitation request accepted successfully."
-        await session.refresh(
-            instance=invitation_exists, attribute_names=["invitation_status"]
-        )
         return RoomInvitationUpdateResponseDto(
             data={
-                "invitation_status": invitation_exists.invitation_status,
+                "invitation_status": updated_invitation.invitation_status,
                 "invitation_id": schema.invitation_id,
             },
             message=message,
         )
 
+    async def retrieve_received_invitations(
+        self,
+        request: Request,
+        session: AsyncSession,
+        limit: int = 50,
+        cursor: typing.Optional[str] = None,
+        invitation_status: typing.Optional[str] = None,
+    ) -> RoomInvitationsResponseDto:
+        """
+        Retrieves a page of the invitations the user received, newest first.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            limit (int): The number of invitations per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
+            invitation_status (str): Only invitations with this status, all if None.
+        Returns:
+            RoomInvitationsResponseDto (pydantic): The response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        response = await self._paginate(
+            session=session,
+            limit=limit,
+            cursor=cursor,
+            invitee_id=current_user_id,
+            invitation_status=invitation_status,
+        )
+        response.pending_count = (
+            await room_invitation_repository.count_pending_received(
+                session=session, invitee_id=current_user_id
+            )
+        )
+        return response
+
+    async def retrieve_sent_invitations(
+        self,
+        request: Request,
+        session: AsyncSession,
+        limit: int = 50,
+        cursor: typing.Optional[str] = None,
+        invitation_status: typing.Optional[str] = None,
+    ) -> RoomInvitationsResponseDto:
+        """
+        Retrieves a page of the invitations the user sent, newest first.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            limit (int): The number of invitations per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
+            invitation_status (str): Only invitations with this status, all if None.
+        Returns:
+            RoomInvitationsResponseDto (pydantic): The response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        return await self._paginate(
+            session=session,
+            limit=limit,
+            cursor=cursor,
+            inviter_id=current_user_id,
+            invitation_status=invitation_status,
+        )
+
+    async def retrieve_room_invitations(
+        self,
+        request: Request,
+        session: AsyncSession,
+        room_id: str,
+        limit: int = 50,
+        cursor: typing.Optional[str] = None,
+        invitation_status: typing.Optional[str] = None,
+    ) -> RoomInvitationsResponseDto:
+        """
+        Retrieves a page of a room's invitations, newest first, for its admins.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            room_id (str): The id of the room.
+            limit (int): The number of invitations per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
+            invitation_status (str): Only invitations with this status, all if None.
+        Returns:
+            RoomInvitationsResponseDto (pydantic): The response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        is_user_admin = await room_member_repository.fetch(
+            room_id=room_id, session=session, member_id=current_user_id
+        )
+        if not is_user_admin or is_user_admin.left_room:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not part of the Room.",
+            )
+        if not is_user_admin.is_admin:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Room invitations only visible to Admins",
+            )
+
+        response = await self._paginate(
+            session=session,
+            limit=limit,
+            cursor=cursor,
+            room_id=room_id,
+            invitation_status=invitation_status,
+        )
+        response.pending_count = (
+            await room_invitation_repository.count_pending_for_room(
+                session=session, room_id=room_id
+            )
+        )
+        return response
+
+    async def count_pending_invitations(
+        self, request: Request, session: AsyncSession
+    ) -> PendingInvitationsCountResponseDto:
+        """
+        Counts the user's pending invitations, for badges.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+        Returns:
+            PendingInvitationsCountResponseDto (pydantic): The response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        return PendingInvitationsCountResponseDto(
+            pending_count=await room_invitation_repository.count_pending_received(
+                session=session, invitee_id=current_user_id
+            )
+        )
+
+    async def _paginate(
+        self,
+        session: AsyncSession,
+        limit: int,
+        cursor: typing.Optional[str],
+        **filters: typing.Optional[str],
+    ) -> RoomInvitationsResponseDto:
+        """
+        Retrieves a page of invitations matching filters, newest first.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            limit (int): The number of invitations per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
+            filters: The filters of RoomInvitationRepository.fetch_page.
+        Returns:
+            RoomInvitationsResponseDto (pydantic): The page
+        """
+        after = after_cursor(
+            cursor,
+            2,
+            lambda created_at, invitation_id: (
+                datetime.fromisoformat(created_at),
+                str(invitation_id),
+            ),
+        )
+        invitations, next_cursor = split_page(
+            await room_invitation_repository.fetch_page(
+                session=session, limit=limit + 1, after=after, **filters
+            ),
+            limit,
+            lambda invitation: [invitation.created_at.isoformat(), invitation.id],
+        )
+
+        return RoomInvitationsResponseDto(
+            limit=limit,
+            next_cursor=next_cursor,
+            data=[
+                RoomInvitationListItemDto.model_validate(invitation)
+                for invitation in invitations
+            ],
+        )
+
 
 room_invitation_service = RoomInvitationService()
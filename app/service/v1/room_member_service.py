@@ -3,8 +3,11 @@ Room member service module
 """
 
 import typing
+from datetime import datetime
 from fastapi import Request, status, HTTPException
 from asyncpg.exceptions import ForeignKeyViolationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 
 from sqlalchemy.exc import IntegrityError
 
@@ -15,13 +18,26 @@ from app.repository.v1.room_member_repository import (
 from app.dto.v1.room_member_dto import (
     RoomMebersResponseDto,
     RoomMemberBaseDto,
+    RoomOnlineMembersResponseDto,
     AddRoomMemberRequestDto,
     AddRoomMemberResponseDto,
     UpdateRoomMemberRequestDto,
     UpdateRoomMemberResponseDto,
+    BulkRoomMembersActionEnum,
+    BulkRoomMembersResultDto,
+    BulkUpdateRoomMembersRequestDto,
+    BulkUpdateRoomMembersResponseDto,
 )
+from app.repository.v1.room_presence_repository import room_presence_repository
 from app.repository.v1.room_repository import room_repository
+from app.repository.v1.room_roster_cache_repository import (
+    room_roster_cache_repository,
+)
+from app.repository.v1.user_repository import user_repository
+from app.utils.guards import raise_failed_guard
+from app.utils.pagination import after_cursor, split_page
 from app.utils.task_logger import create_logger
+from app.websocketss.ws_redis_connection_manager import ws_redis_connection_manager
 
 logger = create_logger(":::: RoomMemberService ::::")
 
@@ -32,21 +48,40 @@ class RoomMemberService:
     """
 
     async def retrieve_room_members(
-        self, request: Request, session: AsyncSession, room_id: str
+        self,
+        request: Request,
+        session: AsyncSession,
+        room_id: str,
+        redis: Redis,
+        limit: int = 50,
+        cursor: typing.Optional[str] = None,
     ) -> typing.Union[None, RoomMebersResponseDto]:
         """
-        Retrieves all room members
+        Retrieves a page of room members, admins first then by join time.
 
         Args:
             request (Request): The request object.
             session (AsyncSession): The database async session object.
             room_id (str): The room to fetch its members
+            redis (Redis): The redis client.
+            limit (int): The number of members per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
         Returns:
             RoomMebersResponseDto(pydantic): Response payload
         """
         claims: dict = request.state.claims
         current_user_id = claims.get("user_id", "")
 
+        after = after_cursor(
+            cursor,
+            3,
+            lambda is_admin, joined_at, member_id: (
+                bool(is_admin),
+                datetime.fromisoformat(joined_at),
+                member_id,
+            ),
+        )
+
         room_exists = await room_repository.fetch(room_id=room_id, session=session)
         if not room_exists:
             raise HTTPException(
@@ -65,24 +100,162 @@ class RoomMemberService:
                 detail="User already left the room",
             )
 
-        all_members = await room_member_repository.fetch_all(
-            session=session, room_id=room_id
+        members = await room_roster_cache_repository.page(
+            room_id=room_id,
+            after_member_id=after[2] if after else None,
+            limit=limit + 1,
+            redis=redis,
+        )
+        if members is None:
+            # read before the rows, a write in between drops the fill
+            generation = await room_roster_cache_repository.generation(
+                scope_id=room_id, redis=redis
+            )
+            members = await room_member_repository.fetch_roster(
+                room_id=room_id, session=session, limit=limit + 1, after=after
+            )
+            await self.cache_roster(
+                room_id=room_id,
+                members=members[:limit],
+                generation=generation,
+                session=session,
+                redis=redis,
+            )
+
+        members, next_cursor = split_page(
+            members,
+            limit,
+            lambda member: [
+                member["is_admin"],
+                member["joined_at"].isoformat(),
+                member["member_id"],
+            ],
         )
 
         return RoomMebersResponseDto(
-            data=[
-                RoomMemberBaseDto.model_validate(member, from_attributes=True)
-                for member in all_members
-                if member
-            ]
+            limit=limit,
+            next_cursor=next_cursor,
+            data=[RoomMemberBaseDto.model_validate(dict(member)) for member in members],
+        )
+
+    async def retrieve_online_members(
+        self, request: Request, session: AsyncSession, room_id: str, redis: Redis
+    ) -> typing.Union[None, RoomOnlineMembersResponseDto]:
+        """
+        Retrieves the room members who are online.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            room_id (str): The room to fetch its online members
+            redis (Redis): The redis client.
+        Returns:
+            RoomOnlineMembersResponseDto(pydantic): Response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        is_user_a_member = await room_member_repository.fetch(
+            member_id=current_user_id,
+            session=session,
+            room_id=room_id,
+            attributes=["left_room"],
+        )
+        if not is_user_a_member:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="User not a member"
+            )
+        if is_user_a_member.left_room:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User already left the room",
+            )
+
+        online_members = await room_presence_repository.online_members(
+            room_id=room_id, redis=redis
+        )
+        if online_members is None:
+            members = await room_member_repository.fetch_member_ids(
+                room_ids=[room_id], session=session
+            )
+            online_members = await room_presence_repository.online_members(
+                room_id=room_id, redis=redis, member_ids=members[room_id]
+            )
+        if online_members is None:
+            # presence only lives in redis
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Presence unavailable",
+            )
+
+        return RoomOnlineMembersResponseDto(
+            online_count=len(online_members), data=online_members
+        )
+
+    async def cache_roster(
+        self,
+        room_id: str,
+        members: typing.Sequence[typing.Any],
+        generation: typing.Optional[str],
+        session: AsyncSession,
+        redis: Redis,
+    ) -> None:
+        """
+        Caches a room's roster after a miss: the order of every member if it
+        is not cached yet, and the profiles of the page.
+
+        Args:
+            room_id (str): The id of the room.
+            members (Sequence): The page rows.
+            generation (str): The roster generation read before the rows.
+            session (AsyncSession): The database async session object.
+            redis (Redis): The redis client.
+        Returns:
+            None
+        """
+        await room_roster_cache_repository.cache_page(
+            room_id,
+            members,
+            lambda: room_member_repository.fetch_roster_scores(
+                room_id=room_id, session=session
+            ),
+            generation=generation,
+            redis=redis,
         )
 
+    async def cache_joined_member(
+        self, room_id: str, member_id: str, session: AsyncSession, redis: Redis
+    ) -> None:
+        """
+        Adds a member who joined or rejoined to the room's cached roster and
+        member set.
+
+        Args:
+            room_id (str): The id of the room.
+            member_id (str): The id of the member.
+            session (AsyncSession): The database async session object.
+            redis (Redis): The redis client.
+        Returns:
+            None
+        """
+        member = await room_member_repository.fetch_roster_member(
+            room_id=room_id, member_id=member_id, session=session
+        )
+        if member:
+            await room_roster_cache_repository.add(
+                room_id=room_id, member=member, redis=redis
+            )
+            await room_presence_repository.add_members(
+                room_id=room_id, member_ids=[member_id], redis=redis
+            )
+
     async def add_room_member(
         self,
         session: AsyncSession,
         schema: AddRoomMemberRequestDto,
         request: Request,
         room_id: str,
+        redis: Redis,
     ) -> typing.Union[None, AddRoomMemberResponseDto]:
         """
         Adss a new member to a room.
@@ -92,6 +265,7 @@ class RoomMemberService:
             schema (AddRoomMemberRequestDto): The request payload.
             request (Request): the request object.
             room_id (str): The id of the room.
+            redis (Redis): The redis client.
         Returns:
             AddRoomMemberResponseDto: response payload
         """
@@ -122,36 +296,52 @@ class RoomMemberService:
                 detail="User already left the room",
             )
 
-        is_user_a_member = await room_member_repository.fetch(
-            member_id=schema.member_id, session=session, room_id=room_id
-        )
-        if is_user_a_member and is_user_a_member.left_room:
-            await room_member_repository.update(
+        try:
+            await room_member_repository.create(
                 session=session,
                 room_id=room_id,
                 member_id=schema.member_id,
-                left_room=False,
                 is_admin=schema.is_admin,
             )
-            return AddRoomMemberResponseDto()
-        if is_user_a_member and not is_user_a_member.left_room:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="User already a member"
-            )
-
-        try:
-            await room_member_repository.create(
+        except (ForeignKeyViolationError, IntegrityError) as exc:
+            await session.rollback()
+            # already a row for this member: rejoin if they left the room
+            rejoined_member = await room_member_repository.update(
                 session=session,
                 room_id=room_id,
                 member_id=schema.member_id,
+                left_room=False,
                 is_admin=schema.is_admin,
+                where_left_room=True,
             )
-        except (ForeignKeyViolationError, IntegrityError) as exc:
+            if rejoined_member:
+                await self.cache_joined_member(
+                    room_id=room_id,
+                    member_id=schema.member_id,
+                    session=session,
+                    redis=redis,
+                )
+                return AddRoomMemberResponseDto()
+
+            is_user_a_member = await room_member_repository.fetch(
+                member_id=schema.member_id,
+                session=session,
+                room_id=room_id,
+                attributes=["left_room"],
+            )
+            if is_user_a_member:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="User already a member",
+                ) from exc
             logger.error("Error adding user to room: %s", str(exc))
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             ) from exc
 
+        await self.cache_joined_member(
+            room_id=room_id, member_id=schema.member_id, session=session, redis=redis
+        )
         return AddRoomMemberResponseDto()
 
     async def update_member_to_admin_or_remove_member_from_room(
@@ -160,6 +350,7 @@ class RoomMemberService:
         room_id: str,
         request: Request,
         schema: UpdateRoomMemberRequestDto,
+        redis: Redis,
     ) -> typing.Union[None, UpdateRoomMemberResponseDto]:
         """
         Updates member to admin or remove member from room.
@@ -169,6 +360,7 @@ class RoomMemberService:
             room_id (str): The id of the room.
             request (Request): The request o bject.
             schema (UpdateRoomMemberRequestDto): The request payload.
+            redis (Redis): The redis client.
 
         Returns:
             UpdateRoomMemberResponseDto: response payload
@@ -211,33 +403,170 @@ class RoomMemberService:
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Oops! You already left the room",
             )
-        is_user_a_member = await room_member_repository.fetch(
-            member_id=schema.member_id, session=session, room_id=room_id
+        updated_member = await room_member_repository.update(
+            session=session,
+            room_id=room_id,
+            member_id=schema.member_id,
+            left_room=schema.remove_member,
+            is_admin=schema.is_admin,
+            where_left_room=False if schema.remove_member else None,
+            where_is_admin=False if schema.is_admin else None,
         )
-        if not is_user_a_member:
+        if not updated_member:
+            raise_failed_guard(
+                await room_member_repository.fetch(
+                    member_id=schema.member_id, session=session, room_id=room_id
+                ),
+                missing=(
+                    status.HTTP_404_NOT_FOUND,
+                    "Cannot update User. User is not a member",
+                ),
+                guards=[
+                    (
+                        lambda member: schema.remove_member and member.left_room,
+                        status.HTTP_409_CONFLICT,
+                        "Cannot remove User. User already removed from room",
+                    ),
+                ],
+                otherwise=(status.HTTP_409_CONFLICT, "User already an admin"),
+            )
+
+        if updated_member.left_room:
+            await room_roster_cache_repository.remove(
+                room_id=room_id, member_id=schema.member_id, redis=redis
+            )
+            await room_presence_repository.remove_members(
+                room_id=room_id, member_ids=[schema.member_id], redis=redis
+            )
+        elif schema.is_admin is not None:
+            await room_roster_cache_repository.set_admin(
+                room_id=room_id,
+                member_id=schema.member_id,
+                is_admin=updated_member.is_admin,
+                joined_at=updated_member.created_at,
+                redis=redis,
+            )
+        return UpdateRoomMemberResponseDto()
+
+    async def bulk_update_room_members(
+        self,
+        session: AsyncSession,
+        room_id: str,
+        request: Request,
+        schema: BulkUpdateRoomMembersRequestDto,
+        redis: Redis,
+    ) -> BulkUpdateRoomMembersResponseDto:
+        """
+        Adds, removes, promotes or demotes many members of a room in one
+        statement, announced in one room system event.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            room_id (str): The id of the room.
+            request (Request): The request object.
+            schema (BulkUpdateRoomMembersRequestDto): The request payload.
+            redis (Redis): The redis client.
+
+        Returns:
+            BulkUpdateRoomMembersResponseDto: the members updated and the
+            ones skipped, already in that state or not allowed.
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        room_exists = await room_repository.fetch(room_id=room_id, session=session)
+        if not room_exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cannot update User. User is not a member",
+                detail="Room not found",
             )
-        if schema.remove_member and is_user_a_member.left_room:
+        is_user_admin = await room_member_repository.fetch(
+            member_id=current_user_id, session=session, room_id=room_id
+        )
+        if not is_user_admin:
             raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Cannot remove User. User already removed from room",
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Oops! You have no access to this room.",
             )
-        if schema.is_admin and is_user_a_member.is_admin:
+        if not is_user_admin.is_admin:
             raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="User already an admin",
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Oops! You have not enough access to perform this action",
+            )
+        if is_user_admin.left_room:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Oops! You already left the room",
             )
-        await room_member_repository.update(
-            session=session,
-            room_id=room_id,
-            member_id=schema.member_id,
-            left_room=schema.remove_member,
-            is_admin=schema.is_admin,
-        )
 
-        return UpdateRoomMemberResponseDto()
+        member_ids = list(dict.fromkeys(schema.member_ids))
+        # no action on self, nor on the room owner
+        targets = [
+            member_id
+            for member_id in member_ids
+            if member_id not in (current_user_id, room_exists.owner_id)
+        ]
+        action = schema.action
+        if action == BulkRoomMembersActionEnum.ADD:
+            existing_users = await user_repository.fetch_existing_ids(
+                user_ids=targets, session=session
+            )
+            updated = await room_member_repository.bulk_add(
+                room_id=room_id,
+                member_ids=[
+                    member_id for member_id in targets if member_id in existing_users
+                ],
+                session=session,
+            )
+        else:
+            updated = await room_member_repository.bulk_update(
+                room_id=room_id,
+                session=session,
+                member_ids=targets,
+                is_admin={
+                    BulkRoomMembersActionEnum.PROMOTE: True,
+                    BulkRoomMembersActionEnum.DEMOTE: False,
+                }.get(action),
+                left_room=action == BulkRoomMembersActionEnum.REMOVE or None,
+            )
+
+        if updated:
+            await room_roster_cache_repository.invalidate(room_id=room_id, redis=redis)
+            if action == BulkRoomMembersActionEnum.ADD:
+                await room_presence_repository.add_members(
+                    room_id=room_id, member_ids=updated, redis=redis
+                )
+            elif action == BulkRoomMembersActionEnum.REMOVE:
+                await room_presence_repository.remove_members(
+                    room_id=room_id, member_ids=updated, redis=redis
+                )
+            try:
+                await ws_redis_connection_manager.room_members_changed(
+                    room_id=room_id,
+                    event={
+                        BulkRoomMembersActionEnum.ADD: "members_joined",
+                        BulkRoomMembersActionEnum.REMOVE: "members_left",
+                        BulkRoomMembersActionEnum.PROMOTE: "members_promoted",
+                        BulkRoomMembersActionEnum.DEMOTE: "members_demoted",
+                    }[action],
+                    member_ids=updated,
+                    actor_id=current_user_id,
+                    redis=redis,
+                )
+            except RedisError as exc:
+                # the change is committed, only the announcement is lost
+                logger.warning("room members event failed: %s", str(exc))
+
+        updated_ids = set(updated)
+        return BulkUpdateRoomMembersResponseDto(
+            data=BulkRoomMembersResultDto(
+                action=action,
+                updated=updated,
+                skipped=[
+                    member_id for member_id in member_ids if member_id not in updated_ids
+                ],
+            )
+        )
 
 
 room_member_service = RoomMemberService()
@@ -8,6 +8,10 @@ from datetime import datetime, timedelta, timezone
 
 from fastapi import Request, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.database.full_text import search_terms
 
 from app.dto.v1.room_message_dto import (
     SendRoomMessageResponseDto,
@@ -19,10 +23,22 @@ from app.dto.v1.room_message_dto import (
     UpdateRoomMessageDto,
     DeleteRoomMessageDto,
     DeleteRoomMessageResponseDto,
+    SearchRoomMessageResultDto,
+    SearchRoomMessagesResponseDto,
 )
+
 from app.repository.v1.room_message_repository import room_message_repository
 from app.repository.v1.room_repository import room_repository
 from app.repository.v1.room_member_repository import room_member_repository
+from app.repository.v1.message_history_cache_repository import (
+    ROOM,
+    ROOM_MESSAGE_FIELDS,
+    ROOM_VIEWER,
+    message_history_cache_repository,
+    serialize,
+)
+from app.utils.guards import raise_failed_guard
+from app.utils.pagination import after_cursor, split_page
 from app.utils.task_logger import create_logger
 
 logger = create_logger(":::: RoomMessageService ::::")
@@ -40,7 +56,11 @@ class RoomMessageService:
         self.repository = room_message_repository
 
     async def create_room_message(
-        self, request: Request, session: AsyncSession, schema: SendRoomMessageRequestDto
+        self,
+        request: Request,
+        session: AsyncSession,
+        schema: SendRoomMessageRequestDto,
+        redis: Redis,
     ) -> typing.Optional[SendRoomMessageResponseDto]:
         """
         Creates and Sends a message to a room.
@@ -49,6 +69,7 @@ class RoomMessageService:
             request (Request): The request object.
             session (AsyncSession): The database async session object.
             schema (pydantic): The payload request object.
+            redis (Redis): The redis client.
         Returns:
             SendRoomMessageResponseDto (pydantic): The payoad response object.
         Raises:
@@ -105,6 +126,13 @@ class RoomMessageService:
             media_url=schema.media_url and str(schema.media_url),
             media_type=schema.media_type,
         )
+        await message_history_cache_repository.push(
+            kind=ROOM,
+            scope_id=schema.room_id,
+            entry=serialize(new_room_message, ROOM_MESSAGE_FIELDS),
+            viewer_ids=[ROOM_VIEWER],
+            redis=redis,
+        )
 
         room_base_dto = RoomMessageBaseDto.model_validate(
             new_room_message, from_attributes=True
@@ -120,9 +148,12 @@ class RoomMessageService:
         limit: int,
         room_id: str,
         order_by: RoomMessageOrderEnum,
+        redis: Redis,
     ) -> typing.Optional[AllRoomMessagesResponseDto]:
         """
         Retrieves all room messages.
+        The newest first page is served from the message history cache when
+        it can answer it.
 
         Args:
             request (Request): The request object.
@@ -131,6 +162,7 @@ class RoomMessageService:
             limit (int): The number of messages per page
             room_id (str): The id of the messages to retrieve
             order_by (str): The order of the messages to fetch (default=desc)
+            redis (Redis): The redis client.
         Returns:
             AllRoomMessagesResponseDto (pydantic): The response payload
         """
@@ -159,12 +191,49 @@ class RoomMessageService:
                 status_code=status.HTTP_403_FORBIDDEN, detail="User already left room"
             )
 
-        all_messages, count = await self.repository.fetch_all(
-            room_id=room_id,
-            order=order_by.value,
-            session=session,
-            offset=offset,
-        )
+        newest_first_page = page == 1 and order_by == RoomMessageOrderEnum.DESC
+        cached_page = None
+        generation: typing.Optional[str] = None
+        if newest_first_page:
+            cached_page = await message_history_cache_repository.page(
+                kind=ROOM,
+                scope_id=room_id,
+                viewer_id=ROOM_VIEWER,
+                limit=limit,
+                redis=redis,
+            )
+        if cached_page:
+            all_messages, count = cached_page
+        else:
+            if newest_first_page:
+                generation = await message_history_cache_repository.generation(
+                    kind=ROOM, scope_id=room_id, redis=redis
+                )
+            all_messages, count = await self.repository.fetch_all(
+                room_id=room_id,
+                order=order_by.value,
+                session=session,
+                offset=offset,
+                limit=limit,
+            )
+        if newest_first_page and not cached_page:
+            recent_messages = await self.repository.fetch_recent(
+                room_id=room_id,
+                limit=settings.message_history_cache_size,
+                session=session,
+            )
+            await message_history_cache_repository.fill(
+                kind=ROOM,
+                scope_id=room_id,
+                viewer_id=ROOM_VIEWER,
+                entries=[
+                    serialize(message, ROOM_MESSAGE_FIELDS)
+                    for message in recent_messages
+                ],
+                count=count,
+                generation=generation,
+                redis=redis,
+            )
 
         return AllRoomMessagesResponseDto(
             page=page,
@@ -178,12 +247,79 @@ class RoomMessageService:
             ],
         )
 
+    async def search_messages(
+        self,
+        request: Request,
+        session: AsyncSession,
+        q: str,
+        limit: int = 20,
+        cursor: typing.Optional[str] = None,
+        room_id: typing.Optional[str] = None,
+    ) -> SearchRoomMessagesResponseDto:
+        """
+        Searches the messages of the rooms the user is a member of, best matches first.
+
+        Args:
+            request (Request): The request object.
+            session (AsyncSession): The database async session object.
+            q (str): The searched text.
+            limit (int): The number of messages per page.
+            cursor (str): The next_cursor of the previous page, None for the first.
+            room_id (str): Only messages of this room, all if None.
+        Returns:
+            SearchRoomMessagesResponseDto (pydantic): The response payload
+        """
+        claims: dict = request.state.claims
+        current_user_id = claims.get("user_id", "")
+
+        if not search_terms(q):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Search text has no words to search",
+            )
+        after = after_cursor(
+            cursor,
+            3,
+            lambda rank, created_at, message_id: (
+                float(rank),
+                datetime.fromisoformat(created_at),
+                str(message_id),
+            ),
+        )
+        matches, next_cursor = split_page(
+            await self.repository.search(
+                user_id=current_user_id,
+                text=q,
+                session=session,
+                limit=limit + 1,
+                after=after,
+                room_id=room_id,
+            ),
+            limit,
+            lambda match: [match[1], match[0].created_at.isoformat(), match[0].id],
+        )
+
+        return SearchRoomMessagesResponseDto(
+            limit=limit,
+            next_cursor=next_cursor,
+            data=[
+                SearchRoomMessageResultDto(
+                    **RoomMessageBaseDto.model_validate(
+                        message, from_attributes=True
+                    ).model_dump(),
+                    rank=rank,
+                )
+                for message, rank in matches
+            ],
+        )
+
     async def update_message(
         self,
         request: Request,
         session: AsyncSession,
         schema: UpdateRoomMessageDto,
         room_id: str,
+        redis: Redis,
     ) -> typing.Union[UpdateRoomMessageResponseDto, None]:
         """
         Updates a message.
@@ -193,6 +329,7 @@ class RoomMessageService:
             session (AsyncSession): The database async session object.
             schema (pydantic): The request payload
             room_id (str): The id of the room
+            redis (Redis): The redis client.
         Returns:
             UpdateRoomMessageResponseDto (pydantic): The response payload
         """
@@ -220,44 +357,46 @@ class RoomMessageService:
                 status_code=status.HTTP_403_FORBIDDEN, detail="User already left room"
             )
 
-        message_exists = await self.repository.fetch(
+        updated_message = await self.repository.update(
+            user_id=current_user_id,
             session=session,
+            content=schema.message,
             message_id=schema.message_id,
             room_id=room_id,
         )
-        if not message_exists:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Invalid message id",
-            )
-        if message_exists.is_deleted:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Message not found",
+        if not updated_message:
+            raise_failed_guard(
+                await self.repository.fetch(
+                    session=session,
+                    message_id=schema.message_id,
+                    room_id=room_id,
+                ),
+                missing=(status.HTTP_404_NOT_FOUND, "Invalid message id"),
+                guards=[
+                    (
+                        lambda message: message.is_deleted,
+                        status.HTTP_404_NOT_FOUND,
+                        "Message not found",
+                    ),
+                    (
+                        lambda message: message.sender_id != current_user_id,
+                        status.HTTP_403_FORBIDDEN,
+                        "Cannot update another User message!!!",
+                    ),
+                ],
+                otherwise=(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Cannot update after 15 minutes of sending a message",
+                ),
             )
-        if message_exists.sender_id != current_user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Cannot update another User message!!!",
-            )
-
-        now = datetime.now(timezone.utc)
 
-        if (
-            message_exists.created_at.replace(tzinfo=timezone.utc)
-            + timedelta(minutes=15)
-        ) < (now + timedelta(seconds=0)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cannot update after 15 minutes of sending a message",
-            )
-        updated_message = await room_message_repository.update(
-            user_id=current_user_id,
-            session=session,
-            content=schema.message,
-            message=message_exists,
+        await message_history_cache_repository.patch(
+            kind=ROOM,
+            scope_id=room_id,
+            message_id=updated_message.id,
+            changes={"content": updated_message.content, "is_edited": True},
+            redis=redis,
         )
-
         return UpdateRoomMessageResponseDto(
             data=RoomMessageBaseDto.model_validate(
                 updated_message, from_attributes=True
@@ -270,6 +409,7 @@ class RoomMessageService:
         session: AsyncSession,
         request: Request,
         room_id: str,
+        redis: Redis,
     ) -> typing.Union[DeleteRoomMessageResponseDto, None]:
         """
         Delete room messages.
@@ -279,6 +419,7 @@ class RoomMessageService:
             session (AsyncSession): The database async session object.
             schema (pydantic): The request payload.
             room_id (str): The ID of the room.
+            redis (Redis): The redis client.
         Returns:
             DeleteMessageResponseDto (pydantic): The response payload
         """
@@ -367,6 +508,18 @@ class RoomMessageService:
         await session.commit()
         await session.flush()
 
+        for message_id in schema.message_ids:
+            await message_history_cache_repository.patch(
+                kind=ROOM,
+                scope_id=room_id,
+                message_id=message_id,
+                changes={"is_deleted": True},
+                redis=redis,
+            )
+        await message_history_cache_repository.forget_counts(
+            kind=ROOM, scope_id=room_id, viewer_ids=[ROOM_VIEWER], redis=redis
+        )
+
         return DeleteRoomMessageResponseDto()
 
 
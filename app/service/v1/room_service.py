@@ -6,17 +6,25 @@ import typing
 import math
 
 from fastapi import Request, status, HTTPException
+from redis.asyncio import Redis
 
+from app.cache import tiered_cache
+from app.core.config import settings
 from app.repository.v1.room_repository import room_repository, AsyncSession
 from app.dto.v1.room_dto import (
     RoomBaseDto,
     CreateRoomRequestDto,
     CreateRoomResponseDto,
+    DiscoverRoomsResponseDto,
     RetrieveResponseDto,
     UpdateResponseDto,
     UpdateRoomRequestDto,
 )
+from app.repository.v1.room_discovery_cache_repository import (
+    room_discovery_cache_repository,
+)
 from app.repository.v1.room_member_repository import room_member_repository
+from app.repository.v1.room_presence_repository import room_presence_repository
 
 
 class RoomService:
@@ -57,10 +65,15 @@ class RoomService:
         return CreateRoomResponseDto(data=room_base)
 
     async def retrieve_rooms(
-        self, request: Request, session: AsyncSession, page: int, limit: int
+        self,
+        request: Request,
+        session: AsyncSession,
+        page: int,
+        limit: int,
+        redis: Redis,
     ) -> typing.Union[None, RetrieveResponseDto]:
         """
-        Retrieves rooms
+        Retrieves rooms, with how many of their members are online.
         """
         claims: dict = request.state.claims
         current_user_id = claims.get("user_id", "")
@@ -70,9 +83,15 @@ class RoomService:
             owner_id=current_user_id, session=session, offset=offset, limit=limit
         )
 
+        online_counts = await self.count_online_members(
+            room_ids=[room.id for room in rooms if room], session=session, redis=redis
+        )
+
         return RetrieveResponseDto(
             data=[
-                RoomBaseDto.model_validate(room, from_attributes=True)
+                RoomBaseDto.model_validate(room, from_attributes=True).model_copy(
+                    update={"online_count": online_counts.get(room.id)}
+                )
                 for room in rooms
                 if room
             ],
@@ -82,6 +101,124 @@ class RoomService:
             total_rooms=count,
         )
 
+    async def count_online_members(
+        self, room_ids: typing.List[str], session: AsyncSession, redis: Redis
+    ) -> typing.Dict[str, typing.Optional[int]]:
+        """
+        Counts the online members of rooms, caching the members of those
+        not cached yet with one query.
+
+        Args:
+            room_ids (List[str]): The ids of the rooms.
+            session (AsyncSession): The database async session object.
+            redis (Redis): The redis client.
+        Returns:
+            Dict: room id -> online member count, missing when unavailable.
+        """
+        counts = await room_presence_repository.online_counts(
+            room_ids=room_ids, redis=redis
+        )
+        if counts is None:
+            return {}
+        missing = [room_id for room_id, count in counts.items() if count is None]
+        if missing:
+            members = await room_member_repository.fetch_member_ids(
+                room_ids=missing, session=session
+            )
+            await room_presence_repository.fill(members=members, redis=redis)
+            counts.update(
+                await room_presence_repository.online_counts(
+                    room_ids=missing, redis=redis
+                )
+                or {}
+            )
+        return counts
+
+    async def discover_rooms(
+        self,
+        session: AsyncSession,
+        redis: Redis,
+        page: int,
+        limit: int,
+        ranking: str,
+        name: typing.Optional[str] = None,
+    ) -> typing.Union[None, DiscoverRoomsResponseDto]:
+        """
+        Lists public rooms: those matching a name, else the top ones of a
+        precomputed ranking.
+
+        Args:
+            session (AsyncSession): The database async session object.
+            redis (Redis): The redis client.
+            page (int): The page.
+            limit (int): The number of rooms per page.
+            ranking (str): activity or size, when no name is searched.
+            name (str): The searched room name.
+        Returns:
+            DiscoverRoomsResponseDto: response payload
+        """
+        offset = page * limit - limit
+        if name:
+            rooms = await room_repository.search_discoverable(
+                name=name, session=session, offset=offset, limit=limit
+            )
+            return DiscoverRoomsResponseDto(
+                page=page,
+                limit=limit,
+                data=[
+                    RoomBaseDto.model_validate(room, from_attributes=True)
+                    for room in rooms
+                ],
+            )
+
+        ranked = await room_discovery_cache_repository.fetch(
+            ranking=ranking, redis=redis
+        )
+        if ranked is None:
+            # the beat refresh has not run yet or redis is down, one
+            # request per worker ranks for the others
+            ranked = await tiered_cache.coalesce(
+                f"room-ranking:{ranking}",
+                lambda: self.refresh_ranking(
+                    ranking=ranking, session=session, redis=redis
+                ),
+                namespace="room-ranking",
+            )
+        return DiscoverRoomsResponseDto(
+            page=page,
+            limit=limit,
+            data=[
+                RoomBaseDto.model_validate(room) for room in ranked[offset : offset + limit]
+            ],
+        )
+
+    async def refresh_ranking(
+        self, ranking: str, session: AsyncSession, redis: Redis
+    ) -> typing.List[dict]:
+        """
+        Ranks the top public rooms and caches the ranking.
+
+        Args:
+            ranking (str): activity or size.
+            session (AsyncSession): The database async session object.
+            redis (Redis): The redis client.
+        Returns:
+            List[dict]: the ranked rooms.
+        """
+        rooms = await room_repository.fetch_ranking(
+            ranking=ranking, session=session, limit=settings.room_discovery_ranking_size
+        )
+        ranked = [
+            RoomBaseDto.model_validate(room, from_attributes=True).model_dump(
+                mode="json", exclude={"online_count"}
+            )
+            for room in rooms
+        ]
+        await room_discovery_cache_repository.store(
+            ranking=ranking, rooms=ranked, redis=redis
+        )
+        return ranked
+
     async def update_room(
         self, schema: UpdateRoomRequestDto, session: AsyncSession, request: Request
     ) -> typing.Union[None, UpdateResponseDto]:
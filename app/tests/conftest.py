@@ -2,21 +2,35 @@
 Conftest module
 """
 
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Callable, Tuple
+from uuid import uuid4
 import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import (
+    AsyncSession,
     create_async_engine,
     async_sessionmaker,
 )
-from sqlalchemy import StaticPool
+from sqlalchemy import StaticPool, event
+from sqlalchemy.pool import NullPool
+from fastapi import Request
 from fastapi.testclient import TestClient
 
 from main import app
 from app.core.config import settings
-from app.database.session import get_async_session, Base
+from app.database.session import (
+    get_async_session,
+    get_async_session_factory,
+    get_read_only_session,
+    ReadOnlyAsyncSession,
+    PrimaryAsyncSession,
+    Base,
+)
+from app.database.query_stats import register_query_listeners
 from app.database.redis_db import get_redis_client
 from app.database.redis_db import get_redis_async
+from app.models.user import User
 
 
 # SQLite-specific configuration for local testing
@@ -27,10 +41,23 @@ test_engine = create_async_engine(
     },
     poolclass=StaticPool,
 )
+register_query_listeners(test_engine)
 
 
 TestSessionLocalMemory = async_sessionmaker(
-    bind=test_engine, autoflush=False, autocommit=False, expire_on_commit=False
+    bind=test_engine,
+    class_=PrimaryAsyncSession,
+    autoflush=False,
+    autocommit=False,
+    expire_on_commit=False,
+)
+
+
+TestReadOnlySessionLocalMemory = async_sessionmaker(
+    bind=test_engine,
+    class_=ReadOnlyAsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
 )
 
 
@@ -63,6 +90,14 @@ async def override_get_async_session():
         await session.close()
 
 
+async def override_get_read_only_session():
+    """
+    Overrides get_read_only_session generator in app instance.
+    """
+    async with TestReadOnlySessionLocalMemory() as session:
+        yield session
+
+
 async def override_get_redis_async_client():
     """
     Overrides get_async_session generator in app instance.
@@ -85,6 +120,8 @@ async def override_get_redis_async_session():
 
 
 app.dependency_overrides[get_async_session] = override_get_async_session
+app.dependency_overrides[get_async_session_factory] = lambda: TestSessionLocalMemory
+app.dependency_overrides[get_read_only_session] = override_get_read_only_session
 app.dependency_overrides[get_redis_client] = override_get_redis_async_client
 app.dependency_overrides[get_redis_async] = override_get_redis_async_session
 
@@ -116,3 +153,109 @@ async def test_setup():
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
         yield
+
+
+USER_PASSWORD = "Johnson1234#"
+
+
+@pytest.fixture(scope="function")
+def create_user() -> Callable:
+    """
+    Creates verified users, their password is USER_PASSWORD.
+    """
+
+    async def create(session: AsyncSession, username: str) -> User:
+        user = User(
+            email=f"{username}@gtest.com",
+            username=username,
+            first_name=username.capitalize(),
+            idempotency_key=str(uuid4()),
+            email_verified=True,
+        )
+        user.set_password(USER_PASSWORD)
+        session.add(user)
+        await session.flush()
+        return user
+
+    return create
+
+
+@pytest.fixture(scope="function")
+def as_user() -> Callable:
+    """
+    Builds requests authenticated as a user, for calling services directly.
+    """
+
+    def request(user_id: str) -> Request:
+        return Request({"type": "http", "state": {"claims": {"user_id": user_id}}})
+
+    return request
+
+
+@pytest.fixture(scope="function")
+def record_statements() -> Callable:
+    """
+    Records the statements issued on a session engine.
+
+    Returns:
+        callable: taking the session, returning the recorded statements and a
+        callable to stop recording.
+    """
+
+    def record(session: AsyncSession) -> Tuple[list, Callable]:
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        return statements, lambda: event.remove(
+            engine, "before_cursor_execute", before_cursor_execute
+        )
+
+    return record
+
+
+@pytest.fixture(scope="function")
+def task_session(tmp_path) -> Callable:
+    """
+    Replaces the session of celery tasks: each session opens its own engine
+    on a database file, so tasks can run on event loops of their own.
+    """
+    url = f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}"
+
+    @asynccontextmanager
+    async def session() -> AsyncIterator[AsyncSession]:
+        engine = create_async_engine(url, poolclass=NullPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+            async with sessionmaker() as session_:
+                yield session_
+        finally:
+            await engine.dispose()
+
+    return session
+
+
+@pytest.fixture(scope="function")
+def login(client: AsyncClient):
+    """
+    Logs in users made by create_user: returns their authorization headers.
+    """
+
+    async def headers(user: User) -> dict:
+        response = await client.post(
+            url="/api/v1/auth/login",
+            json={
+                "email": user.email,
+                "password": USER_PASSWORD,
+                "session_id": str(uuid4()),
+            },
+        )
+        token = response.json()["data"]["access_token"]["token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
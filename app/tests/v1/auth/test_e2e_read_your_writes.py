@@ -0,0 +1,69 @@
+"""
+Test read-your-writes tracking module
+"""
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import session as database_session
+from app.database.replica import ReplicaRouter, current_user_var
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.room_message import RoomMessage
+from app.models.user import User
+from app.tests.v1.room_message import register_input, uuid4
+
+
+class TestReadYourWrites:
+    """
+    Test authenticated writes are tracked for replica routing
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_authenticated_write_routes_the_writer_to_the_primary(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        monkeypatch,
+    ):
+        """
+        Tests the auth dependency sets the current user, so a write made
+        through a route marks its author as a recent writer
+        """
+        email = f"{uuid4()}@gmail.com"
+        user = User(email=email, email_verified=True)
+        await user.set_idempotency_key(email)
+        user.set_password(register_input.get("password", ""))
+        room = Room(owner=user, name="read your writes room")
+        room_message = RoomMessage(sender=user, content="before", room=room)
+        test_get_session.add_all(
+            [user, room, RoomMember(member=user, room=room), room_message]
+        )
+        await test_get_session.commit()
+        response = await client.post(
+            url="/api/v1/auth/login",
+            json={
+                "password": register_input.get("password"),
+                "email": email,
+                "session_id": str(uuid4()),
+            },
+        )
+        access_token = response.json()["data"]["access_token"]["token"]
+        primary, replica = object(), object()
+        router = ReplicaRouter(primary, [replica], read_your_writes_seconds=60)
+        monkeypatch.setattr(database_session, "replica_router", router)
+
+        response = await client.patch(
+            url=f"/api/v1/room-messages/{room.id}",
+            headers={"Authorization": f"Bearer {access_token}"},
+            json={"message_id": room_message.id, "message": "after"},
+        )
+
+        assert response.status_code == 200
+        assert router.recently_wrote(user.id)
+        assert router.choose(user.id) is primary
+        # the request's context did not leak into the test's
+        assert current_user_var.get() is None
+        assert router.choose() is replica
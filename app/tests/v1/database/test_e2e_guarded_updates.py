@@ -0,0 +1,177 @@
+"""
+Test guarded RETURNING updates module
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dto.v1.direct_message_dto import UpdateMessageDto
+from app.models.direct_conversation import DirectConversation
+from app.models.direct_message import DirectMessage
+from app.models.room import Room
+from app.models.room_invitation import RoomInvitation
+from app.repository.v1.direct_message_repository import direct_message_repository
+from app.repository.v1.room_invitation_repository import room_invitation_repository
+from app.service.v1.direct_message_service import direct_message_service
+
+
+class TestGuardedUpdates:
+    """
+    Test repository updates check their guards and return the row in one statement
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_message_edit_is_a_single_statement(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        create_user,
+        record_statements,
+    ):
+        """
+        Tests editing a message returns the updated row without a refresh
+        """
+        sender = await create_user(test_get_session, "guardsender")
+        recipient = await create_user(test_get_session, "guardrecipient")
+        conversation = DirectConversation(
+            sender_id=sender.id, recipient_id=recipient.id
+        )
+        message = DirectMessage(
+            sender_id=sender.id,
+            recipient_id=recipient.id,
+            direct_conversation=conversation,
+            content="first draft",
+        )
+        test_get_session.add_all([conversation, message])
+        await test_get_session.commit()
+
+        statements, stop_recording = record_statements(test_get_session)
+        try:
+            updated_message = await direct_message_repository.update(
+                user_id=sender.id,
+                content="second draft",
+                session=test_get_session,
+                message_id=message.id,
+                conversation_id=conversation.id,
+            )
+        finally:
+            stop_recording()
+
+        assert updated_message is message
+        assert updated_message.content == "second draft"
+        assert updated_message.is_edited is True
+        assert len(statements) == 1
+        assert "RETURNING" in statements[0]
+
+    @pytest.mark.asyncio
+    async def test_b_message_edit_guards(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests edits by another user, or after 15 minutes, match no row
+        """
+        sender = await create_user(test_get_session, "guardsender2")
+        recipient = await create_user(test_get_session, "guardrecipient2")
+        conversation = DirectConversation(
+            sender_id=sender.id, recipient_id=recipient.id
+        )
+        fresh_message = DirectMessage(
+            sender_id=sender.id,
+            recipient_id=recipient.id,
+            direct_conversation=conversation,
+            content="fresh",
+        )
+        old_message = DirectMessage(
+            sender_id=sender.id,
+            recipient_id=recipient.id,
+            direct_conversation=conversation,
+            content="old",
+            created_at=datetime.now(timezone.utc) - timedelta(minutes=20),
+        )
+        test_get_session.add_all([conversation, fresh_message, old_message])
+        await test_get_session.commit()
+
+        assert (
+            await direct_message_repository.update(
+                user_id=recipient.id,
+                content="not mine",
+                session=test_get_session,
+                message_id=fresh_message.id,
+            )
+            is None
+        )
+        assert (
+            await direct_message_repository.update(
+                user_id=sender.id,
+                content="too late",
+                session=test_get_session,
+                message_id=old_message.id,
+            )
+            is None
+        )
+        assert fresh_message.content == "fresh"
+        assert old_message.content == "old"
+
+        # the service reads the message back to report the failed guard
+        for user_id, message_id, status_code in [
+            (recipient.id, fresh_message.id, 403),
+            (sender.id, old_message.id, 400),
+            (sender.id, str(uuid.uuid4()), 404),
+        ]:
+            with pytest.raises(HTTPException) as exc:
+                await direct_message_service.update_message(
+                    request=Request(
+                        {"type": "http", "state": {"claims": {"user_id": user_id}}}
+                    ),
+                    session=test_get_session,
+                    schema=UpdateMessageDto(
+                        conversation_id=conversation.id,
+                        message_id=message_id,
+                        message="rejected",
+                    ),
+                    redis=None,
+                )
+            assert exc.value.status_code == status_code
+
+    @pytest.mark.asyncio
+    async def test_c_invitation_transition_applies_once(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests a second transition out of pending matches no row
+        """
+        inviter = await create_user(test_get_session, "guardinviter")
+        invitee = await create_user(test_get_session, "guardinvitee")
+        room = Room(owner_id=inviter.id, name="guarded room")
+        test_get_session.add(room)
+        await test_get_session.flush()
+        invitation = RoomInvitation(
+            room_id=room.id,
+            inviter_id=inviter.id,
+            invitee_id=invitee.id,
+            invitation_status="pending",
+            expiration=datetime.now(timezone.utc) + timedelta(days=7),
+        )
+        test_get_session.add(invitation)
+        await test_get_session.commit()
+
+        accepted = await room_invitation_repository.update(
+            session=test_get_session,
+            invitation_id=invitation.id,
+            status="accepted",
+            expected_status="pending",
+        )
+        cancelled = await room_invitation_repository.update(
+            session=test_get_session,
+            invitation_id=invitation.id,
+            status="cancelled",
+            expected_status="pending",
+        )
+
+        assert accepted is not None
+        assert accepted.invitation_status == "accepted"
+        assert cancelled is None
@@ -0,0 +1,94 @@
+"""
+Test database pool settings module
+"""
+
+import pytest
+import sqlalchemy as sa
+
+from app.core.config import Settings, settings
+from app.core.metrics import DB_POOL_WAIT
+from app.database.session import asyncpg_connect_args, build_async_engine
+
+
+def waits(label: str) -> tuple:
+    """
+    Reads the (count, sum) of the pool wait histogram of an engine.
+    """
+    samples = {
+        sample.name: sample.value
+        for metric in DB_POOL_WAIT.collect()
+        for sample in metric.samples
+        if sample.labels.get("engine") == label
+    }
+    return (
+        samples.get("db_pool_wait_seconds_count", 0.0),
+        samples.get("db_pool_wait_seconds_sum", 0.0),
+    )
+
+
+class TestPoolSettings:
+    """
+    Test engines are sized from settings and time their checkouts
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_pool_is_sized_from_settings(self, tmp_path, monkeypatch):
+        """
+        Tests pool size, overflow and timeout come from settings, and survive
+        the pool being recreated by dispose()
+        """
+        monkeypatch.setattr(settings, "db_pool_size", 3)
+        monkeypatch.setattr(settings, "db_max_overflow", 2)
+        monkeypatch.setattr(settings, "db_pool_timeout", 7)
+        engine = build_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'sized.db'}", "pool-sized"
+        )
+
+        for _ in range(2):
+            assert engine.pool.size() == 3
+            assert engine.pool.timeout() == 7
+            assert engine.pool.metrics_label == "pool-sized"
+            await engine.dispose()
+        # connections are recycled after 5 hours unless DB_POOL_RECYCLE says so
+        assert Settings.model_fields["db_pool_recycle"].default == 18000
+
+    @pytest.mark.asyncio
+    async def test_b_checkout_waits_are_timed(self, tmp_path, monkeypatch):
+        """
+        Tests a checkout queued behind an exhausted pool is recorded with
+        the time it waited
+        """
+        monkeypatch.setattr(settings, "db_pool_size", 1)
+        monkeypatch.setattr(settings, "db_max_overflow", 0)
+        monkeypatch.setattr(settings, "db_pool_timeout", 1)
+        engine = build_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'timed.db'}", "pool-timed"
+        )
+        count_before, sum_before = waits("pool-timed")
+
+        async with engine.connect() as conn:
+            await conn.execute(sa.text("SELECT 1"))
+            with pytest.raises(sa.exc.TimeoutError):
+                async with engine.connect():
+                    pass
+
+        count, total = waits("pool-timed")
+        assert count == count_before + 2
+        assert total - sum_before >= 1.0
+        await engine.dispose()
+
+    def test_c_pgbouncer_mode_disables_statement_caches(self, monkeypatch):
+        """
+        Tests transaction pooling turns both asyncpg statement caches off
+        """
+        monkeypatch.setattr(settings, "db_statement_cache_size", 250)
+        assert asyncpg_connect_args()["statement_cache_size"] == 250
+
+        monkeypatch.setattr(settings, "db_pgbouncer_transaction_mode", True)
+        connect_args = asyncpg_connect_args()
+        assert connect_args["statement_cache_size"] == 0
+        assert connect_args["prepared_statement_cache_size"] == 0
+        assert (
+            connect_args["prepared_statement_name_func"]()
+            != connect_args["prepared_statement_name_func"]()
+        )
@@ -0,0 +1,141 @@
+"""
+Test prebuilt statements module
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.direct_conversation import DirectConversation
+from app.models.direct_message import DirectMessage
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.repository.v1 import direct_message_repository as message_module
+from app.repository.v1.direct_conv_repository import direct_conversation_repository
+from app.repository.v1.direct_message_repository import direct_message_repository
+from app.repository.v1 import room_repository as room_module
+from app.repository.v1.room_member_repository import room_member_repository
+from app.repository.v1.room_repository import room_repository
+
+
+class TestPrebuiltStatements:
+    """
+    Test hot repository queries run prebuilt statements with bound parameters
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_prebuilt_fetches_bind_their_parameters(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests message, conversation and membership lookups find the right rows
+        """
+        sender = await create_user(test_get_session, "prebuiltsender")
+        recipient = await create_user(test_get_session, "prebuiltrecipient")
+        conversation = DirectConversation(
+            sender_id=sender.id, recipient_id=recipient.id
+        )
+        message = DirectMessage(
+            sender_id=sender.id,
+            recipient_id=recipient.id,
+            direct_conversation=conversation,
+            content="prebuilt",
+        )
+        room = Room(owner_id=sender.id, name="prebuilt room")
+        test_get_session.add_all([conversation, message, room])
+        await test_get_session.flush()
+        test_get_session.add(RoomMember(room_id=room.id, member_id=sender.id))
+        await test_get_session.commit()
+
+        assert (
+            await direct_message_repository.fetch(
+                session=test_get_session,
+                message_id=message.id,
+                conversation_id=conversation.id,
+            )
+        ) is message
+        assert (
+            await direct_message_repository.fetch(
+                session=test_get_session,
+                message_id=message.id,
+                conversation_id=str(uuid.uuid4()),
+            )
+        ) is None
+        assert (
+            await direct_message_repository.fetch(
+                session=test_get_session, message_id=message.id, attributes=["id"]
+            )
+        ) == message.id
+
+        for first, second in [(sender, recipient), (recipient, sender)]:
+            assert (
+                await direct_conversation_repository.find_by_users(
+                    sender_id=first.id,
+                    recipient_id=second.id,
+                    session=test_get_session,
+                )
+            ) is conversation
+
+        member = await room_member_repository.fetch(
+            member_id=sender.id,
+            session=test_get_session,
+            room_id=room.id,
+            attributes=["left_room", "is_admin"],
+        )
+        assert member == {"left_room": False, "is_admin": False}
+        assert (
+            await room_member_repository.fetch(
+                member_id=recipient.id, session=test_get_session, room_id=room.id
+            )
+        ) is None
+
+        assert await room_repository.fetch(
+            room_id=room.id, session=test_get_session, attributes=["name"]
+        ) == {"name": "prebuilt room"}
+        assert (
+            await room_repository.fetch(room_id=room.id, session=test_get_session)
+        ).id == room.id
+
+        second_message = DirectMessage(
+            sender_id=recipient.id,
+            recipient_id=sender.id,
+            direct_conversation=conversation,
+            content="prebuilt reply",
+            is_deleted_for_recipient=True,
+            created_at=datetime.now(timezone.utc) + timedelta(minutes=1),
+        )
+        test_get_session.add(second_message)
+        await test_get_session.commit()
+        for user, limit, expected in [
+            (sender, None, [message]),
+            (recipient, 1, [second_message]),
+            (recipient, None, [second_message, message]),
+        ]:
+            messages, count = await direct_message_repository.fetch_all(
+                conversation_id=conversation.id,
+                user_id=user.id,
+                offset=0,
+                order="desc",
+                session=test_get_session,
+                limit=limit,
+            )
+            assert [row.id for row in messages] == [row.id for row in expected]
+            assert count == (1 if user is sender else 2)
+
+    def test_b_statements_are_built_once(self):
+        """
+        Tests the same statement object is reused for the same shape
+        """
+        assert message_module.fetch_statement(
+            ("id",), False
+        ) is message_module.fetch_statement(("id",), False)
+        assert message_module.fetch_statement(("nothing",), False) is None
+        assert message_module.fetch_all_statements(
+            (), "desc", True
+        ) is message_module.fetch_all_statements((), "desc", True)
+        assert room_module.fetch_statement(("name",)) is room_module.fetch_statement(
+            ("name",)
+        )
+        assert room_module.fetch_statement(("nothing",)) is None
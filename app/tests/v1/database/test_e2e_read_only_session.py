@@ -0,0 +1,159 @@
+"""
+Test read-only session module
+"""
+
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database.session import ReadOnlyAsyncSession
+from app.models.user import User
+
+
+class TestReadOnlySession:
+    """
+    Test sessions hold pooled connections for their unit of work only
+    """
+
+    @staticmethod
+    def track_checkouts(engine) -> dict:
+        """
+        Counts connections currently checked out of the engine pool.
+        """
+        checked_out = {"count": 0}
+
+        def on_checkout(*args):
+            checked_out["count"] += 1
+
+        def on_checkin(*args):
+            checked_out["count"] -= 1
+
+        event.listen(engine, "checkout", on_checkout)
+        event.listen(engine, "checkin", on_checkin)
+        checked_out["remove"] = lambda: (
+            event.remove(engine, "checkout", on_checkout),
+            event.remove(engine, "checkin", on_checkin),
+        )
+        return checked_out
+
+    @pytest.mark.asyncio
+    async def test_a_read_only_session_holds_one_connection_until_closed(
+        self, test_setup: None, test_get_session: AsyncSession
+    ):
+        """
+        Tests every read of a session runs on the same connection, back in
+        the pool once the session closes
+        """
+        read_only_factory = async_sessionmaker(
+            bind=test_get_session.bind,
+            class_=ReadOnlyAsyncSession,
+            expire_on_commit=False,
+        )
+        checked_out = self.track_checkouts(test_get_session.bind.sync_engine)
+        try:
+            async with read_only_factory() as session:
+                result = await session.execute(sa.select(User.id).limit(1))
+                assert isinstance(result.all(), list)
+                connection = await session.connection()
+
+                await session.scalar(sa.select(sa.func.count(User.id)))
+                assert await session.connection() is connection
+                assert checked_out["count"] == 1
+            assert checked_out["count"] == 0
+        finally:
+            checked_out["remove"]()
+
+    @pytest.mark.asyncio
+    async def test_b_read_only_session_refuses_writes(
+        self, test_setup: None, test_get_session: AsyncSession
+    ):
+        """
+        Tests read-only sessions can not flush changes
+        """
+        read_only_factory = async_sessionmaker(
+            bind=test_get_session.bind,
+            class_=ReadOnlyAsyncSession,
+            expire_on_commit=False,
+        )
+        async with read_only_factory() as session:
+            session.add(
+                User(
+                    email="readonly@gtest.com",
+                    username="readonly",
+                    idempotency_key=str(uuid.uuid4()),
+                )
+            )
+            with pytest.raises(InvalidRequestError):
+                await session.flush()
+
+    @pytest.mark.asyncio
+    async def test_c_write_session_releases_connection_on_commit(
+        self, test_setup: None, test_get_session: AsyncSession
+    ):
+        """
+        Tests the connection is only held for the unit of work
+        """
+        checked_out = self.track_checkouts(test_get_session.bind.sync_engine)
+        try:
+            assert checked_out["count"] == 0
+            test_get_session.add(
+                User(
+                    email="writer@gtest.com",
+                    username="writer",
+                    idempotency_key=str(uuid.uuid4()),
+                )
+            )
+            await test_get_session.flush()
+            assert checked_out["count"] == 1
+
+            await test_get_session.commit()
+            assert checked_out["count"] == 0
+        finally:
+            checked_out["remove"]()
+
+    @pytest.mark.asyncio
+    async def test_d_reads_after_the_commit_release_their_connection(
+        self, test_setup: None, test_get_session: AsyncSession
+    ):
+        """
+        Tests reads after the unit of work committed hold no connection,
+        while a write after it is held until its own commit
+        """
+        checked_out = self.track_checkouts(test_get_session.bind.sync_engine)
+        try:
+            user = User(
+                email="reader@gtest.com",
+                username="reader",
+                idempotency_key=str(uuid.uuid4()),
+            )
+            test_get_session.add(user)
+            await test_get_session.commit()
+
+            assert (
+                await test_get_session.scalar(
+                    sa.select(User.id).where(User.email == "reader@gtest.com")
+                )
+            ) == user.id
+            assert checked_out["count"] == 0
+            assert not test_get_session.in_transaction()
+
+            # a locking read stays in its transaction
+            await test_get_session.execute(
+                sa.select(User.id).where(User.id == user.id).with_for_update()
+            )
+            assert checked_out["count"] == 1
+            await test_get_session.commit()
+
+            await test_get_session.execute(
+                sa.update(User).where(User.id == user.id).values(first_name="Reader")
+            )
+            await test_get_session.execute(sa.select(User.first_name))
+            assert checked_out["count"] == 1
+            await test_get_session.commit()
+            assert checked_out["count"] == 0
+        finally:
+            checked_out["remove"]()
@@ -0,0 +1,138 @@
+"""
+Test read replica routing module
+"""
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.replica import ReplicaRouter, current_user_var
+from app.database.session import ReadOnlyAsyncSession
+
+
+async def create_instance(path: str, name: str):
+    """
+    Creates an sqlite database standing in for one server.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.execute(sa.text("CREATE TABLE server (name VARCHAR(20))"))
+        await conn.execute(sa.text("INSERT INTO server VALUES (:name)"), {"name": name})
+    return engine
+
+
+async def served_by(router: ReplicaRouter) -> str:
+    """
+    Runs a read through a read-only session routed by `router`.
+    """
+    session_factory = async_sessionmaker(
+        class_=ReadOnlyAsyncSession,
+        expire_on_commit=False,
+        info={"replica_router": router},
+    )
+    async with session_factory() as session:
+        return (await session.execute(sa.text("SELECT name FROM server"))).scalar_one()
+
+
+class TestReplicaRouting:
+    """
+    Test read-only sessions are routed to replicas
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_reads_round_robin_over_replicas(self, tmp_path):
+        """
+        Tests consecutive reads alternate between the replicas
+        """
+        primary = await create_instance(tmp_path / "primary.db", "primary")
+        replica_one = await create_instance(tmp_path / "one.db", "one")
+        replica_two = await create_instance(tmp_path / "two.db", "two")
+        router = ReplicaRouter(primary, [replica_one, replica_two])
+
+        served = [await served_by(router) for _ in range(4)]
+
+        assert served == ["one", "two", "one", "two"]
+        for engine in (primary, replica_one, replica_two):
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_b_unreachable_replica_is_ejected(self, tmp_path):
+        """
+        Tests a read on an unreachable replica is retried on a healthy one
+        and the replica leaves the rotation
+        """
+        primary = await create_instance(tmp_path / "primary.db", "primary")
+        replica_one = await create_instance(tmp_path / "one.db", "one")
+        unreachable = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'two.db'}"
+        )
+        router = ReplicaRouter(primary, [unreachable, replica_one])
+
+        served = [await served_by(router) for _ in range(3)]
+
+        assert served == ["one", "one", "one"]
+        assert router.choose() is replica_one
+        for engine in (primary, replica_one, unreachable):
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_c_recent_writers_read_from_primary(self, tmp_path):
+        """
+        Tests users read their own writes from the primary, then go back
+        to the replicas once the window passes
+        """
+        primary = await create_instance(tmp_path / "primary.db", "primary")
+        replica_one = await create_instance(tmp_path / "one.db", "one")
+        router = ReplicaRouter(primary, [replica_one], read_your_writes_seconds=60)
+        router.mark_write("writer")
+
+        token = current_user_var.set("writer")
+        try:
+            assert await served_by(router) == "primary"
+        finally:
+            current_user_var.reset(token)
+        assert await served_by(router) == "one"
+
+        router.read_your_writes_seconds = 0
+        assert router.choose("writer") is replica_one
+        for engine in (primary, replica_one):
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_d_reads_fall_back_to_primary(self, tmp_path):
+        """
+        Tests the primary serves reads when every replica is ejected
+        """
+        primary = await create_instance(tmp_path / "primary.db", "primary")
+        replica_one = await create_instance(tmp_path / "one.db", "one")
+        router = ReplicaRouter(primary, [replica_one])
+
+        router.eject(replica_one)
+
+        assert await served_by(router) == "primary"
+        for engine in (primary, replica_one):
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_e_reads_of_a_session_stay_on_one_replica(self, tmp_path):
+        """
+        Tests every read of a session is served by the replica its first
+        read went to
+        """
+        primary = await create_instance(tmp_path / "primary.db", "primary")
+        replica_one = await create_instance(tmp_path / "one.db", "one")
+        replica_two = await create_instance(tmp_path / "two.db", "two")
+        router = ReplicaRouter(primary, [replica_one, replica_two])
+        session_factory = async_sessionmaker(
+            class_=ReadOnlyAsyncSession,
+            expire_on_commit=False,
+            info={"replica_router": router},
+        )
+        query = sa.text("SELECT name FROM server")
+
+        async with session_factory() as session:
+            served = [(await session.execute(query)).scalar_one() for _ in range(3)]
+        assert served == ["one", "one", "one"]
+        assert await served_by(router) == "two"
+        for engine in (primary, replica_one, replica_two):
+            await engine.dispose()
@@ -0,0 +1,133 @@
+"""
+Test single-flight read coalescing module
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TieredCache
+from app.cache.single_flight import SingleFlight
+from app.core.metrics import SINGLE_FLIGHT_CALLS
+from app.models.room import Room
+from app.models.room_message import RoomMessage
+from app.repository.v1.room_message_repository import room_message_repository
+
+
+def calls(namespace: str, result: str) -> float:
+    """
+    Reads a single-flight counter.
+    """
+    return SINGLE_FLIGHT_CALLS.labels(namespace=namespace, result=result)._value.get()
+
+
+class TestSingleFlight:
+    """
+    Test identical concurrent reads share one query
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_concurrent_message_pages_share_one_query(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        create_user,
+        record_statements,
+    ):
+        """
+        Tests identical concurrent room message reads run their queries once,
+        and a transaction that wrote messages reads its own
+        """
+        owner = await create_user(test_get_session, "flightowner")
+        room = Room(name="flight room", owner_id=owner.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add(
+            RoomMessage(sender_id=owner.id, room_id=room.id, content="first")
+        )
+        await test_get_session.commit()
+
+        executed = calls("room-messages", "executed")
+        coalesced = calls("room-messages", "coalesced")
+        statements, stop = record_statements(test_get_session)
+        pages = await asyncio.gather(
+            *[
+                room_message_repository.fetch_all(
+                    room_id=room.id, offset=0, order="desc", session=test_get_session
+                )
+                for _ in range(3)
+            ]
+        )
+        stop()
+
+        assert len(statements) == 2
+        assert calls("room-messages", "executed") == executed + 1
+        assert calls("room-messages", "coalesced") == coalesced + 2
+        assert all(page[1] == 1 for page in pages)
+        assert pages[1][0][0] is pages[0][0][0]
+
+        test_get_session.add(
+            RoomMessage(sender_id=owner.id, room_id=room.id, content="second")
+        )
+        await test_get_session.flush()
+        messages, count = await room_message_repository.fetch_all(
+            room_id=room.id, offset=0, order="desc", session=test_get_session
+        )
+        assert count == 2
+        assert calls("room-messages", "executed") == executed + 1
+
+    @pytest.mark.asyncio
+    async def test_b_unreachable_redis_runs_the_read_in_this_worker(self):
+        """
+        Tests coalescing across workers falls back to the worker alone when
+        redis is unreachable
+        """
+        cache = TieredCache(redis_url="redis://127.0.0.1:1/0", remote_single_flight=True)
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return [1, 2]
+
+        results = await asyncio.gather(
+            *[cache.coalesce("flight", loader, namespace="test") for _ in range(3)]
+        )
+        assert results == [[1, 2]] * 3
+        assert len(loads) == 1
+        assert cache.redis() is None
+
+    @pytest.mark.asyncio
+    async def test_c_a_cancelled_leader_leaves_its_joiners_loading(self):
+        """
+        Tests cancelling the caller running a load lets the callers that
+        joined it load again, once, instead of cancelling them
+        """
+        flight = SingleFlight()
+        loads = []
+        started = asyncio.Event()
+
+        async def loader():
+            loads.append(1)
+            started.set()
+            await asyncio.sleep(0.05)
+            return len(loads)
+
+        leader = asyncio.create_task(flight.do("key", loader))
+        await started.wait()
+        joiners = [asyncio.create_task(flight.do("key", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await asyncio.gather(*joiners) == [2, 2, 2]
+        assert leader.cancelled()
+        assert len(loads) == 2
+        assert not flight.in_flight("key")
+
+        joiner = asyncio.create_task(flight.do("key", loader))
+        other = asyncio.create_task(flight.do("key", loader))
+        await asyncio.sleep(0.01)
+        other.cancel()
+        assert await joiner == 3
+        assert other.cancelled()
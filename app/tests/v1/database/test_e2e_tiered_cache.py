@@ -0,0 +1,297 @@
+"""
+Test tiered cache module
+"""
+
+import asyncio
+import time
+from uuid import uuid4
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import MISSING, LocalLRU, Record, TieredCache
+from app.cache import tiered
+from app.cache.serialization import dump
+from app.cache.invalidation import statement_tags
+from app.core.config import settings
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.repository.v1.room_member_repository import room_member_repository
+from app.repository.v1.user_repository import user_repository
+
+
+class TestTieredCache:
+    """
+    Test cached repository reads and their invalidation
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_hit_is_merged_into_the_session_without_a_query(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        create_user,
+        record_statements,
+    ):
+        """
+        Tests a cached user comes back persistent in another session, and
+        its commit drops the entry
+        """
+        user = await create_user(test_get_session, "cacheduser")
+        await test_get_session.commit()
+        await user_repository.fetch_by_id(user_id=user.id, session=test_get_session)
+        test_get_session.expunge_all()
+
+        statements, stop = record_statements(test_get_session)
+        cached = await user_repository.fetch_by_id(
+            user_id=user.id, session=test_get_session
+        )
+        stop()
+        assert statements == []
+        assert cached is not user and cached in test_get_session
+        assert cached.username == "cacheduser"
+
+        cached.first_name = "Renamed"
+        await test_get_session.commit()
+        test_get_session.expunge_all()
+
+        statements, stop = record_statements(test_get_session)
+        fresh = await user_repository.fetch_by_id(
+            user_id=user.id, session=test_get_session
+        )
+        stop()
+        assert len(statements) == 1
+        assert fresh.first_name == "Renamed"
+
+    @pytest.mark.asyncio
+    async def test_b_writes_invalidate_member_lists(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        create_user,
+        record_statements,
+    ):
+        """
+        Tests a new member, a bulk update and an open transaction's own
+        writes are never answered from a stale list
+        """
+        owner = await create_user(test_get_session, "cacheroomowner")
+        member = await create_user(test_get_session, "cacheroommember")
+        room = Room(name="cached room", owner_id=owner.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        await room_member_repository.create(
+            room_id=room.id, member_id=owner.id, is_admin=True, session=test_get_session
+        )
+
+        members = await room_member_repository.fetch_all(
+            session=test_get_session, room_id=room.id
+        )
+        assert [row.member_id for row in members] == [owner.id]
+
+        await room_member_repository.create(
+            room_id=room.id, member_id=member.id, is_admin=False, session=test_get_session
+        )
+        members = await room_member_repository.fetch_all(
+            session=test_get_session, room_id=room.id
+        )
+        assert sorted(row.member_id for row in members) == sorted([owner.id, member.id])
+
+        cached = await room_member_repository.fetch_all(
+            session=test_get_session, room_id=room.id
+        )
+        assert all(isinstance(row, Record) for row in cached)
+
+        await test_get_session.execute(
+            sa.update(User).where(User.id == member.id).values(first_name="Bulk")
+        )
+        renamed = await room_member_repository.fetch_all(
+            session=test_get_session, room_id=room.id
+        )
+        assert "Bulk" in [row.first_name for row in renamed]
+        await test_get_session.commit()
+
+        statements, stop = record_statements(test_get_session)
+        members = await room_member_repository.fetch_all(
+            session=test_get_session, room_id=room.id
+        )
+        stop()
+        assert len(statements) == 1
+        assert "Bulk" in [row["first_name"] for row in members]
+
+        await room_member_repository.update(
+            room_id=room.id,
+            session=test_get_session,
+            member_id=member.id,
+            is_admin=None,
+            left_room=True,
+        )
+        members = await room_member_repository.fetch_all(
+            session=test_get_session, room_id=room.id
+        )
+        assert [row.member_id for row in members] == [owner.id]
+
+    @pytest.mark.asyncio
+    async def test_c_statements_invalidate_the_rows_they_pin(self):
+        """
+        Tests insert, update and delete statements are tagged by the values
+        their parameters and WHERE clause pin, the table tag otherwise
+        """
+        assert statement_tags(
+            sa.update(RoomMember)
+            .where(RoomMember.room_id == "room", RoomMember.member_id == "member")
+            .values(left_room=True),
+            None,
+        ) == {"chat_room_members.room_id:room"}
+        assert statement_tags(
+            sa.delete(RoomMember).where(RoomMember.room_id.in_(["first", "second"])),
+            None,
+        ) == {"chat_room_members.room_id:first", "chat_room_members.room_id:second"}
+        assert statement_tags(
+            sa.insert(RoomMember), [{"room_id": "room", "member_id": "member"}]
+        ) == {"chat_room_members.room_id:room"}
+        assert statement_tags(
+            sa.update(RoomMember).values(room_id="moved"), None
+        ) == {"chat_room_members"}
+        assert statement_tags(
+            sa.update(User).where(User.id == sa.bindparam("user_id")),
+            {"user_id": "user"},
+        ) == {"chat_users:user"}
+        assert statement_tags(
+            sa.update(User).where(User.email == "user@gtest.com"), None
+        ) == {"chat_users"}
+
+    @pytest.mark.asyncio
+    async def test_d_concurrent_misses_share_one_load(self):
+        """
+        Tests concurrent misses run the loader once, and ttls stay in the
+        jitter bounds
+        """
+        cache = TieredCache(redis_url=None, default_ttl=100, jitter=0.1)
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return {"value": 1}
+
+        results = await asyncio.gather(
+            *[cache.get_or_load("key", loader, tags=["tag:1"]) for _ in range(5)]
+        )
+        assert results == [{"value": 1}] * 5
+        assert len(loads) == 1
+        assert await cache.get("key") == {"value": 1}
+
+        await cache.invalidate(["tag:1"])
+        assert await cache.get("key") is MISSING
+        assert all(90 <= cache.jittered() <= 110 for _ in range(100))
+
+    @pytest.mark.asyncio
+    async def test_e_unreachable_redis_leaves_the_local_tier(self):
+        """
+        Tests an unreachable redis is skipped and the local tier still answers
+        """
+        cache = TieredCache(redis_url="redis://127.0.0.1:1/0")
+
+        await cache.set("key", [1, 2], tags=["tag:1"])
+        assert cache.redis() is None
+        assert await cache.get("key") == [1, 2]
+
+        lru = LocalLRU(maxsize=2)
+        lru.set("a", 1, ttl=60, tags=["x"])
+        lru.set("b", 2, ttl=60, tags=["x"])
+        lru.get("a")
+        lru.set("c", 3, ttl=60)
+        assert lru.get("b") is MISSING and lru.get("a") == 1
+        assert lru.invalidate(["x"]) == 1 and len(lru) == 1
+
+    @pytest.mark.asyncio
+    async def test_f_cached_users_carry_no_credentials(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests the password hash and idempotency key stay out of the cache,
+        and a password change after a cached read still checks the old one
+        """
+        user = await create_user(test_get_session, "credentialuser")
+        await test_get_session.commit()
+        await test_get_session.refresh(user)
+
+        attrs = dump(user)["attrs"]
+        assert "password" not in attrs and "idempotency_key" not in attrs
+        assert attrs["username"] == "credentialuser"
+
+        await user_repository.fetch_by_id(user_id=user.id, session=test_get_session)
+        test_get_session.expunge_all()
+        cached = await user_repository.fetch_by_id(
+            user_id=user.id, session=test_get_session
+        )
+        assert {"password", "idempotency_key"} <= sa.inspect(cached).unloaded
+
+        assert not await user_repository.update_password(
+            new_password="Renamed1234#",
+            old_password="Wrong1234#",
+            user_id=user.id,
+            session=test_get_session,
+        )
+        assert await user_repository.update_password(
+            new_password="Renamed1234#",
+            old_password="Johnson1234#",
+            user_id=user.id,
+            session=test_get_session,
+        )
+
+    @pytest.mark.asyncio
+    async def test_g_only_invalidating_its_own_tags_drops_a_load(self):
+        """
+        Tests a load is stored when unrelated tags are invalidated while it
+        runs, and dropped when one of its own is
+        """
+        cache = TieredCache(redis_url=None)
+
+        async def load_while_invalidating(key: str, tag: str) -> None:
+            async def loader():
+                await cache.invalidate([tag])
+                return {"key": key}
+
+            assert await cache.get_or_load(key, loader, tags=["tag:1"]) == {
+                "key": key
+            }
+
+        await load_while_invalidating("kept", "tag:2")
+        assert await cache.get("kept") == {"key": "kept"}
+        await load_while_invalidating("dropped", "tag:1")
+        assert await cache.get("dropped") is MISSING
+        assert cache._tag_generations == {}
+
+    @pytest.mark.asyncio
+    async def test_h_invalidations_redis_missed_are_replayed(self, monkeypatch):
+        """
+        Tests invalidations made while redis is skipped reach it before it is
+        read again, and too many of them drop every entry instead
+        """
+        prefix = f"cache-test-{uuid4()}"
+        cache = TieredCache(prefix=prefix, redis_url=settings.redis_url)
+        other_worker = TieredCache(prefix=prefix, redis_url=settings.redis_url)
+        for key, tag in [("first", "tag:1"), ("second", "tag:2")]:
+            await cache.set(key, key, tags=[tag])
+
+        cache._redis_skipped_until = time.monotonic() + 60
+        await cache.invalidate(["tag:1"])
+        assert await other_worker.get("first") == "first"
+        cache._redis_skipped_until = 0.0
+        assert await cache.get("first") is MISSING
+        other_worker.clear_local()
+        assert await other_worker.get("first") is MISSING
+        assert await other_worker.get("second") == "second"
+
+        monkeypatch.setattr(tiered, "MAX_DEFERRED_TAGS", 1)
+        cache._redis_skipped_until = time.monotonic() + 60
+        await cache.invalidate(["tag:3", "tag:4"])
+        cache._redis_skipped_until = 0.0
+        await cache.invalidate(())
+        other_worker.clear_local()
+        assert await other_worker.get("second") is MISSING
+        assert not await cache.redis().keys(f"{prefix}:*")
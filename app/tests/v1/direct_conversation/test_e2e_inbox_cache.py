@@ -0,0 +1,290 @@
+"""
+Test inbox cache module
+"""
+
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dto.v1.direct_message_dto import SendMessageDto
+from app.models.direct_conversation import DirectConversation
+from app.models.direct_message import DirectMessage
+from app.repository.v1.direct_conv_repository import direct_conversation_repository
+from app.repository.v1.inbox_cache_repository import (
+    inbox_cache_repository,
+    inbox_generation_key,
+    inbox_key,
+    peers_key,
+    preview_key,
+)
+from app.service.v1.direct_conversation_service import direct_conversation_service
+from app.service.v1.direct_message_service import direct_message_service
+
+
+class TestInboxCache:
+    """
+    Test the cached inbox and the conversation delete flags
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_delete_flags_only_the_current_users_side(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests deleting conversations hides them from the current user only
+        """
+        owner = await create_user(test_get_session, "cacheowner")
+        first_peer = await create_user(test_get_session, "cachepeerone")
+        second_peer = await create_user(test_get_session, "cachepeertwo")
+        started = DirectConversation(sender_id=owner.id, recipient_id=first_peer.id)
+        received = DirectConversation(sender_id=second_peer.id, recipient_id=owner.id)
+        test_get_session.add_all([started, received])
+        await test_get_session.commit()
+
+        deleted = await direct_conversation_repository.update(
+            user_id=owner.id,
+            conversation_ids=[started.id, received.id],
+            session=test_get_session,
+        )
+
+        assert sorted(deleted) == sorted([started.id, received.id])
+        assert (
+            await direct_conversation_repository.fetch_inbox_scores(
+                user_id=owner.id, session=test_get_session
+            )
+        ) == []
+        peer_scores = await direct_conversation_repository.fetch_inbox_scores(
+            user_id=first_peer.id, session=test_get_session
+        )
+        assert [conversation_id for conversation_id, _ in peer_scores] == [started.id]
+        assert (
+            await direct_conversation_repository.update(
+                user_id=owner.id,
+                conversation_ids=[started.id],
+                session=test_get_session,
+            )
+        ) == []
+
+    @pytest.mark.asyncio
+    async def test_b_inbox_cache_misses_without_redis(self):
+        """
+        Tests an unreachable redis reads as a miss and drops writes
+        """
+        redis = Redis.from_url(
+            "redis://127.0.0.1:1/0", socket_connect_timeout=0.1, decode_responses=True
+        )
+
+        await inbox_cache_repository.record_message(
+            conversation_id="conversation",
+            participant_ids=["user-a", "user-b"],
+            sent_at=None,
+            content="hello",
+            redis=redis,
+        )
+        assert (
+            await inbox_cache_repository.page(user_id="user-a", limit=20, redis=redis)
+        ) is None
+        assert await inbox_cache_repository.is_cached("user-a", redis) is None
+        await redis.aclose()
+
+
+async def seed_inbox(session: AsyncSession, create_user, prefix: str):
+    """
+    Creates a user with two conversations, the one with the second peer
+    active last.
+    """
+    owner = await create_user(session, f"{prefix}owner")
+    first_peer = await create_user(session, f"{prefix}peerone")
+    second_peer = await create_user(session, f"{prefix}peertwo")
+    sent_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    conversations = []
+    for index, peer in enumerate([first_peer, second_peer]):
+        conversation = DirectConversation(sender_id=owner.id, recipient_id=peer.id)
+        message = DirectMessage(
+            sender_id=peer.id,
+            recipient_id=owner.id,
+            direct_conversation=conversation,
+            content=f"hello from peer {index}",
+            created_at=sent_at + timedelta(minutes=index),
+        )
+        session.add_all([conversation, message])
+        await session.flush()
+        await direct_conversation_repository.set_last_message(
+            conversation_id=conversation.id, message_id=message.id, session=session
+        )
+        conversations.append(conversation)
+    await session.commit()
+    return owner, [first_peer, second_peer], conversations
+
+
+async def forget_inbox(redis: Redis, users, conversations) -> None:
+    """
+    Drops the cache keys seed_inbox and the tests wrote.
+    """
+    await redis.delete(
+        *[
+            key
+            for user in users
+            for key in (
+                inbox_key(user.id),
+                peers_key(user.id),
+                inbox_generation_key(user.id),
+            )
+        ],
+        *[preview_key(conversation.id) for conversation in conversations],
+    )
+
+
+class TestInboxCacheRedis:
+    """
+    Test the inbox served from a live redis against the database
+    """
+
+    @staticmethod
+    async def inbox(session: AsyncSession, user_id: str, as_user, redis: Redis):
+        return (
+            await direct_conversation_service.fetch_direct_conversations(
+                request=as_user(user_id),
+                session=session,
+                page=1,
+                limit=10,
+                redis=redis,
+            )
+        ).model_dump()
+
+    @staticmethod
+    async def uncached_inbox(session: AsyncSession, user_id: str, as_user):
+        """
+        The first page read from the database, redis being unreachable.
+        """
+        redis = Redis.from_url(
+            "redis://127.0.0.1:1/0", socket_connect_timeout=0.1, decode_responses=True
+        )
+        try:
+            return await TestInboxCacheRedis.inbox(session, user_id, as_user, redis)
+        finally:
+            await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_a_hit_is_hydrated_as_the_database_page(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        as_user,
+        record_statements,
+    ):
+        """
+        Tests the page after a miss is served from redis without a query,
+        the same as the database serves it
+        """
+        redis = test_get_redis_client
+        owner, peers, conversations = await seed_inbox(
+            test_get_session, create_user, "inboxhit"
+        )
+        expected = await self.uncached_inbox(test_get_session, owner.id, as_user)
+        assert [row["conversation_id"] for row in expected["data"]] == [
+            conversations[1].id,
+            conversations[0].id,
+        ]
+
+        missed = await self.inbox(test_get_session, owner.id, as_user, redis)
+        assert await inbox_cache_repository.is_cached(owner.id, redis)
+        statements, stop = record_statements(test_get_session)
+        hit = await self.inbox(test_get_session, owner.id, as_user, redis)
+        stop()
+
+        assert statements == []
+        assert missed == expected
+        assert hit == expected
+        await forget_inbox(redis, [owner, *peers], conversations)
+
+    @pytest.mark.asyncio
+    async def test_b_a_write_since_the_miss_drops_the_fill(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        as_user,
+    ):
+        """
+        Tests a fill only lands when the inbox generation read before the
+        rows is unchanged
+        """
+        redis = test_get_redis_client
+        owner, peers, conversations = await seed_inbox(
+            test_get_session, create_user, "inboxfill"
+        )
+        rows, _ = (
+            await direct_conversation_repository.get_conversation_with_last_message_count(
+                user_id=owner.id, page=1, limit=10, session=test_get_session
+            )
+        )
+
+        async def fill(generation):
+            await direct_conversation_service.cache_inbox(
+                user_id=owner.id,
+                conversations=rows,
+                generation=generation,
+                session=test_get_session,
+                redis=redis,
+            )
+
+        generation = await inbox_cache_repository.generation(owner.id, redis)
+        # a message sent between the miss and the fill finds no inbox to move
+        await inbox_cache_repository.record_message(
+            conversation_id=conversations[0].id,
+            participant_ids=[owner.id, peers[0].id],
+            sent_at=datetime.now(timezone.utc),
+            content="raced the fill",
+            redis=redis,
+        )
+        await fill(generation)
+        assert await inbox_cache_repository.is_cached(owner.id, redis) is False
+        assert await redis.exists(peers_key(owner.id)) == 0
+
+        await fill(await inbox_cache_repository.generation(owner.id, redis))
+        assert await inbox_cache_repository.is_cached(owner.id, redis)
+        await forget_inbox(redis, [owner, *peers], conversations)
+
+    @pytest.mark.asyncio
+    async def test_c_a_new_message_reorders_the_cached_inbox(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        as_user,
+    ):
+        """
+        Tests a message in the older conversation moves it to the top of the
+        cached inbox, in the order and with the preview the database gives
+        """
+        redis = test_get_redis_client
+        owner, peers, conversations = await seed_inbox(
+            test_get_session, create_user, "inboxorder"
+        )
+        await self.inbox(test_get_session, owner.id, as_user, redis)
+
+        await direct_message_service.send_message(
+            schema=SendMessageDto(message="back to you", recipient_id=owner.id),
+            session=test_get_session,
+            request=as_user(peers[0].id),
+            redis=redis,
+        )
+
+        assert await inbox_cache_repository.is_cached(owner.id, redis)
+        cached = await self.inbox(test_get_session, owner.id, as_user, redis)
+        expected = await self.uncached_inbox(test_get_session, owner.id, as_user)
+        assert [row["conversation_id"] for row in cached["data"]] == [
+            conversations[0].id,
+            conversations[1].id,
+        ]
+        assert cached["data"][0]["last_message"] == "back to you"
+        assert cached == expected
+        await forget_inbox(redis, [owner, *peers], conversations)
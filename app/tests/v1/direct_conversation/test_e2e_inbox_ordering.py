@@ -0,0 +1,188 @@
+"""
+Test inbox ordering module
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.direct_conversation import DirectConversation
+from app.models.direct_message import DirectMessage
+from app.models.user import User
+from app.repository.v1.direct_conv_repository import direct_conversation_repository
+
+
+async def send(
+    session: AsyncSession,
+    conversation: DirectConversation,
+    sender: User,
+    recipient: User,
+    content: str,
+    sent_at: datetime,
+) -> DirectMessage:
+    """
+    Inserts a message and points its conversation at it, as send_message does.
+    """
+    message = DirectMessage(
+        sender_id=sender.id,
+        recipient_id=recipient.id,
+        conversation_id=conversation.id,
+        content=content,
+        created_at=sent_at,
+    )
+    session.add(message)
+    await session.flush()
+    await direct_conversation_repository.set_last_message(
+        conversation_id=conversation.id, message_id=message.id, session=session
+    )
+    await session.commit()
+    return message
+
+
+class TestInboxOrdering:
+    """
+    Test the inbox is ordered by each conversation's last message
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_inbox_orders_by_last_message(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests conversations started from either side are ordered by their
+        newest message, with its content as the preview
+        """
+        owner = await create_user(test_get_session, "inboxowner")
+        first_peer = await create_user(test_get_session, "inboxpeerone")
+        second_peer = await create_user(test_get_session, "inboxpeertwo")
+        started = DirectConversation(sender_id=owner.id, recipient_id=first_peer.id)
+        received = DirectConversation(
+            sender_id=second_peer.id, recipient_id=owner.id
+        )
+        test_get_session.add_all([started, received])
+        await test_get_session.commit()
+
+        now = datetime.now(timezone.utc)
+        await send(
+            test_get_session, started, owner, first_peer, "hi", now - timedelta(minutes=3)
+        )
+        await send(
+            test_get_session, received, second_peer, owner, "hey", now - timedelta(minutes=2)
+        )
+        await send(
+            test_get_session, started, first_peer, owner, "latest", now - timedelta(minutes=1)
+        )
+
+        conversations, count = (
+            await direct_conversation_repository.get_conversation_with_last_message_count(
+                user_id=owner.id, page=1, limit=10, session=test_get_session
+            )
+        )
+
+        assert count == 2
+        assert [row["conversation_id"] for row in conversations] == [
+            started.id,
+            received.id,
+        ]
+        assert [row["user_id"] for row in conversations] == [
+            first_peer.id,
+            second_peer.id,
+        ]
+        assert [row["last_message"] for row in conversations] == ["latest", "hey"]
+
+        second_page, _ = (
+            await direct_conversation_repository.get_conversation_with_last_message_count(
+                user_id=owner.id, page=2, limit=1, session=test_get_session
+            )
+        )
+        assert [row["conversation_id"] for row in second_page] == [received.id]
+
+    @pytest.mark.asyncio
+    async def test_b_older_message_does_not_move_last_message_back(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests a message older than the current last message leaves it in place
+        """
+        sender = await create_user(test_get_session, "inboxsender")
+        recipient = await create_user(test_get_session, "inboxrecipient")
+        conversation = DirectConversation(sender_id=sender.id, recipient_id=recipient.id)
+        test_get_session.add(conversation)
+        await test_get_session.commit()
+
+        now = datetime.now(timezone.utc)
+        newest = await send(
+            test_get_session, conversation, sender, recipient, "newest", now
+        )
+        await send(
+            test_get_session,
+            conversation,
+            recipient,
+            sender,
+            "late commit",
+            now - timedelta(minutes=1),
+        )
+
+        await test_get_session.refresh(conversation)
+        assert conversation.last_message_id == newest.id
+
+    @pytest.mark.asyncio
+    async def test_c_database_and_cache_order_agree(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests a conversation without messages sits where its start time puts
+        it, in the database page as in the cache scores
+        """
+        owner = await create_user(test_get_session, "inboxscoreowner")
+        peers = [
+            await create_user(test_get_session, f"inboxscorepeer{index}")
+            for index in range(3)
+        ]
+        now = datetime.now(timezone.utc)
+        conversations = [
+            DirectConversation(
+                sender_id=owner.id,
+                recipient_id=peer.id,
+                created_at=now - timedelta(minutes=10 - index),
+            )
+            for index, peer in enumerate(peers)
+        ]
+        test_get_session.add_all(conversations)
+        await test_get_session.commit()
+        await send(
+            test_get_session,
+            conversations[0],
+            owner,
+            peers[0],
+            "oldest start, newest message",
+            now - timedelta(minutes=1),
+        )
+        await send(
+            test_get_session,
+            conversations[2],
+            owner,
+            peers[2],
+            "before the empty one started",
+            now - timedelta(minutes=20),
+        )
+
+        page, _ = (
+            await direct_conversation_repository.get_conversation_with_last_message_count(
+                user_id=owner.id, page=1, limit=10, session=test_get_session
+            )
+        )
+        scores = await direct_conversation_repository.fetch_inbox_scores(
+            user_id=owner.id, session=test_get_session
+        )
+
+        expected = [conversations[0].id, conversations[1].id, conversations[2].id]
+        assert [row["conversation_id"] for row in page] == expected
+        assert [
+            conversation_id
+            for conversation_id, _ in sorted(
+                scores, key=lambda score: (score[1], score[0]), reverse=True
+            )
+        ] == expected
+
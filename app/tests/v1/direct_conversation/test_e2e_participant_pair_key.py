@@ -0,0 +1,139 @@
+"""
+Test participant pair key module
+"""
+
+
+import pytest
+from redis.asyncio import Redis
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dto.v1.direct_message_dto import SendMessageDto
+from app.models.direct_conversation import DirectConversation, participant_pair_key
+from app.repository.v1.direct_conv_repository import direct_conversation_repository
+from app.repository.v1.inbox_cache_repository import (
+    conversation_pair_key,
+    inbox_cache_repository,
+)
+from app.service.v1.direct_message_service import direct_message_service
+
+
+class TestParticipantPairKey:
+    """
+    Test direct conversations are resolved by their canonical participant pair
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_pair_key_resolves_either_direction(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests the key is filled on insert and finds the conversation
+        whichever participant looks it up
+        """
+        sender = await create_user(test_get_session, "pairsender")
+        recipient = await create_user(test_get_session, "pairrecipient")
+        conversation = await direct_conversation_repository.create(
+            sender_id=sender.id, recipient_id=recipient.id, session=test_get_session
+        )
+        test_get_session.add(conversation)
+        await test_get_session.commit()
+
+        assert conversation.participant_pair_key == participant_pair_key(
+            recipient.id, sender.id
+        )
+        for first, second in [(sender, recipient), (recipient, sender)]:
+            assert (
+                await direct_conversation_repository.find_by_users(
+                    sender_id=first.id,
+                    recipient_id=second.id,
+                    session=test_get_session,
+                    conversation_id=conversation.id,
+                )
+            ) is conversation
+
+    @pytest.mark.asyncio
+    async def test_b_reversed_pair_is_rejected(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests a second conversation started from the other side violates
+        the unique pair key
+        """
+        sender = await create_user(test_get_session, "pairsender2")
+        recipient = await create_user(test_get_session, "pairrecipient2")
+        test_get_session.add(
+            DirectConversation(sender_id=sender.id, recipient_id=recipient.id)
+        )
+        await test_get_session.commit()
+
+        test_get_session.add(
+            DirectConversation(sender_id=recipient.id, recipient_id=sender.id)
+        )
+        with pytest.raises(IntegrityError):
+            await test_get_session.commit()
+        await test_get_session.rollback()
+
+    @pytest.mark.asyncio
+    async def test_c_pair_cache_degrades_without_redis(self):
+        """
+        Tests an unreachable redis is a cache miss, not an error
+        """
+        redis = Redis.from_url(
+            "redis://127.0.0.1:1/0", socket_connect_timeout=0.1, decode_responses=True
+        )
+        pair_key = participant_pair_key("user-a", "user-b")
+
+        await inbox_cache_repository.store_conversation_id(
+            pair_key=pair_key, conversation_id="conversation", redis=redis
+        )
+        assert (
+            await inbox_cache_repository.conversation_id(pair_key=pair_key, redis=redis)
+        ) is None
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_d_message_restores_a_conversation_found_in_the_pair_cache(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        as_user,
+    ):
+        """
+        Tests a message sent through a cached pair key brings back a
+        conversation the recipient deleted
+        """
+        sender = await create_user(test_get_session, "pairsender3")
+        recipient = await create_user(test_get_session, "pairrecipient3")
+        conversation = DirectConversation(sender_id=sender.id, recipient_id=recipient.id)
+        test_get_session.add(conversation)
+        await test_get_session.commit()
+        pair_key = participant_pair_key(sender.id, recipient.id)
+        await inbox_cache_repository.store_conversation_id(
+            pair_key=pair_key,
+            conversation_id=conversation.id,
+            redis=test_get_redis_client,
+        )
+        await direct_conversation_repository.update(
+            user_id=recipient.id,
+            conversation_ids=[conversation.id],
+            session=test_get_session,
+        )
+
+        await direct_message_service.send_message(
+            schema=SendMessageDto(message="still there?", recipient_id=recipient.id),
+            session=test_get_session,
+            request=as_user(sender.id),
+            redis=test_get_redis_client,
+        )
+
+        await test_get_session.refresh(conversation)
+        assert not conversation.is_deleted_for_recipient
+        assert not conversation.is_deleted_for_sender
+        scores = await direct_conversation_repository.fetch_inbox_scores(
+            user_id=recipient.id, session=test_get_session
+        )
+        assert [conversation_id for conversation_id, _ in scores] == [conversation.id]
+        await test_get_redis_client.delete(conversation_pair_key(pair_key))
@@ -0,0 +1,166 @@
+"""
+Test message history cache module
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import MESSAGE_HISTORY_CACHE_REQUESTS
+from app.dto.v1.direct_message_dto import MessageBaseDto
+from app.models.direct_conversation import DirectConversation
+from app.models.direct_message import DirectMessage
+from app.repository.v1.direct_message_repository import direct_message_repository
+from app.repository.v1.message_history_cache_repository import (
+    DIRECT,
+    DIRECT_MESSAGE_FIELDS,
+    FILL_HISTORY,
+    PUSH_MESSAGE,
+    generation_key,
+    is_visible,
+    message_history_cache_repository,
+    serialize,
+)
+
+
+class RecordingRedis:
+    """
+    Records the scripts run against it.
+    """
+
+    def __init__(self):
+        self.calls: list = []
+
+    def register_script(self, script: str):
+        async def run(keys: list, args: list):
+            self.calls.append((script, keys, args))
+
+        return run
+
+
+class TestMessageHistoryCache:
+    """
+    Test the first page of history and its cache entries
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_recent_messages_fill_the_cache_with_flags(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests the cache is filled with the newest messages, deleted ones
+        included, and each viewer only sees their own visible ones
+        """
+        sender = await create_user(test_get_session, "historysender")
+        recipient = await create_user(test_get_session, "historyrecipient")
+        conversation = DirectConversation(sender_id=sender.id, recipient_id=recipient.id)
+        now = datetime.now(timezone.utc)
+        messages = [
+            DirectMessage(
+                sender_id=sender.id,
+                recipient_id=recipient.id,
+                direct_conversation=conversation,
+                content=f"message {index}",
+                created_at=now - timedelta(minutes=10 - index),
+                is_deleted_for_sender=index == 2,
+            )
+            for index in range(3)
+        ]
+        test_get_session.add_all([conversation, *messages])
+        await test_get_session.commit()
+
+        page, count = await direct_message_repository.fetch_all(
+            conversation_id=conversation.id,
+            user_id=sender.id,
+            offset=0,
+            order="desc",
+            session=test_get_session,
+            limit=1,
+        )
+        assert [message.content for message in page] == ["message 1"]
+        assert count == 2
+
+        recent = await direct_message_repository.fetch_recent(
+            conversation_id=conversation.id, limit=10, session=test_get_session
+        )
+        entries = [
+            json.loads(serialize(message, DIRECT_MESSAGE_FIELDS)) for message in recent
+        ]
+        assert [entry["content"] for entry in entries] == [
+            "message 2",
+            "message 1",
+            "message 0",
+        ]
+        assert [is_visible(DIRECT, entry, sender.id) for entry in entries] == [
+            False,
+            True,
+            True,
+        ]
+        assert all(is_visible(DIRECT, entry, recipient.id) for entry in entries)
+        assert MessageBaseDto.model_validate(entries[0]).id == messages[2].id
+
+    @pytest.mark.asyncio
+    async def test_b_unreachable_redis_counts_a_miss(self):
+        """
+        Tests an unreachable redis reads as a miss and is counted
+        """
+        redis = Redis.from_url(
+            "redis://127.0.0.1:1/0", socket_connect_timeout=0.1, decode_responses=True
+        )
+        misses = MESSAGE_HISTORY_CACHE_REQUESTS.labels(kind=DIRECT, result="miss")
+        misses_before = misses._value.get()
+
+        assert (
+            await message_history_cache_repository.page(
+                kind=DIRECT,
+                scope_id="conversation",
+                viewer_id="user",
+                limit=20,
+                redis=redis,
+            )
+        ) is None
+        assert misses._value.get() == misses_before + 1
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_c_fill_is_guarded_by_the_write_generation(self):
+        """
+        Tests a push bumps the generation a fill checks, and a fill without
+        a generation is skipped
+        """
+        redis = RecordingRedis()
+        await message_history_cache_repository.push(
+            kind=DIRECT,
+            scope_id="conversation",
+            entry="{}",
+            viewer_ids=["user"],
+            redis=redis,  # type: ignore
+        )
+        await message_history_cache_repository.fill(
+            kind=DIRECT,
+            scope_id="conversation",
+            viewer_id="user",
+            entries=["{}"],
+            count=1,
+            generation="3",
+            redis=redis,  # type: ignore
+        )
+        await message_history_cache_repository.fill(
+            kind=DIRECT,
+            scope_id="conversation",
+            viewer_id="user",
+            entries=["{}"],
+            count=1,
+            generation=None,
+            redis=redis,  # type: ignore
+        )
+
+        (push_script, push_keys, _), (fill_script, fill_keys, fill_args) = redis.calls
+        assert push_script == PUSH_MESSAGE and fill_script == FILL_HISTORY
+        assert generation_key(DIRECT, "conversation") in push_keys
+        assert fill_keys[2] == generation_key(DIRECT, "conversation")
+        assert fill_args[0] == "3"
+        assert "INCR" in PUSH_MESSAGE and "GET" in FILL_HISTORY
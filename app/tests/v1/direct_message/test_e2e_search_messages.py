@@ -0,0 +1,177 @@
+"""
+Test direct message search module
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+import sqlalchemy as sa
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.direct_conversation import DirectConversation
+from app.models.direct_message import DirectMessage
+from app.service.v1.direct_message_service import direct_message_service
+
+
+class TestSearchMessages:
+    """
+    Test full-text search over direct messages
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_visible_matches_page_best_first(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests only the messages the user can see are found, best matches
+        first, paged through the cursor, and edits are searchable at once
+        """
+        sender = await create_user(test_get_session, "searchsender")
+        recipient = await create_user(test_get_session, "searchrecipient")
+        stranger = await create_user(test_get_session, "searchstranger")
+        conversation = DirectConversation(sender_id=sender.id, recipient_id=recipient.id)
+        other_conversation = DirectConversation(
+            sender_id=stranger.id, recipient_id=recipient.id
+        )
+        sent_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        contents = [
+            "Lunch plans: pizza pizza pizza",
+            "is pizza on the menu for the team lunch tomorrow or something else",
+            "pizza deleted for the sender",
+            "no match in here",
+            "pizza for the recipient only",
+        ]
+        messages = [
+            DirectMessage(
+                sender_id=sender.id,
+                recipient_id=recipient.id,
+                direct_conversation=conversation,
+                content=content,
+                created_at=sent_at + timedelta(minutes=index),
+                is_deleted_for_sender=index == 2,
+            )
+            for index, content in enumerate(contents)
+        ]
+        messages.append(
+            DirectMessage(
+                sender_id=stranger.id,
+                recipient_id=recipient.id,
+                direct_conversation=other_conversation,
+                content="pizza with a stranger",
+                created_at=sent_at,
+            )
+        )
+        test_get_session.add_all([conversation, other_conversation, *messages])
+        await test_get_session.commit()
+
+        found = []
+        cursor = None
+        while True:
+            page = await direct_message_service.search_messages(
+                request=as_user(sender.id),
+                session=test_get_session,
+                q="Pizza!",
+                limit=1,
+                cursor=cursor,
+            )
+            found.extend(page.data)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert [message.id for message in found][0] == messages[0].id
+        assert {message.id for message in found} == {
+            messages[0].id,
+            messages[1].id,
+            messages[4].id,
+        }
+        assert [message.rank for message in found] == sorted(
+            (message.rank for message in found), reverse=True
+        )
+
+        received = await direct_message_service.search_messages(
+            request=as_user(recipient.id),
+            session=test_get_session,
+            q="pizza",
+            conversation_id=conversation.id,
+        )
+        assert {message.id for message in received.data} == {
+            messages[index].id for index in [0, 1, 2, 4]
+        }
+        both_words = await direct_message_service.search_messages(
+            request=as_user(recipient.id), session=test_get_session, q="lunch pizza"
+        )
+        assert {message.id for message in both_words.data} == {
+            messages[0].id,
+            messages[1].id,
+        }
+
+        await test_get_session.execute(
+            sa.update(DirectMessage)
+            .where(DirectMessage.id == messages[3].id)
+            .values(content="now about pizza")
+        )
+        await test_get_session.execute(
+            sa.update(DirectMessage)
+            .where(DirectMessage.id == messages[4].id)
+            .values(content="now about pasta")
+        )
+        await test_get_session.commit()
+        edited = await direct_message_service.search_messages(
+            request=as_user(sender.id), session=test_get_session, q="pizza"
+        )
+        assert {message.id for message in edited.data} == {
+            messages[0].id,
+            messages[1].id,
+            messages[3].id,
+        }
+
+        for q, cursor in [("?!", None), ("pizza", "not-a-cursor")]:
+            with pytest.raises(HTTPException) as exc:
+                await direct_message_service.search_messages(
+                    request=as_user(sender.id),
+                    session=test_get_session,
+                    q=q,
+                    cursor=cursor,
+                )
+            assert exc.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_b_search_route(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        create_user,
+        login,
+    ):
+        """
+        Tests the search route finds the authenticated user's messages, and
+        validates the searched text
+        """
+        sender = await create_user(test_get_session, "httpsearchsender")
+        recipient = await create_user(test_get_session, "httpsearchrecipient")
+        conversation = DirectConversation(sender_id=sender.id, recipient_id=recipient.id)
+        message = DirectMessage(
+            sender_id=sender.id,
+            recipient_id=recipient.id,
+            direct_conversation=conversation,
+            content="kiwi smoothie on friday",
+        )
+        test_get_session.add_all([conversation, message])
+        await test_get_session.commit()
+        url = "/api/v1/direct-messages/search"
+
+        response = await client.get(
+            url=url, params={"q": "Kiwi"}, headers=await login(recipient)
+        )
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()["data"]] == [message.id]
+
+        response = await client.get(
+            url=url, params={"q": ""}, headers=await login(sender)
+        )
+        assert response.status_code == 422
+        response = await client.get(url=url, params={"q": "kiwi"})
+        assert response.status_code == 401
@@ -0,0 +1,42 @@
+"""
+Test metrics module
+"""
+
+import pytest
+from httpx import AsyncClient
+
+
+class TestMetrics:
+    """
+    Test metrics route
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_metrics_include_request_latency_by_route_template(
+        self, test_setup: None, client: AsyncClient
+    ):
+        """
+        Tests request latency is exposed per route template
+        """
+        response = await client.post(
+            url="/api/v1/auth/login",
+            json={
+                "username": "nobodyhere",
+                "password": "Johnson1234#",
+                "session_id": "00osqwosdd0asw-pll0-0000-0000-00asq001",
+            },
+        )
+        assert response.status_code == 401
+
+        response = await client.get(url="/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert (
+            'http_request_duration_seconds_count{method="POST",'
+            'route="/api/v1/auth/login",status_code="401"}'
+        ) in body
+        assert "websocket_active_connections" in body
+        assert "db_pool_checked_out_connections" in body
+        assert "celery_task_queue_latency_seconds" in body
@@ -0,0 +1,65 @@
+"""
+Test query stats module
+"""
+
+import pytest
+import sqlalchemy as sa
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.query_stats import QueryStats, query_stats_var, redact_parameters
+
+
+class TestQueryStats:
+    """
+    Test per request query stats
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_statements_are_recorded_on_the_current_stats(
+        self, test_setup: None, test_get_session: AsyncSession
+    ):
+        """
+        Tests executed statements are recorded on the stats in the contextvar
+        """
+        stats = QueryStats()
+        token = query_stats_var.set(stats)
+        try:
+            await test_get_session.execute(sa.text("SELECT 1"))
+            await test_get_session.execute(sa.text("SELECT 2"))
+        finally:
+            query_stats_var.reset(token)
+
+        assert stats.count == 2
+        assert stats.total_ms >= stats.slowest_ms > 0
+        assert stats.slowest_statement in ["SELECT 1", "SELECT 2"]
+
+    @pytest.mark.asyncio
+    async def test_b_response_has_server_timing_header(
+        self, test_setup: None, client: AsyncClient
+    ):
+        """
+        Tests responses carry the statements issued in a Server-Timing header
+        """
+        response = await client.post(
+            url="/api/v1/auth/login",
+            json={
+                "username": "nobodyhere",
+                "password": "Johnson1234#",
+                "session_id": "00osqwosdd0asw-pll0-0000-0000-00asq001",
+            },
+        )
+
+        assert response.status_code == 401
+        server_timing = response.headers["Server-Timing"]
+        assert 'desc="1 queries"' in server_timing
+        assert "db-slowest;dur=" in server_timing
+        assert "app;dur=" in server_timing
+
+    def test_c_parameters_are_redacted(self):
+        """
+        Tests bound parameter values never reach the logs
+        """
+        assert redact_parameters({"email": "a@b.com"}, False) == {"email": "***"}
+        assert redact_parameters(("secret", 1), False) == ["***", "***"]
+        assert redact_parameters([("a",), ("b",)], True) == "2 parameter sets"
@@ -0,0 +1,125 @@
+"""
+Test public room discovery module
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.room import Room
+from app.service.v1.room_service import room_service
+
+
+class TestDiscoverRooms:
+    """
+    Test public room discovery
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_search_and_rankings_list_public_rooms_only(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests name search puts prefix matches first, rankings order by
+        activity or size, and private or deactivated rooms never show
+        """
+        # nothing listens here: rankings are computed on a cache miss
+        redis = Redis.from_url("redis://127.0.0.1:1/0")
+        owner = await create_user(test_get_session, "discoverowner")
+        active_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        rooms = {
+            name: Room(
+                name=name,
+                owner_id=owner.id,
+                is_private=is_private,
+                is_deactivated=is_deactivated,
+                member_count=member_count,
+                last_activity_at=active_at + timedelta(minutes=minutes),
+            )
+            for name, is_private, is_deactivated, member_count, minutes in [
+                ("Zebra Lovers", False, False, 40, 1),
+                ("All About Zebras", False, False, 90, 3),
+                ("Zebra Secrets", True, False, 500, 5),
+                ("Zebra Archive", False, True, 700, 4),
+                ("Hiking 100%", False, False, 10, 2),
+            ]
+        }
+        test_get_session.add_all(rooms.values())
+        await test_get_session.commit()
+
+        found = await room_service.discover_rooms(
+            session=test_get_session,
+            redis=redis,
+            page=1,
+            limit=10,
+            ranking="activity",
+            name="zebra",
+        )
+        assert [room.name for room in found.data] == [
+            "Zebra Lovers",
+            "All About Zebras",
+        ]
+
+        found = await room_service.discover_rooms(
+            session=test_get_session,
+            redis=redis,
+            page=1,
+            limit=10,
+            ranking="activity",
+            name="0%",
+        )
+        assert [room.name for room in found.data] == ["Hiking 100%"]
+
+        by_activity = await room_service.discover_rooms(
+            session=test_get_session, redis=redis, page=1, limit=3, ranking="activity"
+        )
+        assert [room.name for room in by_activity.data] == [
+            "All About Zebras",
+            "Hiking 100%",
+            "Zebra Lovers",
+        ]
+
+        by_size = await room_service.discover_rooms(
+            session=test_get_session, redis=redis, page=1, limit=2, ranking="size"
+        )
+        assert [room.name for room in by_size.data] == [
+            "All About Zebras",
+            "Zebra Lovers",
+        ]
+        assert by_size.data[0].member_count == 90
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_b_discover_route(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        create_user,
+        login,
+    ):
+        """
+        Tests the discover route searches public rooms for authenticated users
+        only
+        """
+        owner = await create_user(test_get_session, "httpdiscoverowner")
+        test_get_session.add_all(
+            [
+                Room(name="Quokka Club", owner_id=owner.id, is_private=False),
+                Room(name="Quokka Vault", owner_id=owner.id, is_private=True),
+            ]
+        )
+        await test_get_session.commit()
+        params = {"name": "quokka", "limit": 10}
+
+        response = await client.get(
+            url="/api/v1/rooms/discover", params=params, headers=await login(owner)
+        )
+        assert response.status_code == 200
+        assert [room["name"] for room in response.json()["data"]] == ["Quokka Club"]
+
+        response = await client.get(url="/api/v1/rooms/discover", params=params)
+        assert response.status_code == 401
@@ -0,0 +1,239 @@
+"""
+Test room stats counters module
+"""
+
+import asyncio
+import typing
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.tiered import tiered_cache
+from app.models.room import Room
+from app.repository.v1.room_member_repository import room_member_repository
+from app.repository.v1.room_message_repository import room_message_repository
+from app.repository.v1.room_repository import room_repository
+from app.utils.celery_setup import tasks
+
+
+async def room_stats(session: AsyncSession, room_id: str) -> typing.Tuple[int, int]:
+    """
+    Reads a room's member and message counters.
+    """
+    return (
+        await session.execute(
+            sa.select(Room.member_count, Room.message_count).where(Room.id == room_id)
+        )
+    ).one()
+
+
+async def reconcile(session: AsyncSession) -> int:
+    """
+    Reconciles every room, two at a time.
+
+    Returns:
+        int: the number of rooms repaired.
+    """
+    after_room_id, repaired = None, 0
+    while True:
+        after_room_id, batch_repaired = await room_repository.reconcile_stats(
+            session=session, batch_size=2, after_room_id=after_room_id
+        )
+        repaired += batch_repaired
+        if after_room_id is None:
+            return repaired
+
+
+class TestRoomStats:
+    """
+    Test room member and message counters
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_writes_maintain_the_counters(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests joins, removals, messages and deletions move the counters by
+        the rows they changed
+        """
+        owner = await create_user(test_get_session, "statsowner")
+        member = await create_user(test_get_session, "statsmember")
+        room = await room_repository.create(
+            messages_delete_able=True,
+            owner_id=owner.id,
+            name="stats room",
+            room_icon=None,
+            is_private=False,
+            allow_admin_messages_only=False,
+            session=test_get_session,
+            auto_commit=True,
+        )
+        assert room.member_count == 1 and room.last_activity_at is not None
+
+        await room_member_repository.create(
+            room_id=room.id, member_id=member.id, is_admin=False, session=test_get_session
+        )
+        assert await room_stats(test_get_session, room.id) == (2, 0)
+
+        for _ in range(2):
+            await room_member_repository.update(
+                room_id=room.id,
+                session=test_get_session,
+                member_id=member.id,
+                is_admin=None,
+                left_room=True,
+                where_left_room=False,
+            )
+        assert await room_stats(test_get_session, room.id) == (1, 0)
+
+        await room_member_repository.update(
+            room_id=room.id,
+            session=test_get_session,
+            member_id=member.id,
+            is_admin=None,
+            left_room=False,
+        )
+        assert await room_stats(test_get_session, room.id) == (2, 0)
+
+        message = await room_message_repository.create(
+            content="hello",
+            sender_id=owner.id,
+            room_id=room.id,
+            parent_message_id=None,
+            media_url=None,
+            media_type=None,
+            session=test_get_session,
+        )
+        await room_message_repository.create(
+            content="again",
+            sender_id=member.id,
+            room_id=room.id,
+            parent_message_id=None,
+            media_url=None,
+            media_type=None,
+            session=test_get_session,
+        )
+        assert await room_stats(test_get_session, room.id) == (2, 2)
+
+        for _ in range(2):
+            await room_message_repository.delete(
+                room_id=room.id, message_id=message.id, session=test_get_session
+            )
+        await test_get_session.commit()
+        assert await room_stats(test_get_session, room.id) == (2, 1)
+
+    @pytest.mark.asyncio
+    async def test_b_reconciliation_repairs_drifted_rooms(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests reconciliation rewrites only the rooms whose counters drifted,
+        a batch at a time
+        """
+        owner = await create_user(test_get_session, "reconcileowner")
+        rooms = [
+            await room_repository.create(
+                messages_delete_able=True,
+                owner_id=owner.id,
+                name=f"reconcile room {index}",
+                room_icon=None,
+                is_private=False,
+                allow_admin_messages_only=False,
+                session=test_get_session,
+                auto_commit=True,
+            )
+            for index in range(3)
+        ]
+        drifted = rooms[1]
+        await reconcile(test_get_session)
+        await test_get_session.execute(
+            sa.update(Room)
+            .where(Room.id == drifted.id)
+            .values(member_count=7, message_count=3)
+        )
+        await test_get_session.commit()
+
+        assert await reconcile(test_get_session) == 1
+        for room in rooms:
+            assert await room_stats(test_get_session, room.id) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_c_messages_leave_the_room_cache_warm(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        create_user,
+        record_statements,
+    ):
+        """
+        Tests counting a new message does not evict the cached room or its
+        member list, while a change to the room itself still does
+        """
+        owner = await create_user(test_get_session, "warmstatsowner")
+        room = await room_repository.create(
+            messages_delete_able=True,
+            owner_id=owner.id,
+            name="warm stats room",
+            room_icon=None,
+            is_private=False,
+            allow_admin_messages_only=False,
+            session=test_get_session,
+            auto_commit=True,
+        )
+
+        async def reads() -> list:
+            test_get_session.expunge_all()
+            statements, stop = record_statements(test_get_session)
+            await room_repository.fetch(room_id=room.id, session=test_get_session)
+            await room_member_repository.fetch_all(
+                session=test_get_session, room_id=room.id
+            )
+            stop()
+            return statements
+
+        await reads()
+        await room_message_repository.create(
+            content="warm",
+            sender_id=owner.id,
+            room_id=room.id,
+            parent_message_id=None,
+            media_url=None,
+            media_type=None,
+            session=test_get_session,
+        )
+        assert await room_stats(test_get_session, room.id) == (1, 1)
+        assert await reads() == []
+
+        await test_get_session.execute(
+            sa.update(Room).where(Room.id == room.id).values(name="renamed room")
+        )
+        await test_get_session.commit()
+        assert len(await reads()) == 2
+
+    def test_d_the_task_runs_again_on_a_new_event_loop(
+        self, monkeypatch, task_session
+    ):
+        """
+        Tests the reconciliation task runs twice in one worker, each run
+        getting a cache redis client of its own event loop
+        """
+        runs = []
+        reconcile_stats = room_repository.reconcile_stats
+
+        async def recording_reconcile_stats(**kwargs):
+            runs.append((asyncio.get_running_loop(), tiered_cache.redis()))
+            return await reconcile_stats(**kwargs)
+
+        monkeypatch.setattr(tasks, "task_session", task_session)
+        monkeypatch.setattr(
+            room_repository, "reconcile_stats", recording_reconcile_stats
+        )
+        monkeypatch.setattr(tiered_cache, "_redis_skipped_until", 0.0)
+
+        assert tasks.reconcile_room_stats() == 0
+        assert tasks.reconcile_room_stats() == 0
+        (first_loop, first_client), (second_loop, second_client) = runs
+        assert first_loop is not second_loop
+        assert first_client is not None and first_client is not second_client
@@ -0,0 +1,271 @@
+"""
+Test bulk room invitations module
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from fastapi import HTTPException
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dto.v1.room_inivitation_dto import RoomInvitationBulkRequestDto
+from app.models.room import Room
+from app.models.room_invitation import RoomInvitation
+from app.models.room_member import RoomMember
+from app.repository.v1.room_invitation_repository import room_invitation_repository
+from app.service.v1.room_invitation_service import room_invitation_service
+
+
+class TestBulkRoomInvitation:
+    """
+    Test bulk room invitations
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_each_invitee_gets_an_outcome(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests new invitees are invited, declined and departed ones are
+        invited again, and members, pending invitees, unknown users and the
+        inviter are reported without writing anything
+        """
+        admin = await create_user(test_get_session, "bulkadmin")
+        users = {
+            name: await create_user(test_get_session, f"bulk{name}")
+            for name in ["new", "declined", "pending", "member", "leaver"]
+        }
+        room = Room(name="bulk room", owner_id=admin.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        expired_at = datetime.now(timezone.utc) - timedelta(days=1)
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=admin.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=users["member"].id),
+                RoomMember(
+                    room_id=room.id, member_id=users["leaver"].id, left_room=True
+                ),
+            ]
+            + [
+                RoomInvitation(
+                    room_id=room.id,
+                    inviter_id=admin.id,
+                    invitee_id=users[name].id,
+                    invitation_status=invitation_status,
+                    expiration=expired_at,
+                )
+                for name, invitation_status in [
+                    ("declined", "declined"),
+                    ("pending", "pending"),
+                    ("leaver", "accepted"),
+                ]
+            ]
+        )
+        await test_get_session.commit()
+
+        unknown_id = str(uuid.uuid4())
+        invitee_ids = [
+            users["new"].id,
+            users["declined"].id,
+            users["pending"].id,
+            users["member"].id,
+            users["leaver"].id,
+            unknown_id,
+            admin.id,
+            users["new"].id,
+        ]
+        response = await room_invitation_service.create_room_invitations(
+            request=as_user(admin.id),
+            session=test_get_session,
+            schema=RoomInvitationBulkRequestDto(
+                room_id=room.id, invitee_ids=invitee_ids
+            ),
+        )
+        assert [(item.invitee_id, item.outcome.value) for item in response.data] == [
+            (users["new"].id, "invited"),
+            (users["declined"].id, "reinvited"),
+            (users["pending"].id, "already_invited"),
+            (users["member"].id, "already_member"),
+            (users["leaver"].id, "reinvited"),
+            (unknown_id, "not_found"),
+            (admin.id, "self"),
+        ]
+        for item in response.data[:2] + response.data[4:5]:
+            assert item.invitation is not None
+            assert item.invitation.invitation_status == "pending"
+            # sqlite hands datetimes back naive
+            expiration = item.invitation.expiration.replace(tzinfo=timezone.utc)
+            assert expiration > datetime.now(timezone.utc)
+        assert all(item.invitation is None for item in response.data[2:4])
+
+        test_get_session.expunge_all()
+        statuses = dict(
+            (
+                await test_get_session.execute(
+                    sa.select(
+                        RoomInvitation.invitee_id, RoomInvitation.invitation_status
+                    ).where(RoomInvitation.room_id == room.id)
+                )
+            )
+            .tuples()
+            .all()
+        )
+        assert statuses == {
+            users["new"].id: "pending",
+            users["declined"].id: "pending",
+            users["pending"].id: "pending",
+            users["leaver"].id: "pending",
+        }
+
+    @pytest.mark.asyncio
+    async def test_b_only_members_allowed_to_invite_can_bulk_invite(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests non members are refused, and so are non admins when the room
+        only lets admins invite
+        """
+        owner = await create_user(test_get_session, "bulkowner")
+        member = await create_user(test_get_session, "bulkplainmember")
+        invitee = await create_user(test_get_session, "bulkinvitee")
+        room = Room(
+            name="admins only room",
+            owner_id=owner.id,
+            messages_delete_able=True,
+            allow_non_admin_invitations=False,
+        )
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=owner.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=member.id),
+            ]
+        )
+        await test_get_session.commit()
+
+        schema = RoomInvitationBulkRequestDto(
+            room_id=room.id, invitee_ids=[invitee.id]
+        )
+        for user_id, status_code in [(invitee.id, 404), (member.id, 403)]:
+            with pytest.raises(HTTPException) as exc:
+                await room_invitation_service.create_room_invitations(
+                    request=as_user(user_id), session=test_get_session, schema=schema
+                )
+            assert exc.value.status_code == status_code
+
+    @pytest.mark.asyncio
+    async def test_c_upsert_leaves_accepted_invitations_of_members(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests re-inviting takes the new inviter, and skips an invitation
+        accepted by a member still in the room
+        """
+        admin = await create_user(test_get_session, "upsertadmin")
+        inviter = await create_user(test_get_session, "upsertinviter")
+        users = {
+            name: await create_user(test_get_session, f"upsert{name}")
+            for name in ["joined", "leaver", "declined"]
+        }
+        room = Room(name="upsert room", owner_id=admin.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=users["joined"].id),
+                RoomMember(
+                    room_id=room.id, member_id=users["leaver"].id, left_room=True
+                ),
+            ]
+            + [
+                RoomInvitation(
+                    room_id=room.id,
+                    inviter_id=admin.id,
+                    invitee_id=users[name].id,
+                    invitation_status=invitation_status,
+                    expiration=datetime.now(timezone.utc),
+                )
+                for name, invitation_status in [
+                    ("joined", "accepted"),
+                    ("leaver", "accepted"),
+                    ("declined", "declined"),
+                ]
+            ]
+        )
+        await test_get_session.commit()
+
+        invitations = await room_invitation_repository.upsert_pending(
+            session=test_get_session,
+            room_id=room.id,
+            inviter_id=inviter.id,
+            invitee_ids=[user.id for user in users.values()],
+        )
+        assert sorted(
+            (invitation.invitee_id, invitation.inviter_id) for invitation in invitations
+        ) == sorted(
+            [(users["leaver"].id, inviter.id), (users["declined"].id, inviter.id)]
+        )
+
+        test_get_session.expunge_all()
+        joined = (
+            await test_get_session.execute(
+                sa.select(RoomInvitation).where(
+                    RoomInvitation.invitee_id == users["joined"].id
+                )
+            )
+        ).scalar_one()
+        assert (joined.invitation_status, joined.inviter_id) == ("accepted", admin.id)
+
+    @pytest.mark.asyncio
+    async def test_d_bulk_invite_route(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        create_user,
+        login,
+    ):
+        """
+        Tests the bulk invite route reports each invitee's outcome to an
+        authenticated admin, and refuses unauthenticated and non member callers
+        """
+        admin = await create_user(test_get_session, "httpbulkadmin")
+        invitees = [
+            await create_user(test_get_session, f"httpbulkinvitee{index}")
+            for index in range(2)
+        ]
+        room = Room(name="http bulk room", owner_id=admin.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add(
+            RoomMember(room_id=room.id, member_id=admin.id, is_admin=True)
+        )
+        await test_get_session.commit()
+        payload = {
+            "room_id": room.id,
+            "invitee_ids": [invitee.id for invitee in invitees],
+        }
+
+        response = await client.post(
+            url="/api/v1/room-invitations/bulk",
+            json=payload,
+            headers=await login(admin),
+        )
+        assert response.status_code == 200
+        assert [
+            (item["invitee_id"], item["outcome"]) for item in response.json()["data"]
+        ] == [(invitee.id, "invited") for invitee in invitees]
+
+        response = await client.post(url="/api/v1/room-invitations/bulk", json=payload)
+        assert response.status_code == 401
+        response = await client.post(
+            url="/api/v1/room-invitations/bulk",
+            json=payload,
+            headers=await login(invitees[0]),
+        )
+        assert response.status_code == 404
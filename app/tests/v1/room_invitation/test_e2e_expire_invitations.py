@@ -0,0 +1,147 @@
+"""
+Test room invitation expiry sweep module
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.tiered import tiered_cache
+from app.models.room import Room
+from app.models.room_invitation import RoomInvitation
+from app.repository.v1.room_invitation_repository import room_invitation_repository
+from app.utils.celery_setup import tasks
+
+
+class TestExpireRoomInvitations:
+    """
+    Test the room invitation expiry sweep
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_overdue_pending_invitations_expire_in_batches(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests the sweep expires every overdue pending invitation, a batch at
+        a time, and leaves current or already answered invitations alone
+        """
+        inviter = await create_user(test_get_session, "expiryinviter")
+        room = Room(name="expiry room", owner_id=inviter.id, is_private=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        now = datetime.now(timezone.utc)
+        invitations = {}
+        for name, invitation_status, expiration in [
+            ("overdue0", "pending", now - timedelta(days=2)),
+            ("overdue1", "pending", now - timedelta(hours=1)),
+            ("overdue2", "pending", now - timedelta(minutes=1)),
+            ("current", "pending", now + timedelta(days=1)),
+            ("declined", "declined", now - timedelta(days=1)),
+        ]:
+            invitee = await create_user(test_get_session, f"expiry{name}")
+            invitations[name] = RoomInvitation(
+                room_id=room.id,
+                inviter_id=inviter.id,
+                invitee_id=invitee.id,
+                invitation_status=invitation_status,
+                expiration=expiration,
+            )
+        test_get_session.add_all(invitations.values())
+        await test_get_session.commit()
+
+        expired = []
+        while True:
+            batch = await room_invitation_repository.expire_overdue(
+                session=test_get_session, batch_size=2
+            )
+            assert len(batch) <= 2
+            expired.extend(batch)
+            if len(batch) < 2:
+                break
+        expired_ids = {invitation["id"] for invitation in expired}
+        assert {
+            invitations[name].id for name in ["overdue0", "overdue1", "overdue2"]
+        } <= expired_ids
+        assert invitations["current"].id not in expired_ids
+
+        test_get_session.expunge_all()
+        statuses = dict(
+            (
+                await test_get_session.execute(
+                    sa.select(
+                        RoomInvitation.id, RoomInvitation.invitation_status
+                    ).where(RoomInvitation.room_id == room.id)
+                )
+            )
+            .tuples()
+            .all()
+        )
+        assert statuses == {
+            invitations["overdue0"].id: "expired",
+            invitations["overdue1"].id: "expired",
+            invitations["overdue2"].id: "expired",
+            invitations["current"].id: "pending",
+            invitations["declined"].id: "declined",
+        }
+        assert (
+            await room_invitation_repository.expire_overdue(
+                session=test_get_session, batch_size=2
+            )
+            == []
+        )
+
+    def test_b_the_task_runs_again_on_a_new_event_loop(
+        self, monkeypatch, task_session, create_user
+    ):
+        """
+        Tests the expiry task runs twice in one worker, each run expiring the
+        invitations overdue by then with a cache redis client of its own
+        event loop
+        """
+
+        async def invite(name: str) -> None:
+            async with task_session() as session:
+                inviter = await create_user(session, f"taskinviter{name}")
+                invitee = await create_user(session, f"taskinvitee{name}")
+                room = Room(
+                    name=f"task expiry room {name}",
+                    owner_id=inviter.id,
+                    is_private=True,
+                )
+                session.add(room)
+                await session.flush()
+                session.add(
+                    RoomInvitation(
+                        room_id=room.id,
+                        inviter_id=inviter.id,
+                        invitee_id=invitee.id,
+                        invitation_status="pending",
+                        expiration=datetime.now(timezone.utc) - timedelta(hours=1),
+                    )
+                )
+                await session.commit()
+
+        runs = []
+        expire_overdue = room_invitation_repository.expire_overdue
+
+        async def recording_expire_overdue(**kwargs):
+            runs.append((asyncio.get_running_loop(), tiered_cache.redis()))
+            return await expire_overdue(**kwargs)
+
+        monkeypatch.setattr(tasks, "task_session", task_session)
+        monkeypatch.setattr(
+            room_invitation_repository, "expire_overdue", recording_expire_overdue
+        )
+
+        for name in ["first", "second"]:
+            asyncio.run(invite(name))
+            # the seed's failed invalidation made the cache skip redis
+            monkeypatch.setattr(tiered_cache, "_redis_skipped_until", 0.0)
+            assert tasks.expire_room_invitations() == 1
+        (first_loop, first_client), (second_loop, second_client) = runs[0], runs[-1]
+        assert first_loop is not second_loop
+        assert first_client is not None and first_client is not second_client
@@ -0,0 +1,196 @@
+"""
+Test room invitation inbox module
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.room import Room
+from app.models.room_invitation import RoomInvitation
+from app.models.room_member import RoomMember
+from app.repository.v1.room_invitation_repository import room_invitation_repository
+from app.service.v1.room_invitation_service import room_invitation_service
+
+
+class TestRoomInvitationInbox:
+    """
+    Test paginated invitation listings and pending counts
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_invitations_are_listed_newest_first_with_pending_counts(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests received, sent and room invitations page through their cursors
+        newest first, filter by status, and pending counts follow updates
+        """
+        admin = await create_user(test_get_session, "inboxadmin")
+        invitee = await create_user(test_get_session, "inboxinvitee")
+        other = await create_user(test_get_session, "inboxother")
+        rooms = [
+            Room(name=f"inbox room {index}", owner_id=admin.id, is_private=True)
+            for index in range(3)
+        ]
+        test_get_session.add_all(rooms)
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=admin.id, is_admin=True)
+                for room in rooms
+            ]
+            + [RoomMember(room_id=rooms[0].id, member_id=other.id)]
+        )
+        sent_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        invitations = [
+            RoomInvitation(
+                room_id=room.id,
+                inviter_id=admin.id,
+                invitee_id=invitee.id,
+                invitation_status=invitation_status,
+                expiration=sent_at + timedelta(days=7),
+                created_at=sent_at + timedelta(minutes=index),
+            )
+            for index, (room, invitation_status) in enumerate(
+                zip(rooms, ["pending", "declined", "pending"])
+            )
+        ]
+        test_get_session.add_all(invitations)
+        await test_get_session.commit()
+
+        first_page = await room_invitation_service.retrieve_received_invitations(
+            request=as_user(invitee.id), session=test_get_session, limit=2
+        )
+        assert [invitation.id for invitation in first_page.data] == [
+            invitations[2].id,
+            invitations[1].id,
+        ]
+        assert first_page.pending_count == 2
+        second_page = await room_invitation_service.retrieve_received_invitations(
+            request=as_user(invitee.id),
+            session=test_get_session,
+            limit=2,
+            cursor=first_page.next_cursor,
+        )
+        assert [invitation.id for invitation in second_page.data] == [
+            invitations[0].id
+        ]
+        assert second_page.next_cursor is None
+
+        pending = await room_invitation_service.retrieve_sent_invitations(
+            request=as_user(admin.id),
+            session=test_get_session,
+            invitation_status="pending",
+        )
+        assert [invitation.id for invitation in pending.data] == [
+            invitations[2].id,
+            invitations[0].id,
+        ]
+        assert pending.pending_count is None
+
+        room_page = await room_invitation_service.retrieve_room_invitations(
+            request=as_user(admin.id), session=test_get_session, room_id=rooms[0].id
+        )
+        assert [invitation.id for invitation in room_page.data] == [
+            invitations[0].id
+        ]
+        assert room_page.pending_count == 1
+
+        await room_invitation_repository.update(
+            session=test_get_session,
+            invitation_id=invitations[0].id,
+            status="cancelled",
+            expected_status="pending",
+        )
+        count = await room_invitation_service.count_pending_invitations(
+            request=as_user(invitee.id), session=test_get_session
+        )
+        assert count.pending_count == 1
+        assert (
+            await room_invitation_repository.count_pending_for_room(
+                session=test_get_session, room_id=rooms[0].id
+            )
+            == 0
+        )
+
+        for user_id, status_code in [(other.id, 403), (invitee.id, 404)]:
+            with pytest.raises(HTTPException) as exc:
+                await room_invitation_service.retrieve_room_invitations(
+                    request=as_user(user_id),
+                    session=test_get_session,
+                    room_id=rooms[0].id,
+                )
+            assert exc.value.status_code == status_code
+
+        with pytest.raises(HTTPException) as exc:
+            await room_invitation_service.retrieve_received_invitations(
+                request=as_user(invitee.id),
+                session=test_get_session,
+                cursor="not-a-cursor",
+            )
+        assert exc.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_b_inbox_routes(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        create_user,
+        login,
+    ):
+        """
+        Tests the received, pending count, sent and room invitation routes
+        list the authenticated user's invitations
+        """
+        admin = await create_user(test_get_session, "httpinboxadmin")
+        invitee = await create_user(test_get_session, "httpinboxinvitee")
+        room = Room(name="http inbox room", owner_id=admin.id, is_private=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        invitation = RoomInvitation(
+            room_id=room.id,
+            inviter_id=admin.id,
+            invitee_id=invitee.id,
+            invitation_status="pending",
+            expiration=datetime.now(timezone.utc) + timedelta(days=7),
+        )
+        test_get_session.add_all(
+            [RoomMember(room_id=room.id, member_id=admin.id, is_admin=True), invitation]
+        )
+        await test_get_session.commit()
+        admin_headers = await login(admin)
+        invitee_headers = await login(invitee)
+
+        for url, params, headers in [
+            ("/received", {"limit": 5}, invitee_headers),
+            ("/sent", {"invitation_status": "pending"}, admin_headers),
+            (f"/rooms/{room.id}", {}, admin_headers),
+        ]:
+            response = await client.get(
+                url=f"/api/v1/room-invitations{url}", params=params, headers=headers
+            )
+            assert response.status_code == 200
+            assert [item["id"] for item in response.json()["data"]] == [
+                invitation.id
+            ]
+
+        response = await client.get(
+            url="/api/v1/room-invitations/received/pending-count",
+            headers=invitee_headers,
+        )
+        assert response.status_code == 200
+        assert response.json()["pending_count"] == 1
+
+        response = await client.get(
+            url="/api/v1/room-invitations/received",
+            params={"cursor": "not-a-cursor"},
+            headers=invitee_headers,
+        )
+        assert response.status_code == 400
+        response = await client.get(url="/api/v1/room-invitations/received")
+        assert response.status_code == 401
@@ -0,0 +1,207 @@
+"""
+Test bulk room member management module
+"""
+
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from fastapi import HTTPException
+from redis.asyncio import Redis
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dto.v1.room_member_dto import BulkUpdateRoomMembersRequestDto
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.service.v1.room_member_service import room_member_service
+
+
+async def memberships(session: AsyncSession, room_id: str) -> dict:
+    """
+    Reads (is_admin, left_room) of every member of a room.
+    """
+    session.expunge_all()
+    query = sa.select(
+        RoomMember.member_id, RoomMember.is_admin, RoomMember.left_room
+    ).where(RoomMember.room_id == room_id)
+    return {
+        member_id: (is_admin, left_room)
+        for member_id, is_admin, left_room in await session.execute(query)
+    }
+
+
+async def member_count(session: AsyncSession, room_id: str) -> int:
+    """
+    Reads a room's member counter.
+    """
+    return (
+        await session.execute(sa.select(Room.member_count).where(Room.id == room_id))
+    ).scalar_one()
+
+
+class TestBulkRoomMembers:
+    """
+    Test bulk room member management
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_members_are_added_promoted_demoted_and_removed_in_bulk(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests each bulk action changes only the members not already in its
+        state, keeps the member counter in step, and never touches the
+        caller or the room owner
+        """
+        # nothing listens here: cache writes and the room event are dropped
+        redis = Redis.from_url("redis://127.0.0.1:1/0")
+        owner = await create_user(test_get_session, "bulkmemberowner")
+        admin = await create_user(test_get_session, "bulkmemberadmin")
+        users = [
+            await create_user(test_get_session, f"bulkmember{index}")
+            for index in range(3)
+        ]
+        room = Room(
+            name="bulk members room",
+            owner_id=owner.id,
+            messages_delete_able=True,
+            member_count=3,
+        )
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=owner.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=admin.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=users[0].id),
+                RoomMember(room_id=room.id, member_id=users[1].id, left_room=True),
+            ]
+        )
+        await test_get_session.commit()
+        unknown_id = str(uuid.uuid4())
+
+        async def bulk(action: str, member_ids: list) -> tuple:
+            response = await room_member_service.bulk_update_room_members(
+                session=test_get_session,
+                room_id=room.id,
+                request=as_user(admin.id),
+                schema=BulkUpdateRoomMembersRequestDto(
+                    action=action, member_ids=member_ids
+                ),
+                redis=redis,
+            )
+            return sorted(response.data.updated), sorted(response.data.skipped)
+
+        user_ids = [user.id for user in users]
+        assert await bulk("add", user_ids + [unknown_id, admin.id]) == (
+            sorted(user_ids[1:]),
+            sorted([user_ids[0], unknown_id, admin.id]),
+        )
+        assert await member_count(test_get_session, room.id) == 5
+
+        assert await bulk("promote", user_ids[:2] + [owner.id]) == (
+            sorted(user_ids[:2]),
+            [owner.id],
+        )
+        assert await bulk("demote", user_ids + [owner.id]) == (
+            sorted(user_ids[:2]),
+            sorted([user_ids[2], owner.id]),
+        )
+        assert await bulk("remove", user_ids[1:] + [owner.id]) == (
+            sorted(user_ids[1:]),
+            [owner.id],
+        )
+        assert await member_count(test_get_session, room.id) == 3
+        assert await memberships(test_get_session, room.id) == {
+            owner.id: (True, False),
+            admin.id: (True, False),
+            users[0].id: (False, False),
+            users[1].id: (False, True),
+            users[2].id: (False, True),
+        }
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_b_only_admins_manage_members_in_bulk(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests non admins are refused
+        """
+        redis = Redis.from_url("redis://127.0.0.1:1/0")
+        owner = await create_user(test_get_session, "bulknonadminowner")
+        member = await create_user(test_get_session, "bulknonadmin")
+        room = Room(name="bulk refused room", owner_id=owner.id)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=owner.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=member.id),
+            ]
+        )
+        await test_get_session.commit()
+
+        with pytest.raises(HTTPException) as exc:
+            await room_member_service.bulk_update_room_members(
+                session=test_get_session,
+                room_id=room.id,
+                request=as_user(member.id),
+                schema=BulkUpdateRoomMembersRequestDto(
+                    action="remove", member_ids=[owner.id]
+                ),
+                redis=redis,
+            )
+        assert exc.value.status_code == 403
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_c_bulk_members_route(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        create_user,
+        login,
+    ):
+        """
+        Tests the bulk members route applies an admin's action, and refuses
+        non admins
+        """
+        owner = await create_user(test_get_session, "httpbulkmemberowner")
+        member = await create_user(test_get_session, "httpbulkmember")
+        joiner = await create_user(test_get_session, "httpbulkjoiner")
+        room = Room(
+            name="http bulk members room",
+            owner_id=owner.id,
+            messages_delete_able=True,
+            member_count=2,
+        )
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=owner.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=member.id),
+            ]
+        )
+        await test_get_session.commit()
+        url = f"/api/v1/room-members/{room.id}/bulk"
+
+        response = await client.patch(
+            url=url,
+            json={"action": "add", "member_ids": [joiner.id, member.id]},
+            headers=await login(owner),
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert (data["updated"], data["skipped"]) == ([joiner.id], [member.id])
+        assert await member_count(test_get_session, room.id) == 3
+
+        response = await client.patch(
+            url=url,
+            json={"action": "remove", "member_ids": [joiner.id]},
+            headers=await login(member),
+        )
+        assert response.status_code == 403
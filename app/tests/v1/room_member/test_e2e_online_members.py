@@ -0,0 +1,146 @@
+"""
+Test online room members module
+"""
+
+
+import pytest
+from httpx import AsyncClient
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.repository.v1.room_member_repository import room_member_repository
+from app.repository.v1.room_presence_repository import PRESENCE_KEY
+from app.service.v1.room_member_service import room_member_service
+from app.service.v1.room_service import room_service
+
+
+class TestOnlineRoomMembers:
+    """
+    Test online room members
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_member_ids_are_grouped_by_room(
+        self, test_setup: None, test_get_session: AsyncSession, create_user
+    ):
+        """
+        Tests the member sets cached for presence hold current members only,
+        and rooms without members come back empty
+        """
+        owner = await create_user(test_get_session, "presenceowner")
+        member = await create_user(test_get_session, "presencemember")
+        leaver = await create_user(test_get_session, "presenceleaver")
+        room = Room(name="presence room", owner_id=owner.id, messages_delete_able=True)
+        empty_room = Room(
+            name="empty presence room", owner_id=owner.id, messages_delete_able=True
+        )
+        test_get_session.add_all([room, empty_room])
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=room.id, member_id=owner.id, is_admin=True),
+                RoomMember(room_id=room.id, member_id=member.id, is_admin=False),
+                RoomMember(
+                    room_id=room.id,
+                    member_id=leaver.id,
+                    is_admin=False,
+                    left_room=True,
+                ),
+            ]
+        )
+        await test_get_session.commit()
+
+        members = await room_member_repository.fetch_member_ids(
+            room_ids=[room.id, empty_room.id], session=test_get_session
+        )
+        assert sorted(members[room.id]) == sorted([owner.id, member.id])
+        assert members[empty_room.id] == []
+
+    @pytest.mark.asyncio
+    async def test_b_unreachable_presence_is_reported(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests online members answer 503 and room listings leave the online
+        count empty when redis is unreachable, and non members are refused
+        """
+        redis = Redis.from_url("redis://127.0.0.1:1/0")
+        owner = await create_user(test_get_session, "offlineowner")
+        stranger = await create_user(test_get_session, "offlinestranger")
+        room = Room(name="offline room", owner_id=owner.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add(
+            RoomMember(room_id=room.id, member_id=owner.id, is_admin=True)
+        )
+        await test_get_session.commit()
+
+        with pytest.raises(HTTPException) as exc:
+            await room_member_service.retrieve_online_members(
+                request=as_user(owner.id),
+                session=test_get_session,
+                room_id=room.id,
+                redis=redis,
+            )
+        assert exc.value.status_code == 503
+
+        with pytest.raises(HTTPException) as exc:
+            await room_member_service.retrieve_online_members(
+                request=as_user(stranger.id),
+                session=test_get_session,
+                room_id=room.id,
+                redis=redis,
+            )
+        assert exc.value.status_code == 403
+
+        rooms = await room_service.retrieve_rooms(
+            request=as_user(owner.id),
+            session=test_get_session,
+            page=1,
+            limit=10,
+            redis=redis,
+        )
+        assert [listed.id for listed in rooms.data] == [room.id]
+        assert rooms.data[0].online_count is None
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_c_online_members_route(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        login,
+    ):
+        """
+        Tests the online members route lists a member's online room mates,
+        and refuses non members
+        """
+        owner = await create_user(test_get_session, "httponlineowner")
+        stranger = await create_user(test_get_session, "httponlinestranger")
+        room = Room(
+            name="http online room", owner_id=owner.id, messages_delete_able=True
+        )
+        test_get_session.add(room)
+        await test_get_session.flush()
+        test_get_session.add(
+            RoomMember(room_id=room.id, member_id=owner.id, is_admin=True)
+        )
+        await test_get_session.commit()
+        url = f"/api/v1/room-members/{room.id}/online"
+
+        await test_get_redis_client.sadd(PRESENCE_KEY, owner.id, stranger.id)
+
+        response = await client.get(url=url, headers=await login(owner))
+        assert response.status_code == 200
+        assert response.json()["data"] == [owner.id]
+        response = await client.get(url=url, headers=await login(stranger))
+        assert response.status_code == 403
+        response = await client.get(url=url)
+        assert response.status_code == 401
+        await test_get_redis_client.srem(PRESENCE_KEY, owner.id, stranger.id)
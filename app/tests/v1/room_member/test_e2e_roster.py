@@ -0,0 +1,275 @@
+"""
+Test paginated room roster module
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.repository.v1.room_roster_cache_repository import (
+    room_roster_cache_repository,
+    roster_generation_key,
+    roster_key,
+    roster_members_key,
+    roster_score,
+)
+from app.service.v1.room_member_service import room_member_service
+
+
+class TestRoomRoster:
+    """
+    Test keyset paginated room roster
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_pages_list_admins_first_then_by_join_time(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests pages follow each other through their cursors, admins first,
+        without members who left the room
+        """
+        # nothing listens here: every roster read is a cache miss
+        redis = Redis.from_url("redis://127.0.0.1:1/0")
+        joined_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        owner = await create_user(test_get_session, "rosterowner")
+        room = Room(name="roster room", owner_id=owner.id, messages_delete_able=True)
+        test_get_session.add(room)
+        await test_get_session.flush()
+
+        members = [(owner, True, False)]
+        for index in range(4):
+            user = await create_user(test_get_session, f"rostermember{index}")
+            members.append((user, index == 3, index == 1))
+        for index, (user, is_admin, left_room) in enumerate(members):
+            test_get_session.add(
+                RoomMember(
+                    room_id=room.id,
+                    member_id=user.id,
+                    is_admin=is_admin,
+                    left_room=left_room,
+                    created_at=joined_at + timedelta(minutes=index),
+                )
+            )
+        await test_get_session.commit()
+
+        first_page = await room_member_service.retrieve_room_members(
+            request=as_user(owner.id),
+            session=test_get_session,
+            room_id=room.id,
+            redis=redis,
+            limit=2,
+        )
+        assert [member.member_id for member in first_page.data] == [
+            owner.id,
+            members[4][0].id,
+        ]
+        assert all(member.is_admin for member in first_page.data)
+        assert first_page.next_cursor is not None
+
+        second_page = await room_member_service.retrieve_room_members(
+            request=as_user(owner.id),
+            session=test_get_session,
+            room_id=room.id,
+            redis=redis,
+            limit=2,
+            cursor=first_page.next_cursor,
+        )
+        assert [member.member_id for member in second_page.data] == [
+            members[1][0].id,
+            members[3][0].id,
+        ]
+        assert second_page.next_cursor is None
+
+        with pytest.raises(HTTPException) as exc:
+            await room_member_service.retrieve_room_members(
+                request=as_user(owner.id),
+                session=test_get_session,
+                room_id=room.id,
+                redis=redis,
+                cursor="not-a-cursor",
+            )
+        assert exc.value.status_code == 400
+        await redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_b_roster_scores_order_admins_first(self):
+        """
+        Tests cached roster scores order admins first then by join time, and
+        an unreachable redis reads as a miss
+        """
+        joined_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        later = joined_at + timedelta(microseconds=1)
+        assert roster_score(True, later) < roster_score(False, joined_at)
+        assert roster_score(False, joined_at) < roster_score(False, later)
+        # exact as a redis double
+        assert float(roster_score(False, later)) == roster_score(False, later)
+        assert roster_score(True, joined_at.replace(tzinfo=None)) == roster_score(
+            True, joined_at
+        )
+
+        redis = Redis.from_url("redis://127.0.0.1:1/0")
+        assert (
+            await room_roster_cache_repository.page(
+                room_id="room", after_member_id=None, limit=10, redis=redis
+            )
+            is None
+        )
+        assert await room_roster_cache_repository.is_cached("room", redis) is None
+        await redis.aclose()
+
+
+async def seed_roster(session: AsyncSession, create_user, prefix: str, joined_at):
+    """
+    Creates a room whose owner and members joined at joined_at, a list of
+    offsets, and returns the room and the users in the order they joined.
+    """
+    users = [
+        await create_user(session, f"{prefix}{index}")
+        for index in range(len(joined_at))
+    ]
+    room = Room(name=f"{prefix} room", owner_id=users[0].id, messages_delete_able=True)
+    session.add(room)
+    await session.flush()
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    session.add_all(
+        RoomMember(
+            room_id=room.id,
+            member_id=user.id,
+            is_admin=index == 0,
+            created_at=started + offset,
+        )
+        for index, (user, offset) in enumerate(zip(users, joined_at))
+    )
+    await session.commit()
+    return room, users
+
+
+async def forget_roster(redis: Redis, room: Room) -> None:
+    """
+    Drops the cache keys of a room's roster.
+    """
+    await redis.delete(
+        roster_key(room.id), roster_members_key(room.id), roster_generation_key(room.id)
+    )
+
+
+class TestRoomRosterCache:
+    """
+    Test the roster served from a live redis against the database
+    """
+
+    @staticmethod
+    async def pages(session: AsyncSession, room: Room, user_id: str, as_user, redis):
+        """
+        Every page of a roster, two members at a time, as dicts.
+        """
+        pages, cursor = [], None
+        while True:
+            page = await room_member_service.retrieve_room_members(
+                request=as_user(user_id),
+                session=session,
+                room_id=room.id,
+                redis=redis,
+                limit=2,
+                cursor=cursor,
+            )
+            pages.append([member.model_dump() for member in page.data])
+            cursor = page.next_cursor
+            if cursor is None:
+                return pages
+
+    @pytest.mark.asyncio
+    async def test_a_close_join_times_page_as_the_database(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        as_user,
+    ):
+        """
+        Tests members joined within a millisecond, or in the same
+        microsecond, are served from the cache in the database order
+        """
+        room, users = await seed_roster(
+            test_get_session,
+            create_user,
+            "rostertie",
+            [timedelta(0)]
+            + [timedelta(microseconds=offset) for offset in (900, 300, 300, 300)],
+        )
+        unreachable = Redis.from_url("redis://127.0.0.1:1/0")
+        expected = await self.pages(
+            test_get_session, room, users[0].id, as_user, unreachable
+        )
+        await unreachable.aclose()
+        ties = sorted(user.id for user in users[2:])
+        assert [member["member_id"] for page in expected for member in page] == [
+            users[0].id,
+            *ties,
+            users[1].id,
+        ]
+
+        redis = test_get_redis_client
+        missed = await self.pages(test_get_session, room, users[0].id, as_user, redis)
+        cached = await self.pages(test_get_session, room, users[0].id, as_user, redis)
+        assert await room_roster_cache_repository.page(
+            room_id=room.id, after_member_id=None, limit=10, redis=redis
+        )
+        assert missed == expected
+        assert cached == expected
+        await forget_roster(redis, room)
+
+    @pytest.mark.asyncio
+    async def test_b_profile_changes_drop_cached_profiles(
+        self,
+        test_setup: None,
+        test_get_session: AsyncSession,
+        test_get_redis_client: Redis,
+        create_user,
+        as_user,
+    ):
+        """
+        Tests a new name or photo, flushed or updated by statement, is not
+        served from the cached roster once committed
+        """
+        redis = test_get_redis_client
+        room, users = await seed_roster(
+            test_get_session,
+            create_user,
+            "rosterprofile",
+            [timedelta(0), timedelta(minutes=1)],
+        )
+        await self.pages(test_get_session, room, users[0].id, as_user, redis)
+        assert await redis.hexists(roster_members_key(room.id), users[1].id)
+
+        users[1].first_name = "Renamed"
+        await test_get_session.commit()
+        assert not await redis.hexists(roster_members_key(room.id), users[1].id)
+        assert (
+            await room_roster_cache_repository.page(
+                room_id=room.id, after_member_id=None, limit=10, redis=redis
+            )
+            is None
+        )
+        pages = await self.pages(test_get_session, room, users[0].id, as_user, redis)
+        assert pages[0][1]["first_name"] == "Renamed"
+
+        await test_get_session.execute(
+            sa.update(User)
+            .where(User.id == users[0].id)
+            .values(profile_photo="https://photos.example/new.jpg")
+        )
+        await test_get_session.commit()
+        assert not await redis.hexists(roster_members_key(room.id), users[0].id)
+        pages = await self.pages(test_get_session, room, users[0].id, as_user, redis)
+        assert pages[0][0]["profile_photo"] == "https://photos.example/new.jpg"
+        await forget_roster(redis, room)
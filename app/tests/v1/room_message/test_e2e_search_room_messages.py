@@ -0,0 +1,176 @@
+"""
+Test room message search module
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.room_message import RoomMessage
+from app.service.v1.room_message_service import room_message_service
+
+
+class TestSearchRoomMessages:
+    """
+    Test full-text search over room messages
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_only_current_rooms_undeleted_messages_are_found(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests messages of rooms the user left or never joined, and deleted
+        messages, are never found, and room_id narrows the search
+        """
+        member = await create_user(test_get_session, "roomsearchmember")
+        other = await create_user(test_get_session, "roomsearchother")
+        rooms = {
+            name: Room(name=f"search {name} room", owner_id=other.id)
+            for name in ["joined", "second", "left", "foreign"]
+        }
+        test_get_session.add_all(rooms.values())
+        await test_get_session.flush()
+        test_get_session.add_all(
+            [
+                RoomMember(room_id=rooms["joined"].id, member_id=member.id),
+                RoomMember(room_id=rooms["second"].id, member_id=member.id),
+                RoomMember(
+                    room_id=rooms["left"].id, member_id=member.id, left_room=True
+                ),
+            ]
+        )
+        sent_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        messages = {
+            name: RoomMessage(
+                sender_id=other.id,
+                room_id=rooms[room].id,
+                content=f"release notes for the {name} build",
+                is_deleted=name == "deleted",
+                created_at=sent_at + timedelta(minutes=index),
+            )
+            for index, (name, room) in enumerate(
+                [
+                    ("joined", "joined"),
+                    ("deleted", "joined"),
+                    ("second", "second"),
+                    ("left", "left"),
+                    ("foreign", "foreign"),
+                ]
+            )
+        }
+        test_get_session.add_all(messages.values())
+        await test_get_session.commit()
+
+        everywhere = await room_message_service.search_messages(
+            request=as_user(member.id), session=test_get_session, q="release notes"
+        )
+        # equally good matches come newest first
+        assert [message.id for message in everywhere.data] == [
+            messages["second"].id,
+            messages["joined"].id,
+        ]
+        assert everywhere.next_cursor is None
+
+        in_room = await room_message_service.search_messages(
+            request=as_user(member.id),
+            session=test_get_session,
+            q="release",
+            room_id=rooms["joined"].id,
+        )
+        assert [message.id for message in in_room.data] == [messages["joined"].id]
+        assert in_room.data[0].room_id == rooms["joined"].id
+
+    @pytest.mark.asyncio
+    async def test_b_search_route(
+        self,
+        test_setup: None,
+        client: AsyncClient,
+        test_get_session: AsyncSession,
+        create_user,
+        login,
+    ):
+        """
+        Tests the search route finds the messages of the authenticated
+        member's rooms
+        """
+        member = await create_user(test_get_session, "httproomsearchmember")
+        stranger = await create_user(test_get_session, "httproomsearchstranger")
+        room = Room(name="http search room", owner_id=member.id)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        message = RoomMessage(
+            room_id=room.id, sender_id=member.id, content="mango season is here"
+        )
+        test_get_session.add_all(
+            [RoomMember(room_id=room.id, member_id=member.id, is_admin=True), message]
+        )
+        await test_get_session.commit()
+        url = "/api/v1/room-messages/search"
+        params = {"q": "mango", "room_id": room.id}
+
+        for user, found in [(member, [message.id]), (stranger, [])]:
+            response = await client.get(
+                url=url, params=params, headers=await login(user)
+            )
+            assert response.status_code == 200
+            assert [item["id"] for item in response.json()["data"]] == found
+        response = await client.get(url=url, params=params)
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_c_the_index_does_not_follow_the_implicit_rowid(
+        self, test_setup: None, test_get_session: AsyncSession, create_user, as_user
+    ):
+        """
+        Tests matches are found by message id once the rowids of the message
+        table change, and edits and deletes still reach the index
+        """
+        member = await create_user(test_get_session, "rowidsearchmember")
+        room = Room(name="rowid search room", owner_id=member.id)
+        test_get_session.add(room)
+        await test_get_session.flush()
+        messages = [
+            RoomMessage(room_id=room.id, sender_id=member.id, content=content)
+            for content in ["papaya for breakfast", "papaya for lunch"]
+        ]
+        test_get_session.add_all(
+            [RoomMember(room_id=room.id, member_id=member.id), *messages]
+        )
+        await test_get_session.commit()
+        table = RoomMessage.__table__
+
+        async def search(text: str) -> list:
+            found = await room_message_service.search_messages(
+                request=as_user(member.id),
+                session=test_get_session,
+                q=text,
+                room_id=room.id,
+            )
+            return [message.id for message in found.data]
+
+        # as VACUUM or copying the table may do
+        await test_get_session.execute(
+            sa.text(f"UPDATE {table.name} SET rowid = rowid + 1000")
+        )
+        await test_get_session.commit()
+        assert sorted(await search("papaya")) == sorted(
+            message.id for message in messages
+        )
+
+        await test_get_session.execute(
+            sa.update(table)
+            .where(table.c.id == messages[0].id)
+            .values(content="mango for breakfast")
+        )
+        await test_get_session.execute(
+            sa.delete(table).where(table.c.id == messages[1].id)
+        )
+        await test_get_session.commit()
+        assert await search("papaya") == []
+        assert await search("mango breakfast") == [messages[0].id]
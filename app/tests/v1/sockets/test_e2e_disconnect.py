@@ -0,0 +1,54 @@
+"""
+Test websocket disconnect module
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.repository.v1.room_presence_repository import PRESENCE_KEY
+from app.websocketss.ws_redis_connection_manager import (
+    DISCONNECT_SOCKET,
+    ws_redis_connection_manager,
+)
+
+
+class TestWebSocketDisconnect:
+    """
+    Test a user's presence follows their open sockets
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_only_the_last_socket_takes_the_user_offline(self):
+        """
+        Tests each disconnect removes its socket in one script, and presence
+        is only broadcast once the user's last socket is gone
+        """
+        script = AsyncMock(side_effect=[0, 1])
+        redis = MagicMock()
+        redis.register_script.return_value = script
+        redis.hkeys = AsyncMock(return_value=[])
+        redis.publish = AsyncMock()
+        websocket = MagicMock()
+
+        websocket.client.port = 50001
+        await ws_redis_connection_manager.disconnect_user(
+            user_id="user", websocket=websocket, redis=redis
+        )
+        redis.publish.assert_not_awaited()
+
+        websocket.client.port = 50002
+        await ws_redis_connection_manager.disconnect_user(
+            user_id="user", websocket=websocket, redis=redis
+        )
+        redis.publish.assert_awaited_once()
+
+        redis.register_script.assert_called_with(DISCONNECT_SOCKET)
+        assert [call.kwargs for call in script.await_args_list] == [
+            {
+                "keys": ["user-sockets-connected:user", "online_users", PRESENCE_KEY],
+                "args": [port, "user"],
+            }
+            for port in (50001, 50002)
+        ]
+        assert DISCONNECT_SOCKET.index("SREM") < DISCONNECT_SOCKET.index("SCARD")
@@ -0,0 +1,98 @@
+"""
+Test websocket pool connections module
+"""
+
+from unittest.mock import patch
+import uuid
+
+import pytest
+from fastapi import WebSocket
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.security import generate_token
+from app.models.user import User
+from app.models.user_session import UserSession
+
+
+class TestWebSocketPoolConnections:
+    """
+    Test websocket connections do not hold pooled database connections
+    """
+
+    @pytest.mark.asyncio
+    async def test_a_connected_sockets_hold_no_pool_connections(
+        self,
+        test_setup: None,
+        app_client: TestClient,
+        test_get_session: AsyncSession,
+    ):
+        """
+        Tests the auth session is released before the websocket relay starts
+        """
+        user = User(
+            email="socketpool@gtest.com",
+            username="socketpool",
+            first_name="Socket",
+            idempotency_key=str(uuid.uuid4()),
+            email_verified=True,
+        )
+        user.set_password("Johnson1234#")
+        test_get_session.add(user)
+        await test_get_session.flush()
+        user_session = UserSession(
+            user_id=user.id,
+            session_id=str(uuid.uuid4()),
+            jti=str(uuid.uuid4()),
+            location="Lagos",
+            ip_address="127.0.0.1",
+        )
+        test_get_session.add(user_session)
+        await test_get_session.commit()
+        await test_get_session.close()
+
+        token = await generate_token(
+            session_id=user_session.session_id,
+            user_id=user.id,
+            jti=user_session.jti,
+            user_agent="testclient",
+            ip_address="127.0.0.1",
+            location="Lagos",
+        )
+
+        engine = test_get_session.bind.sync_engine
+        checked_out = {"count": 0}
+
+        def on_checkout(*args):
+            checked_out["count"] += 1
+
+        def on_checkin(*args):
+            checked_out["count"] -= 1
+
+        event.listen(engine, "checkout", on_checkout)
+        event.listen(engine, "checkin", on_checkin)
+
+        held_while_connected = []
+
+        async def relay(websocket: WebSocket, subscribe_to: str, redis) -> None:
+            await websocket.accept()
+            held_while_connected.append(checked_out["count"])
+            await websocket.send_json({"type": "presence", "users": []})
+            await websocket.close()
+
+        try:
+            with patch(
+                "app.websocketss.ws_service.WebsocketService.connect_to_websocket",
+                side_effect=relay,
+            ):
+                with app_client.websocket_connect(
+                    "/chats/ws?subscribe_to=dm:1",
+                    headers={"Authorization": f"Bearer {token}"},
+                ) as websocket:
+                    assert websocket.receive_json()["type"] == "presence"
+        finally:
+            event.remove(engine, "checkout", on_checkout)
+            event.remove(engine, "checkin", on_checkin)
+
+        assert held_while_connected == [0]
@@ -1,6 +1,19 @@
 from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    task_prerun,
+    task_failure,
+    task_retry,
+    worker_init,
+)
 
 from app.core.config import settings
+from app.core.metrics import (
+    stamp_task_sent_at,
+    observe_task_queue_latency,
+    count_task_failure,
+    count_task_retry,
+)
 
 
 def make_celery(app=None, broker_url=None, result_backend=None):
@@ -24,6 +37,20 @@ def make_celery(app=None, broker_url=None, result_backend=None):
 
     # add celery configurations
     celery.config_from_object("app.core.celery_config")
+    celery.conf.beat_schedule = {
+        "reconcile-room-stats": {
+            "task": "app.utils.celery_setup.tasks.reconcile_room_stats",
+            "schedule": settings.room_stats_reconcile_interval_seconds,
+        },
+        "refresh-room-rankings": {
+            "task": "app.utils.celery_setup.tasks.refresh_room_rankings",
+            "schedule": settings.room_discovery_refresh_interval_seconds,
+        },
+        "expire-room-invitations": {
+            "task": "app.utils.celery_setup.tasks.expire_room_invitations",
+            "schedule": settings.room_invitation_expiry_interval_seconds,
+        },
+    }
 
     # Automatically discover tasks from the specified module
     celery.autodiscover_tasks(["app.utils.celery_setup.tasks"], related_name="tasks")
@@ -34,6 +61,22 @@ def make_celery(app=None, broker_url=None, result_backend=None):
 # Create a Celery app instance for production
 app = make_celery()
 
+# queue latency and failure metrics, see app.core.metrics
+before_task_publish.connect(stamp_task_sent_at)
+task_prerun.connect(observe_task_queue_latency)
+task_failure.connect(count_task_failure)
+task_retry.connect(count_task_retry)
+
+
+@worker_init.connect
+def create_results_tables(**kwargs):
+    """
+    Creates the celery results backend tables when a worker starts.
+    """
+    from app.database.celery_database import setup_celery_results_db
+
+    setup_celery_results_db()
+
 if __name__ == "__main__":
 
     app.start()
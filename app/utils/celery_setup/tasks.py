@@ -2,15 +2,28 @@
 Celery Task Module
 """
 
+import asyncio
 import os
 import smtplib
+import typing
+from contextlib import asynccontextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from jinja2 import Environment, FileSystemLoader, TemplateNotFound
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 
 from app.core.config import settings
+from app.database.redis_db import InstrumentedRedis
+from app.database.session import DATABASE_URL, asyncpg_connect_args
+from app.repository.v1.room_invitation_repository import room_invitation_repository
+from app.repository.v1.room_repository import RANKING_ORDER, room_repository
+from app.service.v1.room_service import room_service
 from app.utils.celery_setup.setup import app
 from app.utils.task_logger import create_logger
+from app.core.metrics import CELERY_TASK_FAILURES
+from app.websocketss.ws_redis_connection_manager import ws_redis_connection_manager
 
 
 RETRY_DELAY = 60  # 60 seconds delay for retry
@@ -84,6 +97,152 @@ def send_email_in_background(self, context: dict):
         except self.MaxRetriesExceededError:
             # retry task incase of failure.
             logger_.error("Max retries exceeded for task: %s", self.request.id)
+            CELERY_TASK_FAILURES.labels(task=self.name).inc()
+
+
+@asynccontextmanager
+async def task_session() -> typing.AsyncIterator[AsyncSession]:
+    """
+    Database session of a task running its own event loop: pooled
+    connections would outlive the loop, so none are kept.
+    """
+    engine = create_async_engine(
+        DATABASE_URL,
+        poolclass=NullPool,
+        connect_args=asyncpg_connect_args() if "asyncpg" in DATABASE_URL else {},
+    )
+    try:
+        async with async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )() as session:
+            yield session
+    finally:
+        await engine.dispose()
+
+
+async def reconcile_room_stats_in_batches() -> int:
+    """
+    Repairs the member and message counters of every room, a batch of rooms
+    per transaction.
+
+    Returns:
+        int: the number of rooms repaired.
+    """
+    repaired = 0
+    async with task_session() as session:
+        after_room_id = None
+        while True:
+            after_room_id, batch_repaired = await room_repository.reconcile_stats(
+                session=session,
+                batch_size=settings.room_stats_reconcile_batch_size,
+                after_room_id=after_room_id,
+            )
+            repaired += batch_repaired
+            if after_room_id is None:
+                return repaired
+
+
+@app.task(bind=True, max_retries=MAX_RETRIES, default_retry_delay=RETRY_DELAY)
+def reconcile_room_stats(self) -> int:
+    """
+    Repairs drifted room member and message counters, run by celery beat.
+
+    Returns:
+        int: the number of rooms repaired.
+    """
+    try:
+        repaired = asyncio.run(reconcile_room_stats_in_batches())
+    except Exception as exc:  # type: ignore
+        logger_.error("Room stats reconciliation failed: %s", exc)
+        try:
+            raise self.retry(exc=exc, countdown=RETRY_DELAY, max_retries=MAX_RETRIES)
+        except self.MaxRetriesExceededError:
+            logger_.error("Max retries exceeded for task: %s", self.request.id)
+            CELERY_TASK_FAILURES.labels(task=self.name).inc()
+            return 0
+    if repaired:
+        logger_.info("Room stats repaired for %s rooms", repaired)
+    return repaired
+
+
+async def refresh_room_rankings_once() -> None:
+    """
+    Ranks the top public rooms by activity and by size into the cache.
+    """
+    redis = InstrumentedRedis.from_url(url=settings.redis_url, decode_responses=True)
+    try:
+        async with task_session() as session:
+            for ranking in RANKING_ORDER:
+                await room_service.refresh_ranking(
+                    ranking=ranking, session=session, redis=redis
+                )
+    finally:
+        await redis.aclose()
+
+
+@app.task(bind=True)
+def refresh_room_rankings(self) -> None:
+    """
+    Precomputes the public room rankings of the discovery page, run by
+    celery beat. A failed run is not retried, the next one replaces it.
+    """
+    try:
+        asyncio.run(refresh_room_rankings_once())
+    except Exception as exc:  # type: ignore
+        logger_.error("Room rankings refresh failed: %s", exc)
+        CELERY_TASK_FAILURES.labels(task=self.name).inc()
+
+
+async def expire_room_invitations_in_batches() -> int:
+    """
+    Expires overdue pending room invitations, a batch per transaction, and
+    tells each batch's invitees.
+
+    Returns:
+        int: the number of invitations expired.
+    """
+    expired_count = 0
+    redis = InstrumentedRedis.from_url(url=settings.redis_url, decode_responses=True)
+    try:
+        async with task_session() as session:
+            while True:
+                expired = await room_invitation_repository.expire_overdue(
+                    session=session,
+                    batch_size=settings.room_invitation_expiry_batch_size,
+                )
+                expired_count += len(expired)
+                if expired:
+                    try:
+                        await ws_redis_connection_manager.invitations_expired(
+                            invitations=expired, redis=redis
+                        )
+                    except RedisError as exc:
+                        # the invitations stay expired, only the notice is lost
+                        logger_.warning("Invitation expiry notice failed: %s", exc)
+                if len(expired) < settings.room_invitation_expiry_batch_size:
+                    return expired_count
+    finally:
+        await redis.aclose()
+
+
+@app.task(bind=True)
+def expire_room_invitations(self) -> int:
+    """
+    Expires overdue room invitations, run by celery beat. A failed run is
+    not retried, the next one picks up where it stopped.
+
+    Returns:
+        int: the number of invitations expired.
+    """
+    try:
+        expired_count = asyncio.run(expire_room_invitations_in_batches())
+    except Exception as exc:  # type: ignore
+        logger_.error("Room invitations expiry failed: %s", exc)
+        CELERY_TASK_FAILURES.labels(task=self.name).inc()
+        return 0
+    if expired_count:
+        logger_.info("Room invitations expired: %s", expired_count)
+    return expired_count
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+"""
+Guarded writes module
+
+Writes check their preconditions inside the statement (a guarded UPDATE),
+so concurrent requests can't slip between a check and a write. When the
+write matches nothing the row is read back once to tell the caller which
+precondition failed.
+"""
+
+import typing
+
+from fastapi import HTTPException
+
+# (failed(row), status code, detail)
+Guard = typing.Tuple[typing.Callable[[typing.Any], bool], int, str]
+
+
+def raise_failed_guard(
+    row: typing.Any,
+    missing: typing.Tuple[int, str],
+    guards: typing.Sequence[Guard],
+    otherwise: typing.Tuple[int, str],
+) -> typing.NoReturn:
+    """
+    Raises the error of the first guard a row fails, after a guarded write
+    matched nothing.
+
+    Args:
+        row: The row read back, None if it does not exist.
+        missing(tuple): (status code, detail) when the row does not exist.
+        guards(Sequence): (failed(row), status code, detail), checked in order.
+        otherwise(tuple): (status code, detail) when every guard passes, for
+            the guard that can't be checked on the row.
+    Raises:
+        HTTPException: always.
+    """
+    if row is None:
+        raise HTTPException(status_code=missing[0], detail=missing[1])
+    for failed, status_code, detail in guards:
+        if failed(row):
+            raise HTTPException(status_code=status_code, detail=detail)
+    raise HTTPException(status_code=otherwise[0], detail=otherwise[1])
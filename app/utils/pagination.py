@@ -0,0 +1,101 @@
+"""
+Keyset pagination module
+
+Cursors are opaque to clients: the sort key of the last row of a page,
+JSON encoded then urlsafe base64 encoded. Pages are fetched one row
+larger than asked, the extra row tells whether a next page exists.
+"""
+
+import base64
+import binascii
+import json
+import typing
+
+from fastapi import HTTPException, status
+
+Row = typing.TypeVar("Row")
+
+
+def encode_cursor(values: typing.Sequence[typing.Any]) -> str:
+    """
+    Encodes the sort key of the last row of a page.
+
+    Args:
+        values(Sequence): The sort key, JSON compatible values.
+    Returns:
+        str: the cursor.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> typing.List[typing.Any]:
+    """
+    Decodes a cursor.
+
+    Args:
+        cursor(str): The cursor.
+        size(int): The number of values of the sort key.
+    Returns:
+        List: the sort key.
+    Raises:
+        ValueError: for a cursor this module did not encode.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("invalid cursor")
+    return values
+
+
+def after_cursor(
+    cursor: typing.Optional[str],
+    size: int,
+    parse: typing.Callable[..., typing.Tuple[typing.Any, ...]],
+) -> typing.Optional[typing.Tuple[typing.Any, ...]]:
+    """
+    Reads the sort key a page request continues after.
+
+    Args:
+        cursor(str): The next_cursor of the previous page, None for the first.
+        size(int): The number of values of the sort key.
+        parse(Callable): Builds the sort key from the decoded values.
+    Returns:
+        tuple: the sort key, None for the first page.
+    Raises:
+        HTTPException: 400 for an invalid cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        return parse(*decode_cursor(cursor, size))
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from exc
+
+
+def split_page(
+    rows: typing.Sequence[Row],
+    limit: int,
+    sort_key: typing.Callable[[Row], typing.Sequence[typing.Any]],
+) -> typing.Tuple[typing.List[Row], typing.Optional[str]]:
+    """
+    Splits the limit + 1 rows fetched for a page into the page and the
+    cursor of the next one.
+
+    Args:
+        rows(Sequence): The fetched rows, in page order.
+        limit(int): The page size.
+        sort_key(Callable): The JSON compatible sort key of a row.
+    Returns:
+        tuple: the page, and the next cursor, None on the last page.
+    """
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    return page, encode_cursor(sort_key(page[-1]))
+
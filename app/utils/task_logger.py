@@ -36,6 +36,20 @@ class DictFormatter(logging.Formatter):
             log_record["status_code"] = record.status_code  # type: ignore
         if hasattr(record, "process_time"):
             log_record["process_time"] = record.process_time  # type: ignore
+        if hasattr(record, "db_queries"):
+            log_record["db_queries"] = record.db_queries  # type: ignore
+        if hasattr(record, "db_time"):
+            log_record["db_time"] = record.db_time  # type: ignore
+        if hasattr(record, "db_slowest"):
+            log_record["db_slowest"] = record.db_slowest  # type: ignore
+        if hasattr(record, "db_slowest_statement"):
+            log_record["db_slowest_statement"] = record.db_slowest_statement  # type: ignore
+        if hasattr(record, "statement"):
+            log_record["statement"] = record.statement  # type: ignore
+        if hasattr(record, "parameters"):
+            log_record["parameters"] = record.parameters  # type: ignore
+        if hasattr(record, "duration"):
+            log_record["duration"] = record.duration  # type: ignore
 
         return json.dumps(log_record)
 
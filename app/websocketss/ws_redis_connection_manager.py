@@ -10,9 +10,22 @@ from fastapi import WebSocket
 
 from app.core.config import settings
 from app.models.direct_message import DirectMessage
+from app.repository.v1.room_presence_repository import PRESENCE_KEY
 
 REDIS_URL: str = settings.redis_url
 
+# drops one socket of a user and, once none is left, the user's presence;
+# returns 1 when the user went offline
+DISCONNECT_SOCKET = """
+redis.call('SREM', KEYS[1], ARGV[1])
+if redis.call('SCARD', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[2])
+redis.call('SREM', KEYS[3], ARGV[2])
+return 1
+"""
+
 
 class WSRedisConnectionManager:
     """
@@ -29,17 +42,22 @@ class WSRedisConnectionManager:
         """
         await redis.sadd(f"user-sockets-connected:{user_id}", websocket.client.port)  # type: ignore
         await redis.hset("online_users", user_id, "online")  # type: ignore
+        # the set form of online_users, intersected with room members
+        await redis.sadd(PRESENCE_KEY, user_id)  # type: ignore
         await self._broadcast_presence(redis=redis)
 
     async def disconnect_user(
         self, user_id: str, websocket: WebSocket, redis: Redis
     ) -> None:
         """
-        Removes User from Redis set
+        Removes a user's socket, and the user from the online users once it
+        was their last one
         """
-        if await redis.scard(f"user-sockets-connected:{user_id}") == 0:  # type: ignore
-            await redis.srem(f"user-sockets-connected:{user_id}", websocket.client.port)  # type: ignore
-            await redis.hdel("online_users", user_id)  # type: ignore
+        went_offline = await redis.register_script(DISCONNECT_SOCKET)(
+            keys=[f"user-sockets-connected:{user_id}", "online_users", PRESENCE_KEY],
+            args=[websocket.client.port, user_id],  # type: ignore
+        )
+        if went_offline:
             await self._broadcast_presence(redis=redis)
 
     async def _broadcast_presence(self, redis: Redis) -> None:
@@ -107,6 +125,37 @@ class WSRedisConnectionManager:
             json.dumps({"type": "system", "text": f"{user_id} left"}),
         )  # type: ignore
 
+    async def room_members_changed(
+        self,
+        room_id: str,
+        event: str,
+        member_ids: typing.Sequence[str],
+        actor_id: str,
+        redis: Redis,
+    ) -> None:
+        """
+        Announces many members joining, leaving, promoted or demoted in one
+        room system event
+        """
+        async with redis.pipeline(transaction=False) as pipe:
+            if event == "members_joined":
+                pipe.sadd(f"room:socket:{room_id}:members", *member_ids)
+            elif event == "members_left":
+                pipe.srem(f"room:socket:{room_id}:members", *member_ids)
+            pipe.publish(
+                f"room:{room_id}",
+                json.dumps(
+                    {
+                        "type": "system",
+                        "event": event,
+                        "by": actor_id,
+                        "members": list(member_ids),
+                        "text": f"{len(member_ids)} {event.replace('_', ' ')}",
+                    }
+                ),
+            )
+            await pipe.execute()
+
     async def send_room_message(
         self, user_id: str, room_id: str, message: str, redis: Redis
     ) -> None:
@@ -125,6 +174,27 @@ class WSRedisConnectionManager:
             redis=redis,
         )
 
+    # +++++++++++++++++++ INVITATIONS +++++++++++++++++++++++
+    async def invitations_expired(
+        self, invitations: typing.Sequence[typing.Mapping], redis: Redis
+    ) -> None:
+        """
+        Tells invitees their invitations expired, every invitee's channel
+        in one pipelined round trip
+        """
+        expired_by_invitee: typing.Dict[str, typing.List[dict]] = {}
+        for invitation in invitations:
+            expired_by_invitee.setdefault(invitation["invitee_id"], []).append(
+                {"invitation_id": invitation["id"], "room_id": invitation["room_id"]}
+            )
+        async with redis.pipeline(transaction=False) as pipe:
+            for invitee_id, expired in expired_by_invitee.items():
+                pipe.publish(
+                    f"invitations:{invitee_id}",
+                    json.dumps({"type": "invitations_expired", "invitations": expired}),
+                )
+            await pipe.execute()
+
     # +++++++++++++++++++ SUBSCRIPTION HANDLER +++++++++++++++++++++++
 
     async def publish_message(self, channel: str, message: str, redis: Redis) -> None:
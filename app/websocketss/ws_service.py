@@ -7,6 +7,7 @@ from redis.asyncio import Redis
 
 from app.websocketss.ws_redis_connection_manager import ws_redis_connection_manager
 from app.utils.task_logger import create_logger
+from app.core.metrics import WEBSOCKET_CONNECTIONS, PUBSUB_CHANNELS
 
 
 logger = create_logger(":: WebsocketService ::")
@@ -37,6 +38,8 @@ class WebsocketService:
         pubsub = await ws_redis_connection_manager.subscribe(
             channels=channels, redis=redis
         )
+        WEBSOCKET_CONNECTIONS.inc()
+        PUBSUB_CHANNELS.inc(len(channels))
 
         try:
             # Send initial presence data
@@ -54,6 +57,9 @@ class WebsocketService:
             await ws_redis_connection_manager.disconnect_user(
                 user_id=current_user_id, websocket=websocket, redis=redis
             )
+        finally:
+            WEBSOCKET_CONNECTIONS.dec()
+            PUBSUB_CHANNELS.dec(len(channels))
 
 
 websocket_service = WebsocketService()
@@ -0,0 +1,5 @@
+"""
+Benchmarks package.
+
+Local load-test and benchmark tools. Nothing in here is imported by the app.
+"""
@@ -0,0 +1,215 @@
+"""
+Benchmark common module
+"""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import typing
+from datetime import datetime, timezone
+
+
+def percentile(samples: typing.Sequence[float], pct: float) -> float:
+    """
+    Returns the nearest-rank percentile of samples.
+
+    Args:
+        samples (Sequence[float]): The recorded samples.
+        pct (float): The percentile to compute (0 - 100).
+    Returns:
+        float: the percentile value or 0.0 for empty samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: typing.Sequence[float]) -> typing.Dict[str, float]:
+    """
+    Summarizes samples into count, mean, p50, p95, p99 and max.
+
+    Args:
+        samples (Sequence[float]): The recorded samples.
+    Returns:
+        dict: The summary.
+    """
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3),
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "p99": round(percentile(samples, 99), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+def metric(
+    value: typing.Optional[float], unit: str, better: str = "lower"
+) -> typing.Dict[str, typing.Any]:
+    """
+    Builds a metric entry for a results file.
+
+    Args:
+        value (float): The measured value.
+        unit (str): The unit of the value (ms, msg/s, bytes, ...).
+        better (str): Which direction is an improvement (lower, higher).
+    Returns:
+        dict: The metric entry.
+    """
+    if better not in ["lower", "higher"]:
+        raise ValueError("better must be either lower or higher")
+    return {"value": value, "unit": unit, "better": better}
+
+
+def git_revision() -> typing.Optional[str]:
+    """
+    Retrieves the current git revision, if any.
+    """
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_results(
+    name: str, parameters: dict, metrics: typing.Dict[str, dict], extra: dict = {}
+) -> dict:
+    """
+    Builds the results payload saved as a JSON baseline.
+
+    Args:
+        name (str): The benchmark name.
+        parameters (dict): The parameters the benchmark ran with.
+        metrics (dict): Flat mapping of metric name to metric entry.
+        extra (dict): Optional extra details (not compared).
+    Returns:
+        dict: The results payload.
+    """
+    return {
+        "benchmark": name,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "metrics": metrics,
+        "extra": extra,
+    }
+
+
+def save_results(results: dict, output: typing.Optional[str]) -> str:
+    """
+    Saves results as JSON.
+
+    Args:
+        results (dict): The results payload.
+        output (str): Optional output path. Defaults to benchmarks/results/<name>-<time>.json
+    Returns:
+        str: the path written to.
+    """
+    if not output:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(
+            "benchmarks", "results", f"{results['benchmark']}-{stamp}.json"
+        )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    return output
+
+
+def load_results(path: str) -> dict:
+    """
+    Loads a results file.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def compare_results(
+    current: dict, baseline: dict, tolerance: float = 10.0
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Compares current results against a baseline.
+
+    Args:
+        current (dict): The current results payload.
+        baseline (dict): The baseline results payload.
+        tolerance (float): Allowed regression in percent before flagging.
+    Returns:
+        List[dict]: One entry per metric present in both, flagged if regressed.
+    """
+    comparison = []
+    baseline_metrics: dict = baseline.get("metrics", {})
+    for name, entry in current.get("metrics", {}).items():
+        old = baseline_metrics.get(name)
+        if not old or old.get("value") in [None, 0] or entry.get("value") is None:
+            continue
+        change = (entry["value"] - old["value"]) / abs(old["value"]) * 100
+        regressed = (
+            change > tolerance if entry["better"] == "lower" else change < -tolerance
+        )
+        comparison.append(
+            {
+                "metric": name,
+                "baseline": old["value"],
+                "current": entry["value"],
+                "unit": entry["unit"],
+                "change_pct": round(change, 2),
+                "regressed": regressed,
+            }
+        )
+    return comparison
+
+
+def print_results(results: dict, comparison: typing.List[dict] = []) -> None:
+    """
+    Prints metrics and, if any, the baseline comparison.
+    """
+    print(f"\n== {results['benchmark']} ({results['git_revision']}) ==")
+    for name, entry in sorted(results["metrics"].items()):
+        print(f"{name:<55} {entry['value']!s:>14} {entry['unit']}")
+    if comparison:
+        print("\n-- baseline comparison --")
+        for row in comparison:
+            flag = "REGRESSED" if row["regressed"] else "ok"
+            print(
+                f"{row['metric']:<55} {row['baseline']!s:>12} -> "
+                f"{row['current']!s:<12} {row['change_pct']:>8}%  {flag}"
+            )
+
+
+def process_tree_rss(pid: int) -> typing.Optional[int]:
+    """
+    Returns the resident set size in bytes of a process and its children.
+    Linux only (reads /proc), returns None elsewhere.
+    """
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status", "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            children_path = f"/proc/{current}/task/{current}/children"
+            if os.path.exists(children_path):
+                with open(children_path, "r", encoding="utf-8") as file:
+                    pending.extend(int(child) for child in file.read().split())
+    except (OSError, ValueError):
+        return None
+    return total
@@ -0,0 +1,666 @@
+"""
+HTTP endpoint benchmark module.
+
+Seeds a database with a configurable number of users, conversations, rooms
+and messages, then drives the real FastAPI app in-process through
+`httpx.AsyncClient` (the same way `app/tests/conftest.py` does) against the
+routes in `app/route/v1`. Reports p50/p95/p99 latency and SQL statements
+per request for every endpoint.
+
+Usage:
+    python -m benchmarks.http_benchmark --direct-messages 1000000 --iterations 200
+    python -m benchmarks.http_benchmark --compare benchmarks/results/http-baseline.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+import typing
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import (
+    build_results,
+    compare_results,
+    load_results,
+    metric,
+    print_results,
+    save_results,
+    summarize,
+)
+
+BATCH_SIZE = 5000
+PASSWORD = "Benchmark1234#"
+
+
+@dataclass
+class Actor:
+    """
+    A seeded user that can authenticate against the app.
+    """
+
+    user_id: str
+    username: str
+    token: str = ""
+
+
+@dataclass
+class Dataset:
+    """
+    Identifiers of the seeded rows the endpoint cases need.
+    """
+
+    viewer: Actor
+    users: typing.List[str] = field(default_factory=list)
+    hot_conversation_id: str = ""
+    hot_peer_id: str = ""
+    hot_room_id: str = ""
+    hot_room_members: typing.List[str] = field(default_factory=list)
+    outsiders: typing.List[str] = field(default_factory=list)
+    fresh_direct_messages: typing.List[str] = field(default_factory=list)
+    fresh_room_messages: typing.List[str] = field(default_factory=list)
+    invitations: typing.List[str] = field(default_factory=list)
+
+
+@dataclass
+class EndpointCase:
+    """
+    One benchmarked endpoint.
+
+    build receives the iteration number and returns (method, url, json body).
+    after receives the response, e.g. to collect ids for later cases.
+    """
+
+    name: str
+    build: typing.Callable[[int], typing.Tuple[str, str, typing.Optional[dict]]]
+    needs_redis: bool = False
+    after: typing.Optional[typing.Callable[[typing.Any], None]] = None
+
+
+def configure_environment(database_url: str) -> None:
+    """
+    Points the app settings at the benchmark database.
+    Must run before any `app` module is imported.
+    """
+    os.environ["DB_URL_ASYNC"] = database_url
+    os.environ["TEST"] = ""
+
+
+async def insert_batches(session, table, rows: typing.Iterable[dict]) -> int:
+    """
+    Inserts rows in batches with executemany.
+    Scalar python-side column defaults are filled in the way the ORM would,
+    since some server defaults (e.g. "FALSE") are not portable to SQLite.
+    """
+    import sqlalchemy as sa
+
+    defaults = {
+        column.key: column.default.arg
+        for column in table.columns
+        if column.default is not None and column.default.is_scalar
+    }
+    batch: typing.List[dict] = []
+    total = 0
+    for row in rows:
+        batch.append({**defaults, **row})
+        if len(batch) >= BATCH_SIZE:
+            await session.execute(sa.insert(table), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        await session.execute(sa.insert(table), batch)
+        total += len(batch)
+    return total
+
+
+async def seed(args: argparse.Namespace) -> Dataset:
+    """
+    Seeds users, sessions, direct conversations/messages, rooms, members
+    and room messages with bulk inserts.
+    """
+    from uuid6 import uuid7
+    from app.database.session import create_tables, async_session_factory
+    from app.core.security import generate_token
+    from app.models.user import User, password_context
+    from app.models.user_session import UserSession
+    from app.models.direct_conversation import DirectConversation
+    from app.models.direct_message import DirectMessage
+    from app.models.room import Room
+    from app.models.room_member import RoomMember
+    from app.models.room_message import RoomMessage
+
+    random.seed(args.seed)
+    await create_tables()
+
+    reserve = 2 * (args.iterations + args.warmup)
+    if args.users < reserve + args.members_per_room + 2:
+        raise SystemExit(
+            f"--users must be at least {reserve + args.members_per_room + 2} "
+            "for the chosen iterations and members per room"
+        )
+
+    now = datetime.now(timezone.utc)
+    history_start = now - timedelta(days=30)
+    password_hash = password_context.hash(PASSWORD)
+    user_ids = [str(uuid7()) for _ in range(args.users)]
+
+    def user_rows() -> typing.Iterator[dict]:
+        for index, user_id in enumerate(user_ids):
+            email = f"bench-{index}@example.com"
+            yield {
+                "id": user_id,
+                "email": email,
+                "username": f"bench{index}",
+                "first_name": f"Bench{index}",
+                "password": password_hash,
+                "email_verified": True,
+                "idempotency_key": hashlib.sha256(email.encode()).hexdigest(),
+            }
+
+    viewer = Actor(user_id=user_ids[0], username="bench0")
+    dataset = Dataset(viewer=viewer, users=user_ids)
+    dataset.outsiders = user_ids[-reserve:]
+    members_pool = user_ids[1:-reserve]
+
+    async with async_session_factory() as session:
+        await insert_batches(session, User.__table__, user_rows())
+
+        session_id, jti = str(uuid.uuid4()), str(uuid.uuid4())
+        await insert_batches(
+            session,
+            UserSession.__table__,
+            [
+                {
+                    "id": str(uuid7()),
+                    "user_id": viewer.user_id,
+                    "session_id": session_id,
+                    "jti": jti,
+                    "location": "benchmark",
+                    "ip_address": "127.0.0.1",
+                }
+            ],
+        )
+        viewer.token = await generate_token(
+            session_id=session_id,
+            user_id=viewer.user_id,
+            jti=jti,
+            user_agent="http-benchmark",
+            ip_address="127.0.0.1",
+            location="benchmark",
+        )
+
+        # direct conversations: the viewer talks to the first peers, the rest are
+        # random pairs so the inbox query has to skip other users' rows
+        pairs: typing.Set[typing.Tuple[str, str]] = set()
+        viewer_peers = members_pool[: min(args.viewer_conversations, args.conversations)]
+        for peer in viewer_peers:
+            pairs.add((viewer.user_id, peer))
+        while len(pairs) < args.conversations:
+            sender, recipient = random.sample(members_pool, 2)
+            if (recipient, sender) not in pairs:
+                pairs.add((sender, recipient))
+        conversations = [
+            {"id": str(uuid7()), "sender_id": sender, "recipient_id": recipient}
+            for sender, recipient in sorted(pairs, key=lambda pair: pair[0] != viewer.user_id)
+        ]
+        await insert_batches(session, DirectConversation.__table__, conversations)
+        dataset.hot_conversation_id = conversations[0]["id"]
+        dataset.hot_peer_id = conversations[0]["recipient_id"]
+
+        step = (now - history_start) / max(args.direct_messages, 1)
+
+        def direct_message_rows() -> typing.Iterator[dict]:
+            for index in range(args.direct_messages):
+                conversation = conversations[index % len(conversations)]
+                forward = index % 2 == 0
+                created_at = history_start + step * index
+                yield {
+                    "id": str(uuid7()),
+                    "conversation_id": conversation["id"],
+                    "sender_id": conversation["sender_id" if forward else "recipient_id"],
+                    "recipient_id": conversation["recipient_id" if forward else "sender_id"],
+                    "content": f"benchmark message {index}",
+                    "media_type": "text",
+                    "status": "sent",
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+
+        await insert_batches(session, DirectMessage.__table__, direct_message_rows())
+
+        # messages the viewer can still edit/delete (15 minute window)
+        fresh = [
+            {
+                "id": str(uuid7()),
+                "conversation_id": dataset.hot_conversation_id,
+                "sender_id": viewer.user_id,
+                "recipient_id": dataset.hot_peer_id,
+                "content": "fresh benchmark message",
+                "media_type": "text",
+                "status": "sent",
+            }
+            for _ in range(2 * (args.iterations + args.warmup))
+        ]
+        await insert_batches(session, DirectMessage.__table__, fresh)
+        dataset.fresh_direct_messages = [row["id"] for row in fresh]
+
+        rooms = [
+            {
+                "id": str(uuid7()),
+                "owner_id": viewer.user_id,
+                "name": f"benchmark room {index}",
+                "messages_delete_able": True,
+            }
+            for index in range(args.rooms)
+        ]
+        await insert_batches(session, Room.__table__, rooms)
+        dataset.hot_room_id = rooms[0]["id"]
+
+        def member_rows() -> typing.Iterator[dict]:
+            for room in rooms:
+                yield {
+                    "id": str(uuid7()),
+                    "room_id": room["id"],
+                    "member_id": viewer.user_id,
+                    "is_admin": True,
+                }
+                members = random.sample(members_pool, min(args.members_per_room, len(members_pool)))
+                if room["id"] == dataset.hot_room_id:
+                    dataset.hot_room_members = members
+                for member_id in members:
+                    yield {
+                        "id": str(uuid7()),
+                        "room_id": room["id"],
+                        "member_id": member_id,
+                        "is_admin": False,
+                    }
+
+        await insert_batches(session, RoomMember.__table__, member_rows())
+
+        room_step = (now - history_start) / max(args.room_messages, 1)
+
+        def room_message_rows() -> typing.Iterator[dict]:
+            for index in range(args.room_messages):
+                room = rooms[index % len(rooms)]
+                created_at = history_start + room_step * index
+                yield {
+                    "id": str(uuid7()),
+                    "room_id": room["id"],
+                    "sender_id": viewer.user_id,
+                    "content": f"benchmark room message {index}",
+                    "media_type": "text",
+                    "status": "sent",
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+
+        await insert_batches(session, RoomMessage.__table__, room_message_rows())
+
+        fresh_room = [
+            {
+                "id": str(uuid7()),
+                "room_id": dataset.hot_room_id,
+                "sender_id": viewer.user_id,
+                "content": "fresh benchmark room message",
+                "media_type": "text",
+                "status": "sent",
+            }
+            for _ in range(2 * (args.iterations + args.warmup))
+        ]
+        await insert_batches(session, RoomMessage.__table__, fresh_room)
+        dataset.fresh_room_messages = [row["id"] for row in fresh_room]
+
+        await session.commit()
+
+    return dataset
+
+
+def build_cases(dataset: Dataset) -> typing.List[EndpointCase]:
+    """
+    Builds the endpoint cases, one per route in app/route/v1.
+    Media upload and the email-sending auth routes are left out since they
+    call external services.
+    """
+    viewer = dataset.viewer
+    outsiders = list(dataset.outsiders)
+    half = len(outsiders) // 2
+    member_candidates, invitee_candidates = outsiders[:half], outsiders[half:]
+    promotable = list(dataset.hot_room_members)
+
+    def collect_invitation(response) -> None:
+        if response.status_code == 201:
+            dataset.invitations.append(response.json()["data"]["id"])
+
+    return [
+        EndpointCase(
+            "POST /auth/login",
+            lambda i: (
+                "POST",
+                "/api/v1/auth/login",
+                {
+                    "username": viewer.username,
+                    "password": PASSWORD,
+                    "session_id": str(uuid.uuid4()),
+                },
+            ),
+        ),
+        EndpointCase(
+            "GET /direct-conversations",
+            lambda i: ("GET", "/api/v1/direct-conversations?page=1&limit=50", None),
+        ),
+        EndpointCase(
+            "GET /direct-messages",
+            lambda i: (
+                "GET",
+                f"/api/v1/direct-messages?conversation_id={dataset.hot_conversation_id}&page=1&limit=50",
+                None,
+            ),
+        ),
+        EndpointCase(
+            "POST /direct-messages",
+            lambda i: (
+                "POST",
+                "/api/v1/direct-messages",
+                {
+                    "recipient_id": dataset.hot_peer_id,
+                    "conversation_id": dataset.hot_conversation_id,
+                    "message": f"benchmark send {i}",
+                },
+            ),
+            needs_redis=True,
+        ),
+        EndpointCase(
+            "PATCH /direct-messages",
+            lambda i: (
+                "PATCH",
+                "/api/v1/direct-messages",
+                {
+                    "conversation_id": dataset.hot_conversation_id,
+                    "message_id": dataset.fresh_direct_messages[i],
+                    "message": f"benchmark edit {i}",
+                },
+            ),
+        ),
+        EndpointCase(
+            "PUT /direct-messages",
+            lambda i: (
+                "PUT",
+                "/api/v1/direct-messages",
+                {
+                    "message_ids": [dataset.fresh_direct_messages[-(i + 1)]],
+                    "delete_for_both": False,
+                },
+            ),
+        ),
+        EndpointCase(
+            "GET /rooms",
+            lambda i: ("GET", "/api/v1/rooms?page=1&limit=20", None),
+        ),
+        EndpointCase(
+            "POST /rooms",
+            lambda i: (
+                "POST",
+                "/api/v1/rooms",
+                {
+                    "name": f"benchmark new room {i}",
+                    "is_private": False,
+                    "messages_delete_able": True,
+                    "is_deactivated": False,
+                    "allow_admin_messages_only": False,
+                },
+            ),
+        ),
+        EndpointCase(
+            "PATCH /rooms",
+            lambda i: (
+                "PATCH",
+                "/api/v1/rooms",
+                {"room_id": dataset.hot_room_id, "name": f"benchmark room {i}"},
+            ),
+        ),
+        EndpointCase(
+            "GET /room-members/{room_id}",
+            lambda i: ("GET", f"/api/v1/room-members/{dataset.hot_room_id}", None),
+        ),
+        EndpointCase(
+            "POST /room-members/{room_id}",
+            lambda i: (
+                "POST",
+                f"/api/v1/room-members/{dataset.hot_room_id}",
+                {"member_id": member_candidates[i], "is_admin": False},
+            ),
+        ),
+        EndpointCase(
+            "PUT /room-members/{room_id}",
+            lambda i: (
+                "PUT",
+                f"/api/v1/room-members/{dataset.hot_room_id}",
+                {"member_id": promotable[i % len(promotable)], "is_admin": True},
+            ),
+        ),
+        EndpointCase(
+            "POST /room-invitations",
+            lambda i: (
+                "POST",
+                "/api/v1/room-invitations",
+                {"invitee_id": invitee_candidates[i], "room_id": dataset.hot_room_id},
+            ),
+            after=collect_invitation,
+        ),
+        EndpointCase(
+            "PATCH /room-invitations",
+            lambda i: (
+                "PATCH",
+                "/api/v1/room-invitations",
+                {
+                    "invitation_id": dataset.invitations[i % len(dataset.invitations)]
+                    if dataset.invitations
+                    else str(uuid.uuid4()),
+                    "room_id": dataset.hot_room_id,
+                    "action": "cancel",
+                },
+            ),
+        ),
+        EndpointCase(
+            "GET /room-messages/{room_id}",
+            lambda i: (
+                "GET",
+                f"/api/v1/room-messages/{dataset.hot_room_id}?page=1&limit=50",
+                None,
+            ),
+        ),
+        EndpointCase(
+            "POST /room-messages",
+            lambda i: (
+                "POST",
+                "/api/v1/room-messages",
+                {"room_id": dataset.hot_room_id, "message": f"benchmark room send {i}"},
+            ),
+        ),
+        EndpointCase(
+            "PATCH /room-messages/{room_id}",
+            lambda i: (
+                "PATCH",
+                f"/api/v1/room-messages/{dataset.hot_room_id}",
+                {
+                    "message_id": dataset.fresh_room_messages[i],
+                    "message": f"benchmark room edit {i}",
+                },
+            ),
+        ),
+        EndpointCase(
+            "PUT /room-messages/{room_id}",
+            lambda i: (
+                "PUT",
+                f"/api/v1/room-messages/{dataset.hot_room_id}",
+                {"message_ids": [dataset.fresh_room_messages[-(i + 1)]]},
+            ),
+        ),
+    ]
+
+
+async def redis_available() -> bool:
+    """
+    Checks if the configured redis answers.
+    """
+    from redis.asyncio import Redis
+    from redis.exceptions import RedisError
+    from app.core.config import settings
+
+    redis = Redis.from_url(settings.redis_url, socket_connect_timeout=1)
+    try:
+        return bool(await redis.ping())
+    except (RedisError, OSError):
+        return False
+    finally:
+        await redis.aclose()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """
+    Seeds the database, runs every endpoint case and returns the results payload.
+    """
+    import httpx
+    from sqlalchemy import event
+    from app.database.session import async_engine
+    from main import app
+
+    seed_started = time.perf_counter()
+    dataset = await seed(args)
+    seed_seconds = time.perf_counter() - seed_started
+
+    statements = {"count": 0}
+
+    def count_statement(*_: typing.Any) -> None:
+        statements["count"] += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    has_redis = await redis_available()
+    metrics: typing.Dict[str, dict] = {}
+    endpoints: typing.Dict[str, dict] = {}
+    skipped: typing.List[str] = []
+
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://benchmark",
+        headers={
+            "Authorization": f"Bearer {dataset.viewer.token}",
+            "User-Agent": "http-benchmark",
+        },
+    ) as client:
+        for case in build_cases(dataset):
+            if args.only and not any(part in case.name for part in args.only):
+                continue
+            if case.needs_redis and not has_redis:
+                skipped.append(case.name)
+                continue
+            latencies: typing.List[float] = []
+            queries: typing.List[float] = []
+            statuses: Counter = Counter()
+            for iteration in range(args.warmup + args.iterations):
+                method, url, body = case.build(iteration)
+                before = statements["count"]
+                started = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                elapsed = (time.perf_counter() - started) * 1000
+                if case.after:
+                    case.after(response)
+                if iteration < args.warmup:
+                    continue
+                latencies.append(elapsed)
+                queries.append(statements["count"] - before)
+                statuses[response.status_code] += 1
+
+            latency = summarize(latencies)
+            query_summary = summarize(queries)
+            endpoints[case.name] = {
+                "latency_ms": latency,
+                "queries_per_request": query_summary,
+                "status_codes": {str(code): count for code, count in statuses.items()},
+            }
+            metrics[f"{case.name}.p50_ms"] = metric(latency["p50"], "ms")
+            metrics[f"{case.name}.p95_ms"] = metric(latency["p95"], "ms")
+            metrics[f"{case.name}.p99_ms"] = metric(latency["p99"], "ms")
+            metrics[f"{case.name}.queries_per_request"] = metric(
+                query_summary["mean"], "queries"
+            )
+
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    await async_engine.dispose()
+
+    parameters = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ["output", "compare", "database_url"]
+    }
+    parameters["database_dialect"] = async_engine.dialect.name
+    return build_results(
+        "http-benchmark",
+        parameters,
+        metrics,
+        {
+            "seed_seconds": round(seed_seconds, 2),
+            "skipped_without_redis": skipped,
+            "endpoints": endpoints,
+        },
+    )
+
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    """
+    Parses command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="HTTP endpoint benchmark")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--viewer-conversations", type=int, default=500, help="conversations the benchmark user takes part in")
+    parser.add_argument("--direct-messages", type=int, default=100000)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--members-per-room", type=int, default=500)
+    parser.add_argument("--room-messages", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=100, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per endpoint")
+    parser.add_argument("--only", nargs="*", default=[], help="only run endpoints whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway sqlite file")
+    parser.add_argument("--output", default=None, help="results JSON path")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    """
+    Entry point.
+    """
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="http-benchmark-") as workdir:
+        database_url = args.database_url or (
+            f"sqlite+aiosqlite:///{os.path.join(workdir, 'http-benchmark.db')}"
+        )
+        configure_environment(database_url)
+
+        results = asyncio.run(run(args))
+
+    comparison = []
+    if args.compare:
+        comparison = compare_results(results, load_results(args.compare), args.tolerance)
+    path = save_results(results, args.output)
+    print_results(results, comparison)
+    if results["extra"]["skipped_without_redis"]:
+        print(f"\nskipped (redis unavailable): {results['extra']['skipped_without_redis']}")
+    print(f"\nresults written to {path}")
+    return 1 if any(row["regressed"] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
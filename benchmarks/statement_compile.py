@@ -0,0 +1,303 @@
+"""
+Statement compile overhead benchmark module.
+
+Measures the Python-side cost SQLAlchemy pays per request for the hot
+repository queries (session check, membership fetch, message fetch and
+conversation lookup), comparing statements rebuilt on every call (how the
+repositories built them before) with the prebuilt statements they execute
+now with bound parameters.
+
+Reported per query and per request (all four queries):
+- build_key_us: building the statement and generating its cache key, paid
+  on every execution even when the compiled form is cached.
+- compile_us: compiling the statement, paid on every compiled cache miss.
+- execute_us: executing against a throwaway SQLite database (or
+  --database-url) through an AsyncSession, end to end.
+
+Usage:
+    python -m benchmarks.statement_compile --iterations 5000
+    python -m benchmarks.statement_compile --compare benchmarks/results/statement-compile-baseline.json
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import typing
+import uuid
+
+from benchmarks.common import (
+    build_results,
+    compare_results,
+    load_results,
+    metric,
+    print_results,
+    save_results,
+    summarize,
+)
+
+
+def configure_environment(database_url: str) -> None:
+    """
+    Points the app settings at the benchmark database.
+    Must run before any `app` module is imported.
+    """
+    os.environ["DB_URL_ASYNC"] = database_url
+    os.environ["TEST"] = ""
+
+
+def rebuilt_statements(ids: dict) -> typing.Dict[str, typing.Callable]:
+    """
+    The hot queries as the repositories built them on every call.
+    """
+    import sqlalchemy as sa
+
+    from app.models.direct_conversation import DirectConversation
+    from app.models.direct_message import DirectMessage
+    from app.models.room_member import RoomMember
+    from app.models.user_session import UserSession
+
+    def session_check():
+        return sa.select(UserSession.jti).where(
+            UserSession.session_id == ids["session_id"],
+            UserSession.is_logged_out.is_(False),
+        ), {}
+
+    def membership_fetch():
+        selected_fields = [
+            getattr(RoomMember, attr)
+            for attr in ["left_room", "is_admin"]
+            if isinstance(attr, str) and hasattr(RoomMember, attr)
+        ]
+        return sa.select(*selected_fields).where(
+            RoomMember.member_id == ids["user_id"], RoomMember.room_id == ids["room_id"]
+        ), {}
+
+    def message_fetch():
+        query = sa.select(DirectMessage).where(DirectMessage.id == ids["message_id"])
+        query = query.where(DirectMessage.conversation_id == ids["conversation_id"])
+        return query, {}
+
+    def conversation_lookup():
+        return sa.select(DirectConversation).where(
+            (
+                (DirectConversation.sender_id == ids["user_id"])
+                & (DirectConversation.recipient_id == ids["peer_id"])
+                | (DirectConversation.sender_id == ids["peer_id"])
+                & (DirectConversation.recipient_id == ids["user_id"])
+            )
+        ), {}
+
+    return {
+        "session_check": session_check,
+        "membership_fetch": membership_fetch,
+        "message_fetch": message_fetch,
+        "conversation_lookup": conversation_lookup,
+    }
+
+
+def prebuilt_statements(ids: dict) -> typing.Dict[str, typing.Callable]:
+    """
+    The hot queries as the repositories execute them now.
+    """
+    from app.core.security import ACTIVE_SESSION_JTI
+    from app.models.direct_conversation import participant_pair_key
+    from app.repository.v1 import direct_conv_repository, direct_message_repository
+    from app.repository.v1 import room_member_repository
+
+    return {
+        "session_check": lambda: (
+            ACTIVE_SESSION_JTI,
+            {"session_id": ids["session_id"]},
+        ),
+        "membership_fetch": lambda: (
+            room_member_repository.fetch_statement(tuple(["left_room", "is_admin"])),
+            {"member_id": ids["user_id"], "room_id": ids["room_id"]},
+        ),
+        "message_fetch": lambda: (
+            direct_message_repository.fetch_statement(tuple([]), True),
+            {
+                "message_id": ids["message_id"],
+                "conversation_id": ids["conversation_id"],
+            },
+        ),
+        "conversation_lookup": lambda: (
+            direct_conv_repository.FIND_BY_PAIR_KEY,
+            {"pair_key": participant_pair_key(ids["user_id"], ids["peer_id"])},
+        ),
+    }
+
+
+def time_us(function: typing.Callable, iterations: int) -> typing.List[float]:
+    """
+    Times each call of a function, in microseconds.
+    """
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started_at) * 1_000_000)
+    return samples
+
+
+async def seed(session) -> dict:
+    """
+    Seeds the rows the hot queries look up.
+    """
+    from app.models.direct_conversation import DirectConversation
+    from app.models.direct_message import DirectMessage
+    from app.models.room import Room
+    from app.models.room_member import RoomMember
+    from app.models.user import User
+    from app.models.user_session import UserSession
+
+    users = [
+        User(
+            email=f"compile{index}@example.com",
+            username=f"compile{index}",
+            first_name="Compile",
+            idempotency_key=str(uuid.uuid4()),
+            password="unused",
+        )
+        for index in range(2)
+    ]
+    session.add_all(users)
+    await session.flush()
+    user_session = UserSession(
+        user_id=users[0].id,
+        session_id=str(uuid.uuid4()),
+        jti=str(uuid.uuid4()),
+        location="benchmark",
+        ip_address="127.0.0.1",
+    )
+    conversation = DirectConversation(sender_id=users[0].id, recipient_id=users[1].id)
+    room = Room(owner_id=users[0].id, name="compile")
+    session.add_all([user_session, conversation, room])
+    await session.flush()
+    message = DirectMessage(
+        sender_id=users[0].id,
+        recipient_id=users[1].id,
+        conversation_id=conversation.id,
+        content="compile",
+    )
+    session.add_all([message, RoomMember(room_id=room.id, member_id=users[0].id)])
+    await session.commit()
+    return {
+        "user_id": users[0].id,
+        "peer_id": users[1].id,
+        "session_id": user_session.session_id,
+        "room_id": room.id,
+        "message_id": message.id,
+        "conversation_id": conversation.id,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """
+    Runs the benchmark and builds the results payload.
+    """
+    import app.models  # noqa: F401, registers every table on the metadata
+    from app.database.session import Base, async_engine, async_session_factory
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session_factory() as session:
+        ids = await seed(session)
+
+    dialect = async_engine.dialect
+    variants = {
+        "rebuilt": rebuilt_statements(ids),
+        "prebuilt": prebuilt_statements(ids),
+    }
+    metrics: typing.Dict[str, dict] = {}
+    extra: typing.Dict[str, dict] = {}
+
+    for variant, statements in variants.items():
+        request_build = [0.0] * args.iterations
+        request_compile = [0.0] * args.iterations
+        for name, build in statements.items():
+            build_key = time_us(
+                lambda: build()[0]._generate_cache_key(), args.iterations
+            )
+            compile_ = time_us(
+                lambda: build()[0].compile(dialect=dialect), args.iterations
+            )
+            request_build = [a + b for a, b in zip(request_build, build_key)]
+            request_compile = [a + b for a, b in zip(request_compile, compile_)]
+            summary = summarize(build_key)
+            extra[f"{variant}.{name}.build_key_us"] = summary
+            metrics[f"{variant}.{name}.build_key_us_p50"] = metric(summary["p50"], "us")
+
+        async def execute_request() -> None:
+            async with async_session_factory() as session:
+                for build in statements.values():
+                    statement, parameters = build()
+                    (await session.execute(statement, parameters)).all()
+
+        for _ in range(args.warmup):
+            await execute_request()
+        request_execute = []
+        for _ in range(args.iterations):
+            started_at = time.perf_counter()
+            await execute_request()
+            request_execute.append((time.perf_counter() - started_at) * 1_000_000)
+
+        for label, samples in [
+            ("build_key_us", request_build),
+            ("compile_us", request_compile),
+            ("execute_us", request_execute),
+        ]:
+            summary = summarize(samples)
+            extra[f"{variant}.request.{label}"] = summary
+            metrics[f"{variant}.request.{label}_p50"] = metric(summary["p50"], "us")
+            metrics[f"{variant}.request.{label}_p95"] = metric(summary["p95"], "us")
+
+    await async_engine.dispose()
+    return build_results(
+        "statement-compile",
+        {"iterations": args.iterations, "warmup": args.warmup},
+        metrics,
+        extra,
+    )
+
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    """
+    Parses command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Statement compile overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=2000, help="measured calls per query")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests")
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway sqlite file")
+    parser.add_argument("--output", default=None, help="results JSON path")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    """
+    Entry point.
+    """
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="statement-compile-") as workdir:
+        database_url = args.database_url or (
+            f"sqlite+aiosqlite:///{os.path.join(workdir, 'statement-compile.db')}"
+        )
+        configure_environment(database_url)
+
+        results = asyncio.run(run(args))
+
+    comparison = []
+    if args.compare:
+        comparison = compare_results(results, load_results(args.compare), args.tolerance)
+    path = save_results(results, args.output)
+    print_results(results, comparison)
+    print(f"\nresults written to {path}")
+    return 1 if any(row["regressed"] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
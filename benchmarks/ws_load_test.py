@@ -0,0 +1,566 @@
+"""
+Websocket load-test module.
+
+Spins up the app with uvicorn against a throwaway database and a local
+redis-server, connects many simulated authenticated clients to `/chats/ws`,
+drives direct message and room traffic and reports fan-out latency,
+throughput, memory per connection and Redis connections used.
+
+Usage:
+    python -m benchmarks.ws_load_test --clients 1000 --messages 5000 --spawn-redis
+    python -m benchmarks.ws_load_test --clients 200 --compare benchmarks/results/ws-baseline.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import uuid
+from dataclasses import dataclass, field
+
+from benchmarks.common import (
+    build_results,
+    compare_results,
+    load_results,
+    metric,
+    print_results,
+    process_tree_rss,
+    save_results,
+    summarize,
+)
+
+MARKER = "lt"
+
+
+@dataclass
+class SimulatedClient:
+    """
+    A seeded user the load-test connects as.
+    """
+
+    user_id: str
+    token: str
+    channels: typing.List[str] = field(default_factory=list)
+
+
+@dataclass
+class LoadTestStats:
+    """
+    Counters shared by all simulated clients.
+    """
+
+    connected: int = 0
+    failed_connects: int = 0
+    disconnected: int = 0
+    connect_ms: typing.List[float] = field(default_factory=list)
+    fanout_ms: typing.List[float] = field(default_factory=list)
+    send_ms: typing.List[float] = field(default_factory=list)
+    send_errors: int = 0
+    system_messages: int = 0
+    deliveries: int = 0
+    expected_deliveries: int = 0
+    first_send_at: float = 0.0
+    last_delivery_at: float = 0.0
+
+
+def free_port() -> int:
+    """
+    Returns a free local TCP port.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    """
+    Waits until something accepts connections on a local port.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def spawn_redis() -> typing.Tuple[subprocess.Popen, str]:
+    """
+    Starts a throwaway local redis-server without persistence.
+    """
+    binary = shutil.which("redis-server")
+    if not binary:
+        raise SystemExit("redis-server not found on PATH; pass --redis-url instead")
+    port = free_port()
+    process = subprocess.Popen(
+        [binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    return process, f"redis://127.0.0.1:{port}/0"
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    Points the app settings at the load-test database and redis.
+    Must run before any `app` module is imported.
+    """
+    os.environ["DB_URL_ASYNC"] = args.database_url
+    os.environ["TEST"] = ""
+    if not args.redis_url:
+        from app.core.config import settings
+
+        args.redis_url = settings.redis_url
+    os.environ["REDIS_URL"] = args.redis_url
+
+
+async def seed(args: argparse.Namespace) -> typing.Tuple[
+    typing.List[SimulatedClient], typing.List[typing.Tuple[str, str, str]], dict
+]:
+    """
+    Creates users, sessions, conversations and rooms for the simulated clients.
+
+    Returns:
+        clients, direct conversation triples (conversation_id, user_a, user_b)
+        and a mapping of room_id to member ids.
+    """
+    from app.database.session import create_tables, async_session_factory
+    from app.core.security import generate_token
+    from app.models.user import User
+    from app.models.user_session import UserSession
+    from app.models.direct_conversation import DirectConversation
+    from app.models.room import Room
+    from app.models.room_member import RoomMember
+
+    await create_tables()
+
+    users: typing.List[User] = []
+    clients: typing.List[SimulatedClient] = []
+    async with async_session_factory() as session:
+        for index in range(args.clients):
+            email = f"loadtest-{uuid.uuid4().hex[:12]}-{index}@example.com"
+            user = User(
+                email=email,
+                first_name=f"load{index}",
+                email_verified=True,
+                idempotency_key=hashlib.sha256(email.encode()).hexdigest(),
+            )
+            users.append(user)
+        session.add_all(users)
+        await session.flush()
+
+        user_sessions = []
+        for user in users:
+            session_id, jti = str(uuid.uuid4()), str(uuid.uuid4())
+            user_sessions.append(
+                UserSession(
+                    user_id=user.id,
+                    session_id=session_id,
+                    jti=jti,
+                    location="loadtest",
+                    ip_address="127.0.0.1",
+                )
+            )
+            token = await generate_token(
+                session_id=session_id,
+                user_id=user.id,
+                jti=jti,
+                user_agent="ws-load-test",
+                ip_address="127.0.0.1",
+                location="loadtest",
+            )
+            clients.append(SimulatedClient(user_id=user.id, token=token))
+        session.add_all(user_sessions)
+
+        # pair clients (0, 1), (2, 3), ... into direct conversations
+        conversations: typing.List[typing.Tuple[str, str, str]] = []
+        for index in range(0, len(clients) - 1, 2):
+            conversation = DirectConversation(
+                sender_id=clients[index].user_id,
+                recipient_id=clients[index + 1].user_id,
+            )
+            session.add(conversation)
+            await session.flush()
+            conversations.append(
+                (conversation.id, clients[index].user_id, clients[index + 1].user_id)
+            )
+            clients[index].channels.append(f"dm:{conversation.id}")
+            clients[index + 1].channels.append(f"dm:{conversation.id}")
+
+        rooms: typing.Dict[str, typing.List[str]] = {}
+        for room_index in range(args.rooms):
+            room = Room(owner_id=clients[0].user_id, name=f"load room {room_index}")
+            session.add(room)
+            await session.flush()
+            rooms[room.id] = []
+        room_ids = list(rooms.keys())
+        for index, client in enumerate(clients):
+            if not room_ids:
+                break
+            room_id = room_ids[index % len(room_ids)]
+            session.add(RoomMember(room_id=room_id, member_id=client.user_id))
+            rooms[room_id].append(client.user_id)
+            client.channels.append(f"room:{room_id}")
+
+        await session.commit()
+
+    return clients, conversations, rooms
+
+
+async def run_client(
+    url: str,
+    client: SimulatedClient,
+    stats: LoadTestStats,
+    stop: asyncio.Event,
+) -> None:
+    """
+    Connects one simulated client and records deliveries until stopped.
+    """
+    import websockets
+
+    started = time.perf_counter()
+    channels = ",".join(client.channels) or "system_presence"
+    try:
+        connection = await websockets.connect(
+            f"{url}?subscribe_to={channels}",
+            extra_headers={"Authorization": f"Bearer {client.token}"},
+            ping_interval=None,
+            max_queue=None,
+            open_timeout=60,
+        )
+    except Exception:  # noqa: BLE001 - any handshake failure counts as failed
+        stats.failed_connects += 1
+        return
+    stats.connected += 1
+    stats.connect_ms.append((time.perf_counter() - started) * 1000)
+
+    async def receive() -> None:
+        async for raw in connection:
+            now = time.time()
+            try:
+                payload = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+            text = payload.get("content") or payload.get("text") or ""
+            if not isinstance(text, str) or not text.startswith(f"{MARKER}|"):
+                stats.system_messages += 1
+                continue
+            _, _, sent_at = text.split("|", 2)
+            stats.fanout_ms.append((now - float(sent_at)) * 1000)
+            stats.deliveries += 1
+            stats.last_delivery_at = now
+
+    receiver = asyncio.create_task(receive())
+    try:
+        await asyncio.wait(
+            [receiver, asyncio.create_task(stop.wait())],
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if receiver.done():
+            stats.disconnected += 1
+    finally:
+        receiver.cancel()
+        await connection.close()
+
+
+async def drive_traffic(
+    args: argparse.Namespace,
+    base_url: str,
+    clients: typing.List[SimulatedClient],
+    conversations: typing.List[typing.Tuple[str, str, str]],
+    rooms: typing.Dict[str, typing.List[str]],
+    stats: LoadTestStats,
+) -> None:
+    """
+    Sends direct messages through the HTTP API and room messages through Redis.
+    """
+    import httpx
+    from redis.asyncio import Redis
+    from app.websocketss.ws_redis_connection_manager import (
+        ws_redis_connection_manager,
+    )
+
+    tokens = {client.user_id: client.token for client in clients}
+    room_ids = [room_id for room_id, members in rooms.items() if members]
+    redis = Redis.from_url(args.redis_url, decode_responses=True)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    interval = 1 / args.rate if args.rate > 0 else 0
+
+    async def send_dm(http: httpx.AsyncClient, sequence: int) -> None:
+        conversation_id, sender_id, recipient_id = random.choice(conversations)
+        if random.random() < 0.5:
+            sender_id, recipient_id = recipient_id, sender_id
+        sent_at = time.time()
+        started = time.perf_counter()
+        response = await http.post(
+            "/api/v1/direct-messages",
+            json={
+                "recipient_id": recipient_id,
+                "conversation_id": conversation_id,
+                "message": f"{MARKER}|{sequence}|{sent_at}",
+            },
+            headers={"Authorization": f"Bearer {tokens[sender_id]}"},
+        )
+        stats.send_ms.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 201:
+            stats.send_errors += 1
+            return
+        stats.expected_deliveries += 2
+
+    async def send_room(sequence: int) -> None:
+        room_id = random.choice(room_ids)
+        sent_at = time.time()
+        started = time.perf_counter()
+        await ws_redis_connection_manager.send_room_message(
+            user_id=rooms[room_id][0],
+            room_id=room_id,
+            message=f"{MARKER}|{sequence}|{sent_at}",
+            redis=redis,
+        )
+        stats.send_ms.append((time.perf_counter() - started) * 1000)
+        stats.expected_deliveries += len(rooms[room_id])
+
+    async def send(http: httpx.AsyncClient, sequence: int) -> None:
+        async with semaphore:
+            try:
+                if room_ids and (
+                    not conversations or random.random() < args.room_ratio
+                ):
+                    await send_room(sequence)
+                else:
+                    await send_dm(http, sequence)
+            except Exception:  # noqa: BLE001 - keep driving on errors
+                stats.send_errors += 1
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=60,
+        headers={"User-Agent": "ws-load-test"},
+        limits=httpx.Limits(max_connections=args.concurrency),
+    ) as http:
+        stats.first_send_at = time.time()
+        pending = []
+        for sequence in range(args.messages):
+            pending.append(asyncio.create_task(send(http, sequence)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*pending)
+    await redis.aclose()
+
+
+async def redis_client_count(redis_url: str) -> typing.Optional[int]:
+    """
+    Returns the number of clients connected to redis.
+    """
+    from redis.asyncio import Redis
+
+    redis = Redis.from_url(redis_url)
+    try:
+        info = await redis.info("clients")
+        # exclude this probing connection
+        return int(info.get("connected_clients", 0)) - 1
+    finally:
+        await redis.aclose()
+
+
+async def run(args: argparse.Namespace, server: subprocess.Popen, port: int) -> dict:
+    """
+    Runs the load-test and returns the results payload.
+    """
+    clients, conversations, rooms = await seed(args)
+    stats = LoadTestStats()
+    stop = asyncio.Event()
+
+    rss_before = process_tree_rss(server.pid)
+    redis_before = await redis_client_count(args.redis_url)
+
+    ws_url = f"ws://127.0.0.1:{port}/chats/ws"
+    client_tasks = []
+    connect_started = time.perf_counter()
+    for index, client in enumerate(clients):
+        client_tasks.append(asyncio.create_task(run_client(ws_url, client, stats, stop)))
+        if args.connect_rate and (index + 1) % args.connect_rate == 0:
+            await asyncio.sleep(1)
+    while stats.connected + stats.failed_connects < len(clients):
+        await asyncio.sleep(0.1)
+        if time.perf_counter() - connect_started > args.connect_timeout:
+            break
+    connect_seconds = time.perf_counter() - connect_started
+    # let presence broadcasts from the ramp-up settle before measuring
+    await asyncio.sleep(args.settle_seconds)
+
+    rss_after = process_tree_rss(server.pid)
+    redis_after = await redis_client_count(args.redis_url)
+
+    await drive_traffic(args, f"http://127.0.0.1:{port}", clients, conversations, rooms, stats)
+    send_seconds = max(time.time() - stats.first_send_at, 1e-9)
+
+    drain_deadline = time.monotonic() + args.drain_seconds
+    while (
+        stats.deliveries < stats.expected_deliveries
+        and time.monotonic() < drain_deadline
+    ):
+        await asyncio.sleep(0.1)
+
+    stop.set()
+    await asyncio.gather(*client_tasks, return_exceptions=True)
+
+    delivery_seconds = max(stats.last_delivery_at - stats.first_send_at, 1e-9)
+    rss_per_connection = (
+        (rss_after - rss_before) / stats.connected
+        if rss_before is not None and rss_after is not None and stats.connected
+        else None
+    )
+    redis_connections = (
+        redis_after - redis_before
+        if redis_before is not None and redis_after is not None
+        else None
+    )
+    fanout = summarize(stats.fanout_ms)
+    send = summarize(stats.send_ms)
+    connect = summarize(stats.connect_ms)
+
+    metrics = {
+        "connect_ms.p95": metric(connect["p95"], "ms"),
+        "fanout_latency_ms.p50": metric(fanout["p50"], "ms"),
+        "fanout_latency_ms.p95": metric(fanout["p95"], "ms"),
+        "fanout_latency_ms.p99": metric(fanout["p99"], "ms"),
+        "send_latency_ms.p50": metric(send["p50"], "ms"),
+        "send_latency_ms.p95": metric(send["p95"], "ms"),
+        "messages_sent_per_second": metric(
+            round(args.messages / send_seconds, 2), "msg/s", better="higher"
+        ),
+        "deliveries_per_second": metric(
+            round(stats.deliveries / delivery_seconds, 2), "msg/s", better="higher"
+        ),
+        "delivery_ratio": metric(
+            round(stats.deliveries / stats.expected_deliveries, 4)
+            if stats.expected_deliveries
+            else None,
+            "ratio",
+            better="higher",
+        ),
+        "server_rss_per_connection_bytes": metric(
+            round(rss_per_connection) if rss_per_connection is not None else None,
+            "bytes",
+        ),
+        "redis_connections": metric(redis_connections, "connections"),
+        "redis_connections_per_client": metric(
+            round(redis_connections / stats.connected, 3)
+            if redis_connections is not None and stats.connected
+            else None,
+            "connections",
+        ),
+    }
+    extra = {
+        "connected": stats.connected,
+        "failed_connects": stats.failed_connects,
+        "dropped_connections": stats.disconnected,
+        "connect_seconds": round(connect_seconds, 3),
+        "send_errors": stats.send_errors,
+        "system_messages_received": stats.system_messages,
+        "deliveries": stats.deliveries,
+        "expected_deliveries": stats.expected_deliveries,
+        "fanout_latency_ms": fanout,
+        "send_latency_ms": send,
+        "connect_ms": connect,
+        "server_rss_before_bytes": rss_before,
+        "server_rss_after_connect_bytes": rss_after,
+    }
+    parameters = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ["output", "compare", "database_url", "redis_url"]
+    }
+    return build_results("ws-load-test", parameters, metrics, extra)
+
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    """
+    Parses command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Websocket load-test for /chats/ws")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200, help="messages per second, 0 = unthrottled")
+    parser.add_argument("--room-ratio", type=float, default=0.5, help="share of room messages")
+    parser.add_argument("--concurrency", type=int, default=50, help="in-flight sends")
+    parser.add_argument("--connect-rate", type=int, default=200, help="connections opened per second, 0 = all at once")
+    parser.add_argument("--connect-timeout", type=float, default=120)
+    parser.add_argument("--settle-seconds", type=float, default=2)
+    parser.add_argument("--drain-seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway sqlite file")
+    parser.add_argument("--redis-url", default=None, help="defaults to REDIS_URL")
+    parser.add_argument("--spawn-redis", action="store_true", help="start a throwaway local redis-server")
+    parser.add_argument("--output", default=None, help="results JSON path")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    """
+    Entry point.
+    """
+    args = parse_args(argv)
+    redis_process = None
+    workdir = tempfile.mkdtemp(prefix="ws-load-test-")
+    if args.spawn_redis:
+        redis_process, args.redis_url = spawn_redis()
+    if not args.database_url:
+        args.database_url = f"sqlite+aiosqlite:///{os.path.join(workdir, 'ws-load.db')}"
+    configure_environment(args)
+
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    try:
+        wait_for_port(port)
+        results = asyncio.run(run(args, server, port))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        if redis_process:
+            redis_process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    comparison = []
+    if args.compare:
+        comparison = compare_results(results, load_results(args.compare), args.tolerance)
+    path = save_results(results, args.output)
+    print_results(results, comparison)
+    print(f"\nresults written to {path}")
+    return 1 if any(row["regressed"] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ from typing import AsyncIterator
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, Request, WebSocketException
+from fastapi import FastAPI, Request, Response, WebSocketException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.exceptions import RequestValidationError, HTTPException
@@ -28,12 +28,12 @@ from app.core.error_handlers import (
     ratelimit_exception_handler,
     websocket_exception_handler,
 )
-from app.database.session import async_engine
+from app.database.session import async_engine, replica_router
 from app.utils.task_logger import create_logger
 from app.route.v1 import api_version_one
 from app.websocketss import websocket_router
 from app.core.config import settings
-from app.database.celery_database import setup_celery_results_db
+from app.core.metrics import render_metrics
 
 logger = create_logger("Main App")
 
@@ -49,11 +49,11 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     App instance lifspan
     """
     logger.info(msg="Starting Application")
-    setup_celery_results_db()
     try:
         yield
     finally:
         await async_engine.dispose()
+        await replica_router.dispose()
         logger.info(msg="Shutting Down Application")
 
 
@@ -103,6 +103,15 @@ async def read_root(request: Request) -> dict:
     return {"message": "Welcome to chatroom API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Prometheus metrics
+    """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
 app.add_exception_handler(RateLimitExceeded, ratelimit_exception_handler)
 app.add_exception_handler(HTTPException, http_exception)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)